@@ -0,0 +1,260 @@
+#
+# AST dumper. Version 1.0
+#
+# Streams an AST to a text stream in one of three formats:
+#
+#     tree    the indented format of PrintVisitor, a line per node (the default)
+#     sexpr   a compact S-expression on a single line, the types as :T atoms, the strings quoted as in JSON
+#     jsonl   a JSON object per node, in preorder: its id, the id of its parent and the field of the parent it is in,
+#             its kind, its attributes (name, value, op), and its type and its span (first line and column, last line
+#             and column) when known
+#
+# The tree is walked without recursion, with a stack as deep as the tree, and the output is written in blocks of
+# BUFFER pieces, so dumping a tree takes memory proportional to its depth, not its size. The indentation prefixes
+# are built once per depth.
+#
+#     ast_dump.dump(tree, sys.stdout, 'sexpr')
+#
+import io
+import json
+import sys
+import astree as ast
+
+FORMATS = ['tree', 'sexpr', 'jsonl']
+BUFFER = 4096
+
+# AST node class -> (kind, attributes, fields holding its children, in order). A node without fields is a leaf.
+SHAPES = {
+    ast.IdentifierNode: ('Identifier', ['name'], []),
+    ast.NoneLiteralExprNode: ('None', [], []),
+    ast.StringLiteralExprNode: ('String', ['value'], []),
+    ast.IntegerLiteralExprNode: ('Integer', ['value'], []),
+    ast.BooleanLiteralExprNode: ('Bool', ['value'], []),
+    ast.IdentifierExprNode: ('IdentifierExpr', [], ['identifier']),
+    ast.BinaryOpExprNode: ('BinaryOperator', ['op'], ['lhs', 'rhs']),
+    ast.UnaryOpExprNode: ('UnaryOperator', ['op'], ['operand']),
+    ast.IfExprNode: ('IfExpr', [], ['condition', 'then_expr', 'else_expr']),
+    ast.IndexExprNode: ('IndexExpr', [], ['list_expr', 'index']),
+    ast.MemberExprNode: ('MemberExpr', [], ['expr_object', 'member']),
+    ast.FunctionCallExprNode: ('FunctionCallExpr', [], ['identifier', 'args']),
+    ast.MethodCallExprNode: ('MethodCallExpr', [], ['member', 'args']),
+    ast.ListExprNode: ('ListExpr', [], ['elements']),
+    ast.ExprStmt: ('ExprStmt', [], ['expr']),
+    ast.PassStmtNode: ('PassStmt', [], []),
+    ast.ReturnStmtNode: ('ReturnStmt', [], ['expr']),
+    ast.AssignStmtNode: ('AssignStmt', [], ['targets', 'expr']),
+    ast.IfStmtNode: ('IfStmt', [], ['condition', 'then_body', 'elifs', 'else_body']),
+    ast.WhileStmtNode: ('WhileStmt', [], ['condition', 'body']),
+    ast.ForStmtNode: ('ForStmt', [], ['identifier', 'iterable', 'body']),
+    ast.ClassTypeAnnotationNode: ('ClassTypeAnnotation', ['name'], []),
+    ast.ListTypeAnnotationNode: ('ListTypeAnnotation', [], ['elem_type']),
+    ast.TypedVarNode: ('TypedVar', [], ['identifier', 'id_type']),
+    ast.VarDefNode: ('VarDef', [], ['var', 'value']),
+    ast.GlobalDeclNode: ('GlobalDecl', [], ['variable']),
+    ast.NonLocalDeclNode: ('NonLocalDecl', [], ['variable']),
+    ast.ClassDefNode: ('ClassDef', [], ['name', 'super_class', 'declarations']),
+    ast.FuncDefNode: ('FuncDef', [], ['name', 'params', 'return_type', 'declarations', 'statements']),
+    ast.ProgramNode: ('Program', [], ['declarations', 'statements']),
+}
+
+# The leaves in the tree format, as PrintVisitor prints them.
+TREE_LEAVES = {
+    ast.IdentifierNode: lambda n: f'(Identifier {n.name})',
+    ast.NoneLiteralExprNode: lambda n: f'(None) t:{n.get_type_str()}',
+    ast.StringLiteralExprNode: lambda n: f'(String "{n.value} t:{n.get_type_str()}")',
+    ast.IntegerLiteralExprNode: lambda n: f'(Integer {n.value} t:{n.get_type_str()})',
+    ast.BooleanLiteralExprNode: lambda n: f'(Bool {n.value} t:{n.get_type_str()})',
+    ast.PassStmtNode: lambda n: 'PassStmt)',
+    ast.ClassTypeAnnotationNode: lambda n: f'(ClassTypeAnnotation {n.name})',
+}
+
+
+def children(node):
+    """
+    Yields the children of a node as (field, child) pairs, in the order PrintVisitor visits them. The branches of an
+    if statement are introduced by the markers 'then', 'elif' and 'else', yielded as (None, marker).
+    """
+    if type(node) is ast.IfStmtNode:
+        yield 'condition', node.condition
+        yield None, 'then'
+        yield from (('then_body', s) for s in node.then_body if s)
+        for condition, body in node.elifs:
+            yield None, 'elif'
+            yield 'elif_condition', condition
+            yield from (('elif_body', s) for s in body if s)
+        yield None, 'else'
+        yield from (('else_body', s) for s in node.else_body if s)
+        return
+    for field in SHAPES[type(node)][2]:
+        value = getattr(node, field)
+        if isinstance(value, list):
+            yield from ((field, c) for c in value if c)
+        elif value:
+            yield field, value
+
+
+class Dumper:
+    """
+    Walks a tree and writes it to a stream; the subclasses write the nodes in their format.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = []
+        self.count = 0  # The nodes dumped.
+
+    def write(self, *pieces):
+        self.buffer += pieces
+        if len(self.buffer) >= BUFFER:
+            self.flush()
+
+    def flush(self):
+        self.stream.write(''.join(self.buffer))
+        self.buffer.clear()
+
+    def dump(self, tree, depth: int = 0, parent: int = None, field: str = None) -> int:
+        """
+        Writes a tree and returns the number of its nodes. A tree dumped at a depth is the child in field of the node
+        of id parent, opened before (to stream a program one top-level node at a time).
+        """
+        start, stack = self.count, []  # The stack holds (the children left, node, depth, node id) per open node.
+        if SHAPES[type(tree)][2]:
+            stack.append((children(tree), tree, depth, start))
+            self.open(tree, field, depth, parent)
+        else:
+            self.leaf(tree, field, depth, parent)
+        while stack:
+            items, node, depth, ident = stack[-1]
+            for field, child in items:
+                if field is None:
+                    self.marker(child, depth + 1)
+                elif SHAPES[type(child)][2]:
+                    stack.append((children(child), child, depth + 1, self.count))
+                    self.open(child, field, depth + 1, ident)
+                    break
+                else:
+                    self.leaf(child, field, depth + 1, ident)
+            else:
+                stack.pop()
+                self.close(node, depth)
+        self.flush()
+        return self.count - start
+
+    def leaf(self, node, field: str, depth: int, parent: int):
+        self.count += 1
+
+    def open(self, node, field: str, depth: int, parent: int):
+        self.count += 1
+
+    def close(self, node, depth: int):
+        return
+
+    def marker(self, text: str, depth: int):
+        return
+
+
+class TreeDumper(Dumper):
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.prefixes = ['']
+
+    def line(self, depth: int, text: str):
+        while len(self.prefixes) <= depth:
+            self.prefixes.append(' ' * len(self.prefixes))
+        self.write(self.prefixes[depth], text, '\n')
+
+    def leaf(self, node, field: str, depth: int, parent: int):
+        super().leaf(node, field, depth, parent)
+        self.line(depth, TREE_LEAVES[type(node)](node))
+
+    def open(self, node, field: str, depth: int, parent: int):
+        super().open(node, field, depth, parent)
+        if type(node) is ast.GlobalDeclNode:
+            self.line(depth, 'GlobalDecl')
+            return
+        kind, attributes, _ = SHAPES[type(node)]
+        self.line(depth, '(' + kind + ''.join(f' {getattr(node, a)}' for a in attributes))
+
+    def close(self, node, depth: int):
+        self.line(depth, f't:{node.get_type_str()})' if isinstance(node, ast.ExprNode) else ')')
+
+    def marker(self, text: str, depth: int):
+        self.line(depth, text)
+
+
+def atom(node, attribute: str) -> str:
+    value = getattr(node, attribute)
+    if type(node) is ast.StringLiteralExprNode:
+        return json.dumps(value)
+    return value.name if isinstance(value, ast.Operator) else str(value)
+
+
+class SExprDumper(Dumper):
+
+    def head(self, node, depth: int) -> str:
+        kind, attributes, _ = SHAPES[type(node)]
+        return f"{' ' if depth else ''}({kind}" + ''.join(' ' + atom(node, a) for a in attributes)
+
+    def tail(self, node) -> str:
+        if isinstance(node, ast.ExprNode) and node.get_type_str():
+            return f' :{node.get_type_str()})'
+        return ')'
+
+    def leaf(self, node, field: str, depth: int, parent: int):
+        super().leaf(node, field, depth, parent)
+        self.write(self.head(node, depth), self.tail(node))
+        if depth == 0:
+            self.write('\n')
+
+    def open(self, node, field: str, depth: int, parent: int):
+        super().open(node, field, depth, parent)
+        self.write(self.head(node, depth))
+
+    def close(self, node, depth: int):
+        self.write(self.tail(node))
+        if depth == 0:
+            self.write('\n')
+
+    def marker(self, text: str, depth: int):
+        self.write(' ', text)
+
+
+class JsonDumper(Dumper):
+
+    def leaf(self, node, field: str, depth: int, parent: int):
+        kind, attributes, _ = SHAPES[type(node)]
+        record = {'id': self.count, 'parent': parent, 'field': field, 'kind': kind}
+        for a in attributes:
+            value = getattr(node, a)
+            record[a] = value.name if isinstance(value, ast.Operator) else value
+        if isinstance(node, ast.ExprNode) and node.get_type_str():
+            record['type'] = node.get_type_str()
+        if node.span is not None:
+            start, end = node.span
+            record['span'] = [start.line, start.col, end.line, end.col]
+        self.write(json.dumps(record), '\n')
+        super().leaf(node, field, depth, parent)
+
+    open = leaf
+
+
+DUMPERS = {'tree': TreeDumper, 'sexpr': SExprDumper, 'jsonl': JsonDumper}
+
+
+def dump(tree, stream=None, fmt: str = 'tree') -> int:
+    """
+    Writes a tree to a text stream (the standard output by default) in format fmt, and returns the number of its
+    nodes.
+    """
+    if fmt not in DUMPERS:
+        raise ValueError(f"Unknown AST format {fmt}, they are {', '.join(FORMATS)}")
+    return DUMPERS[fmt](sys.stdout if stream is None else stream).dump(tree)
+
+
+def dumps(tree, fmt: str = 'tree') -> str:
+    """
+    Returns the dump of a tree in format fmt.
+    """
+    out = io.StringIO()
+    dump(tree, out, fmt)
+    return out.getvalue()
@@ -1,5 +1,5 @@
 #
-# ASTree version 1.06
+# ASTree version 1.07
 #
 
 from enum import Enum
@@ -25,6 +25,8 @@ class Operator(Enum):
 
 
 class Node:
+    # The source span of the node, a (start, end) pair of lexer Locations set by the parser (None if unknown).
+    span = None
 
     def __str__(self):
         return self.__class__.__name__ \
@@ -64,6 +66,9 @@ class NoneLiteralExprNode(LiteralExprNode):
     def __init__(self):
         super().__init__()
 
+    def get_value(self):
+        return None
+
 
 class StringLiteralExprNode(LiteralExprNode):
 
@@ -71,6 +76,9 @@ class StringLiteralExprNode(LiteralExprNode):
         super().__init__()
         self.value = value
 
+    def get_value(self) -> str:
+        return self.value
+
 
 class IntegerLiteralExprNode(LiteralExprNode):
 
@@ -78,6 +86,10 @@ class IntegerLiteralExprNode(LiteralExprNode):
         super().__init__()
         self.value = value
 
+    def get_value(self) -> int:
+        # The parser stores the lexeme of the literal.
+        return int(self.value)
+
 
 class BooleanLiteralExprNode(LiteralExprNode):
 
@@ -85,6 +97,10 @@ class BooleanLiteralExprNode(LiteralExprNode):
         super().__init__()
         self.value = value
 
+    def get_value(self) -> bool:
+        # The parser stores the lexeme of the literal.
+        return self.value is True or self.value == 'True'
+
 
 class IdentifierExprNode(ExprNode):
 
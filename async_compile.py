@@ -0,0 +1,286 @@
+#
+# Asyncio compile API. Version 1.0
+#
+# Compiles from an asyncio service without blocking its event loop: the phases run on a pool of warm worker
+# processes (the compiler imported, the built-in prelude built, a query database of recent files, as in the compile
+# server), and the event loop only waits on their pipes. `await compiler.compile_source(text)` returns the driver's
+# record of the text, and `async for d in compiler.stream(text)` yields its diagnostics as the worker produces them:
+# the syntax error, the errors in the symbol table, then the type errors a function body at a time.
+#
+# Requests wait in a bounded queue, so that a burst of requests makes their callers wait instead of piling up in
+# memory. Each request can be given a timeout, which counts from the time it is submitted. A request cancelled or timed
+# out while a worker is compiling it kills that worker, which is replaced, so an abandoned request does not keep a
+# worker busy.
+#
+# Usage: python async_compile.py --worker [--cache-dir=DIR]   (the worker processes, started by AsyncCompiler)
+#
+import asyncio
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+import compile_cache
+import compile_server
+import driver
+
+QUEUE_PER_WORKER = 8
+LINE_LIMIT = 1 << 28  # The longest response line read from a worker, in bytes.
+
+
+class WorkerError(Exception):
+    """
+    Raised for a request on which the compiler failed, or whose worker died.
+    """
+
+
+class Job:
+    """
+    A request: the text to compile and its options, the future of its record, the callback taking its diagnostics
+    and the worker compiling it.
+    """
+    def __init__(self, text: str, filename: str, stop_after: str, emit: list, on_diagnostic):
+        self.request = {'source': text, 'path': filename, 'stop_after': stop_after, 'emit': emit,
+                        'stream': on_diagnostic is not None}
+        self.future = asyncio.get_running_loop().create_future()
+        self.on_diagnostic = on_diagnostic
+        self.worker = None
+
+
+class Worker:
+    """
+    A worker process, compiling one request at a time from JSON lines on its stdin.
+    """
+    def __init__(self, cache_dir: str):
+        self.args = [sys.executable, os.path.abspath(__file__), '--worker']
+        if cache_dir:
+            self.args.append(f'--cache-dir={cache_dir}')
+        self.process = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(*self.args, stdin=asyncio.subprocess.PIPE,
+                                                            stdout=asyncio.subprocess.PIPE, limit=LINE_LIMIT)
+
+    def kill(self):
+        if self.process.returncode is None:
+            self.process.kill()
+
+    async def stop(self):
+        self.kill()
+        await self.process.wait()
+
+    async def run(self, job: Job, request_id: int):
+        """
+        Sends a request to the worker and resolves its future with the record, passing on its diagnostics as they
+        come. Raises WorkerError if the worker dies.
+        """
+        self.process.stdin.write(json.dumps({**job.request, 'id': request_id}).encode() + b'\n')
+        try:
+            await self.process.stdin.drain()
+        except ConnectionError:
+            pass  # The worker died, and reading its output says so.
+        while line := await self.process.stdout.readline():
+            response = json.loads(line)
+            if job.future.done():
+                continue  # Abandoned: the worker is being killed.
+            if 'diagnostic' in response:
+                job.on_diagnostic(response['diagnostic'])
+                continue
+            if 'error' in response:
+                job.future.set_exception(WorkerError(response['error']))
+            else:
+                job.future.set_result(response['record'])
+            return
+        await self.process.wait()
+        raise WorkerError(f"The worker process exited with status {self.process.returncode}.")
+
+
+class AsyncCompiler:
+    """
+    A pool of compile workers for an event loop. Start it with `await compiler.start()` (or `async with`) and close
+    it with `await compiler.close()`.
+    """
+    def __init__(self, workers: int = None, queue_size: int = None, timeout: float = None,
+                 cache_dir: str = compile_cache.DEFAULT_DIR):
+        self.workers = [Worker(cache_dir) for _ in range(workers or os.cpu_count() or 1)]
+        self.queue_size = queue_size or QUEUE_PER_WORKER * len(self.workers)
+        self.queue = None
+        self.timeout = timeout
+        self.dispatchers = []
+        self.busy = 0  # The requests being compiled.
+        self.ids = itertools.count(1)
+        self.counters = collections.Counter()
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        await asyncio.gather(*(w.start() for w in self.workers))
+        self.dispatchers = [asyncio.create_task(self.dispatch(w)) for w in self.workers]
+
+    async def close(self):
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        await asyncio.gather(*(w.stop() for w in self.workers))
+        self.dispatchers = []
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(WorkerError("The compiler was closed."))
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def dispatch(self, worker: Worker):
+        """
+        Feeds a worker the requests from the queue, skipping those abandoned while queued, and replaces the worker
+        when it dies (or is killed for an abandoned request).
+        """
+        while True:
+            job = await self.queue.get()
+            if job.future.done():
+                continue
+            job.worker = worker
+            self.busy += 1
+            try:
+                await worker.run(job, next(self.ids))
+            except WorkerError as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                self.counters['restarts'] += 1
+                await worker.start()
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.set_exception(WorkerError("The compiler was closed."))
+                raise
+            finally:
+                job.worker = None
+                self.busy -= 1
+
+    async def submit(self, job: Job, timeout: float) -> dict:
+        """
+        Queues a request, waiting while the queue is full, and returns its record. A request abandoned (cancelled or
+        timed out) while it is compiling kills its worker.
+        """
+        if not self.dispatchers:
+            raise RuntimeError("The compiler is not started.")
+        timeout = self.timeout if timeout is None else timeout
+        self.counters['requests'] += 1
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                await self.queue.put(job)
+                if not self.dispatchers:
+                    raise WorkerError("The compiler was closed.")
+                self.counters['queue_wait'] += time.perf_counter() - start
+                return await asyncio.shield(job.future)
+        except TimeoutError:
+            self.counters['timeouts'] += 1
+            raise
+        except asyncio.CancelledError:
+            self.counters['cancelled'] += 1
+            raise
+        finally:
+            if not job.future.done():
+                job.future.cancel()
+                if job.worker:
+                    job.worker.kill()
+            self.counters['time'] += time.perf_counter() - start
+
+    async def compile_source(self, text: str, filename: str = '<string>', stop_after: str = 'typecheck',
+                             emit: list = (), timeout: float = None, on_diagnostic=None) -> dict:
+        """
+        Compiles a source text on a worker and returns the driver's record of it (see driver.compile_source), with the
+        outputs given by emit under 'output' (see compile_server.py). on_diagnostic is called with each diagnostic of
+        the record as soon as it is produced. Raises TimeoutError after timeout seconds (the compiler's default timeout
+        if None) and WorkerError if the compiler fails.
+        """
+        if stop_after not in driver.PHASES or any(kind not in compile_server.OUTPUTS for kind in emit):
+            raise ValueError(f"Phases are {driver.PHASES}, outputs are {compile_server.OUTPUTS}")
+        return await self.submit(Job(text, filename, stop_after, list(emit), on_diagnostic), timeout)
+
+    async def stream(self, text: str, filename: str = '<string>', stop_after: str = 'typecheck',
+                     timeout: float = None):
+        """
+        Yields the diagnostics of a source text as they are produced. Leaving the loop early abandons the request.
+        """
+        diagnostics = asyncio.Queue()
+        task = asyncio.create_task(self.compile_source(text, filename, stop_after, timeout=timeout,
+                                                       on_diagnostic=diagnostics.put_nowait))
+        task.add_done_callback(lambda _: diagnostics.put_nowait(None))
+        try:
+            while (d := await diagnostics.get()) is not None:
+                yield d
+            await task
+        finally:
+            task.cancel()
+
+    def stats(self) -> dict:
+        """
+        The counters of the requests (with the seconds spent waiting in the queue and in total), the requests queued
+        and those being compiled.
+        """
+        return {**{k: round(v, 3) for k, v in self.counters.items()}, 'queued': self.queue.qsize() if self.queue else 0,
+                'in_flight': self.busy}
+
+
+# The compiler of compile_source, with the event loop it was started on.
+default_compiler = None
+
+
+async def compile_source(text: str, filename: str = '<string>', stop_after: str = 'typecheck', emit: list = (),
+                         timeout: float = None, on_diagnostic=None) -> dict:
+    """
+    Compiles a source text on a shared AsyncCompiler, started on first use with a worker per CPU.
+    """
+    global default_compiler
+    loop = asyncio.get_running_loop()
+    if default_compiler is None or default_compiler[0] is not loop:
+        default_compiler = loop, AsyncCompiler()
+        await default_compiler[1].start()
+    return await default_compiler[1].compile_source(text, filename, stop_after, emit, timeout, on_diagnostic)
+
+
+def serve_worker(cache_dir: str):
+    """
+    The loop of a worker process: a JSON request per line on stdin, the diagnostics then the record on stdout.
+    """
+    out = sys.stdout
+    sys.stdout = sys.stderr  # Nothing else may write to the responses.
+    compile_server.init_worker(cache_dir)
+
+    def reply(response: dict):
+        out.write(json.dumps(response) + '\n')
+        out.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        text, filename, stop_after = request['source'], request['path'], request['stop_after']
+        try:
+            if request['stream']:
+                compile_server.worker_db.set_source(filename, text)
+                for d in compile_server.worker_db.diagnostics(filename, stop_after):
+                    reply({'id': request['id'], 'diagnostic': d})
+            record = compile_server.compile_request(text, filename, stop_after, request['emit'])
+        except Exception as e:  # A bug in the compiler fails the request, not the worker.
+            compile_server.worker_db.forget(filename)
+            compile_server.worker_files.pop(filename, None)
+            reply({'id': request['id'], 'error': f"{type(e).__name__}: {e}"})
+        else:
+            reply({'id': request['id'], 'record': record})
+
+
+def main(argv):
+    if '--worker' not in argv:
+        print("Usage: python async_compile.py --worker [--cache-dir=DIR]", file=sys.stderr)
+        sys.exit(2)
+    cache_dir = next((a.split('=', 1)[1] for a in argv if a.startswith('--cache-dir=')), None)
+    serve_worker(cache_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
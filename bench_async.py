@@ -0,0 +1,108 @@
+#
+# Asyncio compile API load test. Version 1.0
+#
+# Drives thousands of concurrent requests against a local AsyncCompiler (see async_compile.py), all submitted at once,
+# and reports the throughput, the latency of the requests (from submission, so including the time spent waiting in
+# the bounded queue), the largest queue seen and how late a timer on the event loop fired, which stays small as long
+# as nothing blocks the loop. The sources are the test and benchmark programs; every tenth request streams its
+# diagnostics, and a few are cancelled or given a timeout too short to finish. Every record and every stream is
+# checked against the driver's record of the same text.
+#
+# Usage: python bench_async.py [--requests=N] [--workers=N] [--queue=N]
+#
+import asyncio
+import glob
+import sys
+import time
+import async_compile
+import bench_lsp
+import bench_typecheck
+import driver
+
+TICK = 0.005
+LARGE = bench_typecheck.generated_program(2000)  # Too large to compile within the timeout given.
+
+
+def corpus() -> list[str]:
+    texts = []
+    for path in sorted(glob.glob('tests/**/*.py', recursive=True) + glob.glob('benchmarks/*.py')):
+        with open(path, encoding='utf-8') as f:
+            texts.append(f.read())
+    return texts
+
+
+async def heartbeat(lags: list):
+    """
+    Records how late a timer of TICK seconds fires, until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - start - TICK)
+
+
+async def request(compiler: async_compile.AsyncCompiler, i: int, text: str, expected: dict, outcomes: dict,
+                  times: list):
+    start = time.perf_counter()
+    filename = f'submission{i}.py'
+    try:
+        if i % 10 == 0:
+            streamed = [d async for d in compiler.stream(text, filename)]
+            assert streamed == expected['diagnostics'], f"The stream of request {i} differs from the driver's."
+        elif i % 100 == 1:
+            task = asyncio.create_task(compiler.compile_source(text, filename))
+            await asyncio.sleep(0)
+            task.cancel()
+            await task
+        elif i % 100 == 2:
+            await compiler.compile_source(LARGE, filename, timeout=0.05)
+        else:
+            record = await compiler.compile_source(text, filename)
+            assert {**record, 'file': None, 'cached': None} == {**expected, 'file': None, 'cached': None}, \
+                f"The record of request {i} differs from the driver's."
+        outcomes['ok'] += 1
+        times.append(time.perf_counter() - start)
+    except asyncio.CancelledError:
+        outcomes['cancelled'] += 1
+    except TimeoutError:
+        outcomes['timed out'] += 1
+
+
+async def run(n: int, workers: int, queue_size: int):
+    texts = corpus()
+    expected = [driver.run_phases(text, 'submission.py', 'typecheck') for text in texts]
+    async with async_compile.AsyncCompiler(workers, queue_size, cache_dir=None) as compiler:
+        print(f"{n} requests on {len(texts)} sources, {len(compiler.workers)} workers, a queue of "
+              f"{compiler.queue_size}")
+        lags, times = [], []
+        outcomes = dict.fromkeys(['ok', 'cancelled', 'timed out'], 0)
+        max_queued = 0
+        beat = asyncio.create_task(heartbeat(lags))
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(request(compiler, i, texts[i % len(texts)], expected[i % len(texts)], outcomes,
+                                             times)) for i in range(n)]
+        while not all(t.done() for t in tasks):
+            max_queued = max(max_queued, compiler.stats()['queued'])
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        beat.cancel()
+        stats = compiler.stats()
+    print(f"{elapsed:.1f} s, {n / elapsed:.0f} requests/s; " + ", ".join(f"{v} {k}" for k, v in outcomes.items()))
+    print(f"latency: {bench_lsp.percentiles(times)}")
+    print(f"event loop lag: {bench_lsp.percentiles(lags)}")
+    print(f"queued at most {max_queued}; {stats.get('restarts', 0)} worker restarts")
+
+
+def main(argv):
+    options = {'--requests': '2000', '--workers': '0', '--queue': '0'}
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name in options and value:
+            options[name] = value
+    asyncio.run(run(int(options['--requests']), int(options['--workers']) or None, int(options['--queue']) or None))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
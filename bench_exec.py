@@ -0,0 +1,106 @@
+#
+# Execution benchmarks. Version 1.0
+#
+# Runs the ChocoPy programs in benchmarks/ (loops, recursion, list building, objects) on the execution backends,
+# the closure engine, the bytecode VM and CPython code objects, and on the naive tree-walking interpreter as the
+# baseline, and reports the best wall-clock time of a few repetitions. If a C compiler is available the programs are
+# also built with the C backend and the native binaries are timed (process start-up included, the one-off build
+# excluded).
+#
+# Usage: python bench_exec.py [-n REPEAT] [program.py ...]
+#
+import glob
+import io
+import sys
+import time
+import parser
+import symtab_visitor
+import type_env
+import type_visitor
+import closure_engine
+import tree_walker
+import bytecode
+import vm
+import py_backend
+import c_backend
+
+
+def front_end(filename: str):
+    with open(filename) as f:
+        ast = parser.Parser(f).parse()
+    st_visitor = symtab_visitor.SymbolTableVisitor()
+    st_visitor.do_visit(ast)
+    t_visitor = type_visitor.TypeVisitor(type_env.TypeEnvironment(st_visitor.get_symbol_table()))
+    t_visitor.do_visit(ast)
+    return ast
+
+
+def run_closure(ast, out):
+    closure_engine.ClosureCompiler(out).compile(ast).run()
+
+
+def run_walker(ast, out):
+    tree_walker.Interpreter(out).run(ast)
+
+
+def run_vm(ast, out):
+    vm.VM(bytecode.BytecodeCompiler().compile(ast), out).run()
+
+
+def run_py(ast, out):
+    py_backend.PyCompiler().compile(ast).run(out)
+
+
+def run_c(path, out):
+    out.write(c_backend.run(path, '').stdout)
+
+
+def best_time(run, ast, repeat: int):
+    """
+    Returns the best time of repeat runs (compilation included) and the output of the last one.
+    """
+    best = None
+    for _ in range(repeat):
+        out = io.StringIO()
+        start = time.perf_counter()
+        run(ast, out)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out.getvalue()
+
+
+def main(argv):
+    repeat = 3
+    if '-n' in argv:
+        repeat = int(argv[argv.index('-n') + 1])
+        del argv[argv.index('-n'):argv.index('-n') + 2]
+    files = argv or sorted(glob.glob('benchmarks/*.py'))
+    try:
+        cc = c_backend.find_cc()
+    except c_backend.CompilerNotFound:
+        cc = None
+
+    print(f"{'program':24s}{'walker (s)':>14s}{'closure (s)':>14s}{'vm (s)':>14s}{'python (s)':>14s}{'c (s)':>14s}"
+          f"{'walker/closure':>16s}{'vm/closure':>12s}{'python/closure':>16s}{'c/closure':>12s}{'bytecode':>10s}")
+    for filename in files:
+        ast = front_end(filename)
+        t_closure, out_closure = best_time(run_closure, ast, repeat)
+        t_vm, out_vm = best_time(run_vm, ast, repeat)
+        t_py, out_py = best_time(run_py, ast, repeat)
+        t_walker, out_walker = best_time(run_walker, ast, repeat)
+        assert out_closure == out_vm == out_py == out_walker, f"{filename}: the backends disagree"
+        c_time, c_ratio = f"{'-':>14s}", f"{'-':>12s}"
+        if cc:
+            with open(filename) as f:
+                path = c_backend.build(f.read(), cc=cc)
+            t_c, out_c = best_time(run_c, path, repeat)
+            assert out_c == out_closure, f"{filename}: the C backend disagrees"
+            c_time, c_ratio = f"{t_c:14.4f}", f"{t_c / t_closure:12.2f}"
+        program = bytecode.BytecodeCompiler().compile(ast)
+        size = (len(program.module.code) + sum(len(co.code) for co in program.functions)) // 2
+        print(f"{filename:24s}{t_walker:14.4f}{t_closure:14.4f}{t_vm:14.4f}{t_py:14.4f}{c_time}"
+              f"{t_walker / t_closure:16.2f}{t_vm / t_closure:12.2f}{t_py / t_closure:16.2f}{c_ratio}{size:10d}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
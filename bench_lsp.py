@@ -0,0 +1,196 @@
+#
+# Language server benchmark. Version 1.0
+#
+# Replays edit sessions against the language server (lsp_server.py) run as a subprocess, with a minimal stand-in
+# client speaking LSP over its stdio, and reports the latency from sending each change to receiving the diagnostics
+# of that version. The document is a generated program of about 10k lines (see bench_typecheck.py). The sessions
+# are generated (typing a statement into a function body character by character and deleting it again, editing a
+# literal, pasting a new function, changing a return type and a class attribute), 57 edits at each of --sessions places
+# in the file (8 by default), and can be saved with --record and replayed with --replay. The diagnostics of the last
+# version are checked against an analysis of the final text from scratch.
+#
+# Usage: python bench_lsp.py [--record=FILE | --replay=FILE] [--sessions=N] [FUNCTIONS]
+#
+import json
+import statistics
+import subprocess
+import sys
+import time
+import bench_typecheck
+import lsp_server
+
+
+class Editor:
+    """
+    Builds an edit session on a text: a list of LSP content changes, each one a didChange.
+    """
+    def __init__(self, text: str):
+        self.lines = text.splitlines(keepends=True)
+        self.changes = []
+
+    def find(self, line: str, start: int = 0) -> int:
+        return next(i for i in range(start, len(self.lines)) if self.lines[i].rstrip('\n') == line)
+
+    def edit(self, line: int, start: int, end: int, text: str):
+        """
+        Replaces the characters start to end of a line (end may take its newline) with text.
+        """
+        old = self.lines[line]
+        end_pos = {'line': line, 'character': end}
+        if end > len(old.rstrip('\n')):
+            end_pos = {'line': line + 1, 'character': 0}
+        self.changes.append({'range': {'start': {'line': line, 'character': start}, 'end': end_pos}, 'text': text})
+        self.lines[line:line + 1] = (old[:start] + text + old[end:]).splitlines(keepends=True)
+
+    def type(self, line: int, col: int, text: str):
+        """
+        Types text at a position, a character per change (one line at most).
+        """
+        for i, ch in enumerate(text):
+            self.edit(line, col + i, col + i, ch)
+
+    def delete(self, line: int, col: int, n: int):
+        """
+        Deletes n characters before a position, one per change (backspace).
+        """
+        for i in range(n):
+            self.edit(line, col - i - 1, col - i, '')
+
+    def replace(self, line: int, old: str, new: str):
+        col = self.lines[line].index(old)
+        self.edit(line, col, col + len(old), new)
+
+
+def sessions(text: str, n: int, count: int = 8) -> list[dict]:
+    """
+    Returns count edit sessions on the generated program of n functions, one after the other, each at its own place in
+    the file (the functions around the (j + 1)/(count + 1)th one and class Cj for session j).
+    """
+    editor = Editor(text)
+    for j in range(count):
+        k = (j + 1) * n // (count + 1)
+        # Typing a statement into the body of a function, and deleting it.
+        line = editor.find('    return a', editor.find(f'def f{k}(a: int, xs: [int]) -> int:'))
+        editor.edit(line, 0, 0, '\n')
+        editor.type(line, 0, '    a = a + len(xs) * 2')
+        editor.delete(line, len('    a = a + len(xs) * 2'), len('    a = a + len(xs) * 2'))
+        editor.edit(line, 0, 1, '')
+        # Editing a literal.
+        line = editor.find('    b: int = 0', editor.find(f'def f{k + 1}(a: int, xs: [int]) -> int:'))
+        for value in ['5', '57', '5', '0']:
+            editor.replace(line, editor.lines[line].split('= ')[1].rstrip('\n'), value)
+        # Pasting a new function before the main program.
+        line = editor.find('print(f0(1, [1, 2, 3]))')
+        editor.edit(line, 0, 0, f'def g{j}(x: int) -> int:\n    return f{k}(x, [x]) + 1\n')
+        # Changing the return type of a function, and back.
+        line = editor.find(f'def f{k + 2}(a: int, xs: [int]) -> int:')
+        editor.replace(line, '-> int', '-> bool')
+        editor.replace(line, '-> bool', '-> int')
+        # Changing the type of a class attribute, and back (every statement using the attribute is checked again).
+        line = editor.find('    x: int = 0', editor.find(f'class C{j % max(1, n // 20)}(object):'))
+        editor.replace(line, 'x: int = 0', 'x: bool = False')
+        editor.replace(line, 'x: bool = False', 'x: int = 0')
+    return [{'version': i + 2, 'changes': [c]} for i, c in enumerate(editor.changes)]
+
+
+class StandInClient:
+    """
+    Runs the language server and talks to it over its stdio.
+    """
+    def __init__(self):
+        self.server = subprocess.Popen([sys.executable, 'lsp_server.py'], stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE)
+        self.next_id = 0
+
+    def send(self, method: str, params: dict, request: bool = False):
+        message = {'jsonrpc': '2.0', 'method': method, 'params': params}
+        if request:
+            self.next_id += 1
+            message['id'] = self.next_id
+        body = json.dumps(message).encode()
+        self.server.stdin.write(f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+        self.server.stdin.flush()
+
+    def receive(self) -> dict:
+        length = None
+        while line := self.server.stdout.readline().strip():
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        return json.loads(self.server.stdout.read(length))
+
+    def wait_for(self, predicate) -> dict:
+        while not predicate(message := self.receive()):
+            pass
+        return message
+
+    def diagnostics(self, version: int) -> list:
+        return self.wait_for(lambda m: m.get('method') == 'textDocument/publishDiagnostics'
+                             and m['params']['version'] == version)['params']['diagnostics']
+
+    def close(self):
+        self.send('shutdown', {}, request=True)
+        self.wait_for(lambda m: m.get('id') == self.next_id)
+        self.send('exit', {})
+        self.server.wait()
+
+
+def percentiles(times: list[float]) -> str:
+    times = sorted(times)
+    p = lambda q: times[min(len(times) - 1, int(len(times) * q))] * 1000
+    return f"median {statistics.median(times) * 1000:7.1f} ms   p95 {p(0.95):7.1f} ms   p99 {p(0.99):7.1f} ms   " \
+           f"max {times[-1] * 1000:7.1f} ms"
+
+
+def main(argv):
+    options = {'--record': None, '--replay': None, '--sessions': '8'}
+    args = []
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name in options:
+            options[name] = value
+        else:
+            args.append(a)
+    uri = 'file:///bench.py'
+    if options['--replay']:
+        with open(options['--replay']) as f:
+            recorded = json.load(f)
+        text, edits = recorded['text'], recorded['edits']
+    else:
+        n = int(args[0]) if args else 700
+        text = bench_typecheck.generated_program(n)
+        edits = sessions(text, n, int(options['--sessions']))
+    if options['--record']:
+        with open(options['--record'], 'w') as f:
+            json.dump({'text': text, 'edits': edits}, f)
+    print(f"{len(text.splitlines())} lines, {len(edits)} edits")
+
+    client = StandInClient()
+    client.send('initialize', {'processId': None, 'rootUri': None, 'capabilities': {}}, request=True)
+    client.wait_for(lambda m: m.get('id') == client.next_id)
+    client.send('initialized', {})
+    start = time.perf_counter()
+    client.send('textDocument/didOpen', {'textDocument': {'uri': uri, 'languageId': 'chocopy', 'version': 1,
+                                                          'text': text}})
+    client.diagnostics(1)
+    print(f"open: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    times = []
+    diagnostics = None
+    for edit in edits:
+        start = time.perf_counter()
+        client.send('textDocument/didChange', {'textDocument': {'uri': uri, 'version': edit['version']},
+                                               'contentChanges': edit['changes']})
+        diagnostics = client.diagnostics(edit['version'])
+        times.append(time.perf_counter() - start)
+    client.close()
+    print(f"edits: {percentiles(times)}")
+
+    document = lsp_server.Document(uri, text)
+    for edit in edits:
+        document.apply(edit['changes'])
+    assert diagnostics == lsp_server.Document(uri, document.text).diagnostics(), \
+        "The diagnostics of the last version differ from an analysis from scratch."
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
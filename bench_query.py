@@ -0,0 +1,65 @@
+#
+# Query engine benchmark. Version 1.0
+#
+# Replays the edit sessions of bench_lsp.py (or a session recorded with bench_lsp.py --record) on a query database
+# (see query.py), asking for the driver's record of the file after each edit, and reports the time of a first run,
+# the latency of the runs after an edit and how many queries ran again or were reused. The record of the last version
+# (of every version with --check) is checked against one computed from scratch.
+#
+# Usage: python bench_query.py [--replay=FILE] [--sessions=N] [--check] [FUNCTIONS]
+#
+import collections
+import json
+import sys
+import time
+import bench_lsp
+import bench_typecheck
+import lsp_server
+import query
+
+
+def main(argv):
+    replay = next((a.split('=', 1)[1] for a in argv if a.startswith('--replay=')), None)
+    count = next((int(a.split('=', 1)[1]) for a in argv if a.startswith('--sessions=')), 8)
+    check_all = '--check' in argv
+    args = [a for a in argv if not a.startswith('--')]
+    if replay:
+        with open(replay) as f:
+            recorded = json.load(f)
+        text, edits = recorded['text'], recorded['edits']
+    else:
+        n = int(args[0]) if args else 700
+        text = bench_typecheck.generated_program(n)
+        edits = bench_lsp.sessions(text, n, count)
+    print(f"{len(text.splitlines())} lines, {len(edits)} edits")
+
+    path = 'bench.py'
+    db = query.CompilerDatabase()
+    db.set_source(path, text)
+    start = time.perf_counter()
+    db.record(path, 'typecheck')
+    print(f"first run: {(time.perf_counter() - start) * 1000:.1f} ms, {db.stats['executed']} queries")
+
+    times = []
+    totals = collections.Counter()
+    for i, edit in enumerate(edits):
+        text = lsp_server.apply_changes(text, edit['changes'])
+        db.stats.clear()
+        start = time.perf_counter()
+        db.set_source(path, text)
+        record = db.record(path, 'typecheck')
+        times.append(time.perf_counter() - start)
+        totals.update(db.stats)
+        db.sweep_file(path)
+        if check_all or i == len(edits) - 1:
+            fresh = query.CompilerDatabase()
+            fresh.set_source(path, text)
+            assert record == fresh.record(path, 'typecheck'), f"The record of version {edit['version']} differs " \
+                                                              f"from one computed from scratch."
+    print(f"edits: {bench_lsp.percentiles(times)}")
+    print(f"per edit: {totals['executed'] / len(edits):.0f} queries run, {totals['reused'] / len(edits):.0f} "
+          f"reused, {totals['backdated'] / len(edits):.0f} of those run backdated; {len(db.memos)} memos")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,74 @@
+#
+# Compile server benchmark. Version 1.0
+#
+# Compares the latency of checking a file with a cold command-line run (python driver.py, a new interpreter each
+# time) against the warm compile server, reached through the thin client script (a new, small interpreter each time)
+# and through a Client connection kept open. The server runs without the compilation cache and every request has a
+# distinct source (trailing newlines are added), so that each one is really compiled.
+#
+# Usage: python bench_server.py [-n REQUESTS] [program.py ...]
+#
+import glob
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import compile_client
+
+
+def percentiles(times: list[float]) -> str:
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    return f"median {statistics.median(times) * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms"
+
+
+def main(argv):
+    n = 20
+    if '-n' in argv:
+        n = int(argv[argv.index('-n') + 1])
+        del argv[argv.index('-n'):argv.index('-n') + 2]
+    programs = argv or sorted(glob.glob('benchmarks/*.py')) + ['tests/lang_ref_test.py']
+    sources = [open(p).read() for p in programs]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, 'server.sock')
+        server = subprocess.Popen([sys.executable, 'compile_server.py', f'--socket={socket_path}', '--workers=1',
+                                   '--no-cache'], stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.05)
+            files = []
+            for i in range(n):
+                files.append(os.path.join(tmp, f'{i}.py'))
+                with open(files[-1], 'w') as f:
+                    f.write(sources[i % len(sources)] + '\n' * (i + 1))
+
+            results = {'cold CLI': [], 'server, client script': [], 'server, open connection': []}
+            for f in files:
+                start = time.perf_counter()
+                subprocess.run([sys.executable, 'driver.py', '--no-cache', '--workers=1', f], capture_output=True)
+                results['cold CLI'].append(time.perf_counter() - start)
+            for f in files:
+                start = time.perf_counter()
+                subprocess.run([sys.executable, 'compile_client.py', f'--socket={socket_path}', f],
+                               capture_output=True)
+                results['server, client script'].append(time.perf_counter() - start)
+            with compile_client.Client(socket_path) as client:
+                for i, f in enumerate(files):
+                    source = sources[i % len(sources)] + '\n' * (n + i + 1)
+                    start = time.perf_counter()
+                    assert client.compile(source)['ok']
+                    results['server, open connection'].append(time.perf_counter() - start)
+                client.request({'command': 'shutdown'})
+        finally:
+            server.wait(10)
+
+    print(f"{n} requests on {len(programs)} programs")
+    for name, times in results.items():
+        print(f"{name:>25}: {percentiles(times)}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
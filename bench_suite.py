@@ -0,0 +1,165 @@
+#
+# Compiler benchmark suite. Version 1.0
+#
+# Measures each phase of the front end (lexing, parsing, the symbol-table construction and type checking, see
+# instrument.py) and with --backends the code generation of each backend, on synthetic programs (see synth_corpus.py)
+# of growing size, for each preset shape. Every phase is run repeat times after a warm-up run, and the median time is
+# reported. For each preset it reports the throughput of the phases on the largest program (tokens/s for the lexer,
+# AST nodes/s for the others) and their scaling exponents: the slope of log(time) against log(nodes) over the sizes,
+# 1 for a phase linear in the size of the program. --save writes the results to a JSON file, and --compare prints the
+# ratio of the times to those of a saved run.
+#
+# Usage: python bench_suite.py [--presets=default,classes,...] [--sizes=25,50,100,200] [--seed=N] [--repeat=N]
+#                              [--backends] [--save=FILE] [--compare=FILE]
+#
+import collections
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import bytecode
+import c_backend
+import closure_engine
+import driver
+import instrument
+import ir
+import py_backend
+import riscv_backend
+import synth_corpus
+import type_env
+
+SIZES = [25, 50, 100, 200]
+# Backend -> function generating its code from a type-checked AST and its symbol table.
+BACKENDS = {
+    'closure': lambda tree, st: closure_engine.ClosureCompiler().compile(tree),
+    'bytecode': lambda tree, st: bytecode.BytecodeCompiler().compile(tree),
+    'py': lambda tree, st: py_backend.PyCompiler().compile(tree),
+    'ir': lambda tree, st: ir.IRBuilder(type_env.TypeEnvironment(st)).build(tree),
+    'riscv': lambda tree, st: riscv_backend.RiscVGenerator(type_env.TypeEnvironment(st)).generate(tree),
+    'c': lambda tree, st: c_backend.CGenerator(type_env.TypeEnvironment(st)).generate(tree),
+}
+
+
+def program(preset: str, size: int, seed: int) -> str:
+    """
+    The program of a preset with size functions, and as many classes per function as the preset has.
+    """
+    shape = {**synth_corpus.SHAPE, **synth_corpus.PRESETS[preset]}
+    classes = max(1, shape['classes'] * size // synth_corpus.SHAPE['functions'])
+    return synth_corpus.generate(seed, **{**synth_corpus.PRESETS[preset], 'functions': size, 'classes': classes})
+
+
+def measure(text: str, repeat: int = 3, warmup: int = 1, backends: bool = False, memory: bool = False) -> dict:
+    """
+    Compiles a correct program warmup + repeat times and returns its size (lines, tokens and AST nodes) and the times
+    of each phase in the last repeat runs, in seconds. With memory the peak memory of each front-end phase is measured
+    in one more run.
+    """
+    times = collections.defaultdict(list)
+    nodes = 0
+    for i in range(warmup + repeat):
+        with instrument.Profile(counters=False) as profile:
+            record = instrument.run_phases(text, 'bench.py', 'typecheck')
+        assert record['ok'], f"The program is not correct: {record['diagnostics'][:3]}"
+        nodes = sum(profile.nodes.values())
+        if i >= warmup:
+            for name, phase in profile.phases.items():
+                times[name].append(phase.wall)
+        for name, generate in BACKENDS.items() if backends else ():
+            tree, st = driver.typed_ast(text)
+            start = time.perf_counter()
+            generate(tree, st)
+            if i >= warmup:
+                times[name].append(time.perf_counter() - start)
+    result = {'lines': text.count('\n'), 'tokens': driver.run_phases(text, 'bench.py', 'lex')['tokens'],
+              'nodes': nodes, 'times': dict(times)}
+    if memory:
+        with instrument.Profile(memory=True, counters=False) as profile:
+            instrument.run_phases(text, 'bench.py', 'typecheck')
+        result['peak_memory'] = {name: phase.peak_memory for name, phase in profile.phases.items()}
+    return result
+
+
+def exponent(sizes: list, times: list) -> float:
+    """
+    The least-squares slope of log(time) against log(size).
+    """
+    xs, ys = [math.log(s) for s in sizes], [math.log(max(t, 1e-9)) for t in times]
+    mx, my = statistics.fmean(xs), statistics.fmean(ys)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sum((x - mx) ** 2 for x in xs)
+
+
+def run(presets: list, sizes: list, seed: int, repeat: int, backends: bool) -> dict:
+    results, exponents = [], {}
+    for preset in presets:
+        rows = []
+        for size in sizes:
+            m = measure(program(preset, size, seed), repeat, backends=backends, memory=True)
+            row = {'preset': preset, 'size': size, 'lines': m['lines'], 'tokens': m['tokens'], 'nodes': m['nodes'],
+                   'times': {k: statistics.median(v) for k, v in m['times'].items()}, 'peak_memory': m['peak_memory']}
+            rows.append(row)
+        phases = list(rows[0]['times'])
+        print(f"\n{preset}: {', '.join(f'{k}={v}' for k, v in synth_corpus.PRESETS[preset].items()) or 'default shape'}")
+        print(f"{'size':>6}{'lines':>8}{'nodes':>9}" + ''.join(f"{p + ' ms':>13}" for p in phases))
+        for row in rows:
+            print(f"{row['size']:>6}{row['lines']:>8}{row['nodes']:>9}"
+                  + ''.join(f"{row['times'][p] * 1000:>13.1f}" for p in phases))
+        last = rows[-1]
+        rates = [f"lex {last['tokens'] / last['times']['lex']:,.0f} tokens/s"]
+        rates += [f"{p} {last['nodes'] / last['times'][p]:,.0f} nodes/s" for p in phases if p != 'lex']
+        print("throughput: " + ', '.join(rates))
+        if len(rows) > 1:
+            exponents[preset] = {p: round(exponent([r['nodes'] for r in rows], [r['times'][p] for r in rows]), 3)
+                                 for p in phases}
+            print("scaling exponents: " + ', '.join(f"{p} {k:.2f}" for p, k in exponents[preset].items()))
+        results += rows
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'machine': platform.machine(), 'cpus': os.cpu_count(), 'seed': seed, 'repeat': repeat,
+            'results': results, 'exponents': exponents}
+
+
+def compare(current: dict, saved: dict):
+    """
+    Prints the ratio of each time to the time of the same phase, preset and size in a saved run.
+    """
+    previous = {(r['preset'], r['size']): r for r in saved['results']}
+    print(f"\nCompared with the run of {saved['date']} (ratio of the times, below 1 is faster):")
+    for row in current['results']:
+        old = previous.get((row['preset'], row['size']))
+        if old is None or old['nodes'] != row['nodes']:
+            continue  # Not run then, or another program (the generator changed).
+        ratios = [f"{p} {t / old['times'][p]:.2f}" for p, t in row['times'].items() if old['times'].get(p)]
+        print(f"{row['preset']:>12} {row['size']:>5}: " + ', '.join(ratios))
+
+
+def main(argv):
+    options = {'--presets': ','.join(synth_corpus.PRESETS), '--sizes': ','.join(map(str, SIZES)), '--seed': '0',
+               '--repeat': '3', '--save': None, '--compare': None}
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name in options and value:
+            options[name] = value
+        elif a != '--backends':
+            print(f"Unknown option {a}", file=sys.stderr)
+            return 2
+    presets = options['--presets'].split(',')
+    if unknown := [p for p in presets if p not in synth_corpus.PRESETS]:
+        print(f"Unknown presets {unknown}, they are {list(synth_corpus.PRESETS)}", file=sys.stderr)
+        return 2
+    sizes = [int(s) for s in options['--sizes'].split(',')]
+    current = run(presets, sizes, int(options['--seed']), int(options['--repeat']), '--backends' in argv)
+    if options['--compare']:
+        with open(options['--compare']) as f:
+            compare(current, json.load(f))
+    if options['--save']:
+        with open(options['--save'], 'w') as f:
+            json.dump(current, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,76 @@
+#
+# Type-checking benchmark. Version 1.0
+#
+# Type-checks a generated program with many functions serially and with TypeVisitor's parallel mode on 1, 2, 4 and 8
+# worker processes, checks that the results are those of the serial run, and reports the best wall-clock time of a
+# few repetitions (the symbol-table construction excluded). For the parallel runs it also shows the time spent in the
+# parent process checking the declarations, waiting for the workers' bodies (while listing their expressions) and
+# merging the types the workers returned into the tree.
+#
+# Usage: python bench_typecheck.py [-n REPEAT] [FUNCTIONS]
+#
+import io
+import os
+import sys
+import time
+import parser
+import symtab_visitor
+import type_env
+import type_visitor
+
+
+def generated_program(n: int) -> str:
+    """
+    Returns a program with n functions with loops, lists, strings and method calls, and n/20 classes.
+    """
+    lines = []
+    for i in range(n // 20):
+        lines += [f'class C{i}(object):', '    x: int = 0', '    s: str = ""',
+                  f'    def get(self: "C{i}", k: int) -> int:', '        return self.x + k',
+                  f'    def name(self: "C{i}") -> str:', '        return self.s + "!"']
+    for i in range(n):
+        c = f'C{i % max(1, n // 20)}'
+        lines += [f'def f{i}(a: int, xs: [int]) -> int:', '    b: int = 0', '    s: str = ""', f'    o: {c} = None',
+                  '    for b in xs:', '        a = a + b * 2 if b > 0 else a - len(s)', '        s = s + "x"',
+                  f'    o = {c}()', '    o.x = a', '    while a > 100 and not (a == 7):', '        a = a // 3 + xs[0]',
+                  '    if len(o.name()) > 1:', '        return o.get(a) + len([1, 2, a] if a > 0 else xs)',
+                  '    return a']
+    lines += ['print(f0(1, [1, 2, 3]))']
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv):
+    repeat = 3
+    if '-n' in argv:
+        repeat = int(argv[argv.index('-n') + 1])
+        del argv[argv.index('-n'):argv.index('-n') + 2]
+    n = int(argv[0]) if argv else 4000
+    source = generated_program(n)
+    print(f"{n} functions, {len(source.splitlines())} lines, {os.cpu_count()} CPUs")
+
+    reference = None
+    serial = None
+    for workers in [None, 1, 2, 4, 8]:
+        best, timings = None, {}
+        for _ in range(repeat):
+            program = parser.Parser(io.StringIO(source)).parse()
+            st_visitor = symtab_visitor.SymbolTableVisitor()
+            st_visitor.do_visit(program)
+            t_visitor = type_visitor.TypeVisitor(type_env.TypeEnvironment(st_visitor.get_symbol_table()),
+                                                 workers=workers)
+            start = time.perf_counter()
+            t_visitor.do_visit(program)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best, timings = elapsed, t_visitor.timings
+        types = [e.get_type_str() for e in type_visitor.expressions(program)]
+        if reference is None:
+            reference, serial = types, best
+        assert types == reference, f"{workers} workers: types differ from the serial run"
+        label = 'serial' if workers is None else f'{workers} workers'
+        parts = '' if workers is None else '   ' + ', '.join(f'{k} {v * 1000:.1f} ms' for k, v in timings.items())
+        print(f"{label:>10} {best * 1000:10.1f} ms {serial / best:6.2f}x{parts}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
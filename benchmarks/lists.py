@@ -0,0 +1,33 @@
+def sieve(n: int) -> [int]:
+    flags: [bool] = None
+    primes: [int] = None
+    i: int = 0
+    j: int = 0
+    flags = []
+    primes = []
+    while i <= n:
+        flags = flags + [True]
+        i = i + 1
+    i = 2
+    while i <= n:
+        if flags[i]:
+            primes = primes + [i]
+            j = i * i
+            while j <= n:
+                flags[j] = False
+                j = j + i
+        i = i + 1
+    return primes
+
+def reverse(xs: [int]) -> [int]:
+    out: [int] = None
+    x: int = 0
+    out = []
+    for x in xs:
+        out = [x] + out
+    return out
+
+ps: [int] = None
+ps = reverse(sieve(3000))
+print(len(ps))
+print(ps[0])
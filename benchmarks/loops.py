@@ -0,0 +1,10 @@
+i: int = 0
+j: int = 0
+total: int = 0
+while i < 300:
+    j = 0
+    while j < 300:
+        total = (total + i * j) % 1000003
+        j = j + 1
+    i = i + 1
+print(total)
@@ -0,0 +1,25 @@
+class Shape(object):
+    n: int = 0
+    def area(self: "Shape") -> int:
+        return 0
+
+class Square(Shape):
+    def area(self: "Square") -> int:
+        return self.n * self.n
+
+class Tri(Shape):
+    def area(self: "Tri") -> int:
+        return self.n * self.n // 2
+
+i: int = 0
+total: int = 0
+s: Shape = None
+while i < 20000:
+    if i % 2 == 0:
+        s = Square()
+    else:
+        s = Tri()
+    s.n = i % 100
+    total = total + s.area()
+    i = i + 1
+print(total)
@@ -0,0 +1,433 @@
+#
+# Bytecode compiler and disassembler. Version 1.0
+#
+# Lowers a type-checked ProgramNode to a compact instruction stream for the VM in vm.py. Every instruction is an
+# (opcode, argument) pair of ints stored in an array('i'); constants and names live in separate per-function pools.
+# Operators are lowered to typed opcodes (ADD_INT, CONCAT_STR, INDEX_LIST, ...) chosen from the nodes' type_str.
+#
+import functools
+from array import array
+import astree as ast
+from astree import Operator
+import visitor
+
+OPCODES = [
+    'LOAD_CONST', 'LOAD_LOCAL', 'STORE_LOCAL', 'LOAD_GLOBAL', 'STORE_GLOBAL', 'LOAD_OUTER', 'STORE_OUTER',
+    'LOAD_LINK', 'POP', 'DUP',
+    'ADD_INT', 'SUB_INT', 'MUL_INT', 'DIV_INT', 'MOD_INT', 'NEG_INT',
+    'LT_INT', 'LE_INT', 'GT_INT', 'GE_INT', 'EQ', 'NE', 'IS', 'NOT',
+    'CONCAT_STR', 'CONCAT_LIST', 'INDEX_STR', 'INDEX_LIST', 'STORE_INDEX_LIST', 'BUILD_LIST',
+    'LOAD_ATTR', 'STORE_ATTR', 'NEW', 'CALL_FUNC', 'CALL_METHOD', 'RETURN_VALUE',
+    'JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP', 'GET_ITER', 'FOR_ITER',
+    'PRINT_INT', 'PRINT_STR', 'PRINT', 'LEN_STR', 'LEN', 'INPUT',
+]
+for _i, _name in enumerate(OPCODES):
+    globals()[_name] = _i
+
+# Opcodes whose argument is a jump target, an index in the constant pool, or an index in the name pool.
+JUMPS = {JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, FOR_ITER}
+CONST_ARGS = {LOAD_CONST}
+NAME_ARGS = {LOAD_ATTR, STORE_ATTR}
+
+INT_OPS = {Operator.Plus: ADD_INT, Operator.Minus: SUB_INT, Operator.Mult: MUL_INT, Operator.IntDivide: DIV_INT,
+           Operator.Modulus: MOD_INT, Operator.Lt: LT_INT, Operator.LtEq: LE_INT, Operator.Gt: GT_INT,
+           Operator.GtEq: GE_INT}
+
+
+class CodeObject:
+    """
+    The bytecode of a function, method or the module's top-level statements.
+    The frame of a function holds the static link at index 0, then the parameters and the locals.
+    """
+    def __init__(self, name: str, n_params: int = 0):
+        self.name = name
+        self.n_params = n_params
+        self.code = array('i')
+        self.consts = []
+        self.names = []
+        self.defaults = []  # Initial values of the locals (after the parameters).
+
+    def const_index(self, v) -> int:
+        # Compare with the type too, as True == 1 and False == 0.
+        for i, c in enumerate(self.consts):
+            if type(c) is type(v) and c == v:
+                return i
+        self.consts.append(v)
+        return len(self.consts) - 1
+
+    def name_index(self, name: str) -> int:
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+
+class Program:
+    """
+    A compiled program: the module code, the function table (indexed by CALL_FUNC), the classes (indexed by NEW)
+    and the initial values of the globals.
+    """
+    def __init__(self):
+        self.module = CodeObject('<module>')
+        self.functions = []
+        self.classes = []
+        self.global_defaults = []
+
+
+class Scope:
+    """
+    Compile-time information about a module or function scope.
+    """
+    def __init__(self, kind: str, parent: "Scope" = None):
+        self.kind = kind
+        self.parent = parent  # The enclosing function scope (None for the module and top-level functions).
+        self.depth = parent.depth + 1 if parent else (0 if kind == 'module' else 1)
+        self.slots = {}
+        self.globals = set()
+        self.functions = {}  # Name -> (index in the function table, defining scope).
+
+    def add_slot(self, name: str):
+        self.slots[name] = len(self.slots) + (1 if self.kind == 'function' else 0)
+
+
+class BytecodeCompiler(visitor.Visitor):
+
+    def __init__(self):
+        self.program = Program()
+        self.module = None
+        self.scope = None
+        self.co = None
+        self.class_index = {}  # Class name -> index in the program's classes.
+        self.class_defs = []  # (name, super class name, attributes, methods) in declaration order.
+
+    def compile(self, node: ast.ProgramNode) -> Program:
+        self.visit(node)
+        return self.program
+
+    def do_visit(self, node):
+        if node:
+            self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        self.co.code.append(op)
+        self.co.code.append(arg)
+        return len(self.co.code) - 2
+
+    def here(self) -> int:
+        return len(self.co.code)
+
+    def patch(self, pos: int, target: int = None):
+        self.co.code[pos + 1] = self.here() if target is None else target
+
+    ####################################################################################################################
+    # Scopes and names.
+
+    def declare(self, scope: Scope, co: CodeObject, declarations: list, defaults: list):
+        pending = []
+        for d in declarations:
+            if isinstance(d, ast.VarDefNode):
+                scope.add_slot(d.var.identifier.name)
+                defaults.append(d.value.get_value())
+            elif isinstance(d, ast.GlobalDeclNode):
+                scope.globals.add(d.variable.name)
+        for d in declarations:
+            if isinstance(d, ast.FuncDefNode):
+                index, f_scope, f_pending = self.declare_function(d, scope)
+                scope.functions[d.name.name] = (index, scope)
+                pending.append((d, index, f_scope, f_pending))
+            elif isinstance(d, ast.ClassDefNode):
+                pending.extend(self.declare_class(d))
+        return pending
+
+    def declare_function(self, node: ast.FuncDefNode, def_scope: Scope):
+        scope = Scope('function', def_scope if def_scope.kind == 'function' else None)
+        for p in node.params:
+            scope.add_slot(p.identifier.name)
+        co = CodeObject(node.name.name, len(node.params))
+        index = len(self.program.functions)
+        self.program.functions.append(co)
+        pending = self.declare(scope, co, node.declarations, co.defaults)
+        return index, scope, pending
+
+    def declare_class(self, node: ast.ClassDefNode) -> list:
+        attrs, methods, pending = [], {}, []
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                attrs.append((d.var.identifier.name, d.value.get_value()))
+            elif isinstance(d, ast.FuncDefNode):
+                index, f_scope, f_pending = self.declare_function(d, self.module)
+                methods[d.name.name] = index
+                pending.append((d, index, f_scope, f_pending))
+        self.class_index[node.name.name] = len(self.program.classes)
+        self.program.classes.append((node.name.name, node.super_class.name, attrs, methods))
+        return pending
+
+    def compile_functions(self, pending: list):
+        for node, index, scope, f_pending in pending:
+            self.compile_functions(f_pending)
+            saved = self.scope, self.co
+            self.scope, self.co = scope, self.program.functions[index]
+            self.block(node.statements)
+            self.emit(LOAD_CONST, self.co.const_index(None))
+            self.emit(RETURN_VALUE)
+            self.scope, self.co = saved
+
+    def resolve(self, name: str):
+        scope = self.scope
+        if scope.kind == 'function' and name not in scope.globals:
+            hops = 0
+            while scope:
+                if name in scope.slots:
+                    return hops, scope.slots[name]
+                scope, hops = scope.parent, hops + 1
+        return None, self.module.slots[name]
+
+    def load(self, name: str):
+        hops, i = self.resolve(name)
+        if hops is None:
+            self.emit(LOAD_GLOBAL, i)
+        elif hops == 0:
+            self.emit(LOAD_LOCAL, i)
+        else:
+            self.emit(LOAD_OUTER, hops << 16 | i)
+
+    def store(self, name: str):
+        hops, i = self.resolve(name)
+        if hops is None:
+            self.emit(STORE_GLOBAL, i)
+        elif hops == 0:
+            self.emit(STORE_LOCAL, i)
+        else:
+            self.emit(STORE_OUTER, hops << 16 | i)
+
+    def lookup_function(self, name: str):
+        scope = self.scope if self.scope.kind == 'function' else None
+        while scope:
+            if name in scope.functions:
+                return scope.functions[name]
+            scope = scope.parent
+        return self.module.functions.get(name)
+
+    ####################################################################################################################
+    # Statements.
+
+    def block(self, statements: list):
+        for s in statements:
+            self.visit(s)
+            if isinstance(s, ast.ExprNode):
+                self.emit(POP)
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        self.module = self.scope = Scope('module')
+        self.co = self.program.module
+        pending = self.declare(self.module, self.co, node.declarations, self.program.global_defaults)
+        self.compile_functions(pending)
+        self.block(node.statements)
+        self.emit(LOAD_CONST, self.co.const_index(None))
+        self.emit(RETURN_VALUE)
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        if node.expr is None:
+            self.emit(LOAD_CONST, self.co.const_index(None))
+        else:
+            self.visit(node.expr)
+        self.emit(RETURN_VALUE)
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        self.visit(node.expr)
+        for i, t in enumerate(node.targets):
+            if i < len(node.targets) - 1:
+                self.emit(DUP)
+            if isinstance(t, ast.IdentifierExprNode):
+                self.store(t.identifier.name)
+            elif isinstance(t, ast.MemberExprNode):
+                self.visit(t.expr_object)
+                self.emit(STORE_ATTR, self.co.name_index(t.member.name))
+            else:
+                self.visit(t.list_expr)
+                self.visit(t.index)
+                self.emit(STORE_INDEX_LIST)
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        end_jumps = []
+        branches = [(node.condition, node.then_body)] + node.elifs
+        for i, (cond, body) in enumerate(branches):
+            self.visit(cond)
+            skip = self.emit(JUMP_IF_FALSE)
+            self.block(body)
+            if i < len(branches) - 1 or node.else_body:
+                end_jumps.append(self.emit(JUMP))
+            self.patch(skip)
+        self.block(node.else_body)
+        for j in end_jumps:
+            self.patch(j)
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        start = self.here()
+        self.visit(node.condition)
+        exit_jump = self.emit(JUMP_IF_FALSE)
+        self.block(node.body)
+        self.emit(JUMP, start)
+        self.patch(exit_jump)
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        self.visit(node.iterable)
+        self.emit(GET_ITER)
+        start = self.here()
+        exit_jump = self.emit(FOR_ITER)
+        self.store(node.identifier.name)
+        self.block(node.body)
+        self.emit(JUMP, start)
+        self.patch(exit_jump)
+
+    ####################################################################################################################
+    # Expressions.
+
+    @visit.register
+    def _(self, node: ast.LiteralExprNode):
+        self.emit(LOAD_CONST, self.co.const_index(node.get_value()))
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        self.load(node.identifier.name)
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        self.visit(node.operand)
+        self.emit(NOT if node.op == Operator.Not else NEG_INT)
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        if node.op in (Operator.And, Operator.Or):
+            self.visit(node.lhs)
+            jump = self.emit(JUMP_IF_FALSE_OR_POP if node.op == Operator.And else JUMP_IF_TRUE_OR_POP)
+            self.visit(node.rhs)
+            self.patch(jump)
+            return
+        self.visit(node.lhs)
+        self.visit(node.rhs)
+        t = node.lhs.get_type_str()
+        if node.op == Operator.Is:
+            self.emit(IS)
+        elif node.op == Operator.Eq:
+            self.emit(EQ)
+        elif node.op == Operator.NotEq:
+            self.emit(NE)
+        elif t == 'int':
+            self.emit(INT_OPS[node.op])
+        elif t == 'str':
+            self.emit(CONCAT_STR)
+        else:
+            self.emit(CONCAT_LIST)
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        self.visit(node.condition)
+        else_jump = self.emit(JUMP_IF_FALSE)
+        self.visit(node.then_expr)
+        end_jump = self.emit(JUMP)
+        self.patch(else_jump)
+        self.visit(node.else_expr)
+        self.patch(end_jump)
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        self.visit(node.list_expr)
+        self.visit(node.index)
+        self.emit(INDEX_STR if node.list_expr.get_type_str() == 'str' else INDEX_LIST)
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        self.visit(node.expr_object)
+        self.emit(LOAD_ATTR, self.co.name_index(node.member.name))
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        for e in node.elements:
+            self.visit(e)
+        self.emit(BUILD_LIST, len(node.elements))
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        self.visit(node.member.expr_object)
+        for a in node.args:
+            self.visit(a)
+        self.emit(CALL_METHOD, len(node.args) << 16 | self.co.name_index(node.member.member.name))
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        name = node.identifier.name
+        if f := self.lookup_function(name):
+            index, def_scope = f
+            # The static link: the frame of the scope defining the function (None for top-level functions).
+            if def_scope.kind == 'function':
+                self.emit(LOAD_LINK, self.scope.depth - def_scope.depth)
+            else:
+                self.emit(LOAD_CONST, self.co.const_index(None))
+            for a in node.args:
+                self.visit(a)
+            self.emit(CALL_FUNC, index)
+        elif name in self.class_index or name == 'object':
+            self.emit(NEW, self.class_index.get(name, -1))
+            self.emit(DUP)
+            self.emit(CALL_METHOD, self.co.name_index('__init__'))
+            self.emit(POP)
+        elif name == 'input':
+            self.emit(INPUT)
+        else:
+            self.visit(node.args[0])
+            t = node.args[0].get_type_str()
+            if name == 'len':
+                self.emit(LEN_STR if t == 'str' else LEN)
+            else:
+                self.emit({'int': PRINT_INT, 'str': PRINT_STR}.get(t, PRINT))
+
+
+def disassemble(co: CodeObject) -> str:
+    """
+    Returns a human-readable listing of the bytecode of co.
+    """
+    lines = [f"Disassembly of {co.name} ({co.n_params} params, {len(co.defaults)} locals):"]
+    code = co.code
+    for pc in range(0, len(code), 2):
+        op, arg = code[pc], code[pc + 1]
+        text = f"{pc:6d} {OPCODES[op]:22s}"
+        if op in JUMPS:
+            text += f"{arg:<6d}(to {arg})"
+        elif op in CONST_ARGS:
+            text += f"{arg:<6d}({co.consts[arg]!r})"
+        elif op in NAME_ARGS:
+            text += f"{arg:<6d}({co.names[arg]})"
+        elif op == CALL_METHOD:
+            text += f"{arg:<6d}({co.names[arg & 0xFFFF]}, {arg >> 16} args)"
+        elif op in (LOAD_OUTER, STORE_OUTER):
+            text += f"{arg:<6d}({arg >> 16} up, slot {arg & 0xFFFF})"
+        elif op not in (POP, DUP, RETURN_VALUE, GET_ITER, INPUT) and OPCODES[op] not in OPERATOR_NAMES:
+            text += f"{arg}"
+        lines.append(text.rstrip())
+    return "\n".join(lines)
+
+
+def disassemble_program(program: Program) -> str:
+    listings = [disassemble(program.module)]
+    listings.extend(disassemble(co) for co in program.functions)
+    return "\n\n".join(listings)
+
+
+OPERATOR_NAMES = {'ADD_INT', 'SUB_INT', 'MUL_INT', 'DIV_INT', 'MOD_INT', 'NEG_INT', 'LT_INT', 'LE_INT', 'GT_INT',
+                  'GE_INT', 'EQ', 'NE', 'IS', 'NOT', 'CONCAT_STR', 'CONCAT_LIST', 'INDEX_STR', 'INDEX_LIST',
+                  'STORE_INDEX_LIST', 'PRINT_INT', 'PRINT_STR', 'PRINT', 'LEN_STR', 'LEN'}
@@ -0,0 +1,901 @@
+#
+# C backend. Version 1.0
+#
+# Lowers a type-checked ProgramNode to a portable C99 program (with the small run-time library in C_RUNTIME), builds
+# it with the system C compiler and caches the binaries by the hash of the ChocoPy source.
+#
+# int and bool values are int32_t, all other values are Object pointers (None is NULL). Objects start with a pointer
+# to their class, which holds the type tag and the dispatch table; user classes become structs extending the
+# attributes of their superclass. Functions with nested functions keep their variables in a frame struct whose
+# address is passed to the nested functions as their static link.
+#
+# C leaves the evaluation order of operands and arguments unspecified, so every compound subexpression is evaluated
+# into a temporary, in ChocoPy (left-to-right) order.
+#
+# Every function starts with cp_enter(), which checks how much of the C stack is in use: recursion deeper than
+# CP_STACK_LIMIT bytes is the "Out of memory" error (exit code 5), as on the other backends, rather than a crash.
+#
+import functools
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import astree as ast
+from astree import Operator
+import parser
+import symtab_visitor
+import type_env
+import type_visitor
+import visitor
+import const_fold
+
+VERSION = 2
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'chocopy', 'c')
+CFLAGS = ['-std=c99', '-O2', '-fno-strict-aliasing']
+
+INT_OPS = {Operator.Plus: 'cp_add', Operator.Minus: 'cp_sub', Operator.Mult: 'cp_mul', Operator.IntDivide: 'cp_div',
+           Operator.Modulus: 'cp_mod'}
+CMP_OPS = {Operator.Lt: '<', Operator.LtEq: '<=', Operator.Gt: '>', Operator.GtEq: '>=', Operator.Eq: '==',
+           Operator.NotEq: '!=', Operator.Is: '=='}
+
+
+class CompilerNotFound(Exception):
+    def __init__(self):
+        self.message = "No C compiler found (set CC or install cc/gcc)."
+        super().__init__(self.message)
+
+
+class BuildError(Exception):
+    def __init__(self, output: str):
+        self.message = f"C compilation failed:\n{output}"
+        super().__init__(self.message)
+
+
+class Scope:
+    """
+    Compile-time information about the module or a function. Functions with nested functions keep their parameters
+    and locals in a frame struct (has_frame).
+    """
+    def __init__(self, kind: str, parent: "Scope" = None):
+        self.kind = kind
+        self.parent = parent  # The enclosing function scope (None for the module and for top-level functions).
+        self.depth = parent.depth + 1 if parent else (0 if kind == 'module' else 1)
+        self.vars = {}  # Name -> type.
+        self.globals = set()
+        self.functions = {}
+        self.has_frame = False
+
+
+class FunctionInfo:
+    def __init__(self, cname: str, node: ast.FuncDefNode, scope: Scope, def_scope: Scope, symtab):
+        self.cname = cname
+        self.node = node
+        self.scope = scope
+        self.def_scope = def_scope
+        self.symtab = symtab
+        self.signature = type_visitor.TypeVisitor.get_signature(symtab)
+
+
+class ClassInfo:
+    def __init__(self, name: str, tag: int, attrs: list, methods: list):
+        self.name = name
+        self.tag = tag
+        self.attrs = attrs  # (name, type, initial value), inherited first.
+        self.methods = methods  # (name, FunctionInfo or C name), inherited first, __init__ at index 0.
+
+    def method_index(self, name: str) -> int:
+        return [m for m, _ in self.methods].index(name)
+
+
+def ctype(t: str) -> str:
+    return 'int32_t' if t in ('int', 'bool') else 'Object *'
+
+
+def c_string(s: str) -> str:
+    return '"' + s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t') + '"'
+
+
+def c_int(v: int) -> str:
+    # -2147483648 would be the negation of a long constant in C.
+    return '(-2147483647 - 1)' if v == -2 ** 31 else str(v)
+
+
+def has_effects(node) -> bool:
+    """
+    True if evaluating the expression may call a function (and so change variables or print).
+    """
+    if isinstance(node, (ast.FunctionCallExprNode, ast.MethodCallExprNode)):
+        return True
+    if isinstance(node, ast.BinaryOpExprNode):
+        return has_effects(node.lhs) or has_effects(node.rhs)
+    if isinstance(node, ast.UnaryOpExprNode):
+        return has_effects(node.operand)
+    if isinstance(node, ast.IfExprNode):
+        return has_effects(node.condition) or has_effects(node.then_expr) or has_effects(node.else_expr)
+    if isinstance(node, ast.IndexExprNode):
+        return has_effects(node.list_expr) or has_effects(node.index)
+    if isinstance(node, ast.MemberExprNode):
+        return has_effects(node.expr_object)
+    if isinstance(node, ast.ListExprNode):
+        return any(has_effects(e) for e in node.elements)
+    return False
+
+
+class CGenerator(visitor.Visitor):
+
+    def __init__(self, t_env):
+        self.t_env = t_env
+        self.st = None
+        self.module = None
+        self.scope = None
+        self.function = None
+        self.functions = []
+        self.classes = {'object': ClassInfo('object', 0, [], [('__init__', 'cp_object_init')])}
+        self.strings = {}  # String constant -> C name.
+        self.temps = 0
+        self.body = []
+        self.indent = 1
+
+    def generate(self, node: ast.ProgramNode) -> str:
+        """
+        Returns the C source of the program.
+        """
+        return self.visit(node)
+
+    def do_visit(self, node):
+        if node:
+            return self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    ####################################################################################################################
+    # Emission helpers.
+
+    def line(self, text: str):
+        self.body.append('    ' * self.indent + text)
+
+    def temp(self, t: str, value: str) -> str:
+        self.temps += 1
+        name = f't{self.temps}'
+        self.line(f'{ctype(t)}{"" if t not in ("int", "bool") else " "}{name} = {value};')
+        return name
+
+    def string_constant(self, s: str) -> str:
+        if s not in self.strings:
+            self.strings[s] = f's{len(self.strings)}'
+        return self.strings[s]
+
+    def literal(self, value, t: str) -> str:
+        """
+        Returns the C expression of a literal value stored in a location of type t.
+        """
+        if value is None:
+            return 'NULL'
+        if isinstance(value, str):
+            return self.string_constant(value)
+        if t in ('int', 'bool'):
+            return c_int(int(value))
+        return f'cp_box_bool({int(value)})' if isinstance(value, bool) else f'cp_box_int({c_int(value)})'
+
+    def coerce(self, value: str, src: str, dst: str) -> str:
+        if src in ('int', 'bool') and dst not in ('int', 'bool'):
+            return f'cp_box_{src}({value})'
+        return value
+
+    ####################################################################################################################
+    # Declarations.
+
+    def declare(self, scope: Scope, declarations: list, prefix: str):
+        for d in declarations:
+            if isinstance(d, ast.VarDefNode):
+                name = d.var.identifier.name
+                scope.vars[name] = self.t_env.get_scope_symbol_table().lookup(name).get_type_str()
+            elif isinstance(d, ast.GlobalDeclNode):
+                scope.globals.add(d.variable.name)
+        for d in declarations:
+            if isinstance(d, ast.FuncDefNode):
+                scope.functions[d.name.name] = self.declare_function(d, f'{prefix}{d.name.name}', scope)
+                scope.has_frame = scope.kind == 'function'
+            elif isinstance(d, ast.ClassDefNode):
+                self.declare_class(d)
+
+    def declare_function(self, node: ast.FuncDefNode, cname: str, def_scope: Scope) -> FunctionInfo:
+        self.t_env.enter_scope(node.name.name)
+        st = self.t_env.get_scope_symbol_table()
+        scope = Scope('function', def_scope if def_scope.kind == 'function' else None)
+        for p in node.params:
+            scope.vars[p.identifier.name] = st.lookup(p.identifier.name).get_type_str()
+        info = FunctionInfo(f'f{len(self.functions)}_{cname}', node, scope, def_scope, st)
+        self.functions.append(info)
+        self.declare(scope, node.declarations, f'{cname}_')
+        self.t_env.exit_scope()
+        return info
+
+    def declare_class(self, node: ast.ClassDefNode):
+        name = node.name.name
+        base = self.classes[node.super_class.name]
+        attrs, methods = list(base.attrs), list(base.methods)
+        self.t_env.enter_scope(name)
+        class_st = self.t_env.get_scope_symbol_table()
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                a = d.var.identifier.name
+                attrs.append((a, class_st.lookup(a).get_type_str(), d.value.get_value()))
+            elif isinstance(d, ast.FuncDefNode):
+                info = self.declare_function(d, f'{name}_{d.name.name}', self.module)
+                names = [m for m, _ in methods]
+                if d.name.name in names:
+                    methods[names.index(d.name.name)] = (d.name.name, info)
+                else:
+                    methods.append((d.name.name, info))
+        self.t_env.exit_scope()
+        self.classes[name] = ClassInfo(name, len(self.classes) + 3, attrs, methods)
+
+    def prototype(self, f: FunctionInfo) -> str:
+        params = [f'{ctype(t)} v_{p.identifier.name}' for p, t in zip(f.node.params, f.signature.args_type)]
+        if f.def_scope.kind == 'function':
+            params.insert(0, f'struct fr_{self.owner(f.def_scope).cname} *link')
+        return f'static {ctype(f.signature.return_type)} {f.cname}({", ".join(params) or "void"})'
+
+    def owner(self, scope: Scope) -> FunctionInfo:
+        return next(f for f in self.functions if f.scope is scope)
+
+    def frame_struct(self, f: FunctionInfo) -> str:
+        fields = []
+        if f.def_scope.kind == 'function':
+            fields.append(f'struct fr_{self.owner(f.def_scope).cname} *link;')
+        fields.extend(f'{ctype(t)} v_{name};' for name, t in f.scope.vars.items())
+        return f'struct fr_{f.cname} {{\n' + ''.join(f'    {x}\n' for x in fields) + '};'
+
+    def class_struct(self, c: ClassInfo) -> str:
+        fields = ''.join(f'    {ctype(t)} a_{a};\n' for a, t, _ in c.attrs)
+        return f'struct C_{c.name} {{\n    Object h;\n{fields}}};'
+
+    def class_tables(self, c: ClassInfo) -> str:
+        methods = ', '.join(f'(Method) {m if isinstance(m, str) else m.cname}' for _, m in c.methods)
+        inits = ''.join(f'    o->a_{a} = {self.literal(v, t)};\n' for a, t, v in c.attrs)
+        return (f'static const Method mt_{c.name}[] = {{{methods}}};\n'
+                f'static const Class cls_{c.name} = {{"{c.name}", {c.tag}, mt_{c.name}}};\n'
+                f'static Object *new_{c.name}(void) {{\n'
+                f'    struct C_{c.name} *o = cp_alloc(sizeof(struct C_{c.name}));\n'
+                f'    o->h.cls = &cls_{c.name};\n{inits}    return &o->h;\n}}')
+
+    ####################################################################################################################
+    # Names.
+
+    def lvalue(self, name: str) -> str:
+        scope = self.scope
+        if scope.kind == 'function' and name not in scope.globals:
+            hops = 0
+            while scope:
+                if name in scope.vars:
+                    if hops == 0:
+                        return f'fr.v_{name}' if scope.has_frame else f'v_{name}'
+                    return 'link' + '->link' * (hops - 1) + f'->v_{name}'
+                scope, hops = scope.parent, hops + 1
+        return f'g_{name}'
+
+    def static_link(self, f: FunctionInfo) -> str:
+        hops = self.scope.depth - f.def_scope.depth
+        return '&fr' if hops == 0 else 'link' + '->link' * (hops - 1)
+
+    def lookup_function(self, name: str):
+        scope = self.scope if self.scope.kind == 'function' else None
+        while scope:
+            if name in scope.functions:
+                return scope.functions[name]
+            scope = scope.parent
+        return self.module.functions.get(name)
+
+    ####################################################################################################################
+    # Program and functions.
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        self.module = self.scope = Scope('module')
+        self.st = self.t_env.get_symbol_table()
+        self.declare(self.module, node.declarations, '')
+
+        function_code = []
+        for f in self.functions:
+            function_code.append(self.function_body(f))
+        self.scope, self.st, self.function = self.module, self.t_env.get_symbol_table(), None
+        self.body, self.indent = [], 1
+        self.block(node.statements)
+        main_body = self.body
+        user_classes = [c for c in self.classes.values() if c.name != 'object']
+        tables = [self.class_tables(c) for c in user_classes]
+        global_defs = [d for d in node.declarations if isinstance(d, ast.VarDefNode)]
+        global_names = [d.var.identifier.name for d in global_defs]
+        inits = [f'    g_{name} = {self.literal(d.value.get_value(), self.module.vars[name])};'
+                 for name, d in zip(global_names, global_defs)]
+        # String constants are created first, the class tables and global initializers refer to them.
+        inits[:0] = [f'    {name} = cp_str_lit({c_string(s)}, {len(s)});' for s, name in self.strings.items()]
+
+        parts = [C_RUNTIME]
+        parts.extend(self.class_struct(c) for c in user_classes)
+        parts.extend(f'struct fr_{f.cname};' for f in self.functions)
+        parts.extend(self.frame_struct(f) for f in self.functions if f.scope.has_frame)
+        parts.extend(self.prototype(f) + ';' for f in self.functions)
+        parts.extend(f'static Object *{name};' for name in self.strings.values())
+        parts.extend(tables)
+        parts.extend(f'static {ctype(self.module.vars[name])} g_{name};' for name in global_names)
+        parts.extend(function_code)
+        parts.append('int main(void) {\n    char base;\n    cp_stack_base = (uintptr_t) &base;\n    cp_init();\n' +
+                     '\n'.join(inits + main_body) + '\n    cp_exit(0);\n    return 0;\n}')
+        return '\n\n'.join(parts) + '\n'
+
+    def function_body(self, f: FunctionInfo) -> str:
+        self.scope, self.st, self.function = f.scope, f.symtab, f
+        self.body, self.indent = [], 1
+        node = f.node
+        self.line('cp_enter();')
+        if f.scope.has_frame:
+            self.line(f'struct fr_{f.cname} fr;')
+            if f.def_scope.kind == 'function':
+                self.line('fr.link = link;')
+            for p in node.params:
+                self.line(f'fr.v_{p.identifier.name} = v_{p.identifier.name};')
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                name = d.var.identifier.name
+                value = self.literal(d.value.get_value(), f.scope.vars[name])
+                if f.scope.has_frame:
+                    self.line(f'fr.v_{name} = {value};')
+                else:
+                    self.line(f'{ctype(f.scope.vars[name])} v_{name} = {value};')
+        self.block(node.statements)
+        self.line('return 0;' if ctype(f.signature.return_type) == 'int32_t' else 'return NULL;')
+        return self.prototype(f) + ' {\n' + '\n'.join(self.body) + '\n}'
+
+    ####################################################################################################################
+    # Statements.
+
+    def block(self, statements: list):
+        for s in statements:
+            if isinstance(s, ast.ExprNode):
+                self.expr_statement(s)
+            else:
+                self.visit(s)
+
+    def nested_block(self, statements: list):
+        self.indent += 1
+        self.block(statements)
+        self.indent -= 1
+
+    def expr_statement(self, node: ast.ExprNode):
+        if isinstance(node, ast.FunctionCallExprNode) and node.identifier.name == 'print':
+            self.line(self.print_call(node) + ';')
+        else:
+            self.visit(node)
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        if node.expr is None:
+            self.line('return NULL;')
+            return
+        value = self.visit(node.expr)
+        self.line(f'return {self.coerce(value, node.expr.get_type_str(), self.function.signature.return_type)};')
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        src = node.expr.get_type_str()
+        value = self.visit(node.expr)
+        if len(node.targets) > 1 and isinstance(node.expr, ast.IdentifierExprNode):
+            value = self.temp(src, value)
+        for t in node.targets:
+            v = self.coerce(value, src, t.get_type_str())
+            if isinstance(t, ast.IdentifierExprNode):
+                self.line(f'{self.lvalue(t.identifier.name)} = {v};')
+            elif isinstance(t, ast.MemberExprNode):
+                obj = self.visit(t.expr_object)
+                self.line(f'{self.member(obj, t.expr_object.get_type_str(), t.member.name)} = {v};')
+            else:
+                lst = self.visit(t.list_expr)
+                if has_effects(t.index):
+                    lst = self.temp('object', lst)
+                index = self.visit(t.index)
+                field = 'i' if t.get_type_str() in ('int', 'bool') else 'o'
+                self.line(f'cp_list_at({lst}, {index})->{field} = {v};')
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        self.line(f'if ({self.visit(node.condition)}) {{')
+        self.nested_block(node.then_body)
+        closing = 1
+        for cond, body in node.elifs:
+            # The condition may need statements, so each elif opens a nested block.
+            self.line('} else {')
+            self.indent += 1
+            self.line(f'if ({self.visit(cond)}) {{')
+            self.nested_block(body)
+            closing += 1
+        if node.else_body:
+            self.line('} else {')
+            self.nested_block(node.else_body)
+        for i in range(closing, 0, -1):
+            self.line('}')
+            if i > 1:
+                self.indent -= 1
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        self.line('for (;;) {')
+        self.indent += 1
+        cond = self.visit(node.condition)
+        self.line(f'if (!{cond}) break;')
+        self.block(node.body)
+        self.indent -= 1
+        self.line('}')
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        iterable = self.temp('object', f'cp_nn({self.visit(node.iterable)})')
+        self.temps += 1
+        i = f'i{self.temps}'
+        var = self.lvalue(node.identifier.name)
+        if node.iterable.get_type_str() == 'str':
+            self.line(f'for (int32_t {i} = 0; {i} < ((Str *) {iterable})->len; {i}++) {{')
+            self.line(f'    {var} = cp_str_index({iterable}, {i});')
+        else:
+            elem = node.iterable.get_type_str()[1:-1]
+            field = 'i' if elem in ('int', 'bool') else 'o'
+            value = self.coerce(f'((List *) {iterable})->e[{i}].{field}', elem, self.st.lookup(
+                node.identifier.name).get_type_str())
+            self.line(f'for (int32_t {i} = 0; {i} < ((List *) {iterable})->len; {i}++) {{')
+            self.line(f'    {var} = {value};')
+        self.nested_block(node.body)
+        self.line('}')
+
+    ####################################################################################################################
+    # Expressions. Each returns a C expression without side effects (a literal, variable or temporary).
+
+    @visit.register
+    def _(self, node: ast.LiteralExprNode):
+        v = node.get_value()
+        return 'NULL' if v is None else self.string_constant(v) if isinstance(v, str) else c_int(int(v))
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        return self.lvalue(node.identifier.name)
+
+    def operands(self, nodes: list) -> list:
+        """
+        Evaluates expressions left to right; a variable is copied if a later expression may change it.
+        """
+        values = []
+        for k, n in enumerate(nodes):
+            v = self.visit(n)
+            if isinstance(n, ast.IdentifierExprNode) and any(has_effects(m) for m in nodes[k + 1:]):
+                v = self.temp(n.get_type_str(), v)
+            values.append(v)
+        return values
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        v = self.visit(node.operand)
+        if node.op == Operator.Not:
+            return self.temp('bool', f'!{v}')
+        if isinstance(node.operand, ast.IntegerLiteralExprNode) and node.operand.get_value() != -2 ** 31:
+            return f'(-{v})'
+        return self.temp('int', f'cp_neg({v})')
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        if node.op in (Operator.And, Operator.Or):
+            result = self.temp('bool', self.visit(node.lhs))
+            self.line(f'if ({"" if node.op == Operator.And else "!"}{result}) {{')
+            self.indent += 1
+            self.line(f'{result} = {self.visit(node.rhs)};')
+            self.indent -= 1
+            self.line('}')
+            return result
+        lhs, rhs = self.operands([node.lhs, node.rhs])
+        t = node.lhs.get_type_str()
+        if node.op in CMP_OPS:
+            if t == 'str' and node.op != Operator.Is:
+                eq = f'cp_str_eq({lhs}, {rhs})'
+                return self.temp('bool', eq if node.op == Operator.Eq else f'!{eq}')
+            return self.temp('bool', f'{lhs} {CMP_OPS[node.op]} {rhs}')
+        if t == 'int':
+            return self.temp('int', f'{INT_OPS[node.op]}({lhs}, {rhs})')
+        if t == 'str':
+            return self.temp('str', f'cp_str_concat({lhs}, {rhs})')
+        return self.temp('object', f'cp_list_concat({lhs}, {rhs})')
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        t = node.get_type_str()
+        self.temps += 1
+        result = f't{self.temps}'
+        self.line(f'{ctype(t)} {result};')
+        self.line(f'if ({self.visit(node.condition)}) {{')
+        self.indent += 1
+        self.line(f'{result} = {self.coerce(self.visit(node.then_expr), node.then_expr.get_type_str(), t)};')
+        self.indent -= 1
+        self.line('} else {')
+        self.indent += 1
+        self.line(f'{result} = {self.coerce(self.visit(node.else_expr), node.else_expr.get_type_str(), t)};')
+        self.indent -= 1
+        self.line('}')
+        return result
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        lst, index = self.operands([node.list_expr, node.index])
+        if node.list_expr.get_type_str() == 'str':
+            return self.temp('str', f'cp_str_index({lst}, {index})')
+        t = node.get_type_str()
+        return self.temp(t, f'cp_list_at({lst}, {index})->{"i" if t in ("int", "bool") else "o"}')
+
+    def member(self, obj: str, cls: str, name: str) -> str:
+        return f'((struct C_{cls} *) cp_nn({obj}))->a_{name}'
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        obj = self.visit(node.expr_object)
+        return self.temp(node.get_type_str(), self.member(obj, node.expr_object.get_type_str(), node.member.name))
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        elem = node.get_type_str()[1:-1]
+        field = 'i' if elem in ('int', 'bool') else 'o'
+        values = [self.coerce(v, e.get_type_str(), elem) for v, e in zip(self.operands(node.elements), node.elements)]
+        lst = self.temp('object', f'cp_list_new({len(values)})')
+        for k, v in enumerate(values):
+            self.line(f'((List *) {lst})->e[{k}].{field} = {v};')
+        return lst
+
+    def arguments(self, nodes: list, types: list) -> list:
+        return [self.coerce(v, n.get_type_str(), t) for v, n, t in zip(self.operands(nodes), nodes, types)]
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        cls = node.member.expr_object.get_type_str()
+        name = node.member.member.name
+        signature = type_visitor.TypeVisitor.get_signature(self.t_env.get_method_symbol_table(cls, name))
+        obj, *args = self.operands([node.member.expr_object] + node.args)
+        args = [self.coerce(v, n.get_type_str(), t) for v, n, t in zip(args, node.args, signature.args_type[1:])]
+        fn_type = f'{ctype(signature.return_type)} (*)({", ".join(ctype(t) for t in signature.args_type)})'
+        method = f'cp_nn({obj})->cls->methods[{self.classes[cls].method_index(name)}]'
+        return self.temp(signature.return_type, f'(({fn_type}) {method})({", ".join([obj] + args)})')
+
+    def print_call(self, node: ast.FunctionCallExprNode) -> str:
+        arg = node.args[0]
+        t = arg.get_type_str()
+        f = {'int': 'cp_print_int', 'bool': 'cp_print_bool', 'str': 'cp_print_str'}.get(t, 'cp_print')
+        return f'{f}({self.visit(arg)})'
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        name = node.identifier.name
+        if f := self.lookup_function(name):
+            args = self.arguments(node.args, f.signature.args_type)
+            if f.def_scope.kind == 'function':
+                args.insert(0, self.static_link(f))
+            return self.temp(f.signature.return_type, f'{f.cname}({", ".join(args)})')
+        if name == 'object':
+            return self.temp('object', 'cp_new_object()')
+        if name in self.classes:
+            obj = self.temp(name, f'new_{name}()')
+            self.line(f'((Object *(*)(Object *)) {obj}->cls->methods[0])({obj});')
+            return obj
+        if name == 'input':
+            return self.temp('str', 'cp_input()')
+        if name == 'print':
+            return self.temp('object', self.print_call(node))
+        arg = node.args[0]
+        v, t = self.visit(arg), arg.get_type_str()
+        return self.temp('int', f'((Str *) {v})->len' if t == 'str' else f'cp_len({v})')
+
+
+########################################################################################################################
+# Building and running.
+
+def find_cc() -> str:
+    for cc in (os.environ.get('CC'), 'cc', 'gcc', 'clang'):
+        if cc and (path := shutil.which(cc)):
+            return path
+    raise CompilerNotFound()
+
+
+def binary_key(source: str, cc: str, fold: bool = False) -> str:
+    return hashlib.sha256(f'{VERSION}\0{cc}\0{" ".join(CFLAGS)}\0{fold}\0{source}'.encode()).hexdigest()
+
+
+def build(source: str, cache_dir: str = DEFAULT_CACHE, cc: str = None, fold: bool = False) -> str:
+    """
+    Compiles ChocoPy source text to an executable and returns its path. The binary is cached in cache_dir under the
+    hash of the source (with the backend version and compiler), so the front end and cc only run on a miss.
+    """
+    cc = cc or find_cc()
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, binary_key(source, cc, fold))
+    if os.path.exists(path):
+        return path
+    compile_c(generate(source, fold), path, cc)
+    return path
+
+
+def build_c(c_source: str, cache_dir: str = DEFAULT_CACHE, cc: str = None) -> str:
+    """
+    Compiles generated C source (e.g., of separately compiled units linked together, see modules.py) to an executable
+    and returns its path, cached in cache_dir under the hash of the C source.
+    """
+    cc = cc or find_cc()
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, hashlib.sha256(f'{cc}\0{" ".join(CFLAGS)}\0{c_source}'.encode()).hexdigest())
+    if not os.path.exists(path):
+        compile_c(c_source, path, cc)
+    return path
+
+
+def compile_c(c_source: str, path: str, cc: str):
+    """
+    Compiles C source to the executable path with cc, replacing it atomically.
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as tmp:
+        c_file = os.path.join(tmp, 'program.c')
+        with open(c_file, 'w') as f:
+            f.write(c_source)
+        exe = os.path.join(tmp, 'program')
+        result = subprocess.run([cc, *CFLAGS, '-o', exe, c_file], capture_output=True, text=True)
+        if result.returncode:
+            raise BuildError(result.stderr)
+        os.replace(exe, path)
+
+
+def generate(source: str, fold: bool = False) -> str:
+    """
+    Returns the C source of a ChocoPy program (raising on syntax and semantic errors), constant folded with fold.
+    """
+    ast_root = parser.Parser(io.StringIO(source)).parse()
+    st_visitor = symtab_visitor.SymbolTableVisitor()
+    st_visitor.do_visit(ast_root)
+    st = st_visitor.get_symbol_table()
+    type_visitor.TypeVisitor(type_env.TypeEnvironment(st)).do_visit(ast_root)
+    if fold:
+        const_fold.ConstantFolder().fold(ast_root)
+    return CGenerator(type_env.TypeEnvironment(st)).generate(ast_root)
+
+
+def run(path: str, input_text: str = None, capture: bool = True) -> subprocess.CompletedProcess:
+    """
+    Runs a built program, returning the completed process (exit code and, with capture, the output). Without
+    input_text the program reads the inherited standard input.
+    """
+    return subprocess.run([path], input=input_text, capture_output=capture, text=True)
+
+
+C_RUNTIME = r"""#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef void (*Method)(void);
+typedef struct Class { const char *name; int32_t tag; const Method *methods; } Class;
+typedef struct Object { const Class *cls; } Object;
+typedef struct Int { Object h; int32_t v; } Int;
+typedef struct Str { Object h; int32_t len; char s[]; } Str;
+typedef union Value { int32_t i; Object *o; } Value;
+typedef struct List { Object h; int32_t len; Value e[]; } List;
+
+static void cp_exit(int code) {
+    fflush(stdout);
+    exit(code);
+}
+
+static void cp_error(const char *message, int code) {
+    printf("%s\n", message);
+    cp_exit(code);
+}
+
+/* Below the usual 8 MB stack of the main thread, with room for the run-time library and printf. */
+#define CP_STACK_LIMIT (6 << 20)
+static uintptr_t cp_stack_base;
+
+static inline void cp_enter(void) {
+    char here;
+    if ((uintptr_t) &here + CP_STACK_LIMIT < cp_stack_base)  /* &here may be above base once inlined into main. */
+        cp_error("Out of memory", 5);
+}
+
+static char *cp_heap, *cp_heap_end;
+
+static void *cp_alloc(size_t n) {
+    n = (n + 7) & ~(size_t) 7;
+    if ((size_t) (cp_heap_end - cp_heap) < n) {
+        size_t chunk = n > (1 << 20) ? n : (1 << 20);
+        cp_heap = calloc(1, chunk);
+        if (!cp_heap)
+            cp_error("Out of memory", 5);
+        cp_heap_end = cp_heap + chunk;
+    }
+    void *p = cp_heap;
+    cp_heap += n;
+    return p;
+}
+
+static Object *cp_object_init(Object *self) { (void) self; return NULL; }
+static const Method cp_object_methods[] = {(Method) cp_object_init};
+static const Class cls_object = {"object", 0, cp_object_methods};
+static const Class cls_int = {"int", 1, cp_object_methods};
+static const Class cls_bool = {"bool", 2, cp_object_methods};
+static const Class cls_str = {"str", 3, cp_object_methods};
+static const Class cls_list = {".list", -1, cp_object_methods};
+static Int cp_true = {{&cls_bool}, 1}, cp_false = {{&cls_bool}, 0};
+static Object *cp_chars[256];
+
+static inline Object *cp_nn(Object *o) {
+    if (!o)
+        cp_error("Operation on None", 4);
+    return o;
+}
+
+static inline int32_t cp_check(int64_t v) {
+    if (v < INT32_MIN || v > INT32_MAX)
+        cp_error("Integer overflow", 6);
+    return (int32_t) v;
+}
+
+static inline int32_t cp_add(int32_t a, int32_t b) { return cp_check((int64_t) a + b); }
+static inline int32_t cp_sub(int32_t a, int32_t b) { return cp_check((int64_t) a - b); }
+static inline int32_t cp_mul(int32_t a, int32_t b) { return cp_check((int64_t) a * b); }
+static inline int32_t cp_neg(int32_t a) { return cp_check(-(int64_t) a); }
+
+static inline int32_t cp_div(int32_t a, int32_t b) {
+    if (b == 0)
+        cp_error("Division by zero", 2);
+    int64_t q = (int64_t) a / b, r = (int64_t) a % b;
+    if (r != 0 && (r < 0) != (b < 0))
+        q--;
+    return cp_check(q);
+}
+
+static inline int32_t cp_mod(int32_t a, int32_t b) {
+    if (b == 0)
+        cp_error("Division by zero", 2);
+    int64_t r = (int64_t) a % b;
+    if (r != 0 && (r < 0) != (b < 0))
+        r += b;
+    return (int32_t) r;
+}
+
+static Object *cp_new_object(void) {
+    Object *o = cp_alloc(sizeof(Object));
+    o->cls = &cls_object;
+    return o;
+}
+
+static Object *cp_box_int(int32_t v) {
+    Int *o = cp_alloc(sizeof(Int));
+    o->h.cls = &cls_int;
+    o->v = v;
+    return &o->h;
+}
+
+static Object *cp_box_bool(int32_t v) { return v ? &cp_true.h : &cp_false.h; }
+
+static Str *cp_str_new(int32_t n) {
+    Str *s = cp_alloc(sizeof(Str) + n + 1);
+    s->h.cls = &cls_str;
+    s->len = n;
+    return s;
+}
+
+static Object *cp_str_lit(const char *chars, int32_t n) {
+    Str *s = cp_str_new(n);
+    memcpy(s->s, chars, n);
+    return &s->h;
+}
+
+static Object *cp_str_index(Object *o, int32_t i) {
+    Str *s = (Str *) o;
+    if (i < 0 || i >= s->len)
+        cp_error("Index out of bounds", 3);
+    return cp_chars[(unsigned char) s->s[i]];
+}
+
+static Object *cp_str_concat(Object *a, Object *b) {
+    Str *x = (Str *) a, *y = (Str *) b, *s = cp_str_new(x->len + y->len);
+    memcpy(s->s, x->s, x->len);
+    memcpy(s->s + x->len, y->s, y->len);
+    return &s->h;
+}
+
+static int32_t cp_str_eq(Object *a, Object *b) {
+    Str *x = (Str *) a, *y = (Str *) b;
+    return x->len == y->len && memcmp(x->s, y->s, x->len) == 0;
+}
+
+static Object *cp_list_new(int32_t n) {
+    List *l = cp_alloc(sizeof(List) + n * sizeof(Value));
+    l->h.cls = &cls_list;
+    l->len = n;
+    return &l->h;
+}
+
+static inline Value *cp_list_at(Object *o, int32_t i) {
+    List *l = (List *) cp_nn(o);
+    if (i < 0 || i >= l->len)
+        cp_error("Index out of bounds", 3);
+    return &l->e[i];
+}
+
+static Object *cp_list_concat(Object *a, Object *b) {
+    List *x = (List *) cp_nn(a), *y = (List *) cp_nn(b);
+    Object *o = cp_list_new(x->len + y->len);
+    List *l = (List *) o;
+    memcpy(l->e, x->e, x->len * sizeof(Value));
+    memcpy(l->e + x->len, y->e, y->len * sizeof(Value));
+    return o;
+}
+
+static int32_t cp_len(Object *o) {
+    if (o && o->cls->tag == 3)
+        return ((Str *) o)->len;
+    if (o && o->cls->tag == -1)
+        return ((List *) o)->len;
+    cp_error("Invalid argument", 1);
+    return 0;
+}
+
+static Object *cp_print_int(int32_t v) {
+    printf("%d\n", (int) v);
+    return NULL;
+}
+
+static Object *cp_print_bool(int32_t v) {
+    fputs(v ? "True\n" : "False\n", stdout);
+    return NULL;
+}
+
+static Object *cp_print_str(Object *o) {
+    Str *s = (Str *) o;
+    fwrite(s->s, 1, s->len, stdout);
+    putchar('\n');
+    return NULL;
+}
+
+static Object *cp_print(Object *o) {
+    if (o && o->cls->tag == 1)
+        return cp_print_int(((Int *) o)->v);
+    if (o && o->cls->tag == 2)
+        return cp_print_bool(((Int *) o)->v);
+    if (o && o->cls->tag == 3)
+        return cp_print_str(o);
+    cp_error("Invalid argument", 1);
+    return NULL;
+}
+
+static Object *cp_input(void) {
+    size_t n = 0, cap = 64;
+    char *buf = malloc(cap);
+    int c;
+    while ((c = getchar()) != EOF && c != '\n') {
+        if (n == cap)
+            buf = realloc(buf, cap *= 2);
+        buf[n++] = (char) c;
+    }
+    Object *s = cp_str_lit(buf, (int32_t) n);
+    free(buf);
+    return s;
+}
+
+static void cp_init(void) {
+    static char buffer[1 << 16];
+    setvbuf(stdout, buffer, _IOFBF, sizeof(buffer));
+    for (int c = 0; c < 256; c++) {
+        char ch = (char) c;
+        cp_chars[c] = cp_str_lit(&ch, 1);
+    }
+}"""
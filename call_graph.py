@@ -0,0 +1,389 @@
+#
+# Call graph and dead code elimination. Version 1.0
+#
+# Builds the call graph of a parsed program: one node per function, method and the top-level statements ('<module>'),
+# with edges for the resolved call sites. Function calls are resolved through the nesting of the declarations, a call
+# of a class goes to its (possibly inherited) __init__, and a method call e.m(...) goes, by class hierarchy analysis,
+# to every class defining a method m. Each node also records the classes its declarations and body refer to.
+#
+# eliminate_dead_code() removes the FuncDefNode and ClassDefNode declarations (and methods) not reachable from the
+# top-level statements. It only needs the parsed AST, so it can run before the symbol table and type checking.
+# Keeping the implementations of a called method name in every needed class keeps the program well typed whatever
+# the receiver's static type.
+#
+# Usage: python call_graph.py [--synthetic N] [program.py ...] reports what is removed and the compile time saved.
+#
+import functools
+import io
+import sys
+import time
+import astree as ast
+import visitor
+
+MODULE = '<module>'
+BUILT_INS = {'print', 'len', 'input', 'object', 'int', 'bool', 'str'}
+
+
+class FunctionNode:
+    def __init__(self, name: str, node, cls: str = None):
+        self.name = name  # 'f', 'outer.inner', 'A.m' or '<module>'.
+        self.node = node
+        self.cls = cls  # The class of a method.
+        self.calls = set()  # Names of the called functions and methods.
+        self.method_calls = set()  # Names of the methods called on objects.
+        self.classes = set()  # Classes named in type annotations or instantiated.
+        self.instantiated = set()
+
+
+class ClassNode:
+    def __init__(self, name: str, node: ast.ClassDefNode):
+        self.name = name
+        self.node = node
+        self.super_class = node.super_class.name
+        self.methods = {}  # Name -> function name, defined in this class.
+        self.classes = set()  # Classes named in the attribute annotations.
+
+
+class CallGraph:
+    def __init__(self):
+        self.functions = {}
+        self.classes = {}
+
+    def resolve_method(self, cls: str, name: str):
+        """
+        Returns the function implementing a method for a class, following the superclasses.
+        """
+        while cls in self.classes:
+            if name in self.classes[cls].methods:
+                return self.classes[cls].methods[name]
+            cls = self.classes[cls].super_class
+        return None
+
+    def implementations(self, name: str) -> list:
+        return [c.methods[name] for c in self.classes.values() if name in c.methods]
+
+    def callees(self, f: FunctionNode) -> set:
+        """
+        Returns the functions called by f: direct calls, plus by class hierarchy analysis every implementation of the
+        methods it calls.
+        """
+        result = set(f.calls)
+        for m in f.method_calls:
+            result.update(self.implementations(m))
+        return result
+
+    def reachable(self) -> tuple:
+        """
+        Returns the functions reachable from the top-level statements and the classes they need (instantiated, named
+        in an annotation, or a superclass of those). A method call reaches the implementations in the needed classes
+        only: no object of another class can exist, and the declarations are not needed for typing either.
+        """
+        functions, classes, called = set(), set(), set()
+        pending_functions, pending_classes = [MODULE], []
+        while pending_functions or pending_classes:
+            while pending_functions:
+                f = self.functions[pending_functions.pop()]
+                if f.name in functions:
+                    continue
+                functions.add(f.name)
+                pending_functions.extend(f.calls)
+                pending_functions.extend(m for m in (self.resolve_method(c, '__init__') for c in f.instantiated) if m)
+                pending_classes.extend(f.classes)
+                for m in f.method_calls - called:
+                    called.add(m)
+                    pending_functions.extend(self.classes[c].methods[m] for c in classes
+                                             if m in self.classes[c].methods)
+            while pending_classes:
+                c = pending_classes.pop()
+                if c not in self.classes or c in classes:
+                    continue
+                classes.add(c)
+                node = self.classes[c]
+                pending_classes.append(node.super_class)
+                pending_classes.extend(node.classes)
+                pending_functions.extend(f for m, f in node.methods.items() if m in called)
+        return functions, classes
+
+    def __str__(self):
+        lines = []
+        for f in self.functions.values():
+            callees = ', '.join(sorted(self.callees(f)))
+            lines.append(f'{f.name} -> {callees}' if callees else f.name)
+        return '\n'.join(lines)
+
+
+def annotation_classes(annotation) -> set:
+    while isinstance(annotation, ast.ListTypeAnnotationNode):
+        annotation = annotation.elem_type
+    return {annotation.name} if isinstance(annotation, ast.ClassTypeAnnotationNode) else set()
+
+
+class CallGraphBuilder(visitor.Visitor):
+
+    def __init__(self):
+        self.graph = CallGraph()
+        self.function = None
+        self.scopes = []  # Per nesting level: function name -> graph node name.
+
+    def build(self, node: ast.ProgramNode) -> CallGraph:
+        self.visit(node)
+        return self.graph
+
+    def do_visit(self, node):
+        if node:
+            return self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    def declarations(self, declarations: list, prefix: str):
+        scope = {d.name.name: prefix + d.name.name for d in declarations if isinstance(d, ast.FuncDefNode)}
+        self.scopes.append(scope)
+        for d in declarations:
+            if isinstance(d, ast.VarDefNode):
+                self.function.classes |= annotation_classes(d.var.id_type)
+            elif isinstance(d, ast.FuncDefNode):
+                self.function_node(d, scope[d.name.name], None)
+            elif isinstance(d, ast.ClassDefNode):
+                self.visit(d)
+
+    def function_node(self, node: ast.FuncDefNode, name: str, cls: str):
+        saved, self.function = self.function, FunctionNode(name, node, cls)
+        self.graph.functions[name] = self.function
+        for p in node.params:
+            self.function.classes |= annotation_classes(p.id_type)
+        if node.return_type:
+            self.function.classes |= annotation_classes(node.return_type)
+        self.declarations(node.declarations, name + '.')
+        for s in node.statements:
+            self.visit(s)
+        self.scopes.pop()
+        self.function = saved
+
+    def lookup(self, name: str):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        self.function = FunctionNode(MODULE, node)
+        self.graph.functions[MODULE] = self.function
+        # The scope of the module-level functions stays open for the top-level statements.
+        self.scopes = []
+        self.declarations(node.declarations, '')
+        for s in node.statements:
+            self.visit(s)
+
+    @visit.register
+    def _(self, node: ast.ClassDefNode):
+        name = node.name.name
+        cls = ClassNode(name, node)
+        self.graph.classes[name] = cls
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                cls.classes |= annotation_classes(d.var.id_type)
+            elif isinstance(d, ast.FuncDefNode):
+                cls.methods[d.name.name] = f'{name}.{d.name.name}'
+        # Methods only see the module-level functions.
+        saved_scopes, self.scopes = self.scopes, self.scopes[:1]
+        for d in node.declarations:
+            if isinstance(d, ast.FuncDefNode):
+                self.function_node(d, cls.methods[d.name.name], name)
+        self.scopes = saved_scopes
+
+    # Statements.
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        self.do_visit(node.expr)
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        for t in node.targets:
+            self.visit(t)
+        self.visit(node.expr)
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        for cond, body in [(node.condition, node.then_body)] + node.elifs:
+            self.visit(cond)
+            for s in body:
+                self.visit(s)
+        for s in node.else_body:
+            self.visit(s)
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        self.visit(node.condition)
+        for s in node.body:
+            self.visit(s)
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        self.visit(node.iterable)
+        for s in node.body:
+            self.visit(s)
+
+    # Expressions.
+
+    @visit.register
+    def _(self, node: ast.LiteralExprNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        self.visit(node.operand)
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        self.visit(node.lhs)
+        self.visit(node.rhs)
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        self.visit(node.condition)
+        self.visit(node.then_expr)
+        self.visit(node.else_expr)
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        self.visit(node.list_expr)
+        self.visit(node.index)
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        self.visit(node.expr_object)
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        for e in node.elements:
+            self.visit(e)
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        name = node.identifier.name
+        if function := self.lookup(name):
+            self.function.calls.add(function)
+        elif name not in BUILT_INS:
+            self.function.classes.add(name)
+            self.function.instantiated.add(name)
+        for a in node.args:
+            self.visit(a)
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        self.function.method_calls.add(node.member.member.name)
+        self.visit(node.member.expr_object)
+        for a in node.args:
+            self.visit(a)
+
+
+class EliminationReport:
+    def __init__(self):
+        self.functions = []  # Names of the removed functions and methods.
+        self.classes = []
+
+    def __str__(self):
+        return (f"Removed {len(self.classes)} classes: {', '.join(self.classes) or '-'}\n"
+                f"Removed {len(self.functions)} functions and methods: {', '.join(self.functions) or '-'}")
+
+
+def eliminate_dead_code(program: ast.ProgramNode) -> EliminationReport:
+    """
+    Removes the functions, methods and classes not reachable from the top-level statements, in place.
+    """
+    graph = CallGraphBuilder().build(program)
+    functions, classes = graph.reachable()
+    report = EliminationReport()
+
+    def prune(declarations: list, prefix: str) -> list:
+        kept = []
+        for d in declarations:
+            if isinstance(d, ast.FuncDefNode):
+                name = prefix + d.name.name
+                if name not in functions:
+                    report.functions.append(name)
+                    continue
+                d.declarations = prune(d.declarations, name + '.')
+            elif isinstance(d, ast.ClassDefNode):
+                if d.name.name not in classes:
+                    report.classes.append(d.name.name)
+                    continue
+                d.declarations = prune(d.declarations, d.name.name + '.')
+            kept.append(d)
+        return kept
+    program.declarations = prune(program.declarations, '')
+    return report
+
+
+########################################################################################################################
+# Measurement.
+
+def synthetic_program(n: int) -> str:
+    """
+    Returns a program with n helper functions and n/10 classes of which only a few are used.
+    """
+    lines = []
+    for i in range(n // 10):
+        lines += [f'class C{i}(object):', '    x: int = 0',
+                  f'    def get(self: "C{i}", k: int) -> int:', '        return self.x + k']
+    for i in range(n):
+        callee = f'h{i - 1}(a) + ' if i and i % 5 else ''
+        lines += [f'def h{i}(a: int) -> int:', '    b: int = 0', '    b = a * 2 + 1',
+                  '    if b > 100:', '        b = b // 3', f'    return {callee}b']
+    lines += ['print(h3(1))', 'print(C0().get(2))']
+    return '\n'.join(lines) + '\n'
+
+
+def compile_time(source: str, eliminate: bool, repeat: int = 3) -> float:
+    import parser
+    import symtab_visitor
+    import type_env
+    import type_visitor
+    import py_backend
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        program = parser.Parser(io.StringIO(source)).parse()
+        if eliminate:
+            eliminate_dead_code(program)
+        st_visitor = symtab_visitor.SymbolTableVisitor()
+        st_visitor.do_visit(program)
+        type_visitor.TypeVisitor(type_env.TypeEnvironment(st_visitor.get_symbol_table())).do_visit(program)
+        py_backend.PyCompiler().compile(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    import parser
+    sources = []
+    if '--synthetic' in argv:
+        n = int(argv[argv.index('--synthetic') + 1])
+        del argv[argv.index('--synthetic'):argv.index('--synthetic') + 2]
+        sources.append((f'<synthetic {n}>', synthetic_program(n)))
+    for filename in argv:
+        with open(filename) as f:
+            sources.append((filename, f.read()))
+    for name, source in sources:
+        print(name)
+        print(eliminate_dead_code(parser.Parser(io.StringIO(source)).parse()))
+        before, after = compile_time(source, False), compile_time(source, True)
+        print(f"Compile time: {before:.4f}s -> {after:.4f}s ({100 * (before - after) / before:.1f}% saved)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
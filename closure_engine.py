@@ -0,0 +1,725 @@
+#
+# Closure-compiled execution engine. Version 1.0
+#
+# Compiles a type-checked ProgramNode into a tree of pre-bound Python closures, one per AST node. Operators, built-in
+# calls and variable accesses are specialized at compile time (from the nodes' type_str and the resolved scopes),
+# so running a program does no dispatch on node classes or types.
+#
+import functools
+import sys
+import astree as ast
+from astree import Operator
+import visitor
+import runtime
+from runtime import operation_on_none, index_out_of_bounds, integer_overflow, division_by_zero, out_of_memory
+
+
+class Scope:
+    """
+    Compile-time information about a module or function scope.
+    A function frame is a list holding the static link (the frame of the enclosing function, or None) at index 0,
+    followed by the parameters and the local variables. The module frame holds the global variables.
+    """
+    def __init__(self, kind: str, parent: "Scope" = None):
+        self.kind = kind  # 'module' or 'function'
+        self.parent = parent  # The enclosing function scope (None for the module and for top-level functions).
+        self.depth = parent.depth + 1 if parent else (0 if kind == 'module' else 1)
+        self.slots = {}
+        self.defaults = []
+        self.globals = set()
+        self.nonlocals = set()
+        self.functions = {}
+
+    def add_slot(self, name: str, default=None):
+        self.slots[name] = len(self.defaults) + (1 if self.kind == 'function' else 0)
+        self.defaults.append(default)
+
+
+class FunctionInfo:
+    """
+    A compiled function or method. The entry is a Python callable taking the static link and the arguments;
+    its body is compiled (and bound with set_body) after all declarations of the enclosing scope are known.
+    """
+    def __init__(self, name: str, scope: Scope, def_scope: Scope, n_params: int, pending: list):
+        self.name = name
+        self.scope = scope
+        self.def_scope = def_scope
+        self.pending = pending  # Nested function definitions.
+        # The parameters are passed by the caller, only the locals are initialized from the defaults.
+        self.entry, self.set_body = make_entry(scope.defaults[n_params:])
+
+
+def make_entry(defaults: list):
+    body = None
+
+    def set_body(b):
+        nonlocal body
+        body = b
+
+    def entry(link, *args):
+        r = body([link, *args, *defaults])
+        return None if r is None else r[0]
+    return entry, set_body
+
+
+class Program:
+    """
+    A compiled ChocoPy program.
+    """
+    def __init__(self, globals_frame: list, defaults: list, body):
+        self.globals_frame = globals_frame
+        self.defaults = defaults
+        self.body = body
+
+    def run(self):
+        """
+        Runs the program. Raises runtime.RuntimeException on ChocoPy run-time errors, out of memory when the calls
+        nest too deeply.
+        """
+        self.globals_frame[:] = self.defaults
+        limit = sys.getrecursionlimit()
+        # A ChocoPy call takes several Python frames (the entry, the body, the statements and expressions on the way).
+        sys.setrecursionlimit(max(limit, 1000000))
+        try:
+            self.body(self.globals_frame)
+        except RecursionError:
+            out_of_memory()
+        finally:
+            sys.setrecursionlimit(limit)
+
+
+class ClosureCompiler(visitor.Visitor):
+
+    def __init__(self, out=None, inp=None):
+        self.write = (out or sys.stdout).write
+        self.readline = (inp or sys.stdin).readline
+        self.module = None
+        self.scope = None
+        self.classes = {'object': runtime.Object}
+        self.g = []
+
+    def compile(self, node: ast.ProgramNode) -> Program:
+        return self.visit(node)
+
+    def do_visit(self, node):
+        if node:
+            return self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    ####################################################################################################################
+    # Scopes and names.
+
+    def declare(self, scope: Scope, declarations: list):
+        """
+        Declares the variables and (nested) functions of a scope, the classes of the module.
+        Returns the function definitions whose bodies still need to be compiled.
+        """
+        pending = []
+        for d in declarations:
+            if isinstance(d, ast.VarDefNode):
+                scope.add_slot(d.var.identifier.name, d.value.get_value())
+            elif isinstance(d, ast.GlobalDeclNode):
+                scope.globals.add(d.variable.name)
+            elif isinstance(d, ast.NonLocalDeclNode):
+                scope.nonlocals.add(d.variable.name)
+        for d in declarations:
+            if isinstance(d, ast.FuncDefNode):
+                info = self.declare_function(d, scope)
+                scope.functions[d.name.name] = info
+                pending.append((d, info))
+            elif isinstance(d, ast.ClassDefNode):
+                pending.extend(self.declare_class(d))
+        return pending
+
+    def declare_function(self, node: ast.FuncDefNode, def_scope: Scope) -> FunctionInfo:
+        scope = Scope('function', def_scope if def_scope.kind == 'function' else None)
+        for p in node.params:
+            scope.add_slot(p.identifier.name)
+        pending = self.declare(scope, node.declarations)
+        return FunctionInfo(node.name.name, scope, def_scope, len(node.params), pending)
+
+    def declare_class(self, node: ast.ClassDefNode) -> list:
+        attrs, methods, pending = [], {}, []
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                attrs.append((d.var.identifier.name, d.value.get_value()))
+            elif isinstance(d, ast.FuncDefNode):
+                info = self.declare_function(d, self.module)
+                methods[d.name.name] = info.entry
+                pending.append((d, info))
+        base = self.classes[node.super_class.name]
+        self.classes[node.name.name] = runtime.make_class(node.name.name, base, attrs, methods)
+        return pending
+
+    def compile_functions(self, pending: list):
+        for node, info in pending:
+            saved, self.scope = self.scope, info.scope
+            self.compile_functions(info.pending)
+            info.set_body(self.block(node.statements))
+            self.scope = saved
+
+    def resolve(self, name: str):
+        """
+        Resolves a variable of the current scope to ('global', index) or ('local', hops, index), where hops is the
+        number of static links to follow.
+        """
+        scope = self.scope
+        if scope.kind == 'function' and name not in scope.globals:
+            hops = 0
+            while scope:
+                if name in scope.slots:
+                    return 'local', hops, scope.slots[name]
+                scope, hops = scope.parent, hops + 1
+        return 'global', self.module.slots[name]
+
+    def getter(self, name: str):
+        res = self.resolve(name)
+        if res[0] == 'global':
+            g, i = self.g, res[1]
+            return lambda f: g[i]
+        _, hops, i = res
+        if hops == 0:
+            return lambda f: f[i]
+        if hops == 1:
+            return lambda f: f[0][i]
+
+        def get(f):
+            for _ in range(hops):
+                f = f[0]
+            return f[i]
+        return get
+
+    def setter(self, name: str):
+        res = self.resolve(name)
+        if res[0] == 'global':
+            g, i = self.g, res[1]
+
+            def set_global(f, v):
+                g[i] = v
+            return set_global
+        _, hops, i = res
+
+        def set_local(f, v):
+            for _ in range(hops):
+                f = f[0]
+            f[i] = v
+        return set_local
+
+    def static_link(self, info: FunctionInfo):
+        """
+        Returns a closure computing the static link for a call of the function info from the current scope.
+        """
+        if info.def_scope.kind != 'function':
+            return None
+        hops = self.scope.depth - info.def_scope.depth
+        if hops == 0:
+            return lambda f: f
+        if hops == 1:
+            return lambda f: f[0]
+
+        def link(f):
+            for _ in range(hops):
+                f = f[0]
+            return f
+        return link
+
+    def lookup_function(self, name: str):
+        scope = self.scope if self.scope.kind == 'function' else None
+        while scope:
+            if name in scope.functions:
+                return scope.functions[name]
+            scope = scope.parent
+        return self.module.functions.get(name)
+
+    ####################################################################################################################
+    # Statements.
+
+    def statement(self, node):
+        """
+        Compiles a statement into a closure returning None, or a 1-tuple with the value of an executed return.
+        """
+        if isinstance(node, ast.ExprNode):
+            e = self.visit(node)
+
+            def expr_stmt(f):
+                e(f)
+            return expr_stmt
+        return self.visit(node)
+
+    def block(self, statements: list):
+        stmts = [self.statement(s) for s in statements]
+        if len(stmts) == 1:
+            return stmts[0]
+        stmts = tuple(stmts)
+
+        def run_block(f):
+            for s in stmts:
+                r = s(f)
+                if r is not None:
+                    return r
+        return run_block
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        self.module = self.scope = Scope('module')
+        pending = self.declare(self.module, node.declarations)
+        self.compile_functions(pending)
+        return Program(self.g, list(self.module.defaults), self.block(node.statements))
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        return lambda f: None
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        if node.expr is None:
+            return lambda f: (None,)
+        e = self.visit(node.expr)
+        return lambda f: (e(f),)
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        e = self.visit(node.expr)
+        if len(node.targets) == 1 and isinstance(node.targets[0], ast.IdentifierExprNode):
+            res = self.resolve(node.targets[0].identifier.name)
+            if res[0] == 'global':
+                g, i = self.g, res[1]
+
+                def assign_global(f):
+                    g[i] = e(f)
+                return assign_global
+            if res[1] == 0:
+                i = res[2]
+
+                def assign_local(f):
+                    f[i] = e(f)
+                return assign_local
+        setters = tuple(self.target(t) for t in node.targets)
+        if len(setters) == 1:
+            set_target = setters[0]
+
+            def assign(f):
+                set_target(f, e(f))
+            return assign
+
+        def assign_multiple(f):
+            v = e(f)
+            for s in setters:
+                s(f, v)
+        return assign_multiple
+
+    def target(self, node):
+        """
+        Compiles an assignment target into a closure storing a value.
+        """
+        if isinstance(node, ast.IdentifierExprNode):
+            return self.setter(node.identifier.name)
+        if isinstance(node, ast.MemberExprNode):
+            o, name = self.visit(node.expr_object), node.member.name
+
+            def set_member(f, v):
+                obj = o(f)
+                if obj is None:
+                    operation_on_none()
+                setattr(obj, name, v)
+            return set_member
+        lst, idx = self.visit(node.list_expr), self.visit(node.index)
+
+        def set_index(f, v):
+            a, i = lst(f), idx(f)
+            if a is None:
+                operation_on_none()
+            if i < 0 or i >= len(a):
+                index_out_of_bounds()
+            a[i] = v
+        return set_index
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        conds = [self.visit(node.condition)] + [self.visit(c) for c, _ in node.elifs]
+        bodies = [self.block(node.then_body)] + [self.block(b) for _, b in node.elifs]
+        else_body = self.block(node.else_body) if node.else_body else None
+        if len(conds) == 1:
+            c, then_body = conds[0], bodies[0]
+            if else_body is None:
+                def if_then(f):
+                    if c(f):
+                        return then_body(f)
+                return if_then
+
+            def if_then_else(f):
+                if c(f):
+                    return then_body(f)
+                return else_body(f)
+            return if_then_else
+        branches = tuple(zip(conds, bodies))
+
+        def if_elif(f):
+            for c, b in branches:
+                if c(f):
+                    return b(f)
+            if else_body is not None:
+                return else_body(f)
+        return if_elif
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        c, body = self.visit(node.condition), self.block(node.body)
+
+        def while_loop(f):
+            while c(f):
+                r = body(f)
+                if r is not None:
+                    return r
+        return while_loop
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        it, body = self.visit(node.iterable), self.block(node.body)
+        res = self.resolve(node.identifier.name)
+        set_var = self.setter(node.identifier.name)
+        if res[0] == 'local' and res[1] == 0:
+            i = res[2]
+
+            def for_local(f):
+                seq = it(f)
+                if seq is None:
+                    operation_on_none()
+                for v in seq:
+                    f[i] = v
+                    r = body(f)
+                    if r is not None:
+                        return r
+            return for_local
+
+        def for_loop(f):
+            seq = it(f)
+            if seq is None:
+                operation_on_none()
+            for v in seq:
+                set_var(f, v)
+                r = body(f)
+                if r is not None:
+                    return r
+        return for_loop
+
+    ####################################################################################################################
+    # Expressions.
+
+    @visit.register
+    def _(self, node: ast.NoneLiteralExprNode):
+        return lambda f: None
+
+    @visit.register
+    def _(self, node: ast.StringLiteralExprNode):
+        v = node.get_value()
+        return lambda f: v
+
+    @visit.register
+    def _(self, node: ast.IntegerLiteralExprNode):
+        v = node.get_value()
+        return lambda f: v
+
+    @visit.register
+    def _(self, node: ast.BooleanLiteralExprNode):
+        v = node.get_value()
+        return lambda f: v
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        return self.getter(node.identifier.name)
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        e = self.visit(node.operand)
+        if node.op == Operator.Not:
+            return lambda f: not e(f)
+
+        def negate(f):
+            v = e(f)
+            if v == -2147483648:
+                integer_overflow()
+            return -v
+        return negate
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        op, t = node.op, node.lhs.get_type_str()
+        lhs, rhs = self.visit(node.lhs), self.visit(node.rhs)
+        if op == Operator.And:
+            return lambda f: lhs(f) and rhs(f)
+        if op == Operator.Or:
+            return lambda f: lhs(f) or rhs(f)
+        if op == Operator.Is:
+            return lambda f: lhs(f) is rhs(f)
+        if t == 'int':
+            if isinstance(node.rhs, ast.IntegerLiteralExprNode):
+                return int_const_ops[op](lhs, node.rhs.get_value())
+            return int_ops[op](lhs, rhs)
+        if op == Operator.Eq:
+            return lambda f: lhs(f) == rhs(f)
+        if op == Operator.NotEq:
+            return lambda f: lhs(f) != rhs(f)
+        if t == 'str':  # Concatenation.
+            return lambda f: lhs(f) + rhs(f)
+
+        def concat(f):  # Lists.
+            a, b = lhs(f), rhs(f)
+            if a is None or b is None:
+                operation_on_none()
+            return a + b
+        return concat
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        c, t, e = self.visit(node.condition), self.visit(node.then_expr), self.visit(node.else_expr)
+        return lambda f: t(f) if c(f) else e(f)
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        lst, idx = self.visit(node.list_expr), self.visit(node.index)
+        if node.list_expr.get_type_str() == 'str':
+            def index_str(f):
+                s, i = lst(f), idx(f)
+                if 0 <= i < len(s):
+                    return s[i]
+                index_out_of_bounds()
+            return index_str
+
+        def index_list(f):
+            a, i = lst(f), idx(f)
+            if a is None:
+                operation_on_none()
+            if 0 <= i < len(a):
+                return a[i]
+            index_out_of_bounds()
+        return index_list
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        o, name = self.visit(node.expr_object), node.member.name
+
+        def member(f):
+            obj = o(f)
+            if obj is None:
+                operation_on_none()
+            return getattr(obj, name)
+        return member
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        elements = tuple(self.visit(e) for e in node.elements)
+        if not elements:
+            return lambda f: []
+        if len(elements) == 1:
+            e0 = elements[0]
+            return lambda f: [e0(f)]
+        return lambda f: [e(f) for e in elements]
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        o, name = self.visit(node.member.expr_object), node.member.member.name
+        args = tuple(self.visit(a) for a in node.args)
+        if not args:
+            def call0(f):
+                obj = o(f)
+                if obj is None:
+                    operation_on_none()
+                return obj.cp_methods[name](None, obj)
+            return call0
+        if len(args) == 1:
+            a0 = args[0]
+
+            def call1(f):
+                obj = o(f)
+                v0 = a0(f)
+                if obj is None:
+                    operation_on_none()
+                return obj.cp_methods[name](None, obj, v0)
+            return call1
+
+        def call(f):
+            obj = o(f)
+            vs = [a(f) for a in args]
+            if obj is None:
+                operation_on_none()
+            return obj.cp_methods[name](None, obj, *vs)
+        return call
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        name = node.identifier.name
+        args = tuple(self.visit(a) for a in node.args)
+        info = self.lookup_function(name)
+        if info is not None:
+            return self.call_function(info, args)
+        if name in self.classes:
+            cls = self.classes[name]
+            init, attrs = cls.cp_methods['__init__'], cls.cp_attrs
+
+            def construct(f):
+                obj = cls.__new__(cls)
+                for a, v in attrs:
+                    setattr(obj, a, v)
+                init(None, obj)
+                return obj
+            return construct
+        return self.call_built_in(name, node.args, args)
+
+    def call_function(self, info: FunctionInfo, args: tuple):
+        entry, link = info.entry, self.static_link(info)
+        if link is None:
+            if not args:
+                return lambda f: entry(None)
+            if len(args) == 1:
+                a0 = args[0]
+                return lambda f: entry(None, a0(f))
+            if len(args) == 2:
+                a0, a1 = args
+                return lambda f: entry(None, a0(f), a1(f))
+            return lambda f: entry(None, *[a(f) for a in args])
+        return lambda f: entry(link(f), *[a(f) for a in args])
+
+    def call_built_in(self, name: str, arg_nodes: list, args: tuple):
+        write, readline = self.write, self.readline
+        if name == 'input':
+            def input_line(f):
+                line = readline()
+                return line[:-1] if line.endswith("\n") else line
+            return input_line
+        a0, t = args[0], arg_nodes[0].get_type_str()
+        if name == 'len':
+            if t == 'str':
+                return lambda f: len(a0(f))
+            return lambda f: runtime.builtin_len(a0(f))
+        assert name == 'print', f"Should not happen, unknown function {name}."
+        if t == 'str':
+            return lambda f: write(a0(f) + "\n")
+        if t == 'int':
+            return lambda f: write(str(a0(f)) + "\n")
+        return lambda f: write(runtime.to_str(a0(f)) + "\n")
+
+
+########################################################################################################################
+# Specialized integer operators. Results outside the 32-bit range are run-time errors.
+
+def int_add(lhs, rhs):
+    def add(f):
+        v = lhs(f) + rhs(f)
+        if -2147483648 <= v <= 2147483647:
+            return v
+        integer_overflow()
+    return add
+
+
+def int_sub(lhs, rhs):
+    def sub(f):
+        v = lhs(f) - rhs(f)
+        if -2147483648 <= v <= 2147483647:
+            return v
+        integer_overflow()
+    return sub
+
+
+def int_mul(lhs, rhs):
+    def mul(f):
+        v = lhs(f) * rhs(f)
+        if -2147483648 <= v <= 2147483647:
+            return v
+        integer_overflow()
+    return mul
+
+
+def int_div(lhs, rhs):
+    def div(f):
+        a, b = lhs(f), rhs(f)
+        if b == 0:
+            division_by_zero()
+        v = a // b
+        if v == 2147483648:
+            integer_overflow()
+        return v
+    return div
+
+
+def int_mod(lhs, rhs):
+    def mod(f):
+        a, b = lhs(f), rhs(f)
+        if b == 0:
+            division_by_zero()
+        return a % b
+    return mod
+
+
+int_ops = {
+    Operator.Plus: int_add,
+    Operator.Minus: int_sub,
+    Operator.Mult: int_mul,
+    Operator.IntDivide: int_div,
+    Operator.Modulus: int_mod,
+    Operator.Eq: lambda lhs, rhs: lambda f: lhs(f) == rhs(f),
+    Operator.NotEq: lambda lhs, rhs: lambda f: lhs(f) != rhs(f),
+    Operator.Lt: lambda lhs, rhs: lambda f: lhs(f) < rhs(f),
+    Operator.LtEq: lambda lhs, rhs: lambda f: lhs(f) <= rhs(f),
+    Operator.Gt: lambda lhs, rhs: lambda f: lhs(f) > rhs(f),
+    Operator.GtEq: lambda lhs, rhs: lambda f: lhs(f) >= rhs(f),
+}
+
+
+def int_add_const(lhs, c):
+    def add(f):
+        v = lhs(f) + c
+        if -2147483648 <= v <= 2147483647:
+            return v
+        integer_overflow()
+    return add
+
+
+def int_sub_const(lhs, c):
+    def sub(f):
+        v = lhs(f) - c
+        if -2147483648 <= v <= 2147483647:
+            return v
+        integer_overflow()
+    return sub
+
+
+def int_mul_const(lhs, c):
+    def mul(f):
+        v = lhs(f) * c
+        if -2147483648 <= v <= 2147483647:
+            return v
+        integer_overflow()
+    return mul
+
+
+def int_div_const(lhs, c):
+    if c == 0 or c == -1:
+        return int_div(lhs, lambda f: c)
+    return lambda f: lhs(f) // c
+
+
+def int_mod_const(lhs, c):
+    if c == 0:
+        return int_mod(lhs, lambda f: c)
+    return lambda f: lhs(f) % c
+
+
+# Operators with an integer literal as the right operand.
+int_const_ops = {
+    Operator.Plus: int_add_const,
+    Operator.Minus: int_sub_const,
+    Operator.Mult: int_mul_const,
+    Operator.IntDivide: int_div_const,
+    Operator.Modulus: int_mod_const,
+    Operator.Eq: lambda lhs, c: lambda f: lhs(f) == c,
+    Operator.NotEq: lambda lhs, c: lambda f: lhs(f) != c,
+    Operator.Lt: lambda lhs, c: lambda f: lhs(f) < c,
+    Operator.LtEq: lambda lhs, c: lambda f: lhs(f) <= c,
+    Operator.Gt: lambda lhs, c: lambda f: lhs(f) > c,
+    Operator.GtEq: lambda lhs, c: lambda f: lhs(f) >= c,
+}
@@ -0,0 +1,178 @@
+#
+# Compilation cache. Version 1.0
+#
+# A content-addressed on-disk store for the outcome of compiling a source: the driver's result record after a phase,
+# a pickled type-checked AST with its symbol table, or a backend's output. An entry is keyed by the SHA-256 of the
+# source bytes, the compiler version (a hash of the front-end modules, so that changing the compiler invalidates the
+# cache) and the kind of outcome. Entries are written atomically (to a temporary file renamed into place), so
+# concurrent processes never read partial entries. The total size is bounded: entries are evicted least recently used
+# first, a hit refreshing the modification time of its entry. The hit and miss counts are kept in the directory.
+#
+# Usage: python compile_cache.py stats|clear [--dir=DIR]
+#
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sys
+from typing import Optional
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'chocopy', 'compile')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# The modules whose code determines the outcomes stored in the cache.
+COMPILER_FILES = ['lexer.py', 'parser.py', 'astree.py', 'symbol_table.py', 'symtab_visitor.py', 'type_env.py',
+                  'type_visitor.py', 'semantic_error.py', 'query.py', 'driver.py']
+STATS_FILE = 'stats.json'
+
+
+@functools.cache
+def compiler_version() -> str:
+    digest = hashlib.sha256()
+    for name in COMPILER_FILES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Cache:
+    """
+    A compilation cache in directory, holding at most max_bytes of entries.
+    """
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.written = 0  # Bytes written since the size of the cache was last checked.
+
+    @staticmethod
+    def key(source: bytes, kind: str) -> str:
+        """
+        Returns the key of the outcome kind (e.g., 'record:typecheck') of compiling source.
+        """
+        return hashlib.sha256(f'{compiler_version()}\0{kind}\0'.encode() + source).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the entry stored under key, or None on a miss.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.written += len(data)
+        if self.written > self.max_bytes // 8:
+            self.evict()
+
+    def get_object(self, key: str):
+        data = self.get(key)
+        return pickle.loads(data) if data is not None else None
+
+    def put_object(self, key: str, value):
+        self.put(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def entries(self) -> list[os.DirEntry]:
+        """
+        Returns the entries of the cache, the least recently used first.
+        """
+        entries = []
+        if os.path.isdir(self.directory):
+            for d in os.scandir(self.directory):
+                if d.is_dir():
+                    entries += [e for e in os.scandir(d.path) if not e.name.endswith('.tmp')]
+        return sorted(entries, key=lambda e: e.stat().st_mtime)
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used entries until the cache fits in max_bytes, and returns how many were removed.
+        """
+        self.written = 0
+        entries = self.entries()
+        size = sum(e.stat().st_size for e in entries)
+        removed = 0
+        for e in entries:
+            if size <= self.max_bytes:
+                break
+            size -= e.stat().st_size
+            try:
+                os.remove(e.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def flush(self):
+        """
+        Adds the hits and misses counted since the last flush to the statistics in the cache directory.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, STATS_FILE), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            stats = json.loads(f.read() or '{}')
+            stats['hits'] = stats.get('hits', 0) + self.hits
+            stats['misses'] = stats.get('misses', 0) + self.misses
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(stats))
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, STATS_FILE)) as f:
+                stats = json.loads(f.read() or '{}')
+        except FileNotFoundError:
+            stats = {}
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': sum(e.stat().st_size for e in entries), 'max_bytes': self.max_bytes,
+                'hits': stats.get('hits', 0), 'misses': stats.get('misses', 0)}
+
+    def clear(self):
+        for e in self.entries():
+            os.remove(e.path)
+        try:
+            os.remove(os.path.join(self.directory, STATS_FILE))
+        except FileNotFoundError:
+            pass
+
+
+def main(argv):
+    directory = DEFAULT_DIR
+    for a in argv:
+        if a.startswith('--dir='):
+            directory = a.split('=', 1)[1]
+    cache = Cache(directory)
+    if 'clear' in argv:
+        cache.clear()
+    elif 'stats' in argv:
+        s = cache.stats()
+        lookups = s['hits'] + s['misses']
+        print(f"{directory}: {s['entries']} entries, {s['bytes'] / 1024:.1f} KiB of {s['max_bytes'] / 1024 ** 2:.0f} MiB")
+        print(f"{s['hits']} hits, {s['misses']} misses, hit rate {s['hits'] / lookups if lookups else 0:.1%}")
+    else:
+        print("Usage: python compile_cache.py stats|clear [--dir=DIR]", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,84 @@
+#
+# Compile server client. Version 1.0
+#
+# A thin client of the compile server (compile_server.py): it only imports the standard library, so that it starts
+# fast, sends one JSON request per line over the server's Unix socket and reads one JSON response per line.
+#
+# Usage: python compile_client.py [--socket=PATH] [--stop-after=PHASE] [--emit=ast,symtab,...] FILE...
+#        python compile_client.py [--socket=PATH] stats|shutdown
+#
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or '/tmp', f'chocopy-{os.getuid()}.sock')
+
+
+class Client:
+    """
+    A connection to the compile server, on which requests are sent one after the other.
+    """
+    def __init__(self, path: str = DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.reader = self.sock.makefile('r', encoding='utf-8')
+
+    def request(self, request: dict) -> dict:
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("The compile server closed the connection.")
+        return json.loads(line)
+
+    def compile(self, source: str = None, path: str = None, stop_after: str = 'typecheck', emit: list = ()) -> dict:
+        """
+        Compiles source text, or the file at path (read by the server), and returns the server's record.
+        """
+        request = {'stop_after': stop_after, 'emit': list(emit)}
+        if source is not None:
+            request['source'] = source
+        else:
+            request['path'] = os.path.abspath(path)
+        return self.request(request)
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv):
+    path, stop_after, emit, files = DEFAULT_SOCKET, 'typecheck', [], []
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name == '--socket':
+            path = value
+        elif name == '--stop-after':
+            stop_after = value
+        elif name == '--emit':
+            emit = value.split(',')
+        else:
+            files.append(a)
+    failed = 0
+    with Client(path) as client:
+        if files in (['stats'], ['shutdown']):
+            print(json.dumps(client.request({'command': files[0]})))
+            return 0
+        for f in files:
+            record = client.compile(path=f, stop_after=stop_after, emit=emit)
+            outputs = record.pop('output', {})
+            failed += not record.get('ok')
+            print(json.dumps(record))
+            for text in outputs.values():
+                print(text)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
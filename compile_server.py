@@ -0,0 +1,192 @@
+#
+# Compile server. Version 1.0
+#
+# A long-running compile daemon listening on a Unix socket, so that editors and grading queues do not pay the Python
+# start-up and the imports of the compiler on every file. A connection carries JSON requests and responses, one per
+# line. A request names the source text ('source') or a file ('path'), the last phase to run ('stop_after', as for
+# driver.py) and optionally the outputs wanted for a correct program ('emit': 'ast', 'ast-sexpr', 'ast-jsonl', 'symtab',
+# 'symtab-json', 'ir', 'c', 'asm', the AST outputs in the formats of ast_dump.py, symtab-json as in symtab_io.py).
+# The response is the driver's record of the file, with the outputs under 'output'. {'command': 'stats'} returns the
+# server's counters and {'command': 'shutdown'} stops it. A malformed request, or a bug of the compiler raising in the
+# worker, gets {'ok': false, 'error': message} and the connection stays open.
+#
+# Requests are compiled on a pool of warm worker processes (the compiler imported and the built-in prelude built),
+# with at most twice as many requests in flight as workers; further requests wait. Recent responses are memoized in
+# the server by the hash of the request, and the workers share the on-disk compilation cache. Each worker keeps a
+# query database (see query.py) with the files of its recent requests, so a file sent again after an edit is compiled
+# incrementally: only the declarations that changed are parsed and only the bodies depending on them are checked.
+#
+# Usage: python compile_server.py [--socket=PATH] [--workers=N] [--cache-dir=DIR] [--no-cache]
+#
+import collections
+import concurrent.futures
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import ast_dump
+import compile_cache
+import compile_client
+import driver
+import disp_symtable
+import query
+import symbol_table
+import symtab_io
+import type_env
+import ir
+import c_backend
+import riscv_backend
+
+MEMO_SIZE = 1024
+WORKER_FILES = 64
+OUTPUTS = ['ast', 'ast-sexpr', 'ast-jsonl', 'symtab', 'symtab-json', 'ir', 'c', 'asm']
+# AST output -> its format.
+AST_FORMATS = {'ast': 'tree', 'ast-sexpr': 'sexpr', 'ast-jsonl': 'jsonl'}
+
+# The compilation cache of a worker process, its query database and the files there, the most recently used last.
+worker_cache = None
+worker_db = None
+worker_files = collections.OrderedDict()
+
+
+def init_worker(cache_dir: str):
+    global worker_cache, worker_db
+    symbol_table.prelude()
+    worker_cache = compile_cache.Cache(cache_dir) if cache_dir else None
+    worker_db = query.CompilerDatabase()
+
+
+def emit(filename: str, kind: str) -> str:
+    """
+    Returns output kind of a correct program, the current text of filename in the worker's database.
+    """
+    tree, st = worker_db.typed_program(filename)
+    if kind in AST_FORMATS:
+        return ast_dump.dumps(tree, AST_FORMATS[kind]).removesuffix('\n')
+    if kind == 'symtab':
+        ds = disp_symtable.DispSymbolTable(do_print=False)
+        ds.print_symtable(st)
+        return '\n'.join(ds.lines)
+    if kind == 'symtab-json':
+        return symtab_io.dumps(st, 'json').decode('utf-8').removesuffix('\n')
+    if kind == 'ir':
+        return ir.dump(ir.IRBuilder(type_env.TypeEnvironment(st)).build(tree))
+    if kind == 'c':
+        return c_backend.CGenerator(type_env.TypeEnvironment(st)).generate(tree)
+    return riscv_backend.RiscVGenerator(type_env.TypeEnvironment(st)).generate(tree)
+
+
+def compile_request(text: str, filename: str, stop_after: str, outputs: list) -> dict:
+    """
+    Compiles a request in a worker process and returns its response.
+    """
+    worker_files[filename] = True
+    worker_files.move_to_end(filename)
+    if len(worker_files) > WORKER_FILES:
+        worker_db.forget(worker_files.popitem(last=False)[0])
+    record = driver.compile_source(text, filename, stop_after, worker_cache, worker_db)
+    if outputs and record['ok'] and stop_after == 'typecheck':
+        worker_db.set_source(filename, text)
+        record['output'] = {kind: emit(filename, kind) for kind in outputs}
+    if not record.get('cached'):
+        worker_db.sweep_file(filename)
+    return record
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, workers: int, cache_dir: str = None):
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, Handler)
+        self.pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker, initargs=(cache_dir,))
+        # Warm up the workers, so that the first requests do not pay for starting them.
+        for f in [self.pool.submit(os.getpid) for _ in range(workers)]:
+            f.result()
+        self.slots = threading.BoundedSemaphore(2 * workers)
+        self.memo = collections.OrderedDict()  # Request key -> response, the most recently used last.
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = collections.Counter()
+
+    def respond(self, request: dict) -> dict:
+        if request.get('command') == 'stats':
+            with self.lock:
+                return {**self.counters, 'memoized': len(self.memo), 'uptime': round(time.time() - self.started, 1)}
+        if request.get('command') == 'shutdown':
+            threading.Thread(target=self.shutdown).start()
+            return {'ok': True}
+
+        stop_after = request.get('stop_after', 'typecheck')
+        outputs = request.get('emit', [])
+        if stop_after not in driver.PHASES or any(kind not in OUTPUTS for kind in outputs):
+            return {'ok': False, 'error': f"Bad request: phases are {driver.PHASES}, outputs are {OUTPUTS}"}
+        filename = request.get('path', '<string>')
+        if 'source' in request:
+            text = request['source']
+        else:
+            try:
+                with open(filename, encoding='utf-8') as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                return {'file': filename, 'ok': False, 'phase': 'read', 'diagnostics': [
+                    {'kind': 'io', 'message': str(e), 'scope': None, 'line': None, 'col': None}]}
+
+        key = compile_cache.Cache.key(text.encode(), f'server:{stop_after}:{",".join(outputs)}')
+        with self.lock:
+            self.counters['requests'] += 1
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                self.counters['memo_hits'] += 1
+                return {**self.memo[key], 'file': filename, 'cached': True}
+        with self.slots:
+            try:
+                response = self.pool.submit(compile_request, text, filename, stop_after, outputs).result()
+            except Exception as e:  # A bug in the compiler fails the request, not the connection.
+                return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        with self.lock:
+            self.memo[key] = response
+            if len(self.memo) > MEMO_SIZE:
+                self.memo.popitem(last=False)
+        return response
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in io.TextIOWrapper(self.rfile, encoding='utf-8'):
+            try:
+                response = self.server.respond(json.loads(line))
+            except (ValueError, AttributeError) as e:
+                response = {'ok': False, 'error': f"Bad request: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+def main(argv):
+    options = {'--socket': compile_client.DEFAULT_SOCKET, '--workers': str(os.cpu_count() or 1),
+               '--cache-dir': compile_cache.DEFAULT_DIR}
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name in options and value:
+            options[name] = value
+    cache_dir = None if '--no-cache' in argv else options['--cache-dir']
+    with Server(options['--socket'], int(options['--workers']), cache_dir) as server:
+        print(f"Listening on {options['--socket']} with {options['--workers']} workers", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
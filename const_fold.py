@@ -0,0 +1,334 @@
+#
+# Constant folding and propagation. Version 1.0
+#
+# An optimization pass over the type-checked AST, run after TypeVisitor. It folds unary and binary operators and
+# conditional expressions over int, bool and str literals with ChocoPy semantics (an overflowing operation or a
+# division by zero is left in place, so it still fails at run time), replaces reads of variables that are never
+# assigned after their declaration by their initial value, and prunes if/elif/else branches and while loops whose
+# condition is a constant. The tree is rewritten in place.
+#
+import functools
+import astree as ast
+from astree import Operator
+import visitor
+
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+INT_OPS = {Operator.Plus: lambda a, b: a + b, Operator.Minus: lambda a, b: a - b, Operator.Mult: lambda a, b: a * b,
+           Operator.IntDivide: lambda a, b: a // b, Operator.Modulus: lambda a, b: a % b}
+COMPARISONS = {Operator.Eq: lambda a, b: a == b, Operator.NotEq: lambda a, b: a != b, Operator.Lt: lambda a, b: a < b,
+               Operator.LtEq: lambda a, b: a <= b, Operator.Gt: lambda a, b: a > b, Operator.GtEq: lambda a, b: a >= b}
+LITERAL_TYPES = {'int': ast.IntegerLiteralExprNode, 'bool': ast.BooleanLiteralExprNode,
+                 'str': ast.StringLiteralExprNode}
+
+
+def is_constant(node) -> bool:
+    return isinstance(node, (ast.IntegerLiteralExprNode, ast.BooleanLiteralExprNode, ast.StringLiteralExprNode))
+
+
+def make_literal(value, t: str, origin: ast.Node) -> ast.LiteralExprNode:
+    literal = LITERAL_TYPES[t](value)
+    literal.set_type_str(t)
+    literal.span = origin.span
+    return literal
+
+
+class Scope:
+    """
+    The variables declared by the module or a function, and how the function refers to other variables.
+    """
+    def __init__(self, parent: "Scope" = None):
+        self.parent = parent
+        self.vars = {}  # Name -> VarDefNode (None for parameters).
+        self.globals = set()
+
+    def resolve(self, name: str, module: "Scope") -> "Scope":
+        """
+        Returns the scope declaring a variable used in this one.
+        """
+        if name in self.globals:
+            return module
+        scope = self
+        while scope and name not in scope.vars:
+            scope = scope.parent
+        return scope or module
+
+
+class ConstantFolder(visitor.Visitor):
+
+    def __init__(self):
+        self.module = None
+        self.scope = None
+        self.scopes = {}  # FuncDefNode -> Scope.
+        self.assigned = set()  # (Scope, name) of the variables assigned after their declaration.
+        self.folded = 0
+        self.propagated = 0
+        self.pruned = 0
+
+    def fold(self, node: ast.ProgramNode) -> ast.ProgramNode:
+        self.visit(node)
+        return node
+
+    def do_visit(self, node):
+        if node:
+            return self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    ####################################################################################################################
+    # Finding the variables that are never reassigned.
+
+    def collect(self, declarations: list, statements: list, scope: Scope):
+        for d in declarations:
+            if isinstance(d, ast.VarDefNode):
+                scope.vars[d.var.identifier.name] = d
+            elif isinstance(d, ast.GlobalDeclNode):
+                scope.globals.add(d.variable.name)
+        for d in declarations:
+            if isinstance(d, ast.FuncDefNode):
+                inner = self.scopes[d] = Scope(scope if scope is not self.module else None)
+                inner.vars.update((p.identifier.name, None) for p in d.params)
+                self.collect(d.declarations, d.statements, inner)
+            elif isinstance(d, ast.ClassDefNode):
+                for m in d.declarations:
+                    if isinstance(m, ast.FuncDefNode):
+                        inner = self.scopes[m] = Scope()
+                        inner.vars.update((p.identifier.name, None) for p in m.params)
+                        self.collect(m.declarations, m.statements, inner)
+        self.collect_assignments(statements, scope)
+
+    def collect_assignments(self, statements: list, scope: Scope):
+        for s in statements:
+            if isinstance(s, ast.AssignStmtNode):
+                for t in s.targets:
+                    if isinstance(t, ast.IdentifierExprNode):
+                        self.assigned.add((scope.resolve(t.identifier.name, self.module), t.identifier.name))
+            elif isinstance(s, ast.ForStmtNode):
+                self.assigned.add((scope.resolve(s.identifier.name, self.module), s.identifier.name))
+                self.collect_assignments(s.body, scope)
+            elif isinstance(s, ast.WhileStmtNode):
+                self.collect_assignments(s.body, scope)
+            elif isinstance(s, ast.IfStmtNode):
+                self.collect_assignments(s.then_body, scope)
+                for _, body in s.elifs:
+                    self.collect_assignments(body, scope)
+                self.collect_assignments(s.else_body, scope)
+
+    def constant_value(self, name: str, t: str):
+        """
+        Returns the initial value of a variable that is never reassigned and whose type is that of its initial value,
+        or None.
+        """
+        scope = self.scope.resolve(name, self.module)
+        definition = scope.vars.get(name)
+        if definition is None or (scope, name) in self.assigned or not is_constant(definition.value) \
+                or definition.value.get_type_str() != t:
+            return None
+        return definition.value
+
+    ####################################################################################################################
+    # Declarations and statements. Statement visitors return the list of statements replacing the node.
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        self.module = self.scope = Scope()
+        self.collect(node.declarations, node.statements, self.module)
+        for d in node.declarations:
+            self.visit(d)
+        self.scope = self.module
+        node.statements = self.block(node.statements, allow_empty=True)
+
+    @visit.register
+    def _(self, node: ast.VarDefNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.GlobalDeclNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.NonLocalDeclNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.ClassDefNode):
+        for d in node.declarations:
+            self.visit(d)
+
+    @visit.register
+    def _(self, node: ast.FuncDefNode):
+        saved, self.scope = self.scope, self.scopes[node]
+        for d in node.declarations:
+            self.visit(d)
+        node.statements = self.block(node.statements)
+        self.scope = saved
+
+    def block(self, statements: list, allow_empty: bool = False) -> list:
+        result = []
+        for s in statements:
+            if isinstance(s, ast.ExprNode):
+                result.append(self.visit(s))
+            else:
+                result.extend(self.visit(s))
+        if not result and not allow_empty:
+            result.append(ast.PassStmtNode())
+        return result
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        return [node]
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        if node.expr:
+            node.expr = self.visit(node.expr)
+        return [node]
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        for t in node.targets:
+            if isinstance(t, ast.MemberExprNode):
+                t.expr_object = self.visit(t.expr_object)
+            elif isinstance(t, ast.IndexExprNode):
+                t.list_expr = self.visit(t.list_expr)
+                t.index = self.visit(t.index)
+        node.expr = self.visit(node.expr)
+        return [node]
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        branches = []
+        for cond, body in [(node.condition, node.then_body)] + node.elifs:
+            cond = self.visit(cond)
+            if isinstance(cond, ast.BooleanLiteralExprNode):
+                self.pruned += 1
+                if not cond.get_value():
+                    continue
+                # Always taken: it becomes the else branch and the later branches are dropped.
+                if not branches:
+                    return self.block(body, allow_empty=True)
+                return [self.if_statement(node, branches, self.block(body))]
+            branches.append((cond, self.block(body)))
+        else_body = self.block(node.else_body, allow_empty=True)
+        if not branches:
+            return else_body
+        return [self.if_statement(node, branches, else_body)]
+
+    @staticmethod
+    def if_statement(node: ast.IfStmtNode, branches: list, else_body: list) -> ast.IfStmtNode:
+        node.condition, node.then_body = branches[0]
+        node.elifs = branches[1:]
+        node.else_body = else_body
+        return node
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        node.condition = self.visit(node.condition)
+        if isinstance(node.condition, ast.BooleanLiteralExprNode) and not node.condition.get_value():
+            self.pruned += 1
+            return []
+        node.body = self.block(node.body)
+        return [node]
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        node.iterable = self.visit(node.iterable)
+        node.body = self.block(node.body)
+        return [node]
+
+    ####################################################################################################################
+    # Expressions. Each visitor returns the node replacing the expression.
+
+    @visit.register
+    def _(self, node: ast.LiteralExprNode):
+        return node
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        value = self.constant_value(node.identifier.name, node.get_type_str())
+        if value is None:
+            return node
+        self.propagated += 1
+        return make_literal(value.get_value(), value.get_type_str(), node)
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        node.operand = self.visit(node.operand)
+        operand = node.operand
+        if node.op == Operator.Not and isinstance(operand, ast.BooleanLiteralExprNode):
+            return self.folded_literal(not operand.get_value(), 'bool', node)
+        if node.op == Operator.Minus and isinstance(operand, ast.IntegerLiteralExprNode) \
+                and operand.get_value() != INT_MIN:
+            return self.folded_literal(-operand.get_value(), 'int', node)
+        return node
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        node.lhs = self.visit(node.lhs)
+        node.rhs = self.visit(node.rhs)
+        lhs, rhs, op = node.lhs, node.rhs, node.op
+        if op in (Operator.And, Operator.Or) and isinstance(lhs, ast.BooleanLiteralExprNode):
+            # The right operand is only evaluated (and is then the result) if the left one does not decide.
+            self.folded += 1
+            return rhs if lhs.get_value() == (op == Operator.And) else lhs
+        if not (is_constant(lhs) and is_constant(rhs)) or op == Operator.Is:
+            return node
+        a, b, t = lhs.get_value(), rhs.get_value(), lhs.get_type_str()
+        if op in COMPARISONS:
+            return self.folded_literal(COMPARISONS[op](a, b), 'bool', node)
+        if t == 'str':
+            return self.folded_literal(a + b, 'str', node)
+        if t == 'int':
+            if op in (Operator.IntDivide, Operator.Modulus) and b == 0:
+                return node
+            value = INT_OPS[op](a, b)
+            if INT_MIN <= value <= INT_MAX:
+                return self.folded_literal(value, 'int', node)
+        return node
+
+    def folded_literal(self, value, t: str, node: ast.ExprNode) -> ast.LiteralExprNode:
+        self.folded += 1
+        return make_literal(value, t, node)
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        node.condition = self.visit(node.condition)
+        node.then_expr = self.visit(node.then_expr)
+        node.else_expr = self.visit(node.else_expr)
+        if isinstance(node.condition, ast.BooleanLiteralExprNode):
+            chosen = node.then_expr if node.condition.get_value() else node.else_expr
+            # Only if the type does not change, as the backends pick operations from the static types.
+            if chosen.get_type_str() == node.get_type_str():
+                self.folded += 1
+                return chosen
+        return node
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        node.list_expr = self.visit(node.list_expr)
+        node.index = self.visit(node.index)
+        return node
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        node.expr_object = self.visit(node.expr_object)
+        return node
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        node.elements = [self.visit(e) for e in node.elements]
+        return node
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        node.args = [self.visit(a) for a in node.args]
+        return node
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        node.member.expr_object = self.visit(node.member.expr_object)
+        node.args = [self.visit(a) for a in node.args]
+        return node
@@ -0,0 +1,196 @@
+#
+# Batch compiler driver. Version 1.0
+#
+# Checks many ChocoPy files, given as files, directories (searched recursively for .py and .cpy files) or glob
+# patterns, in parallel on a pool of worker processes, and streams one JSON object per file to stdout as the results
+# come in (in the order of the input). Each file is read once; the phases run on the text in memory. With
+# --stop-after the pipeline stops after lexing, parsing, the symbol-table construction or the type checking (the
+# default). All semantic errors of a file are reported, not only the first one. The phases run as the queries of a
+# query database (see query.py). The records are stored in the compilation cache (see compile_cache.py), so an
+# unchanged file is not compiled again; --no-cache disables it. With --profile (or --profile=json) the files are
+# compiled one after the other in this process, without the cache, and the time, counters and memory (with
+# --profile-memory) of each phase are written to stderr (see instrument.py).
+#
+# Usage: python driver.py [--stop-after=lex|parse|symtab|typecheck] [--workers=N] [--chunksize=N]
+#                         [--cache-dir=DIR] [--no-cache] [--profile[=table|json]] [--profile-memory] PATH...
+#
+import concurrent.futures
+import contextlib
+import functools
+import glob
+import io
+import json
+import os
+import sys
+import time
+import compile_cache
+import instrument
+import parser
+import query
+import symtab_visitor
+import type_env
+import type_visitor
+
+PHASES = ['lex', 'parse', 'symtab', 'typecheck']
+EXTENSIONS = ('.py', '.cpy')
+
+
+def compile_source(text: str, filename: str = '<string>', stop_after: str = 'typecheck',
+                   cache: compile_cache.Cache = None, db: query.CompilerDatabase = None) -> dict:
+    """
+    Runs the phases up to stop_after on a source text, and returns the result record of the file: its name, whether
+    it is correct, the last phase run, the number of tokens (lex) and its diagnostics. With a cache the record is
+    looked up there first (and 'cached' tells whether it was found), and stored there after compilation otherwise.
+    With a query database the text is the new revision of the file there, so what did not change is not compiled
+    again.
+    """
+    assert stop_after in PHASES, f"Unknown phase '{stop_after}'."
+    if cache is None:
+        return run_phases(text, filename, stop_after, db)
+    key = cache.key(text.encode(), 'record:' + stop_after)
+    if (data := cache.get(key)) is not None:
+        return {'file': filename, **json.loads(data), 'cached': True}
+    result = run_phases(text, filename, stop_after, db)
+    cache.put(key, json.dumps({k: v for k, v in result.items() if k != 'file'}).encode())
+    result['cached'] = False
+    return result
+
+
+def run_phases(text: str, filename: str, stop_after: str, db: query.CompilerDatabase = None) -> dict:
+    if instrument.active:
+        return instrument.run_phases(text, filename, stop_after)
+    db = db or query.CompilerDatabase()
+    db.set_source(filename, text)
+    return dict(db.record(filename, stop_after))
+
+
+def compile_file(filename: str, stop_after: str = 'typecheck', cache: compile_cache.Cache = None) -> dict:
+    """
+    Reads a file (once) and returns the result record of compile_source. A compiler failure (an unexpected
+    exception) is the record of the file, with an internal diagnostic, so that the other files of a batch still get
+    theirs.
+    """
+    try:
+        with open(filename, encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return {'file': filename, 'ok': False, 'phase': 'read', 'diagnostics': [
+            {'kind': 'io', 'message': str(e), 'scope': None, 'line': None, 'col': None}]}
+    try:
+        return compile_source(text, filename, stop_after, cache)
+    except Exception as e:
+        return {'file': filename, 'ok': False, 'phase': 'internal', 'diagnostics': [
+            {'kind': 'internal', 'message': f"Internal compiler error: {type(e).__name__}: {e}", 'scope': None,
+             'line': None, 'col': None}]}
+
+
+def typed_ast(text: str, cache: compile_cache.Cache = None):
+    """
+    Returns the type-checked AST of a program and its symbol table, raising on syntax and semantic errors. With a
+    cache the pair is unpickled from there if present, and stored there after compilation otherwise.
+    """
+    key = cache.key(text.encode(), 'typed-ast') if cache is not None else None
+    if key and (pair := cache.get_object(key)) is not None:
+        return pair
+    tree = parser.Parser(io.StringIO(text)).parse()
+    st_visitor = symtab_visitor.SymbolTableVisitor()
+    st_visitor.do_visit(tree)
+    type_visitor.TypeVisitor(type_env.TypeEnvironment(st_visitor.get_symbol_table())).do_visit(tree)
+    if key:
+        cache.put_object(key, (tree, st_visitor.get_symbol_table()))
+    return tree, st_visitor.get_symbol_table()
+
+
+def expand(paths: list[str]) -> list[str]:
+    """
+    Returns the files named by a list of files, directories and glob patterns. A path matching nothing is kept, so
+    that it is reported as unreadable.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(root, n) for n in sorted(names) if n.endswith(EXTENSIONS)]
+        elif glob.has_magic(path):
+            files += sorted(f for f in glob.glob(path, recursive=True) if os.path.isfile(f))
+        else:
+            files.append(path)
+    return files
+
+
+def compile_files(files: list[str], stop_after: str = 'typecheck', workers: int = None, chunksize: int = 16,
+                  cache: compile_cache.Cache = None):
+    """
+    Yields the result records of compile_file for files, in order. With more than one worker (by default one per
+    CPU) the files are compiled on a process pool, submitted in chunks of chunksize files.
+    """
+    task = functools.partial(compile_file, stop_after=stop_after, cache=cache)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) <= 1:
+        yield from map(task, files)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for result in executor.map(task, files, chunksize=chunksize):
+            if cache is not None:
+                # The workers count on copies of the cache, the counts are taken from the records instead.
+                cache.hits += result.get('cached', False)
+                cache.misses += not result.get('cached', False)
+            yield result
+
+
+def main(argv):
+    options = {'--stop-after': 'typecheck', '--workers': '0', '--chunksize': '16',
+               '--cache-dir': compile_cache.DEFAULT_DIR, '--profile': None}
+    paths = []
+    use_cache = '--no-cache' not in argv
+    for a in argv:
+        name, _, value = a.partition('=')
+        if a in ('--no-cache', '--profile-memory'):
+            pass
+        elif a == '--profile':
+            options['--profile'] = 'table'
+        elif name in options and value:
+            options[name] = value
+        elif a.startswith('--'):
+            print(f"Unknown option {a}", file=sys.stderr)
+            return 2
+        else:
+            paths.append(a)
+    if options['--stop-after'] not in PHASES:
+        print(f"--stop-after must be one of {', '.join(PHASES)}", file=sys.stderr)
+        return 2
+    if options['--profile'] not in (None, 'table', 'json'):
+        print("--profile must be table or json", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    files = expand(paths)
+    profile = None
+    if options['--profile']:
+        # The phases are measured in this process, and a cached record would not run them.
+        profile = instrument.Profile(memory='--profile-memory' in argv)
+        options['--workers'], use_cache = '1', False
+    cache = compile_cache.Cache(options['--cache-dir']) if use_cache else None
+    failed = 0
+    with profile or contextlib.nullcontext():
+        for result in compile_files(files, options['--stop-after'], int(options['--workers']),
+                                    int(options['--chunksize']), cache):
+            failed += not result['ok']
+            sys.stdout.write(json.dumps(result) + '\n')
+            sys.stdout.flush()
+    elapsed = time.perf_counter() - start
+    if profile:
+        print(profile.table() if options['--profile'] == 'table' else profile.json(), file=sys.stderr)
+    summary = f"{len(files)} files, {failed} failed, {elapsed:.2f} s ({len(files) / max(elapsed, 1e-9):.0f} files/s)"
+    if cache is not None:
+        summary += f", {cache.hits} cached"
+        if cache.misses:
+            cache.evict()
+        cache.flush()
+    print(summary, file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
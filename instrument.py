@@ -0,0 +1,213 @@
+#
+# Compiler instrumentation. Version 1.0
+#
+# Measures where compile time goes: the wall and CPU time of each phase (lexing, parsing, the symbol-table
+# construction and type checking), the tokens per second of the lexer, the AST nodes by class, the symbol lookups and
+# scopes walked outward, the subtype checks and joins, and optionally the peak memory of each phase (with tracemalloc).
+#
+#     with instrument.Profile() as profile:
+#         driver.compile_source(text)
+#     print(profile.table())
+#
+# While a profile is active, driver.run_phases runs the phases one after the other instead of through the query engine
+# (the record is the same), each one measured on its own. Lexing is measured as a phase of its own, parsing lexes the
+# text again. The counters are taken by wrapping the counted methods of the lexer, the symbol tables and the type
+# environment while a profile is active, so the compiler runs unchanged, at no cost, when none is.
+#
+import collections
+import contextlib
+import functools
+import io
+import json
+import time
+import tracemalloc
+import lexer
+import parser
+import query
+import symbol_table
+import symtab_visitor
+import type_env
+import type_visitor
+
+# Counter name -> the methods counted, as (class, method name).
+COUNTED = {
+    'tokens': [(lexer.Lexer, 'next')],
+    'symbol lookups': [(symbol_table.SymbolTable, 'lookup'), (symbol_table.SymbolTable, 'get_symbols'),
+                       (symbol_table.SymbolTable, 'get_child')],
+    'scopes walked': [(symbol_table.SymbolTable, 'get_parent')],
+    'subtype checks': [(type_env.TypeEnvironment, 'is_subtype_of')],
+    'joins': [(type_env.TypeEnvironment, 'join')],
+}
+PHASES = ['lex', 'parse', 'symtab', 'typecheck']
+
+# The active profile, or None.
+active = None
+
+
+class Phase:
+    """
+    The measures of a phase, summed over its runs.
+    """
+    def __init__(self):
+        self.runs = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = 0  # The largest over the runs, in bytes above the memory in use when the phase started.
+        self.counters = collections.Counter()
+
+    def json(self) -> dict:
+        return {'runs': self.runs, 'wall': round(self.wall, 6), 'cpu': round(self.cpu, 6),
+                'peak_memory': self.peak_memory, **self.counters}
+
+
+class Profile:
+    """
+    Collects the measures of the phases run while it is active (as a context manager). With memory the peak memory of
+    each phase is traced too, which makes the phases about twice as slow. Without counters only the times (and the
+    memory) are taken, and the compiler runs at full speed.
+    """
+    def __init__(self, memory: bool = False, counters: bool = True):
+        self.memory = memory
+        self.counters = counters
+        self.phases = collections.defaultdict(Phase)
+        self.nodes = collections.Counter()  # AST node class name -> count.
+        self.files = 0
+        self.current = None  # The counters of the phase running, or None.
+        self.saved = []  # The counted methods replaced, as (class, method name, method).
+        self.tracing = False
+
+    def __enter__(self):
+        global active
+        if active is not None:
+            raise RuntimeError("Another profile is active.")
+        active = self
+        for name, methods in COUNTED.items() if self.counters else ():
+            for cls, attr in methods:
+                self.saved.append((cls, attr, cls.__dict__[attr]))
+                setattr(cls, attr, self.counted(name, cls.__dict__[attr]))
+        self.tracing = self.memory and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        global active
+        if self.tracing:
+            tracemalloc.stop()
+        for cls, attr, fn in reversed(self.saved):
+            setattr(cls, attr, fn)
+        self.saved.clear()
+        active = None
+
+    def counted(self, name: str, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self.current is not None:
+                self.current[name] += 1
+            return fn(*args, **kwargs)
+        return wrapper
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """
+        Measures the code run in the block as a run of phase name.
+        """
+        measures = self.phases[name]
+        outer, self.current = self.current, measures.counters
+        if self.memory:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield measures
+        finally:
+            measures.wall += time.perf_counter() - wall
+            measures.cpu += time.process_time() - cpu
+            measures.runs += 1
+            if self.memory:
+                measures.peak_memory = max(measures.peak_memory, tracemalloc.get_traced_memory()[1] - base)
+            self.current = outer
+
+    def count_nodes(self, tree):
+        self.nodes.update(type(n).__name__ for n in query.nodes(tree))
+
+    def report(self) -> dict:
+        """
+        The measures as a JSON object: the phases in pipeline order, the rates and the node counts, the most common
+        first.
+        """
+        phases = {name: self.phases[name].json() for name in PHASES if name in self.phases}
+        rates = {}
+        if 'lex' in self.phases and self.phases['lex'].wall:
+            rates['tokens/s'] = round(self.phases['lex'].counters['tokens'] / self.phases['lex'].wall)
+        if 'parse' in self.phases and self.phases['parse'].wall:
+            rates['nodes/s'] = round(sum(self.nodes.values()) / self.phases['parse'].wall)
+        return {'files': self.files, 'phases': phases, 'rates': rates, 'nodes': dict(self.nodes.most_common())}
+
+    def table(self) -> str:
+        """
+        The measures as a human-readable table.
+        """
+        report = self.report()
+        counters = list(COUNTED)
+        lines = [f"{'phase':<10}{'runs':>7}{'wall ms':>10}{'cpu ms':>10}{'peak KiB':>10}"
+                 + ''.join(f"{c:>16}" for c in counters)]
+        for name, p in report['phases'].items():
+            peak = f"{p['peak_memory'] / 1024:.0f}" if self.memory else '-'
+            lines.append(f"{name:<10}{p['runs']:>7}{p['wall'] * 1000:>10.1f}{p['cpu'] * 1000:>10.1f}{peak:>10}"
+                         + ''.join(f"{p.get(c, 0):>16}" for c in counters))
+        lines.append(f"{report['files']} files; " + ', '.join(f"{v} {k}" for k, v in report['rates'].items()))
+        total = sum(self.nodes.values())
+        lines.append(f"{total} AST nodes: " + ', '.join(f"{k} {v}" for k, v in list(report['nodes'].items())[:10])
+                     + (', ...' if len(self.nodes) > 10 else ''))
+        return '\n'.join(lines)
+
+    def json(self) -> str:
+        return json.dumps(self.report())
+
+
+def run_phases(text: str, filename: str, stop_after: str) -> dict:
+    """
+    Returns the driver's record of a source text (see driver.run_phases), the phases run one after the other and
+    measured in the active profile.
+    """
+    profile = active
+    profile.files += 1
+    result = {'file': filename, 'ok': True, 'phase': stop_after, 'diagnostics': []}
+    try:
+        try:
+            with profile.phase('lex'):
+                lex = lexer.Lexer(io.StringIO(text))
+                count = 1
+                while lex.next().type != lexer.Tokentype.EOI:
+                    count += 1
+        except lexer.SyntaxErrorException:
+            if stop_after == 'lex':
+                raise  # Otherwise the parser reports the first syntax error, which may come before this one.
+        if stop_after == 'lex':
+            result['tokens'] = count
+            return result
+        with profile.phase('parse'):
+            tree = parser.Parser(io.StringIO(text)).parse()
+    except lexer.SyntaxErrorException as e:
+        result.update(ok=False, phase='parse', diagnostics=[query.syntax_json(e)])
+        return result
+    profile.count_nodes(tree)
+    if stop_after == 'parse':
+        return result
+
+    with profile.phase('symtab'):
+        st_visitor = symtab_visitor.SymbolTableVisitor(collect_errors=True)
+        st_visitor.do_visit(tree)
+    diagnostics = st_visitor.get_diagnostics()
+    if stop_after == 'typecheck' and not diagnostics:
+        with profile.phase('typecheck'):
+            t_visitor = type_visitor.TypeVisitor(type_env.TypeEnvironment(st_visitor.get_symbol_table()),
+                                                 collect_errors=True)
+            t_visitor.do_visit(tree)
+        diagnostics = t_visitor.get_diagnostics()
+    elif diagnostics:
+        result['phase'] = 'symtab'  # The types are not checked against an incomplete symbol table.
+    result['ok'] = not diagnostics
+    result['diagnostics'] = [query.diagnostic_json(d) for d in diagnostics]
+    return result
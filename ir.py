@@ -0,0 +1,960 @@
+#
+# Three-address SSA intermediate representation. Version 1.0
+#
+# A Module holds one Function per ChocoPy function, method and the top-level statements ('<module>'), plus the
+# classes and globals. A Function is a list of basic blocks forming an explicit control-flow graph; every instruction
+# defines one SSA value (numbered densely per function) of a ChocoPy type, and values are merged with PHI
+# instructions at the start of join blocks.
+#
+# Instructions are stored column-wise in arrays: the opcode, the type (an index in the function's type table), an
+# immediate (an index in the module's constant or name pool, or a parameter number) and the operands, which are kept
+# in one array with per-instruction offsets. Operands are value numbers, except for the block targets of JUMP and
+# BRANCH. A PHI has one operand per predecessor of its block, in the order of Block.preds.
+#
+# Variables of functions without nested functions are SSA values. Globals, the variables of functions with nested
+# functions and variables of enclosing functions are memory, accessed with LOAD_GLOBAL/STORE_GLOBAL and
+# LOAD_VAR/STORE_VAR (whose immediate names the variable as 'function/variable').
+#
+import functools
+from array import array
+import astree as ast
+from astree import Operator
+import visitor
+import type_visitor
+
+OPCODES = [
+    'CONST', 'PARAM', 'PHI', 'UNDEF',
+    'ADD', 'SUB', 'MUL', 'DIV', 'MOD', 'NEG',
+    'LT', 'LE', 'GT', 'GE', 'EQ', 'NE', 'IS', 'NOT',
+    'CONCAT', 'INDEX', 'STORE_INDEX', 'NEW_LIST', 'LEN', 'CHECK_NONE',
+    'LOAD_GLOBAL', 'STORE_GLOBAL', 'LOAD_VAR', 'STORE_VAR', 'LOAD_ATTR', 'STORE_ATTR',
+    'NEW', 'CALL', 'CALL_METHOD', 'PRINT', 'INPUT',
+    'JUMP', 'BRANCH', 'RETURN',
+]
+for _i, _name in enumerate(OPCODES):
+    globals()[_name] = _i
+
+TERMINATORS = {JUMP, BRANCH, RETURN}
+# Instructions that must be kept even if their value is unused: they write memory, do I/O, call code or may fail.
+SIDE_EFFECTS = {ADD, SUB, MUL, DIV, MOD, NEG, CONCAT, INDEX, STORE_INDEX, LEN, CHECK_NONE, STORE_GLOBAL, STORE_VAR,
+                LOAD_ATTR, STORE_ATTR, NEW, CALL, CALL_METHOD, PRINT, INPUT} | TERMINATORS
+# Opcodes whose immediate is an index in the constant pool or in the name pool.
+CONST_IMM = {CONST}
+NAME_IMM = {LOAD_GLOBAL, STORE_GLOBAL, LOAD_VAR, STORE_VAR, LOAD_ATTR, STORE_ATTR, NEW, CALL, CALL_METHOD}
+
+BINARY_OPS = {Operator.Plus: ADD, Operator.Minus: SUB, Operator.Mult: MUL, Operator.IntDivide: DIV,
+              Operator.Modulus: MOD, Operator.Lt: LT, Operator.LtEq: LE, Operator.Gt: GT, Operator.GtEq: GE,
+              Operator.Eq: EQ, Operator.NotEq: NE, Operator.Is: IS}
+INT_OPS = {ADD, SUB, MUL, DIV, MOD, LT, LE, GT, GE}
+
+VOID = '<void>'
+
+
+class IRError(Exception):
+    def __init__(self, function: str, message: str):
+        self.message = f"{function}: {message}"
+        super().__init__(self.message)
+
+
+class Block:
+    def __init__(self, index: int, instrs: array, preds: array):
+        self.index = index
+        self.instrs = instrs  # Value numbers, PHIs first, a terminator last.
+        self.preds = preds  # Block numbers.
+
+
+class Function:
+    """
+    A function in SSA form. Values are numbered 0..len(ops)-1 in block order.
+    """
+    def __init__(self, module: "Module", name: str, params: list, return_type: str):
+        self.module = module
+        self.name = name
+        self.params = params  # (name, type)
+        self.return_type = return_type
+        self.types = []
+        self.ops = array('B')
+        self.tys = array('H')
+        self.imms = array('i')
+        self.arg_start = array('I', [0])
+        self.args = array('i')
+        self.blocks = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def type(self, v: int) -> str:
+        return self.types[self.tys[v]]
+
+    def operands(self, v: int) -> array:
+        return self.args[self.arg_start[v]:self.arg_start[v + 1]]
+
+    def successors(self, b: Block) -> list:
+        last = b.instrs[-1]
+        if self.ops[last] == JUMP:
+            return [self.args[self.arg_start[last]]]
+        if self.ops[last] == BRANCH:
+            return list(self.operands(last)[1:])
+        return []
+
+    def uses(self) -> list:
+        """
+        Returns, for every value, the list of instructions using it.
+        """
+        users = [[] for _ in range(len(self))]
+        for b in self.blocks:
+            for v in b.instrs:
+                operands = self.operands(v)
+                if self.ops[v] == JUMP:
+                    continue
+                for u in operands[:1] if self.ops[v] == BRANCH else operands:
+                    users[u].append(v)
+        return users
+
+
+class ClassInfo:
+    def __init__(self, name: str, super_class: str):
+        self.name = name
+        self.super_class = super_class
+        self.attrs = []  # (name, type, constant index), inherited first.
+        self.methods = {}  # Name -> function name, inherited methods included.
+
+
+class Module:
+    def __init__(self):
+        self.functions = {}  # Name -> Function, '<module>' for the top-level statements.
+        self.classes = {}
+        self.globals = []  # (name, type, constant index)
+        self.consts = []  # (value, type)
+        self.names = []
+        self._const_index = {}
+        self._name_index = {}
+
+    def const_index(self, value, t: str) -> int:
+        # Key on the Python type too, as True == 1 and False == 0.
+        key = (type(value), value, t)
+        if key not in self._const_index:
+            self._const_index[key] = len(self.consts)
+            self.consts.append((value, t))
+        return self._const_index[key]
+
+    def name_index(self, name: str) -> int:
+        if name not in self._name_index:
+            self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return self._name_index[name]
+
+
+########################################################################################################################
+# Building.
+
+class FunctionBuilder:
+    """
+    Builds a Function with the SSA construction algorithm of Braun et al. ("Simple and Efficient Construction of
+    Static Single Assignment Form"): variables are looked up backwards through the predecessors, PHIs are created on
+    demand and incomplete ones are completed when their block is sealed (all predecessors known). Trivial PHIs are
+    recorded as replaced and removed by finish().
+    """
+    def __init__(self, module: Module, name: str, params: list, return_type: str):
+        self.module = module
+        self.function = Function(module, name, params, return_type)
+        self.ops, self.types, self.imms, self.args = [], [], [], []
+        self.block_of = []
+        self.blocks, self.preds, self.sealed = [], [], []
+        self.defs, self.incomplete = [], []
+        self.var_types = {}
+        self.replaced = {}
+        self.phi_users = {}
+        self.block = self.new_block()
+        self.seal(self.block)
+
+    def new_block(self) -> int:
+        self.blocks.append([])
+        self.preds.append([])
+        self.sealed.append(False)
+        self.defs.append({})
+        self.incomplete.append({})
+        return len(self.blocks) - 1
+
+    def emit(self, op: int, t: str = VOID, args=(), imm: int = 0, block: int = None) -> int:
+        block = self.block if block is None else block
+        v = len(self.ops)
+        self.ops.append(op)
+        self.types.append(t)
+        self.imms.append(imm)
+        self.args.append(list(args))
+        self.block_of.append(block)
+        if op == PHI or op == UNDEF:
+            # UNDEFs only go to the entry block, which has no PHIs, so that they dominate their uses.
+            self.blocks[block].insert(0, v)
+        else:
+            self.blocks[block].append(v)
+        return v
+
+    def const(self, value, t: str) -> int:
+        return self.emit(CONST, t, imm=self.module.const_index(value, t))
+
+    def terminated(self) -> bool:
+        instrs = self.blocks[self.block]
+        return bool(instrs) and self.ops[instrs[-1]] in TERMINATORS
+
+    def jump(self, target: int):
+        if not self.terminated():
+            self.emit(JUMP, args=[target])
+            self.preds[target].append(self.block)
+
+    def branch(self, cond: int, then_block: int, else_block: int):
+        self.emit(BRANCH, args=[cond, then_block, else_block])
+        self.preds[then_block].append(self.block)
+        self.preds[else_block].append(self.block)
+
+    def start(self, block: int):
+        self.block = block
+
+    # SSA construction.
+
+    def write(self, var: str, value: int, block: int = None):
+        self.defs[self.block if block is None else block][var] = value
+
+    def read(self, var: str, block: int = None) -> int:
+        block = self.block if block is None else block
+        if var in self.defs[block]:
+            return self.resolve(self.defs[block][var])
+        if not self.sealed[block]:
+            value = self.emit(PHI, self.var_types[var], block=block)
+            self.incomplete[block][var] = value
+        elif len(self.preds[block]) == 1:
+            value = self.read(var, self.preds[block][0])
+        elif not self.preds[block]:
+            value = self.emit(UNDEF, self.var_types[var], block=0)
+        else:
+            value = self.emit(PHI, self.var_types[var], block=block)
+            self.write(var, value, block)
+            value = self.add_phi_operands(var, value)
+        self.write(var, value, block)
+        return value
+
+    def add_phi_operands(self, var: str, phi: int) -> int:
+        for p in self.preds[self.block_of[phi]]:
+            operand = self.read(var, p)
+            self.args[phi].append(operand)
+            self.phi_users.setdefault(operand, []).append(phi)
+        return self.remove_trivial_phi(phi)
+
+    def resolve(self, v: int) -> int:
+        while v in self.replaced:
+            v = self.replaced[v]
+        return v
+
+    def remove_trivial_phi(self, phi: int) -> int:
+        same = None
+        for op in self.args[phi]:
+            op = self.resolve(op)
+            if op == same or op == phi:
+                continue
+            if same is not None:
+                return phi
+            same = op
+        if same is None:
+            same = self.emit(UNDEF, self.types[phi], block=0)
+        self.replaced[phi] = same
+        # PHIs using this one may have become trivial too.
+        for user in self.phi_users.pop(phi, []):
+            if user != phi and user not in self.replaced:
+                self.remove_trivial_phi(user)
+        return same
+
+    def seal(self, block: int):
+        for var, phi in self.incomplete[block].items():
+            saved, self.block = self.block, block
+            self.add_phi_operands(var, phi)
+            self.block = saved
+        self.incomplete[block] = {}
+        self.sealed[block] = True
+
+    def successors(self, block: int) -> list:
+        if not self.blocks[block]:
+            return []  # The current block of a part of a function (see IRBuilder.flush).
+        last = self.blocks[block][-1]
+        # Visited in reverse, so that the reverse postorder lists the then block before the else block.
+        return self.args[last][:0:-1] if self.ops[last] == BRANCH else self.args[last] if self.ops[last] == JUMP else []
+
+    # Packing.
+
+    def finish(self) -> Function:
+        """
+        Drops unreachable blocks and replaced PHIs, renumbers the blocks and values and packs the instructions.
+        """
+        # Number the reachable blocks in reverse postorder (a block before its successors, except on back edges).
+        postorder, visited, stack = [], {0}, [(0, iter(self.successors(0)))]
+        while stack:
+            b, succs = stack[-1]
+            for s in succs:
+                if s not in visited:
+                    visited.add(s)
+                    stack.append((s, iter(self.successors(s))))
+                    break
+            else:
+                postorder.append(b)
+                stack.pop()
+        reachable = postorder[::-1]
+        # Remove the PHI operands of unreachable predecessors, which can make more PHIs trivial.
+        for b in reachable:
+            keep = [k for k, p in enumerate(self.preds[b]) if p in visited]
+            if len(keep) != len(self.preds[b]):
+                self.preds[b] = [self.preds[b][k] for k in keep]
+                for v in self.blocks[b]:
+                    if self.ops[v] == PHI:
+                        self.args[v] = [self.args[v][k] for k in keep]
+        for b in reachable:
+            for v in self.blocks[b]:
+                if self.ops[v] == PHI and v not in self.replaced:
+                    self.remove_trivial_phi(v)
+
+        f = self.function
+        block_number = {b: k for k, b in enumerate(reachable)}
+        number = {}
+        for b in reachable:
+            for v in self.blocks[b]:
+                if v not in self.replaced:
+                    number[v] = len(number)
+        type_index = {}
+        for b in reachable:
+            instrs = array('i')
+            for v in self.blocks[b]:
+                if v in self.replaced:
+                    continue
+                instrs.append(number[v])
+                op = self.ops[v]
+                if op in (JUMP, BRANCH):
+                    args = [number[self.resolve(a)] for a in self.args[v][:len(self.args[v]) - 2 + (op == JUMP)]]
+                    args += [block_number[t] for t in self.args[v][len(args):]]
+                else:
+                    args = [number[self.resolve(a)] for a in self.args[v]]
+                if self.types[v] not in type_index:
+                    type_index[self.types[v]] = len(f.types)
+                    f.types.append(self.types[v])
+                f.ops.append(op)
+                f.tys.append(type_index[self.types[v]])
+                f.imms.append(self.imms[v])
+                f.args.extend(args)
+                f.arg_start.append(len(f.args))
+            f.blocks.append(Block(block_number[b], instrs, array('i', (block_number[p] for p in self.preds[b]))))
+        return f
+
+
+class Scope:
+    def __init__(self, name: str, parent: "Scope" = None):
+        self.name = name
+        self.parent = parent  # The enclosing function (None for the module, top-level functions and methods).
+        self.vars = {}  # Name -> type.
+        self.globals = set()
+        self.functions = {}  # Name -> Function name.
+        self.in_memory = False  # True if nested functions may access the variables.
+
+
+class IRBuilder(visitor.Visitor):
+    """
+    Builds the IR Module of a type-checked ProgramNode.
+    """
+    def __init__(self, t_env):
+        self.t_env = t_env
+        self.module = Module()
+        self.module_scope = None
+        self.scope = None
+        self.fb = None
+        self.loops = 0
+
+    def build(self, node: ast.ProgramNode) -> Module:
+        self.visit(node)
+        return self.module
+
+    def begin(self, functions: list):
+        """
+        Starts building a program one top-level declaration or statement at a time (see add and end), given the names
+        of its top-level functions, which calls may refer to before they are built.
+        """
+        self.module_scope = self.scope = Scope('<module>')
+        self.module_scope.functions.update((name, name) for name in functions)
+
+    def add(self, node: ast.Node):
+        """
+        Builds a top-level declaration, or adds a top-level statement to '<module>', as the visit of the program does.
+        """
+        if isinstance(node, ast.VarDefNode):
+            name = node.var.identifier.name
+            t = self.t_env.get_symbol_table().lookup(name).get_type_str()
+            self.module.globals.append((name, t, self.const(node.value)))
+        elif isinstance(node, ast.FuncDefNode):
+            self.function(node, node.name.name, None)
+        elif isinstance(node, ast.ClassDefNode):
+            self.visit(node)
+        else:
+            if self.fb is None:
+                self.scope = self.module_scope
+                self.fb = FunctionBuilder(self.module, '<module>', [], '<None>')
+            self.body([node])
+
+    def end(self) -> Module:
+        """
+        Finishes '<module>' and returns the module.
+        """
+        if self.fb is None:
+            self.scope = self.module_scope
+            self.fb = FunctionBuilder(self.module, '<module>', [], '<None>')
+        self.end_function()
+        return self.module
+
+    def flush(self) -> Function:
+        """
+        Returns the part of '<module>' built by the statements added since the last flush, for a caller that writes it
+        as it goes (see dump_function), and continues '<module>' afresh in its current block, the last block of the
+        part. As every top-level statement has a single entry and a single exit, the blocks of a part are in the
+        reverse postorder of the whole function, and the values of a part are not used after it.
+        """
+        part = self.fb.finish()
+        self.fb = FunctionBuilder(self.module, '<module>', [], '<None>')
+        return part
+
+    def do_visit(self, node):
+        if node:
+            return self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    def const(self, literal: ast.LiteralExprNode) -> int:
+        return self.module.const_index(literal.get_value(), literal.get_type_str())
+
+    # Declarations.
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        module_scope = self.module_scope = self.scope = Scope('<module>')
+        st = self.t_env.get_symbol_table()
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                name = d.var.identifier.name
+                self.module.globals.append((name, st.lookup(name).get_type_str(), self.const(d.value)))
+            elif isinstance(d, ast.FuncDefNode):
+                module_scope.functions[d.name.name] = d.name.name
+        for d in node.declarations:
+            if isinstance(d, ast.FuncDefNode):
+                self.function(d, d.name.name, None)
+            elif isinstance(d, ast.ClassDefNode):
+                self.visit(d)
+        self.scope = module_scope
+        self.fb = FunctionBuilder(self.module, '<module>', [], '<None>')
+        self.body(node.statements)
+        self.end_function()
+
+    @visit.register
+    def _(self, node: ast.ClassDefNode):
+        name = node.name.name
+        info = ClassInfo(name, node.super_class.name)
+        base = self.module.classes.get(node.super_class.name)
+        if base:
+            info.attrs, info.methods = list(base.attrs), dict(base.methods)
+        else:
+            info.methods['__init__'] = 'object.__init__'
+        self.t_env.enter_scope(name)
+        class_st = self.t_env.get_scope_symbol_table()
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                a = d.var.identifier.name
+                info.attrs.append((a, class_st.lookup(a).get_type_str(), self.const(d.value)))
+            elif isinstance(d, ast.FuncDefNode):
+                info.methods[d.name.name] = f'{name}.{d.name.name}'
+        self.t_env.exit_scope()
+        self.module.classes[name] = info
+        for d in node.declarations:
+            if isinstance(d, ast.FuncDefNode):
+                self.t_env.enter_scope(name)
+                self.function(d, f'{name}.{d.name.name}', None)
+                self.t_env.exit_scope()
+
+    def function(self, node: ast.FuncDefNode, name: str, parent: Scope):
+        self.t_env.enter_scope(node.name.name)
+        st = self.t_env.get_scope_symbol_table()
+        scope = Scope(name, parent)
+        params = [(p.identifier.name, st.lookup(p.identifier.name).get_type_str()) for p in node.params]
+        scope.vars.update(params)
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                scope.vars[d.var.identifier.name] = st.lookup(d.var.identifier.name).get_type_str()
+            elif isinstance(d, ast.GlobalDeclNode):
+                scope.globals.add(d.variable.name)
+            elif isinstance(d, ast.FuncDefNode):
+                scope.functions[d.name.name] = f'{name}.{d.name.name}'
+                scope.in_memory = True
+        saved_scope, saved_fb = self.scope, self.fb
+        self.scope = scope
+        return_type = type_visitor.TypeVisitor.get_signature(st).return_type
+        self.fb = FunctionBuilder(self.module, name, params, return_type)
+        self.fb.var_types.update(scope.vars)
+        for k, (p, t) in enumerate(params):
+            self.assign_name(p, self.fb.emit(PARAM, t, imm=k))
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                value = self.fb.const(d.value.get_value(), d.value.get_type_str())
+                self.assign_name(d.var.identifier.name, value)
+        self.body(node.statements)
+        self.end_function()
+        for d in node.declarations:
+            if isinstance(d, ast.FuncDefNode):
+                self.function(d, f'{name}.{d.name.name}', scope)
+        self.scope, self.fb = saved_scope, saved_fb
+        self.t_env.exit_scope()
+
+    def end_function(self):
+        if not self.fb.terminated():
+            self.fb.emit(RETURN)
+        f = self.fb.finish()
+        self.module.functions[f.name] = f
+
+    # Variables.
+
+    def find(self, name: str):
+        """
+        Returns the scope defining a variable, or None for a global.
+        """
+        scope = self.scope
+        if scope.name == '<module>' or name in scope.globals:
+            return None
+        while scope and name not in scope.vars:
+            scope = scope.parent
+        return scope
+
+    def read_name(self, name: str, t: str) -> int:
+        scope = self.find(name)
+        if scope is None:
+            return self.fb.emit(LOAD_GLOBAL, t, imm=self.module.name_index(name))
+        if scope is self.scope and not scope.in_memory:
+            return self.fb.read(name)
+        return self.fb.emit(LOAD_VAR, scope.vars[name], imm=self.module.name_index(f'{scope.name}/{name}'))
+
+    def assign_name(self, name: str, value: int):
+        scope = self.find(name)
+        if scope is None:
+            self.fb.emit(STORE_GLOBAL, args=[value], imm=self.module.name_index(name))
+        elif scope is self.scope and not scope.in_memory:
+            self.fb.write(name, value)
+        else:
+            self.fb.emit(STORE_VAR, args=[value], imm=self.module.name_index(f'{scope.name}/{name}'))
+
+    def lookup_function(self, name: str):
+        scope = self.scope
+        while scope:
+            if name in scope.functions:
+                return scope.functions[name]
+            scope = scope.parent
+        return self.module_scope.functions.get(name)
+
+    # Statements.
+
+    def body(self, statements: list):
+        for s in statements:
+            if self.fb.terminated():
+                # Code after a return is unreachable: build it in a block without predecessors.
+                self.fb.start(self.fb.new_block())
+                self.fb.seal(self.fb.block)
+            self.visit(s)
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        if node.expr is None:
+            self.fb.emit(RETURN)
+        else:
+            self.fb.emit(RETURN, args=[self.visit(node.expr)])
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        value = self.visit(node.expr)
+        for t in node.targets:
+            if isinstance(t, ast.IdentifierExprNode):
+                self.assign_name(t.identifier.name, value)
+            elif isinstance(t, ast.MemberExprNode):
+                obj = self.visit(t.expr_object)
+                self.fb.emit(STORE_ATTR, args=[obj, value], imm=self.module.name_index(t.member.name))
+            else:
+                lst = self.visit(t.list_expr)
+                self.fb.emit(STORE_INDEX, args=[lst, self.visit(t.index), value])
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        fb = self.fb
+        join = fb.new_block()
+        branches = [(node.condition, node.then_body)] + node.elifs
+        for k, (cond, body) in enumerate(branches):
+            then_block = fb.new_block()
+            else_block = join if k == len(branches) - 1 and not node.else_body else fb.new_block()
+            fb.branch(self.visit(cond), then_block, else_block)
+            fb.seal(then_block)
+            fb.start(then_block)
+            self.body(body)
+            fb.jump(join)
+            if else_block != join:
+                fb.seal(else_block)
+                fb.start(else_block)
+        if node.else_body:
+            self.body(node.else_body)
+            fb.jump(join)
+        fb.seal(join)
+        fb.start(join)
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        fb = self.fb
+        header, body, exit_block = fb.new_block(), fb.new_block(), fb.new_block()
+        fb.jump(header)
+        fb.start(header)
+        fb.branch(self.visit(node.condition), body, exit_block)
+        fb.seal(body)
+        fb.start(body)
+        self.body(node.body)
+        fb.jump(header)
+        fb.seal(header)
+        fb.seal(exit_block)
+        fb.start(exit_block)
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        fb = self.fb
+        iterable = self.visit(node.iterable)
+        fb.emit(CHECK_NONE, args=[iterable])
+        length = fb.emit(LEN, 'int', args=[iterable])
+        self.loops += 1
+        index = f'.i{self.loops}'  # Not a ChocoPy identifier, so it cannot clash with a variable.
+        fb.var_types[index] = 'int'
+        fb.write(index, fb.const(0, 'int'))
+        header, body, exit_block = fb.new_block(), fb.new_block(), fb.new_block()
+        fb.jump(header)
+        fb.start(header)
+        i = fb.read(index)
+        fb.branch(fb.emit(LT, 'bool', args=[i, length]), body, exit_block)
+        fb.seal(body)
+        fb.start(body)
+        t = node.iterable.get_type_str()
+        element = fb.emit(INDEX, 'str' if t == 'str' else t[1:-1], args=[iterable, i])
+        self.assign_name(node.identifier.name, element)
+        self.body(node.body)
+        if not fb.terminated():
+            fb.write(index, fb.emit(ADD, 'int', args=[fb.read(index), fb.const(1, 'int')]))
+        fb.jump(header)
+        fb.seal(header)
+        fb.seal(exit_block)
+        fb.start(exit_block)
+
+    # Expressions.
+
+    @visit.register
+    def _(self, node: ast.LiteralExprNode):
+        return self.fb.const(node.get_value(), node.get_type_str())
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        return self.read_name(node.identifier.name, node.get_type_str())
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        operand = self.visit(node.operand)
+        return self.fb.emit(NOT if node.op == Operator.Not else NEG, node.get_type_str(), args=[operand])
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        fb = self.fb
+        if node.op in (Operator.And, Operator.Or):
+            lhs = self.visit(node.lhs)
+            lhs_end = fb.block
+            rhs_block, join = fb.new_block(), fb.new_block()
+            if node.op == Operator.And:
+                fb.branch(lhs, rhs_block, join)
+            else:
+                fb.branch(lhs, join, rhs_block)
+            fb.seal(rhs_block)
+            fb.start(rhs_block)
+            rhs = self.visit(node.rhs)
+            rhs_end = fb.block
+            fb.jump(join)
+            fb.seal(join)
+            fb.start(join)
+            phi = fb.emit(PHI, 'bool')
+            fb.args[phi] = [lhs if p == lhs_end else rhs for p in fb.preds[join]]
+            return phi
+        lhs = self.visit(node.lhs)
+        rhs = self.visit(node.rhs)
+        op = CONCAT if node.op == Operator.Plus and node.lhs.get_type_str() != 'int' else BINARY_OPS[node.op]
+        return fb.emit(op, node.get_type_str(), args=[lhs, rhs])
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        fb = self.fb
+        then_block, else_block, join = fb.new_block(), fb.new_block(), fb.new_block()
+        fb.branch(self.visit(node.condition), then_block, else_block)
+        fb.seal(then_block)
+        fb.seal(else_block)
+        ends = {}
+        for block, expr in ((then_block, node.then_expr), (else_block, node.else_expr)):
+            fb.start(block)
+            value = self.visit(expr)
+            ends[fb.block] = value
+            fb.jump(join)
+        fb.seal(join)
+        fb.start(join)
+        phi = fb.emit(PHI, node.get_type_str())
+        fb.args[phi] = [ends[p] for p in fb.preds[join]]
+        return phi
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        lst = self.visit(node.list_expr)
+        return self.fb.emit(INDEX, node.get_type_str(), args=[lst, self.visit(node.index)])
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        obj = self.visit(node.expr_object)
+        return self.fb.emit(LOAD_ATTR, node.get_type_str(), args=[obj], imm=self.module.name_index(node.member.name))
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        elements = [self.visit(e) for e in node.elements]
+        return self.fb.emit(NEW_LIST, node.get_type_str(), args=elements)
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        args = [self.visit(node.member.expr_object)] + [self.visit(a) for a in node.args]
+        return self.fb.emit(CALL_METHOD, node.get_type_str(), args=args,
+                            imm=self.module.name_index(node.member.member.name))
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        name = node.identifier.name
+        args = [self.visit(a) for a in node.args]
+        t = node.get_type_str()
+        if function := self.lookup_function(name):
+            return self.fb.emit(CALL, t, args=args, imm=self.module.name_index(function))
+        if name == 'print':
+            return self.fb.emit(PRINT, t, args=args)
+        if name == 'input':
+            return self.fb.emit(INPUT, t)
+        if name == 'len':
+            return self.fb.emit(LEN, t, args=args)
+        return self.fb.emit(NEW, t, imm=self.module.name_index(name))
+
+
+########################################################################################################################
+# Verification.
+
+ARITY = {CONST: 0, PARAM: 0, UNDEF: 0, NEG: 1, NOT: 1, LEN: 1, CHECK_NONE: 1, INPUT: 0, PRINT: 1, LOAD_GLOBAL: 0,
+         STORE_GLOBAL: 1, LOAD_VAR: 0, STORE_VAR: 1, LOAD_ATTR: 1, STORE_ATTR: 2, INDEX: 2, STORE_INDEX: 3, NEW: 0,
+         JUMP: 1, BRANCH: 3}
+ARITY.update((op, 2) for op in (ADD, SUB, MUL, DIV, MOD, LT, LE, GT, GE, EQ, NE, IS, CONCAT))
+
+
+def dominators(f: Function) -> list:
+    """
+    Returns the immediate dominator of every block (the entry block is its own), with the iterative algorithm of
+    Cooper, Harvey and Kennedy over the reverse postorder.
+    """
+    order, seen = [], {0}
+    stack = [(0, iter(f.successors(f.blocks[0])))]  # An explicit stack: a CFG can be thousands of blocks deep.
+    while stack:
+        b, successors = stack[-1]
+        for s in successors:
+            if s not in seen:
+                seen.add(s)
+                stack.append((s, iter(f.successors(f.blocks[s]))))
+                break
+        else:
+            stack.pop()
+            order.append(b)
+    order.reverse()
+    rank = {b: k for k, b in enumerate(order)}
+    idom = [None] * len(f.blocks)
+    idom[0] = 0
+
+    def intersect(a, b):
+        while a != b:
+            while rank[a] > rank[b]:
+                a = idom[a]
+            while rank[b] > rank[a]:
+                b = idom[b]
+        return a
+    changed = True
+    while changed:
+        changed = False
+        for b in order[1:]:
+            preds = [p for p in f.blocks[b].preds if idom[p] is not None]
+            new = preds[0]
+            for p in preds[1:]:
+                new = intersect(p, new)
+            if idom[b] != new:
+                idom[b], changed = new, True
+    return idom
+
+
+def verify_function(f: Function):
+    """
+    Checks the structure, SSA and type invariants of a function, raising IRError.
+    """
+    def fail(message):
+        raise IRError(f.name, message)
+
+    n = len(f)
+    if not f.blocks:
+        fail("no blocks")
+    block_of, position = [None] * n, [0] * n
+    preds = [[] for _ in f.blocks]
+    for k, b in enumerate(f.blocks):
+        if b.index != k:
+            fail(f"block {k} is numbered {b.index}")
+        if not b.instrs or f.ops[b.instrs[-1]] not in TERMINATORS:
+            fail(f"b{k} does not end with a terminator")
+        for j, v in enumerate(b.instrs):
+            if not 0 <= v < n or block_of[v] is not None:
+                fail(f"v{v} is out of range or in two places")
+            block_of[v], position[v] = k, j
+            op = f.ops[v]
+            if op in TERMINATORS and j != len(b.instrs) - 1:
+                fail(f"terminator v{v} in the middle of b{k}")
+            if op == PHI and j and f.ops[b.instrs[j - 1]] != PHI:
+                fail(f"PHI v{v} after a non-PHI in b{k}")
+            if op in (PARAM, UNDEF) and k:
+                fail(f"v{v} outside of the entry block")
+        for s in f.successors(b):
+            if not 0 <= s < len(f.blocks):
+                fail(f"b{k} branches to a missing block b{s}")
+            preds[s].append(k)
+    if None in block_of:
+        fail(f"v{block_of.index(None)} is not in a block")
+    if f.blocks[0].preds or preds[0]:
+        fail("the entry block has predecessors")
+    for k, b in enumerate(f.blocks):
+        if sorted(b.preds) != sorted(preds[k]):
+            fail(f"b{k} has predecessors {list(b.preds)}, expected {sorted(preds[k])}")
+
+    idom = dominators(f)
+
+    def dominates(a, b):
+        while idom[b] is not None and b != a and b != 0:
+            b = idom[b]
+        return a == b
+
+    consts, names = f.module.consts, f.module.names
+    for b in f.blocks:
+        for v in b.instrs:
+            op, operands, t = f.ops[v], f.operands(v), f.type(v)
+            if op in ARITY and len(operands) != ARITY[op]:
+                fail(f"v{v} ({OPCODES[op]}) has {len(operands)} operands")
+            if op in CONST_IMM and not 0 <= f.imms[v] < len(consts) or \
+                    op in NAME_IMM and not 0 <= f.imms[v] < len(names):
+                fail(f"v{v} has an invalid immediate")
+            values = operands[:1] if op == BRANCH else [] if op == JUMP else operands
+            if op == PHI and len(operands) != len(b.preds):
+                fail(f"PHI v{v} has {len(operands)} operands for {len(b.preds)} predecessors")
+            for k, u in enumerate(values):
+                if not 0 <= u < n:
+                    fail(f"v{v} uses an undefined value v{u}")
+                if op == PHI:
+                    ok = idom[b.preds[k]] is None or dominates(block_of[u], b.preds[k])
+                elif block_of[u] == b.index:
+                    ok = position[u] < position[v]
+                else:
+                    ok = dominates(block_of[u], b.index)
+                if not ok:
+                    fail(f"v{u} does not dominate its use in v{v}")
+            types = [f.type(u) for u in values]
+            if op in INT_OPS or op == NEG:
+                if any(a != 'int' for a in types):
+                    fail(f"v{v} ({OPCODES[op]}) has non-int operands")
+            if op in (LT, LE, GT, GE, EQ, NE, IS, NOT) and t != 'bool' or op in (ADD, SUB, MUL, DIV, MOD, NEG, LEN) \
+                    and t != 'int':
+                fail(f"v{v} ({OPCODES[op]}) has type {t}")
+            if op in (NOT, BRANCH) and types[0] != 'bool':
+                fail(f"v{v} ({OPCODES[op]}) has a non-bool condition")
+            if op == CALL:
+                callee = f.module.functions.get(names[f.imms[v]])
+                if callee is None or len(callee.params) != len(operands):
+                    fail(f"v{v} calls {names[f.imms[v]]} with {len(operands)} arguments")
+
+
+def verify(module: Module):
+    for f in module.functions.values():
+        verify_function(f)
+
+
+########################################################################################################################
+# Dumping.
+
+def format_const(value) -> str:
+    return repr(value) if isinstance(value, str) else str(value)
+
+
+def format_instruction(f: Function, v: int, value: int = 0, block: int = 0) -> str:
+    """
+    Formats an instruction, the values and blocks numbered from value and block (for a part of a function).
+    """
+    op, operands, imm = f.ops[v], f.operands(v), f.imms[v]
+    name = OPCODES[op].lower()
+    if op == CONST:
+        text = f'{name} {format_const(f.module.consts[imm][0])}'
+    elif op == PARAM:
+        text = f'{name} {imm}'
+    elif op == PHI:
+        preds = f.blocks[[b.index for b in f.blocks if v in b.instrs][0]].preds
+        text = f'{name} ' + ', '.join(f'[b{p + block}: v{u + value}]' for p, u in zip(preds, operands))
+    elif op == JUMP:
+        text = f'{name} b{operands[0] + block}'
+    elif op == BRANCH:
+        text = f'{name} v{operands[0] + value}, b{operands[1] + block}, b{operands[2] + block}'
+    elif op in (CALL, CALL_METHOD):
+        text = f'{name} {f.module.names[imm]}(' + ', '.join(f'v{u + value}' for u in operands) + ')'
+    else:
+        args = [f'v{u + value}' for u in operands] + ([f.module.names[imm]] if op in NAME_IMM else [])
+        text = f'{name} {", ".join(args)}'.rstrip()
+    t = f.type(v)
+    return text if t == VOID else f'v{v + value}: {t} = {text}'
+
+
+def dump_function(f: Function, value: int = 0, block: int = 0, continued: bool = False) -> str:
+    """
+    Returns the textual form of a function, or of a part of one (see IRBuilder.flush): its values and blocks numbered
+    from value and block, and if continued, its first block the last of the part before, without the header and the
+    label already written.
+    """
+    params = ', '.join(f'{p}: {t}' for p, t in f.params)
+    lines = [] if continued else [f'function {f.name}({params}) -> {f.return_type}']
+    for b in f.blocks:
+        if not continued or b.index:
+            preds = f'  ; preds {", ".join(f"b{p + block}" for p in b.preds)}' if len(b.preds) else ''
+            lines.append(f'  b{b.index + block}:{preds}')
+        lines.extend(f'    {format_instruction(f, v, value, block)}' for v in b.instrs)
+    return '\n'.join(lines)
+
+
+def dump_global(module: Module, name: str, t: str, c: int) -> str:
+    return f'global {name}: {t} = {format_const(module.consts[c][0])}'
+
+
+def dump_class(module: Module, c: ClassInfo) -> str:
+    lines = [f'class {c.name}({c.super_class})']
+    lines.extend(f'  attr {a}: {t} = {format_const(module.consts[k][0])}' for a, t, k in c.attrs)
+    lines.extend(f'  method {m} = {target}' for m, target in c.methods.items())
+    return '\n'.join(lines)
+
+
+def dump(module: Module) -> str:
+    """
+    Returns the textual form of a module: globals, classes, then the functions.
+    """
+    lines = [dump_global(module, *g) for g in module.globals]
+    lines.extend(dump_class(module, c) for c in module.classes.values())
+    if lines:
+        lines.append('')
+    return '\n'.join(lines + ['\n\n'.join(dump_function(f) for f in module.functions.values())]) + '\n'
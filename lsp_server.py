@@ -0,0 +1,659 @@
+#
+# Language server. Version 1.0
+#
+# A ChocoPy language server speaking the Language Server Protocol (JSON-RPC messages with Content-Length headers) over
+# stdio. It publishes the diagnostics of a document whenever it is opened or edited, and answers hover (the type of
+# the expression under the cursor), go-to-definition (resolved through the symbol tables) and completion (the members
+# of a class from its symbol table, or the names in scope).
+#
+# A document is kept as a list of chunks, one per top-level declaration or statement, split as the query engine does
+# (see query.split): a line starting at column 1 begins a chunk, except for elif and else. Each chunk is lexed and
+# parsed on its own, with positions relative to its first line, so an edit re-parses only the chunks whose text changed,
+# and moving a chunk costs nothing. The semantic analysis is done a chunk at a time too: SymbolTableVisitor visits a
+# chunk against a module table holding the symbols of the chunks before it (as in a run over the whole program), and
+# TypeVisitor visits it against the complete module table, unless the chunk has symbol-table errors. After an edit only
+# the changed chunks are analysed again, with the chunks using a definition that changed: the names they use, and the
+# class members they access (recorded with the class from the types of the last check). An edit inside a function body
+# changes no definition. A change of the class hierarchy, or of the order of declarations and statements, re-analyses
+# everything. Unlike a batch run, a syntax error only takes its own chunk out of the analysis. The server keeps this
+# dependency tracking per chunk rather than running the queries of query.py, which give the record of a batch run and
+# so stop the analysis at the first syntax error.
+#
+# Usage: python lsp_server.py
+#
+import bisect
+import io
+import json
+import re
+import sys
+import astree as ast
+import lexer
+import parser
+import query
+import symbol_table
+import symtab_visitor
+import type_env
+import type_visitor
+
+# A def or class header, and the text before the cursor completing a member or a name.
+SCOPE_HEADER = re.compile(r'(\s*)(def|class)\s+(\w+)')
+MEMBER_PREFIX = re.compile(r'([A-Za-z_][\w.]*)\.(\w*)$')
+NAME_PREFIX = re.compile(r'\w*$')
+
+# Kinds of the LSP protocol.
+SEVERITY_ERROR = 1
+COMPLETION_METHOD, COMPLETION_FUNCTION, COMPLETION_FIELD, COMPLETION_VARIABLE, COMPLETION_CLASS = 2, 3, 5, 6, 7
+METHOD_NOT_FOUND = -32601
+
+
+def apply_changes(text: str, changes: list) -> str:
+    """
+    Returns text after LSP content changes (incremental or full).
+    """
+    for change in changes:
+        if 'range' not in change:
+            text = change['text']
+            continue
+        lines = text.split('\n')
+
+        def offset(pos):
+            if pos['line'] >= len(lines):
+                return len(text)
+            return sum(map(len, lines[:pos['line']])) + pos['line'] + min(pos['character'], len(lines[pos['line']]))
+        start, end = offset(change['range']['start']), offset(change['range']['end'])
+        text = text[:start] + change['text'] + text[end:]
+    return text
+
+
+def split(text: str, chunks: list) -> list[str]:
+    """
+    Returns query.split(text), given the chunks of an earlier version of the text. The chunks found in place at the
+    start and at the end of the text are kept, but the last of those at the start and the first of those at the end,
+    which may now end or start elsewhere: only the text between the kept chunks is split again.
+    """
+    prefix, start = 0, 0
+    while prefix < len(chunks) and chunks[prefix].text.endswith('\n') and text.startswith(chunks[prefix].text, start):
+        start += len(chunks[prefix].text)
+        prefix += 1
+    if prefix:
+        prefix -= 1
+        start -= len(chunks[prefix].text)
+    suffix, end = 0, len(text)
+    while suffix < len(chunks) - prefix and text.endswith(chunks[-1 - suffix].text, start, end):
+        end -= len(chunks[-1 - suffix].text)
+        suffix += 1
+    if suffix:
+        suffix -= 1
+        end += len(chunks[-1 - suffix].text)
+    return [c.text for c in chunks[:prefix]] + query.split(text[start:end]) + \
+        [c.text for c in chunks[len(chunks) - suffix:]]
+
+
+def walk(node, parent=None):
+    """
+    Yields the (node, parent) pairs of a tree (or a list of trees), parents first.
+    """
+    stack = [(node, parent)]
+    while stack:
+        node, parent = stack.pop()
+        if isinstance(node, (list, tuple)):
+            stack += [(n, parent) for n in reversed(node) if isinstance(n, (ast.Node, list, tuple))]
+        elif isinstance(node, ast.Node):
+            yield node, parent
+            stack += [(child, node) for child in reversed(vars(node).values())
+                      if isinstance(child, (ast.Node, list, tuple))]
+
+
+def contains(node: ast.Node, pos: tuple) -> bool:
+    span = getattr(node, 'span', None)
+    return span is not None and span[0] <= pos < span[1]
+
+
+def signature(node: ast.Node):
+    """
+    Returns what the other parts of a program see of a declaration: the type and value of a variable, or the
+    signature of a function. The names of the parameters are part of it, and the declarations redefining them, as a
+    redefined parameter is dropped from the function's symbol table.
+    """
+    if isinstance(node, ast.VarDefNode):
+        return 'var', node.var.id_type.to_str(), type(node.value).__name__, getattr(node.value, 'value', None)
+    if isinstance(node, ast.FuncDefNode):
+        params = tuple((p.identifier.name, p.id_type.to_str()) for p in node.params)
+        redefined = tuple(name for d in node.declarations for name in definitions(d) if name in dict(params))
+        return 'def', params, node.return_type.to_str() if node.return_type else '<None>', redefined
+    return None
+
+
+def definitions(node: ast.Node) -> dict:
+    """
+    Returns the definitions of a top-level declaration, keyed by name, or by (class, member) for the members of a
+    class, with their signatures. A class is seen as the signature of its constructor.
+    """
+    if isinstance(node, (ast.VarDefNode, ast.FuncDefNode)):
+        return {(node.var.identifier if isinstance(node, ast.VarDefNode) else node.name).name: signature(node)}
+    if isinstance(node, ast.ClassDefNode):
+        members = {(node.name.name, (d.var.identifier if isinstance(d, ast.VarDefNode) else d.name).name): signature(d)
+                   for d in node.declarations if isinstance(d, (ast.VarDefNode, ast.FuncDefNode))}
+        return {node.name.name: ('class', members.get((node.name.name, '__init__'))), **members}
+    return {}
+
+
+def body_statements(nodes: list, scopes: tuple = ()):
+    """
+    Yields the statements of the function and method bodies among nodes (not those nested in other statements), each
+    with the names of the functions and classes enclosing it, outermost first.
+    """
+    for n in nodes:
+        if isinstance(n, (ast.ClassDefNode, ast.FuncDefNode)):
+            yield from body_statements(n.declarations, scopes + (n.name.name,))
+        if isinstance(n, ast.FuncDefNode):
+            for s in n.statements:
+                yield scopes + (n.name.name,), s
+
+
+class Chunk:
+    """
+    A top-level declaration or statement of a document, with the results of its analysis.
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.line = 0  # The (0-based) line of the chunk in the document.
+        self.nodes = []
+        self.syntax_error = None  # (message, relative line, column)
+        try:
+            tree = parser.Parser(io.StringIO(text)).parse()
+            self.nodes = tree.declarations + tree.statements
+        except lexer.SyntaxErrorException as e:
+            self.syntax_error = (e.message, e.location.line, e.location.col)
+        self.is_declaration = bool(self.nodes) and isinstance(self.nodes[0], ast.DeclarationNode)
+        self.definitions = {k: v for n in self.nodes for k, v in definitions(n).items()}
+        # The names used by the chunk, but for members (o.m), which are recorded with the type of o after checking.
+        self.names = set()
+        self.expressions = []
+        for n, parent in walk(self.nodes):
+            if isinstance(n, ast.ExprNode):
+                self.expressions.append(n)
+            elif isinstance(n, (ast.IdentifierNode, ast.ClassTypeAnnotationNode)) \
+                    and not (isinstance(parent, ast.MemberExprNode) and n is parent.member):
+                self.names.add(n.name)
+        self.member_exprs = [e for e in self.expressions if isinstance(e, ast.MemberExprNode)]
+        self.members = set()  # The (class, member) pairs used by the chunk.
+        self.checked = False  # Whether the types of its expressions are set.
+        self.classes = {n.name.name: n.super_class.name for n in self.nodes if isinstance(n, ast.ClassDefNode)}
+        self.misplaced = False  # A declaration after a statement.
+        self.symbols = {}  # The symbols the chunk adds to the module table.
+        self.tables = []  # The symbol tables of its functions and classes (children of the module table).
+        self.stale_tables = []  # The tables of the last version that parsed, used for completion while editing.
+        self.diagnostics = []
+
+    def is_valid(self) -> bool:
+        return bool(self.nodes) and not self.misplaced
+
+
+class Document:
+    """
+    The text of an open document, split into chunks, with its module symbol table.
+    """
+    def __init__(self, uri: str, text: str):
+        self.uri = uri
+        self.text = ''
+        self.chunks = []
+        self.module = None
+        self.update(text)
+
+    def apply(self, changes: list):
+        """
+        Applies LSP content changes (incremental or full) to the text, then updates the analysis.
+        """
+        self.update(apply_changes(self.text, changes))
+
+    def update(self, text: str):
+        """
+        Re-chunks the text, re-parses the chunks that changed and re-analyses what depends on them.
+        """
+        self.text = text
+        old = self.chunks
+        texts = split(text, old)
+        prefix = 0
+        while prefix < min(len(old), len(texts)) and old[prefix].text == texts[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < min(len(old), len(texts)) - prefix and old[-1 - suffix].text == texts[-1 - suffix]:
+            suffix += 1
+        removed = old[prefix:len(old) - suffix]
+        added = [Chunk(t) for t in texts[prefix:len(texts) - suffix]]
+        self.chunks = old[:prefix] + added + old[len(old) - suffix:]
+        line = 0
+        for c in self.chunks:
+            c.line = line
+            line += c.text.count('\n')
+
+        if len(removed) == len(added):
+            for r, c in zip(removed, added):
+                c.stale_tables = r.tables or r.stale_tables
+        hierarchy = lambda chunks: [item for c in chunks if c.is_valid() for item in c.classes.items()]
+        classes_before = hierarchy(old)
+        misplaced_before = {id(c) for c in old if c.misplaced}
+        before = {k: v for r in removed if r.is_valid() for k, v in r.definitions.items()}
+        seen_statement = False
+        for c in self.chunks:
+            c.misplaced = c.is_declaration and seen_statement
+            seen_statement = seen_statement or bool(c.nodes) and not c.is_declaration
+        # The names and members whose definitions changed. A chunk replaced by one with the same definitions (an
+        # edit in a function body) changes none.
+        after = {k: v for c in added if c.is_valid() for k, v in c.definitions.items()}
+        changed = {k for k in before.keys() | after.keys() if before.get(k) != after.get(k)}
+        if self.module is None or classes_before != hierarchy(self.chunks) \
+                or misplaced_before != {id(c) for c in self.chunks if c.misplaced and c not in added}:
+            self.analyse(set(map(id, self.chunks)))
+            return
+        # A member of class C is also used as a member of the subclasses of C, and is checked by their definitions.
+        # The chunks only using a changed member keep their symbols, the statements using it are checked again.
+        t_env = type_env.TypeEnvironment(self.module)
+        members = {(t, m) for cls, m in (k for k in changed if isinstance(k, tuple))
+                   for t in t_env.get_subtypes() if cls in [t] + t_env.get_supertypes_of(t)}
+        subclasses = {t for t, _ in members}
+        affected = {id(c) for c in self.chunks if c in added or c.names & changed or subclasses.intersection(c.classes)}
+        self.analyse(affected, [c for c in self.chunks if id(c) not in affected and c.members & members], members)
+
+    def analyse(self, affected: set, using: list = (), members: set = frozenset()):
+        """
+        Runs the semantic analysis of the chunks whose ids are in affected, and rebuilds the module table. The chunks
+        in using, whose types were checked, are only checked again where they use one of members.
+        """
+        module = symbol_table.SymbolTable('top')
+        module.set_parent(symbol_table.prelude())
+        st_visitor = symtab_visitor.SymbolTableVisitor(collect_errors=True)
+        for c in self.chunks:
+            if not c.is_valid():
+                c.symbols, c.tables, c.diagnostics = {}, [], []
+            elif id(c) in affected:
+                before = dict(zip(module.get_identifiers(), module.get_symbols()))
+                start = len(st_visitor.diagnostics)
+                children = len(module.get_children())
+                for node in c.nodes:
+                    st_visitor.visit_top_level(module, node)
+                c.symbols = {s.get_name(): s for s in module.get_symbols() if before.get(s.get_name()) is not s}
+                c.tables = module.get_children()[children:]
+                c.diagnostics = st_visitor.diagnostics[start:]
+            else:
+                for s in c.symbols.values():
+                    module.add_symbol(s)
+                for t in c.tables:
+                    t.detach()
+                    module.add_child(t)
+        self.module = module
+
+        t_visitor = type_visitor.TypeVisitor(type_env.TypeEnvironment(module), collect_errors=True)
+        for c in self.chunks:
+            if id(c) not in affected:
+                continue
+            if c.checked:  # The checker does not set the types of all expressions, the old ones would remain.
+                for e in c.expressions:
+                    e.set_type_str('')
+                c.checked, c.members = False, set()
+            if c.is_valid() and not c.diagnostics:
+                start = len(t_visitor.diagnostics)
+                self.check(t_visitor, c)
+                c.diagnostics = c.diagnostics + t_visitor.diagnostics[start:]
+                c.checked = True
+                c.members = {(e.expr_object.get_type_str(), e.member.name) for e in c.member_exprs}
+        for c in using:
+            if not self.recheck(t_visitor, c, members):
+                for e in c.expressions:
+                    e.set_type_str('')
+                start = len(t_visitor.diagnostics)
+                self.check(t_visitor, c)
+                c.diagnostics = t_visitor.diagnostics[start:]
+            c.members = {(e.expr_object.get_type_str(), e.member.name) for e in c.member_exprs}
+
+    @staticmethod
+    def check(t_visitor: type_visitor.TypeVisitor, c: Chunk):
+        """
+        Type-checks a chunk. The checker may trip over the symbol table of an erroneous program, the editor goes on.
+        """
+        try:
+            for node in c.nodes:
+                t_visitor.do_visit(node)
+        except Exception as e:
+            print(f"Type checking stopped in line {c.line + 1}: {e!r}", file=sys.stderr)
+        finally:
+            while t_visitor.t_env.get_scope_symbol_table() is not t_visitor.t_env.get_symbol_table():
+                t_visitor.t_env.exit_scope()
+
+    @staticmethod
+    def recheck(t_visitor: type_visitor.TypeVisitor, c: Chunk, members: set) -> bool:
+        """
+        Type-checks again the statements of the function bodies of a checked chunk that use one of members, and puts
+        their diagnostics in place of the old ones. The types in a statement do not depend on the other statements
+        (every variable is declared with its type), and the checker reports the errors of a statement after those of
+        the code before it and before those of the code after it. Returns False, for a check of the whole chunk, if a
+        member is used outside of a function body, a diagnostic has no position or the checker trips over a statement.
+        """
+        used = [e.span for e in c.member_exprs if (e.expr_object.get_type_str(), e.member.name) in members]
+        statements = [(path, s) for path, s in body_statements(c.nodes)
+                      if any(s.span[0] <= span[0] and span[1] <= s.span[1] for span in used)]
+        if any(d.span is None for d in c.diagnostics) \
+                or sum(s.span[0] <= span[0] and span[1] <= s.span[1] for _, s in statements for span in used) < len(used):
+            return False
+        for path, s in statements:
+            for e, _ in walk(s):
+                if isinstance(e, ast.ExprNode):
+                    e.set_type_str('')
+            start = len(t_visitor.diagnostics)
+            try:
+                for name in path:
+                    t_visitor.t_env.enter_scope(name)
+                t_visitor.do_visit(s)
+            except Exception:
+                return False
+            finally:
+                while t_visitor.t_env.get_scope_symbol_table() is not t_visitor.t_env.get_symbol_table():
+                    t_visitor.t_env.exit_scope()
+            if any(d.span is None for d in t_visitor.diagnostics[start:]):
+                return False
+            c.diagnostics = [d for d in c.diagnostics if d.span[0] < s.span[0]] + t_visitor.diagnostics[start:] + \
+                [d for d in c.diagnostics if d.span[0] >= s.span[1]]
+        return True
+
+    ####################################################################################################################
+    # Queries.
+
+    def diagnostics(self) -> list[dict]:
+        result = []
+        for c in self.chunks:
+            if c.syntax_error:
+                message, line, col = c.syntax_error
+                result.append(self.diagnostic(c, message, (line, col), (line, col + 1), 'syntax'))
+            elif c.misplaced:
+                result.append(self.diagnostic(c, "Syntax error: declaration after the statements.", (1, 1),
+                                              (1, len(c.text.split('\n', 1)[0]) + 1), 'syntax'))
+            for d in c.diagnostics:
+                span = d.span or ((1, 1), (1, 1))
+                result.append(self.diagnostic(c, d.message, span[0], span[1], d.kind))
+        return result
+
+    def diagnostic(self, c: Chunk, message: str, start: tuple, end: tuple, kind: str) -> dict:
+        return {'range': self.range(c, start, end), 'severity': SEVERITY_ERROR, 'source': 'chocopy', 'code': kind,
+                'message': message}
+
+    @staticmethod
+    def range(c: Chunk, start: tuple, end: tuple) -> dict:
+        return {'start': {'line': c.line + start[0] - 1, 'character': start[1] - 1},
+                'end': {'line': c.line + end[0] - 1, 'character': end[1] - 1}}
+
+    def chunk_at(self, line: int) -> tuple:
+        """
+        Returns the chunk holding a (0-based) line and the (1-based) position of the line start relative to it.
+        """
+        i = bisect.bisect_right([c.line for c in self.chunks], line) - 1
+        if i < 0:
+            return None, None
+        return self.chunks[i], line - self.chunks[i].line + 1
+
+    def node_at(self, line: int, character: int) -> tuple:
+        """
+        Returns the chunk at a position, the innermost node there with its parent, and the enclosing function and
+        class definitions, outermost first.
+        """
+        c, rel = self.chunk_at(line)
+        if c is None:
+            return None, None, None, []
+        pos = (rel, character + 1)
+        best, best_parent, scopes = None, None, []
+        for node, parent in walk(c.nodes):
+            if contains(node, pos):
+                if isinstance(node, (ast.FuncDefNode, ast.ClassDefNode)):
+                    scopes.append(node)
+                if best is None or contains(best, node.span[0]) and node.span[1] <= best.span[1]:
+                    best, best_parent = node, parent
+        return c, best, best_parent, scopes
+
+    def hover(self, line: int, character: int):
+        c, node, parent, _ = self.node_at(line, character)
+        if isinstance(node, ast.IdentifierNode) and isinstance(parent, (ast.IdentifierExprNode, ast.MemberExprNode)):
+            node = parent
+        if isinstance(node, ast.IdentifierNode) and isinstance(parent, ast.TypedVarNode):
+            text = f"{node.name}: {parent.id_type.to_str()}"
+        elif isinstance(node, ast.ExprNode) and node.get_type_str():
+            name = node.identifier.name if isinstance(node, ast.IdentifierExprNode) else \
+                node.member.name if isinstance(node, ast.MemberExprNode) else None
+            text = f"{name}: {node.get_type_str()}" if name else node.get_type_str()
+        else:
+            return None
+        return {'contents': {'kind': 'plaintext', 'value': text}, 'range': self.range(c, *node.span)}
+
+    def scope_tables(self, names: list[str], c: Chunk = None) -> list:
+        """
+        Returns the symbol tables of the module and of the nested scopes named in names, as far as they exist.
+        """
+        tables = [self.module]
+        for name in names:
+            children = tables[-1].get_children()
+            if len(tables) == 1 and c is not None and not c.tables:
+                children = c.stale_tables
+            table = next((t for t in children if t.get_name() == name), None)
+            if table is None:
+                break
+            tables.append(table)
+        return tables
+
+    def declaration(self, name: str, scope=None):
+        """
+        Returns the chunk and the identifier declaring name in a function or class definition, or at the top level.
+        """
+        if scope is not None:
+            candidates = list(getattr(scope, 'params', [])) + scope.declarations
+            for d in candidates:
+                if isinstance(d, (ast.TypedVarNode, ast.VarDefNode)):
+                    ident = d.identifier if isinstance(d, ast.TypedVarNode) else d.var.identifier
+                elif isinstance(d, (ast.FuncDefNode, ast.ClassDefNode)):
+                    ident = d.name
+                else:
+                    continue
+                if ident.name == name:
+                    return ident
+            return None
+        for c in self.chunks:
+            if c.is_valid() and name in c.definitions:
+                return c, self.declaration(name, ast.ProgramNode(c.nodes, []))
+        return None
+
+    def definition(self, line: int, character: int):
+        c, node, parent, scopes = self.node_at(line, character)
+        if isinstance(node, ast.IdentifierExprNode):
+            node, parent = node.identifier, node
+        if isinstance(parent, ast.MemberExprNode) and node is parent.member:
+            found = self.member_declaration(parent.expr_object.get_type_str(), node.name)
+        elif isinstance(node, ast.ClassTypeAnnotationNode):
+            found = self.declaration(node.name)
+        elif isinstance(node, ast.IdentifierNode):
+            found = self.name_declaration(c, node.name, scopes)
+        else:
+            found = None
+        if not found:
+            return None
+        chunk, ident = found
+        return {'uri': self.uri, 'range': self.range(chunk, *ident.span)}
+
+    def name_declaration(self, c: Chunk, name: str, scopes: list):
+        """
+        Resolves name used in the nested scopes through their symbol tables, and returns its declaration.
+        """
+        tables = self.scope_tables([s.name.name for s in scopes])
+        for i in range(len(tables) - 1, 0, -1):
+            symbol = tables[i].lookup(name)
+            if tables[i].get_type() == 'class' or symbol is None:
+                continue
+            if symbol.is_global():
+                break
+            if symbol.is_local() and not symbol.is_read_only():
+                ident = self.declaration(name, scopes[i - 1])
+                return (c, ident) if ident else None
+        return self.declaration(name)
+
+    def member_declaration(self, t: str, name: str):
+        if not t or t == '<Error>':
+            return None
+        t_env = type_env.TypeEnvironment(self.module)
+        for cls in [t] + t_env.get_supertypes_of(t):
+            if found := self.declaration(cls):
+                chunk, ident = found
+                class_node = next(n for n in chunk.nodes if isinstance(n, ast.ClassDefNode))
+                if ident := self.declaration(name, class_node):
+                    return chunk, ident
+        return None
+
+    def completion(self, line: int, character: int) -> list[dict]:
+        c, rel = self.chunk_at(line)
+        if c is None:
+            return []
+        lines = c.text.splitlines()
+        text = lines[rel - 1][:character] if rel - 1 < len(lines) else ''
+        # The enclosing functions and classes, from the indentation of the lines above.
+        names, indent = [], len(text) - len(text.lstrip()) if text.strip() else len(text) + 1
+        for previous in reversed(lines[:rel - 1]):
+            m = SCOPE_HEADER.match(previous)
+            if m and len(m.group(1)) < indent:
+                names.insert(0, m.group(3))
+                indent = len(m.group(1))
+        tables = self.scope_tables(names, c)
+        t_env = type_env.TypeEnvironment(self.module)
+
+        if m := MEMBER_PREFIX.search(text):
+            parts = m.group(1).split('.')
+            t = self.name_type(parts[0], tables)
+            for part in parts[1:]:
+                symbol = t_env.get_member_symbol(t, part) if t else None
+                t = symbol.get_type_str() if symbol else None
+            if not t or not t_env.get_class_symbol_table(t):
+                return []
+            items = {}
+            for cls in [t] + t_env.get_supertypes_of(t):
+                st = t_env.get_class_symbol_table(cls)
+                for s in st.get_symbols():
+                    if s.get_name() not in items and st.get_methods_sym_table(s.get_name()):
+                        signature = type_visitor.TypeVisitor.get_signature(st.get_methods_sym_table(s.get_name()))
+                        items[s.get_name()] = {'label': s.get_name(), 'kind': COMPLETION_METHOD,
+                                               'detail': str(signature)}
+                    elif s.get_name() not in items:
+                        items[s.get_name()] = {'label': s.get_name(), 'kind': COMPLETION_FIELD,
+                                               'detail': s.get_type_str()}
+            return list(items.values())
+
+        items = {}
+        for st in reversed(tables + [symbol_table.prelude()]):
+            if st.get_type() == 'class' and st is not tables[-1]:
+                continue
+            for s in st.get_symbols():
+                kind = {symbol_table.DeclType.Function: COMPLETION_FUNCTION,
+                        symbol_table.DeclType.Class: COMPLETION_CLASS}.get(
+                    symbol_table.symbol_decl_type(st, s.get_name()), COMPLETION_VARIABLE)
+                items[s.get_name()] = {'label': s.get_name(), 'kind': kind, 'detail': s.get_type_str()}
+        prefix = NAME_PREFIX.search(text).group(0)
+        return [i for name, i in items.items() if name.startswith(prefix)]
+
+    @staticmethod
+    def name_type(name: str, tables: list):
+        for st in reversed(tables):
+            if st.get_type() == 'class':
+                continue
+            if symbol := st.lookup(name):
+                return symbol.get_type_str()
+        return None
+
+
+class LanguageServer:
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.documents = {}
+        self.shutdown = False
+
+    def read(self):
+        """
+        Returns the next message, or None at the end of the input.
+        """
+        length = None
+        while True:
+            header = self.rfile.readline()
+            if not header:
+                return None
+            header = header.strip()
+            if not header:
+                break
+            name, _, value = header.decode('ascii').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        return json.loads(self.rfile.read(length))
+
+    def send(self, message: dict):
+        body = json.dumps({'jsonrpc': '2.0', **message}).encode()
+        self.wfile.write(f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+        self.wfile.flush()
+
+    def publish(self, doc: Document, version=None):
+        self.send({'method': 'textDocument/publishDiagnostics',
+                   'params': {'uri': doc.uri, 'version': version, 'diagnostics': doc.diagnostics()}})
+
+    def run(self) -> int:
+        while (message := self.read()) is not None:
+            method = message.get('method')
+            params = message.get('params', {})
+            handler = getattr(self, 'on_' + method.replace('/', '_').replace('$', '_'), None) if method else None
+            if 'id' not in message:  # A notification.
+                if handler:
+                    handler(params)
+                if method == 'exit':
+                    return 0 if self.shutdown else 1
+                continue
+            if handler is None:
+                self.send({'id': message['id'], 'error': {'code': METHOD_NOT_FOUND, 'message': f"No method {method}"}})
+            else:
+                self.send({'id': message['id'], 'result': handler(params)})
+        return 0
+
+    def position(self, params: dict):
+        doc = self.documents.get(params['textDocument']['uri'])
+        return doc, params['position']['line'], params['position']['character']
+
+    def on_initialize(self, params):
+        return {'capabilities': {'textDocumentSync': {'openClose': True, 'change': 2}, 'hoverProvider': True,
+                                 'definitionProvider': True, 'completionProvider': {'triggerCharacters': ['.']}},
+                'serverInfo': {'name': 'chocopy-lsp', 'version': '1.0'}}
+
+    def on_shutdown(self, params):
+        self.shutdown = True
+        return None
+
+    def on_textDocument_didOpen(self, params):
+        item = params['textDocument']
+        doc = self.documents[item['uri']] = Document(item['uri'], item['text'])
+        self.publish(doc, item.get('version'))
+
+    def on_textDocument_didChange(self, params):
+        doc = self.documents[params['textDocument']['uri']]
+        doc.apply(params['contentChanges'])
+        self.publish(doc, params['textDocument'].get('version'))
+
+    def on_textDocument_didClose(self, params):
+        uri = params['textDocument']['uri']
+        if self.documents.pop(uri, None):
+            self.send({'method': 'textDocument/publishDiagnostics', 'params': {'uri': uri, 'diagnostics': []}})
+
+    def on_textDocument_hover(self, params):
+        doc, line, character = self.position(params)
+        return doc.hover(line, character) if doc else None
+
+    def on_textDocument_definition(self, params):
+        doc, line, character = self.position(params)
+        return doc.definition(line, character) if doc else None
+
+    def on_textDocument_completion(self, params):
+        doc, line, character = self.position(params)
+        return doc.completion(line, character) if doc else []
+
+
+if __name__ == '__main__':
+    sys.exit(LanguageServer(sys.stdin.buffer, sys.stdout.buffer).run())
@@ -1,15 +1,54 @@
 #
-# Test semantic analyser. Version 1.1
+# Test semantic analyser. Version 1.2
+import io
+import sys
 import parser
 import disp_symtable
 import semantic_error
 import symtab_visitor
 import type_env
 import type_visitor
-import print_visitor
+import ast_dump
+import closure_engine
+import bytecode
+import vm
+import py_backend
+import riscv_backend
+import riscv_sim
+import c_backend
+import ir
+import const_fold
+import call_graph
+import runtime
 
 
-filename = 'tests/test03.cpy'
+files = [a for a in sys.argv[1:] if not a.startswith('--')]
+filename = files[0] if files else 'tests/test03.cpy'
+# With --all-errors all semantic errors are reported in one run instead of stopping at the first one.
+collect_errors = '--all-errors' in sys.argv
+# With --run the type-checked program is executed.
+do_run = '--run' in sys.argv
+# With --vm the program is compiled to bytecode and run on the VM instead, --dis prints the bytecode.
+use_vm = '--vm' in sys.argv
+do_dis = '--dis' in sys.argv
+# With --py it is compiled to a CPython code object instead.
+use_py = '--py' in sys.argv
+# With --riscv it is compiled to RV32IM assembly (printed with --asm) and run on the simulator.
+use_riscv = '--riscv' in sys.argv
+do_asm = '--asm' in sys.argv
+# With --dce functions and classes unreachable from the top-level statements are removed before the symbol table.
+do_dce = '--dce' in sys.argv
+# With --fold constant folding and propagation run after type checking.
+do_fold = '--fold' in sys.argv
+# With --ir the SSA intermediate representation is built, verified and printed.
+do_ir = '--ir' in sys.argv
+# With --c it is compiled to C (printed with --csrc) and built with the system C compiler, binaries are cached.
+use_c = '--c' in sys.argv
+do_csrc = '--csrc' in sys.argv
+# With --check=NAME only the declarations and the body of function NAME (e.g., 'C.m') are type-checked (repeatable).
+check_names = [a.split('=', 1)[1] for a in sys.argv if a.startswith('--check=')]
+# With --ast=sexpr or --ast=jsonl the AST is printed in that format instead of the indented tree (see ast_dump.py).
+ast_format = next((a.split('=', 1)[1] for a in sys.argv if a.startswith('--ast=')), 'tree')
 
 # Read in and print out the code.
 with open(filename) as f:
@@ -17,13 +56,15 @@ with open(filename) as f:
 print(code)
 
 # Parse the code.
-with open(filename) as f:
-    p = parser.Parser(f)
-    ast = p.parse()
+p = parser.Parser(io.StringIO(code))
+ast = p.parse()
+
+if do_dce:
+    print(call_graph.eliminate_dead_code(ast))
 
 # Do the symbol-table construction.
 try:
-    st_visitor = symtab_visitor.SymbolTableVisitor()
+    st_visitor = symtab_visitor.SymbolTableVisitor(collect_errors)
     st_visitor.do_visit(ast)
 except semantic_error.CompilerException as e:
     print(e.message)
@@ -34,12 +75,80 @@ ds.print_symtable(st)
 
 # Do the type checking.
 te = type_env.TypeEnvironment(st)
+if check_names:
+    try:
+        t_visitor = type_visitor.TypeVisitor(te, collect_errors, lazy=True)
+        t_visitor.do_visit(ast)
+        for d in st_visitor.get_diagnostics() + t_visitor.get_diagnostics():
+            print(d)
+        for name in check_names:
+            for d in t_visitor.check_function(name):
+                print(d)
+            print(f"{name}: checked")
+    except semantic_error.CompilerException as e:
+        print(e.message)
+        exit(-1)
+    except KeyError as e:
+        print(f"No function {e} in {filename}, functions are: {', '.join(t_visitor.get_functions())}")
+        exit(-1)
+    exit(-1 if t_visitor.get_diagnostics() or st_visitor.get_diagnostics() else 0)
 try:
-    t_visitor = type_visitor.TypeVisitor(te)
+    t_visitor = type_visitor.TypeVisitor(te, collect_errors)
     t_visitor.do_visit(ast)
 except semantic_error.CompilerException as e:
     print(e.message)
     exit(-1)
 
-p_visitor = print_visitor.PrintVisitor()
-p_visitor.do_visit(ast)
\ No newline at end of file
+if collect_errors:
+    diagnostics = st_visitor.get_diagnostics() + t_visitor.get_diagnostics()
+    for d in diagnostics:
+        print(d)
+    if diagnostics:
+        exit(-1)
+
+if do_fold:
+    folder = const_fold.ConstantFolder()
+    folder.fold(ast)
+    print(f"Constant folding: {folder.folded} folded, {folder.propagated} propagated, {folder.pruned} pruned")
+
+ast_dump.dump(ast, sys.stdout, ast_format)
+
+if use_vm or do_dis:
+    program = bytecode.BytecodeCompiler().compile(ast)
+    if do_dis:
+        print(bytecode.disassemble_program(program))
+
+if use_riscv or do_asm:
+    asm = riscv_backend.RiscVGenerator(type_env.TypeEnvironment(st)).generate(ast)
+    if do_asm:
+        print(asm)
+
+if do_ir:
+    module = ir.IRBuilder(type_env.TypeEnvironment(st)).build(ast)
+    ir.verify(module)
+    print(ir.dump(module))
+
+if do_csrc:
+    print(c_backend.CGenerator(type_env.TypeEnvironment(st)).generate(ast))
+
+# Run the program.
+if do_run and use_c:
+    sys.stdout.flush()
+    exit(c_backend.run(c_backend.build(code, fold=do_fold), capture=False).returncode)
+elif do_run and use_riscv:
+    sim = riscv_sim.Simulator(riscv_sim.assemble(asm))
+    exit_code = sim.run()
+    print(f"{sim.instret} instructions, {sim.cycles} cycles", file=sys.stderr)
+    exit(exit_code)
+elif do_run:
+    if use_py:
+        runner = py_backend.PyCompiler(filename).compile(ast)
+    elif use_vm:
+        runner = vm.VM(program)
+    else:
+        runner = closure_engine.ClosureCompiler().compile(ast)
+    try:
+        runner.run()
+    except runtime.RuntimeException as e:
+        print(e.message)
+        exit(e.exit_code)
\ No newline at end of file
@@ -0,0 +1,271 @@
+#
+# Separate compilation. Version 1.0
+#
+# Compiles a library once into an interface file (NAME.cpi) and an object file (NAME.cpo), so that the programs using
+# it are checked against the interface without parsing or checking the library again:
+#
+#     interface   the library's top-level declarations as a symbol table (see symtab_io.py, binary form): its global
+#                 variables, the signatures of its functions, and its classes with their superclass, attributes and
+#                 method signatures, without the locals and nested functions of the bodies
+#     object      the library's type-checked AST and its full symbol table, pickled, which only the linker reads
+#
+# A unit importing interfaces is checked with the imported declarations in its module table, as if they were declared
+# before its own (ChocoPy has no namespaces, so a unit may not redeclare an imported name). Its object file records the
+# digest of each interface it was checked against, a hash of the interface's declarations, so that a change to the
+# bodies of a library alone does not require recompiling the units importing it. Linking joins the objects, in
+# dependency order, into one program and one symbol table: the declarations of each unit in turn, then the top-level
+# statements of each unit in turn (a library's statements run first, as its initialization). Every backend then
+# compiles the linked program as it does a single file. The linker refuses a unit compiled against another version
+# of an interface than the one linked, and two units declaring the same top-level name.
+#
+# Usage: python modules.py compile [--import=LIB.cpi,...] [--out=NAME] FILE
+#        python modules.py link [--backend=closure|vm|py|riscv|c] NAME.cpo...
+#
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+import astree as ast
+import bytecode
+import c_backend
+import closure_engine
+import compile_cache
+import lexer
+import parser
+import py_backend
+import riscv_backend
+import riscv_sim
+import runtime
+import semantic_error
+import symbol_table
+import symtab_io
+import symtab_visitor
+import type_env
+import type_visitor
+import vm
+from symbol_table import Symbol
+
+INTERFACE_MAGIC = b'CPI1'
+BACKENDS = ['closure', 'vm', 'py', 'riscv', 'c']
+
+
+class LinkError(Exception):
+    pass
+
+
+class Interface:
+    """
+    The interface of a unit: its name, its digest, the interfaces it requires as (name, digest) pairs, and the table
+    of its top-level declarations.
+    """
+    def __init__(self, name: str, digest: str, requires: list, table: symbol_table.SymbolTable):
+        self.name = name
+        self.digest = digest
+        self.requires = requires
+        self.table = table
+
+    def write(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(INTERFACE_MAGIC)
+            f.write(json.dumps({'name': self.name, 'digest': self.digest, 'requires': self.requires}).encode() + b'\n')
+            symtab_io.dump(self.table, f, 'binary')
+
+    @staticmethod
+    def read(path: str) -> 'Interface':
+        with open(path, 'rb') as f:
+            if f.read(len(INTERFACE_MAGIC)) != INTERFACE_MAGIC:
+                raise ValueError(f"{path} is not an interface file.")
+            header = json.loads(f.readline())
+            return Interface(header['name'], header['digest'], [tuple(r) for r in header['requires']],
+                             symtab_io.load(f))
+
+
+class Unit:
+    """
+    A compiled unit, the content of an object file: its name and digest, the interfaces it was checked against as
+    (name, digest) pairs, the names they declare, and its type-checked AST and symbol table.
+    """
+    def __init__(self, name: str, digest: str, imports: list, imported: set, tree: ast.ProgramNode,
+                 st: symbol_table.SymbolTable):
+        self.name = name
+        self.digest = digest
+        self.imports = imports
+        self.imported = imported
+        self.tree = tree
+        self.st = st
+
+    def write(self, path: str):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def read(path: str) -> 'Unit':
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def signature(st: symbol_table.SymbolTable) -> symbol_table.SymbolTable:
+    """
+    Returns a copy of a function table with only its parameters, or of a class table with its attributes and the
+    signatures of its methods.
+    """
+    if st.get_type() == 'function':
+        copy = symbol_table.Function(st.get_name())
+        symbols = [s for s in st.get_symbols() if s.is_parameter()]
+    else:
+        copy = symbol_table.Class(st.get_name(), st.get_super_class())
+        symbols = [s for s in st.get_symbols() if s.is_local()]
+        for method in st.get_children():
+            copy.add_child(signature(method))
+    for s in symbols:
+        copy.add_symbol(Symbol(s.get_name(), s.get_flags(), s.get_type_str()))
+    return copy
+
+
+def interface(unit: Unit) -> Interface:
+    """
+    Returns the interface of a unit, the declarations of its module table that are its own.
+    """
+    table = symbol_table.SymbolTable(unit.name)
+    for s in unit.st.get_symbols():
+        if s.is_local() and s.get_name() not in unit.imported:
+            table.add_symbol(Symbol(s.get_name(), s.get_flags(), s.get_type_str()))
+    for child in unit.st.get_children():
+        if child.get_name() not in unit.imported:
+            table.add_child(signature(child))
+    return Interface(unit.name, unit.digest, unit.imports, table)
+
+
+def compile_unit(text: str, name: str, interfaces: list[Interface]) -> Unit:
+    """
+    Parses and type-checks the source text of unit name against the interfaces it imports, which are consumed (their
+    tables are moved into the unit's module table), and returns the unit. Raises on syntax and semantic errors, and
+    if an interface requires one that is not imported before it.
+    """
+    root = symbol_table.SymbolTable('top')
+    root.set_parent(symbol_table.prelude())
+    imports, imported = [], set()
+    for i in interfaces:
+        for required, digest in i.requires:
+            if (required, digest) not in imports:
+                raise LinkError(f"Interface {i.name} requires interface {required}, import it first.")
+        for s in i.table.get_symbols():
+            if s.get_name() in imported:
+                raise semantic_error.RedefinedIdentifierException(s.get_name(), 'top')
+            imported.add(s.get_name())
+            root.add_symbol(s)
+        for child in list(i.table.get_children()):
+            child.detach()
+            root.add_child(child)
+        imports.append((i.name, i.digest))
+
+    tree = parser.Parser(io.StringIO(text)).parse()
+    st_visitor = symtab_visitor.SymbolTableVisitor()
+    for n in tree.declarations + tree.statements:
+        st_visitor.visit_top_level(root, n)
+    type_visitor.TypeVisitor(type_env.TypeEnvironment(root)).do_visit(tree)
+    unit = Unit(name, None, imports, imported, tree, root)
+    # The digest of the interface, not of the text: a change to the bodies only does not invalidate the dependents.
+    table = symtab_io.dumps(interface(unit).table, 'binary')
+    unit.digest = hashlib.sha256(f'{compile_cache.compiler_version()}\0{imports}\0'.encode() + table).hexdigest()
+    return unit
+
+
+def link(units: list[Unit]) -> tuple[ast.ProgramNode, symbol_table.SymbolTable]:
+    """
+    Links units, in dependency order, into one program and its symbol table, for any backend. The units are consumed
+    (their tables are moved into the linked one).
+    """
+    top = symbol_table.SymbolTable('top')
+    top.set_parent(symbol_table.prelude())
+    linked = {}
+    declarations, statements = [], []
+    for unit in units:
+        if unit.name in linked:
+            raise LinkError(f"Unit {unit.name} is linked twice.")
+        for name, digest in unit.imports:
+            if name not in linked:
+                raise LinkError(f"Unit {unit.name} imports {name}, link it first.")
+            if linked[name] != digest:
+                raise LinkError(f"Unit {unit.name} was compiled against another version of {name}, recompile it.")
+        linked[unit.name] = unit.digest
+        for s in unit.st.get_symbols():
+            if s.get_name() in unit.imported:
+                continue
+            other = top.lookup(s.get_name())
+            if s.is_local() and other and other.is_local():
+                raise LinkError(f"Unit {unit.name} redeclares {s.get_name()}, declared by a unit linked before it.")
+            if s.is_local() or other is None:
+                top.add_symbol(s)
+        for child in list(unit.st.get_children()):
+            if child.get_name() not in unit.imported:
+                child.detach()
+                top.add_child(child)
+        declarations += unit.tree.declarations
+        statements += unit.tree.statements
+    return ast.ProgramNode(declarations, statements), top
+
+
+def run(tree: ast.ProgramNode, st: symbol_table.SymbolTable, backend: str) -> int:
+    """
+    Compiles a linked program with a backend, runs it and returns its exit code.
+    """
+    if backend == 'c':
+        sys.stdout.flush()
+        path = c_backend.build_c(c_backend.CGenerator(type_env.TypeEnvironment(st)).generate(tree))
+        return c_backend.run(path, capture=False).returncode
+    if backend == 'riscv':
+        asm = riscv_backend.RiscVGenerator(type_env.TypeEnvironment(st)).generate(tree)
+        return riscv_sim.Simulator(riscv_sim.assemble(asm)).run()
+    if backend == 'py':
+        runner = py_backend.PyCompiler().compile(tree)
+    elif backend == 'vm':
+        runner = vm.VM(bytecode.BytecodeCompiler().compile(tree))
+    else:
+        runner = closure_engine.ClosureCompiler().compile(tree)
+    try:
+        runner.run()
+    except runtime.RuntimeException as e:
+        print(e.message)
+        return e.exit_code
+    return 0
+
+
+def main(argv):
+    options = {'--import': '', '--out': None, '--backend': 'closure'}
+    files = []
+    for a in argv[1:]:
+        name, _, value = a.partition('=')
+        if name in options and value:
+            options[name] = value
+        elif a.startswith('--'):
+            print(f"Unknown option {a}", file=sys.stderr)
+            return 2
+        else:
+            files.append(a)
+    command = argv[0] if argv else None
+    try:
+        if command == 'compile' and len(files) == 1:
+            out = options['--out'] or os.path.splitext(files[0])[0]
+            with open(files[0], encoding='utf-8') as f:
+                text = f.read()
+            interfaces = [Interface.read(path) for path in options['--import'].split(',') if path]
+            unit = compile_unit(text, os.path.basename(out), interfaces)
+            interface(unit).write(out + '.cpi')
+            unit.write(out + '.cpo')
+            return 0
+        if command == 'link' and files and options['--backend'] in BACKENDS:
+            tree, st = link([Unit.read(path) for path in files])
+            return run(tree, st, options['--backend'])
+    except (lexer.SyntaxErrorException, semantic_error.CompilerException, LinkError) as e:
+        print(f"{' '.join(files)}: {getattr(e, 'message', e)}", file=sys.stderr)
+        return 1
+    print("Usage: python modules.py compile [--import=LIB.cpi,...] [--out=NAME] FILE\n"
+          "       python modules.py link [--backend=closure|vm|py|riscv|c] NAME.cpo...", file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
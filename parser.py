@@ -1,4 +1,4 @@
-from lexer import Lexer, Tokentype, SyntaxErrorException
+from lexer import Lexer, Tokentype, Location, SyntaxErrorException
 import astree as ast
 
 
@@ -8,6 +8,8 @@ class Parser:
         self.lexer = Lexer(f)
         self.token = self.lexer.next()
         self.peek_token = None
+        # End location of the most recently matched token, used for the source spans of the AST nodes.
+        self.prev_end = self.token.location
 
     # for peek function, alter the match
 
@@ -20,6 +22,10 @@ class Parser:
 
     def match(self, type):
         if self.token.type == type:
+            loc, lexeme = self.token.location, self.token.lexeme
+            # String literal lexemes do not include the enclosing quotes.
+            width = len(lexeme) + 2 if type == Tokentype.StringLiteral else len(lexeme)
+            self.prev_end = Location(loc.line, loc.col + width)
             if self.peek_token is None:
                 self.token = self.lexer.next()
             else:
@@ -39,6 +45,19 @@ class Parser:
             return True
         return False
 
+    # Helper function, records the source span of a node starting at start and ending at the last matched token.
+
+    def spanned(self, node, start):
+        node.span = (start, self.prev_end)
+        return node
+
+    # Helper function, matches an identifier and returns its IdentifierNode.
+
+    def identifier(self):
+        start, lexeme = self.token.location, self.token.lexeme
+        self.match(Tokentype.Identifier)
+        return self.spanned(ast.IdentifierNode(lexeme), start)
+
     # Finish implementing the parser.
     # The file should return an AST if parsing is successful,
     # otherwise a syntax-error exception is thrown.
@@ -74,17 +93,14 @@ class Parser:
     # class_def ::= class ID ( ID ) : NEWLINE INDENT class_body DEDENT
 
     def class_def(self):
+        start = self.token.location
         self.match(Tokentype.KwClass)
 
-        id_lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        id_node = ast.IdentifierNode(id_lexeme)
+        id_node = self.identifier()
 
         self.match(Tokentype.ParenthesisL)
 
-        super_id_lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        super_id_node = ast.IdentifierNode(super_id_lexeme)
+        super_id_node = self.identifier()
 
         self.match(Tokentype.ParenthesisR)
         self.match(Tokentype.Colon)
@@ -95,7 +111,7 @@ class Parser:
 
         self.match(Tokentype.Dedent)
 
-        return ast.ClassDefNode(id_node, super_id_node, decl_nodes)
+        return self.spanned(ast.ClassDefNode(id_node, super_id_node, decl_nodes), start)
 
     # class_body ::= pass NEWLINE | [[var_def | func_def]]+
 
@@ -124,11 +140,10 @@ class Parser:
     # func_def ::= def ID ( [[typed var [[, typed var]]* ]]? ) [[-> type]]? : NEWLINE INDENT func_body DEDENT
 
     def func_def(self):
+        start = self.token.location
         self.match(Tokentype.KwDef)
 
-        id_lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        id_node = ast.IdentifierNode(id_lexeme)
+        id_node = self.identifier()
         self.match(Tokentype.ParenthesisL)
 
         # [[typed_var [[, typed_var]]* ]]?
@@ -152,7 +167,7 @@ class Parser:
 
         self.match(Tokentype.Dedent)
 
-        return ast.FuncDefNode(id_node, typed_var_nodes, type_node, decl_nodes, stmt_nodes)
+        return self.spanned(ast.FuncDefNode(id_node, typed_var_nodes, type_node, decl_nodes, stmt_nodes), start)
 
     # func_body requires a stmt at the end, bit weird?
     # func_body ::= [[global_decl | nonlocal_decl | var def | func def]]* stmt+
@@ -183,64 +198,66 @@ class Parser:
     # typed_var ::= ID : type
 
     def typed_var(self):
-        id_lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        id_node = ast.IdentifierNode(id_lexeme)
+        start = self.token.location
+        id_node = self.identifier()
 
         self.match(Tokentype.Colon)
         type_node = self._type()
-        return ast.TypedVarNode(id_node, type_node)
+        return self.spanned(ast.TypedVarNode(id_node, type_node), start)
 
     # type ::= ID | STRING | [ type ]
 
     def _type(self):
+        start = self.token.location
         if self.match_if(Tokentype.BracketL):
             elem_type = self._type()
             self.match(Tokentype.BracketR)
-            return ast.ListTypeAnnotationNode(elem_type)
+            return self.spanned(ast.ListTypeAnnotationNode(elem_type), start)
         else:
             lexeme = self.token.lexeme
             if self.match_if(Tokentype.StringLiteral):
-                return ast.ClassTypeAnnotationNode(lexeme)
+                return self.spanned(ast.ClassTypeAnnotationNode(lexeme), start)
             else:
                 self.match(Tokentype.Identifier)
-                return ast.ClassTypeAnnotationNode(str(lexeme))
+                return self.spanned(ast.ClassTypeAnnotationNode(str(lexeme)), start)
 
     # global_decl ::= global ID NEWLINE
 
     def global_decl(self):
+        start = self.token.location
         self.match(Tokentype.KwGlobal)
 
-        lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        id_node = ast.IdentifierNode(lexeme)
+        id_node = self.identifier()
+        node = self.spanned(ast.GlobalDeclNode(id_node), start)
 
         self.match(Tokentype.Newline)
 
-        return ast.GlobalDeclNode(id_node)
+        return node
 
     # nonlocal_decl ::= nonlocal ID NEWLINE
 
     def nonlocal_decl(self):
+        start = self.token.location
         self.match(Tokentype.KwNonLocal)
 
-        lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        id_node = ast.IdentifierNode(lexeme)
+        id_node = self.identifier()
+        node = self.spanned(ast.NonLocalDeclNode(id_node), start)
 
         self.match(Tokentype.Newline)
 
-        return ast.NonLocalDeclNode(id_node)
+        return node
 
     # var_def ::= typed_var = literal NEWLINE
 
     def var_def(self):
+        start = self.token.location
         typed_var_node = self.typed_var()
         self.match(Tokentype.OpAssign)
         literal_expr_node = self.literal()
+        node = self.spanned(ast.VarDefNode(typed_var_node, literal_expr_node), start)
         self.match(Tokentype.Newline)
 
-        return ast.VarDefNode(typed_var_node, literal_expr_node)
+        return node
 
     # stmt ::= simple_stmt NEWLINE
     # | if expr : block [[elif expr : block]]* [[else : block]]?
@@ -248,6 +265,7 @@ class Parser:
     # | for ID in expr : block
 
     def stmt(self):
+        start = self.token.location
         if self.match_if(Tokentype.KwIf):
             elifs = []
             else_body = []
@@ -266,26 +284,24 @@ class Parser:
                 self.match(Tokentype.Colon)
                 else_body = self.block()
 
-            return ast.IfStmtNode(cond_node, then_body, elifs, else_body)
+            return self.spanned(ast.IfStmtNode(cond_node, then_body, elifs, else_body), start)
 
         elif self.match_if(Tokentype.KwWhile):
             cond_node = self.expr()
             self.match(Tokentype.Colon)
             body = self.block()
 
-            return ast.WhileStmtNode(cond_node, body)
+            return self.spanned(ast.WhileStmtNode(cond_node, body), start)
 
         elif self.match_if(Tokentype.KwFor):
-            id_lexeme = self.token.lexeme
-            self.match(Tokentype.Identifier)
-            id_node = ast.IdentifierNode(id_lexeme)
+            id_node = self.identifier()
 
             self.match(Tokentype.OpIn)
             iterable = self.expr()
             self.match(Tokentype.Colon)
             body = self.block()
 
-            return ast.ForStmtNode(id_node, iterable, body)
+            return self.spanned(ast.ForStmtNode(id_node, iterable, body), start)
 
         else:
             simple_stmt_node = self.simple_stmt()
@@ -293,14 +309,15 @@ class Parser:
             return simple_stmt_node
 
     def simple_stmt(self):
+        start = self.token.location
         if self.match_if(Tokentype.KwPass):
-            return ast.PassStmtNode()
+            return self.spanned(ast.PassStmtNode(), start)
 
         elif self.match_if(Tokentype.KwReturn):
             expr_node = None
             if self.token.type not in [Tokentype.Newline, Tokentype.Dedent]:
                 expr_node = self.expr()
-            return ast.ReturnStmtNode(expr_node)
+            return self.spanned(ast.ReturnStmtNode(expr_node), start)
         # now its either target or expr, so we match on expr
         else:
             expr_or_target_node = self.expr()
@@ -330,7 +347,7 @@ class Parser:
                     prev = self.expr()
                 expr_node = prev
 
-                return ast.AssignStmtNode(targets, expr_node)
+                return self.spanned(ast.AssignStmtNode(targets, expr_node), start)
             else:
                 # otherwise it was just an expr and we are done
                 return expr_or_target_node
@@ -345,16 +362,16 @@ class Parser:
         return stmts
 
     def literal(self):
-        lexeme = self.token.lexeme
+        start, lexeme = self.token.location, self.token.lexeme
         if self.match_if(Tokentype.KwNone):
-            return ast.NoneLiteralExprNode()
+            return self.spanned(ast.NoneLiteralExprNode(), start)
         elif self.match_if(Tokentype.BoolTrueLiteral) or self.match_if(Tokentype.BoolFalseLiteral):
-            return ast.BooleanLiteralExprNode(lexeme)
+            return self.spanned(ast.BooleanLiteralExprNode(lexeme), start)
         elif self.match_if(Tokentype.IntegerLiteral):
-            return ast.IntegerLiteralExprNode(lexeme)
+            return self.spanned(ast.IntegerLiteralExprNode(lexeme), start)
         else:
             self.match(Tokentype.StringLiteral)
-            return ast.StringLiteralExprNode(lexeme)
+            return self.spanned(ast.StringLiteralExprNode(lexeme), start)
 
     # precedence:
     # expr ::=  or_expr if expr else expr | or_expr
@@ -371,7 +388,7 @@ class Parser:
             cond_node = self.expr()
             self.match(Tokentype.KwElse)
             else_node = self.expr()
-            return ast.IfExprNode(cond_node, then_node, else_node)
+            return self.spanned(ast.IfExprNode(cond_node, then_node, else_node), then_node.span[0])
         else:
             return then_node
 
@@ -380,7 +397,7 @@ class Parser:
         node = self.and_expr()
         while self.match_if(Tokentype.OpOr):
             rhs = self.and_expr()
-            node = ast.BinaryOpExprNode(ast.Operator.Or, node, rhs)
+            node = self.spanned(ast.BinaryOpExprNode(ast.Operator.Or, node, rhs), node.span[0])
         return node
 
     # and_expr ::= not_expr {and not_expr}
@@ -388,16 +405,17 @@ class Parser:
         node = self.not_expr()
         while self.match_if(Tokentype.OpAnd):
             rhs = self.not_expr()
-            node = ast.BinaryOpExprNode(ast.Operator.And, node, rhs)
+            node = self.spanned(ast.BinaryOpExprNode(ast.Operator.And, node, rhs), node.span[0])
         return node
 
     # not_expr ::= not expr | cexpr
     def not_expr(self):
+        start = self.token.location
         if self.match_if(Tokentype.OpNot):
             # NOTE: in lab code we wrote "not expr", we think it is incorrect,
             # and changed it with "expr"
             expr_node = self.expr()
-            return ast.UnaryOpExprNode(ast.Operator.Not, expr_node)
+            return self.spanned(ast.UnaryOpExprNode(ast.Operator.Not, expr_node), start)
         else:
             return self.cexpr()
 
@@ -418,7 +436,7 @@ class Parser:
             op = opmap[self.token.type]
             self.match(self.token.type)
             rhs_node = self.aexpr()
-            return ast.BinaryOpExprNode(op, lhs_node, rhs_node)
+            return self.spanned(ast.BinaryOpExprNode(op, lhs_node, rhs_node), lhs_node.span[0])
         else:
             return lhs_node
 
@@ -434,7 +452,7 @@ class Parser:
             op = opmap[self.token.type]
             self.match(self.token.type)
             rhs_node = self.mexpr()
-            node = ast.BinaryOpExprNode(op, node, rhs_node)
+            node = self.spanned(ast.BinaryOpExprNode(op, node, rhs_node), node.span[0])
 
         return node
 
@@ -451,40 +469,41 @@ class Parser:
             op = opmap[self.token.type]
             self.match(self.token.type)
             rhs_node = self.nexpr()
-            node = ast.BinaryOpExprNode(op, node, rhs_node)
+            node = self.spanned(ast.BinaryOpExprNode(op, node, rhs_node), node.span[0])
 
         return node
 
     # nexpr -> - nexpr | mem_or_ind_expr
     def nexpr(self):
+        start = self.token.location
         if self.match_if(Tokentype.OpMinus):
             expr_node = self.nexpr()
-            return ast.UnaryOpExprNode(ast.Operator.Minus, expr_node)
+            return self.spanned(ast.UnaryOpExprNode(ast.Operator.Minus, expr_node), start)
         else:
             return self.mem_or_ind_expr()
 
     # mem_or_ind_expr   -> fexpr { . id_or_func | '[' expr ']' }
     def mem_or_ind_expr(self):
         node = self.fexpr()
+        start = node.span[0]
         while self.token.type in [Tokentype.Period, Tokentype.BracketL]:
             if self.match_if(Tokentype.Period):
                 id_node, args = self.member_id_or_func()
                 if args is None:
-                    node = ast.MemberExprNode(node, id_node)
+                    node = self.spanned(ast.MemberExprNode(node, id_node), start)
                 else:
                     mem_expr_node = ast.MemberExprNode(node, id_node)
-                    node = ast.MethodCallExprNode(mem_expr_node, args)
+                    mem_expr_node.span = (start, id_node.span[1])
+                    node = self.spanned(ast.MethodCallExprNode(mem_expr_node, args), start)
             else:
                 self.match(Tokentype.BracketL)
                 index_node = self.expr()
                 self.match(Tokentype.BracketR)
-                node = ast.IndexExprNode(node, index_node)
+                node = self.spanned(ast.IndexExprNode(node, index_node), start)
         return node
 
     def member_id_or_func(self):
-        lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        id_or_func_node = ast.IdentifierNode(lexeme)
+        id_or_func_node = self.identifier()
         args = None
         if self.match_if(Tokentype.ParenthesisL):
             args = []
@@ -499,9 +518,8 @@ class Parser:
 
     # id_or_func -> ID [ '(' [expr {, expr } ] ')' ]
     def id_or_func(self, as_identifier=False):
-        lexeme = self.token.lexeme
-        self.match(Tokentype.Identifier)
-        id_or_func_node = ast.IdentifierNode(lexeme)
+        id_or_func_node = self.identifier()
+        start = id_or_func_node.span[0]
         if self.match_if(Tokentype.ParenthesisL):
             args = []
             if not self.match_if(Tokentype.ParenthesisR):
@@ -509,17 +527,18 @@ class Parser:
                 while self.match_if(Tokentype.Comma):
                     args.append(self.expr())
                 self.match(Tokentype.ParenthesisR)
-            return ast.FunctionCallExprNode(id_or_func_node, args)
+            return self.spanned(ast.FunctionCallExprNode(id_or_func_node, args), start)
         else:
             if as_identifier:
                 return id_or_func_node
-            return ast.IdentifierExprNode(id_or_func_node)
+            return self.spanned(ast.IdentifierExprNode(id_or_func_node), start)
 
     # fexpr -> [ [[expr {, expr}]]? ]
     #          | ( expr )
     #          | literal
     #          | id_or_func
     def fexpr(self):
+        start = self.token.location
         if self.match_if(Tokentype.BracketL):
             list_elems = []
             if not self.match_if(Tokentype.BracketR):
@@ -527,7 +546,7 @@ class Parser:
                 while self.match_if(Tokentype.Comma):
                     list_elems.append(self.expr())
                 self.match(Tokentype.BracketR)
-            return ast.ListExprNode(list_elems)
+            return self.spanned(ast.ListExprNode(list_elems), start)
         elif self.match_if(Tokentype.ParenthesisL):
             node = self.expr()
             self.match(Tokentype.ParenthesisR)
@@ -541,8 +560,8 @@ class Parser:
     #          | mem_expr
     #          | index_expr
     def target(self):
-        lexeme = self.token.lexeme
+        start, lexeme = self.token.location, self.token.lexeme
         if not self.match_if(Tokentype.Identifier):
             return self.mem_or_ind_expr()
         else:
-            return ast.IdentifierNode(lexeme)
+            return self.spanned(ast.IdentifierNode(lexeme), start)
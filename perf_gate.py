@@ -0,0 +1,172 @@
+#
+# Performance regression gate. Version 1.0
+#
+# Compiles a fixed workload (a synthetic program of each preset shape, see bench_suite.py) a few times after warm-up
+# runs, and compares the median of each metric with a baseline checked into the repository (perf_baseline.json):
+#
+#     lex_tokens_per_s    tokens lexed per second                           (higher is better)
+#     parse_nodes_per_s   AST nodes parsed per second                       (higher is better)
+#     semantic_s          seconds of the symbol-table construction and type checking (lower is better)
+#     memory_per_node     peak memory of the hungriest phase per AST node, in bytes  (lower is better)
+#
+# A metric regresses when its median is worse than the baseline's by more than its threshold (a percentage, stored in
+# the baseline and overridden with --threshold=METRIC=PCT) and by more than the interquartile range of either run, so
+# that noise alone does not fail the gate. The peak memory is traced in a separate compilation in each run, so that
+# it has its own spread and does not slow down the timed ones. The exit status is 1 if a metric regressed and 2 on a
+# bad option or revision. --update writes the current results as the new baseline. With --if-changed=REF the gate
+# only runs if the front end (the lexer, the parser, the visitors and their data structures) changed since git
+# revision REF, so it can run before every merge.
+#
+# Usage: python perf_gate.py [--baseline=FILE] [--repeat=N] [--warmup=N] [--threshold=METRIC=PCT...] [--update]
+#                            [--if-changed=REF]
+#
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import bench_suite
+import instrument
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json')
+WORKLOAD = [(preset, 40) for preset in ['default', 'classes', 'nested', 'expressions', 'strings']]
+# Metric -> (True if higher is better, default threshold in percent).
+METRICS = {
+    'lex_tokens_per_s': (True, 10.0),
+    'parse_nodes_per_s': (True, 10.0),
+    'semantic_s': (False, 10.0),
+    'memory_per_node': (False, 5.0),
+}
+WATCHED = ['lexer.py', 'parser.py', 'astree.py', 'visitor.py', 'symtab_visitor.py', 'type_visitor.py',
+           'symbol_table.py', 'type_env.py', 'semantic_error.py']
+
+
+def run(repeat: int, warmup: int) -> dict:
+    """
+    Compiles the workload and returns the values of each metric in each run.
+    """
+    texts = [bench_suite.program(preset, size, 0) for preset, size in WORKLOAD]
+    measures = [bench_suite.measure(text, repeat, warmup) for text in texts]
+    tokens = sum(m['tokens'] for m in measures)
+    nodes = sum(m['nodes'] for m in measures)
+    runs = {name: [] for name in METRICS}
+    for i in range(repeat):
+        total = lambda *phases: sum(m['times'][p][i] for m in measures for p in phases)
+        runs['lex_tokens_per_s'].append(tokens / total('lex'))
+        runs['parse_nodes_per_s'].append(nodes / total('parse'))
+        runs['semantic_s'].append(total('symtab', 'typecheck'))
+        runs['memory_per_node'].append(sum(peak_memory(text) for text in texts) / nodes)
+    return runs
+
+
+def peak_memory(text: str) -> int:
+    """
+    Compiles a program once more, tracing the allocations, and returns the peak memory of its hungriest phase.
+    """
+    with instrument.Profile(memory=True, counters=False) as profile:
+        instrument.run_phases(text, 'bench.py', 'typecheck')
+    return max(phase.peak_memory for phase in profile.phases.values())
+
+
+def summary(values: list) -> dict:
+    q1, median, q3 = statistics.quantiles(values, n=4, method='inclusive') if len(values) > 1 else values * 3
+    return {'median': median, 'iqr': q3 - q1, 'runs': values}
+
+
+def regressions(current: dict, baseline: dict, thresholds: dict) -> list:
+    """
+    Returns a line per metric comparing the current results with the baseline, and whether it regressed.
+    """
+    lines = []
+    for name, (higher_is_better, _) in METRICS.items():
+        now, then = current[name], baseline['metrics'].get(name)
+        if then is None:
+            lines.append((f"{name:<20}{now['median']:>14.4g}  (not in the baseline)", False))
+            continue
+        change = (now['median'] - then['median']) / then['median'] * 100
+        worse = -change if higher_is_better else change
+        regressed = worse > thresholds[name] and abs(now['median'] - then['median']) > max(now['iqr'], then['iqr'])
+        lines.append((f"{name:<20}{then['median']:>14.4g} ±{then['iqr']:<10.3g}{now['median']:>14.4g} "
+                      f"±{now['iqr']:<10.3g}{change:>+8.1f}%{thresholds[name]:>8.1f}%  "
+                      f"{'REGRESSED' if regressed else 'ok'}", regressed))
+    return lines
+
+
+def changed_since(ref: str) -> list:
+    """
+    Returns the watched files changed since git revision ref, in the commits or the working tree.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run(['git', 'diff', '--name-only', ref, '--', *WATCHED], cwd=here, capture_output=True,
+                         text=True, check=True).stdout
+    return out.split()
+
+
+def main(argv):
+    options = {'--baseline': BASELINE, '--repeat': '5', '--warmup': '1', '--if-changed': None}
+    overrides = {}
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name == '--threshold':
+            metric, _, pct = value.partition('=')
+            if metric not in METRICS:
+                print(f"Unknown metric {metric}, they are {', '.join(METRICS)}", file=sys.stderr)
+                return 2
+            overrides[metric] = float(pct)
+        elif name in options and value:
+            options[name] = value
+        elif a != '--update':
+            print(f"Unknown option {a}", file=sys.stderr)
+            return 2
+
+    if options['--if-changed']:
+        try:
+            changed = changed_since(options['--if-changed'])
+        except subprocess.CalledProcessError as e:
+            print(f"Cannot compare with {options['--if-changed']}: {e.stderr.strip()}", file=sys.stderr)
+            return 2
+        if not changed:
+            print(f"The front end did not change since {options['--if-changed']}, skipping the gate.")
+            return 0
+        print(f"Changed since {options['--if-changed']}: {', '.join(changed)}")
+
+    baseline = None
+    if os.path.exists(options['--baseline']):
+        with open(options['--baseline']) as f:
+            baseline = json.load(f)
+    thresholds = {name: default for name, (_, default) in METRICS.items()}
+    thresholds.update((baseline or {}).get('thresholds', {}))
+    thresholds.update(overrides)
+
+    repeat, warmup = int(options['--repeat']), int(options['--warmup'])
+    print(f"Compiling the workload {warmup} + {repeat} times...")
+    current = {name: summary(values) for name, values in run(repeat, warmup).items()}
+    machine = {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+    if '--update' in argv or baseline is None:
+        with open(options['--baseline'], 'w') as f:
+            json.dump({**machine, 'workload': WORKLOAD, 'thresholds': thresholds, 'metrics': current}, f, indent=1)
+            f.write('\n')
+        print(f"Wrote the baseline {options['--baseline']}.")
+        return 0
+
+    if {k: baseline.get(k) for k in machine} != machine:
+        setup = ', '.join(f'{k} {baseline.get(k)}' for k in machine)
+        print(f"Warning: the baseline was measured on another setup ({setup}).")
+    if [tuple(w) for w in baseline.get('workload', [])] != WORKLOAD:
+        print("Warning: the baseline was measured on another workload, update it.")
+    print(f"{'metric':<20}{'baseline':>14} {'IQR':<10}{'current':>14} {'IQR':<10}{'change':>9}{'limit':>9}")
+    lines = regressions(current, baseline, thresholds)
+    for line, _ in lines:
+        print(line)
+    failed = [line.split()[0] for line, regressed in lines if regressed]
+    if failed:
+        print(f"Performance regression in {', '.join(failed)}.")
+        return 1
+    print("No performance regression.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
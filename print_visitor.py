@@ -1,5 +1,5 @@
 #
-# PrintVisitor version 1.03
+# PrintVisitor version 1.04
 #
 import functools
 import astree as ast
@@ -21,11 +21,7 @@ class PrintVisitor(visitor.Visitor):
             self.visit(node)
 
     def print(self, text):
-        line = []
-        for _ in range(self.indent):
-            line.append(' ')
-        line.append(text)
-        output = "".join(line)
+        output = ' ' * self.indent + text
         if self.do_print:
             print(output)
         else:
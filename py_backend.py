@@ -0,0 +1,434 @@
+#
+# CPython code-object backend. Version 1.0
+#
+# Translates a type-checked ProgramNode into a Python ast.Module and compiles it with compile(), so that ChocoPy
+# programs run as native CPython bytecode. ChocoPy names are prefixed with 'cp_' (run-time helpers use 'rt_' and
+# temporaries 't_'), classes become Python classes with __slots__, and nested functions, global and nonlocal map
+# to their Python counterparts.
+#
+# Checks are only emitted where CPython would not fail by itself: 32-bit overflow of +, -, *, // and unary -, and
+# negative indices. Dereferencing None (AttributeError/TypeError), out-of-range indices (IndexError) and division
+# by zero (ZeroDivisionError) fail natively and are mapped to the ChocoPy run-time errors by Program.run().
+#
+# Compiled code objects can be cached in .pyc-style files keyed by the SHA-256 of the source, see compile_source().
+#
+import ast as pyast
+import functools
+import hashlib
+import importlib.util
+import io
+import marshal
+import os
+import sys
+import astree as ast
+from astree import Operator
+import visitor
+import runtime
+import parser
+import symtab_visitor
+import type_env
+import type_visitor
+
+VERSION = 2
+INT_MIN = runtime.INT_MIN
+INT_MAX = runtime.INT_MAX
+
+OPS = {Operator.Plus: pyast.Add, Operator.Minus: pyast.Sub, Operator.Mult: pyast.Mult,
+       Operator.IntDivide: pyast.FloorDiv, Operator.Modulus: pyast.Mod}
+CMP_OPS = {Operator.Eq: pyast.Eq, Operator.NotEq: pyast.NotEq, Operator.Lt: pyast.Lt, Operator.LtEq: pyast.LtE,
+           Operator.Gt: pyast.Gt, Operator.GtEq: pyast.GtE, Operator.Is: pyast.Is}
+
+
+class RootObject:
+    """
+    The Python class of ChocoPy 'object'. Constructors set all attributes and then call cp___init__.
+    """
+    __slots__ = ()
+
+    def cp___init__(self):
+        pass
+
+
+def bad_index(seq):
+    """
+    Called for a negative index: the error is about None if the indexed value is None (as ChocoPy checks it first).
+    """
+    if seq is None:
+        runtime.operation_on_none()
+    runtime.index_out_of_bounds()
+
+
+def method(obj, name: str):
+    """
+    Returns the bound method of a method call, whose arguments are evaluated after it: for None, a function failing
+    when called, so that the receiver is dereferenced after the arguments. (The call is a plain Python call, which
+    does not grow the C stack as a call with *args does.)
+    """
+    return getattr(obj, name) if obj is not None else none_method
+
+
+def none_method(*args):
+    runtime.operation_on_none()
+
+
+class Program:
+    """
+    A compiled ChocoPy program: a Python code object to be run in a fresh namespace with the run-time helpers.
+    """
+    def __init__(self, code):
+        self.code = code
+
+    def run(self, out=None, inp=None):
+        """
+        Runs the program. Raises runtime.RuntimeException on ChocoPy run-time errors, out of memory when the calls nest
+        too deeply.
+        """
+        write = (out or sys.stdout).write
+        readline = (inp or sys.stdin).readline
+
+        def rt_print(v):
+            write(runtime.to_str(v) + "\n")
+
+        def rt_input():
+            line = readline()
+            return line[:-1] if line.endswith("\n") else line
+        namespace = {'rt_Object': RootObject, 'rt_write': write, 'rt_print': rt_print, 'rt_input': rt_input,
+                     'rt_len': runtime.builtin_len, 'rt_overflow': runtime.integer_overflow,
+                     'rt_bad_index': bad_index, 'rt_method': method}
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 100000))
+        try:
+            exec(self.code, namespace)
+        except ZeroDivisionError:
+            runtime.division_by_zero()
+        except IndexError:
+            runtime.index_out_of_bounds()
+        except (AttributeError, TypeError):
+            # Well-typed code only fails this way when an operand is None.
+            runtime.operation_on_none()
+        except RecursionError:
+            runtime.out_of_memory()
+        finally:
+            sys.setrecursionlimit(limit)
+
+
+def name(n: str) -> str:
+    return 'cp_' + n
+
+
+def load(n: str) -> pyast.Name:
+    return pyast.Name(n, pyast.Load())
+
+
+def store(n: str) -> pyast.Name:
+    return pyast.Name(n, pyast.Store())
+
+
+def call(f: str, *args) -> pyast.Call:
+    return pyast.Call(load(f), list(args), [])
+
+
+def constant(v) -> pyast.Constant:
+    return pyast.Constant(v)
+
+
+def is_pure(node: ast.ExprNode) -> bool:
+    """
+    True if evaluating node can neither fail nor have side effects.
+    """
+    return isinstance(node, (ast.LiteralExprNode, ast.IdentifierExprNode))
+
+
+class PyCompiler(visitor.Visitor):
+
+    def __init__(self, filename: str = '<chocopy>'):
+        self.filename = filename
+        self.temps = 0
+        self.class_attrs = {'object': []}  # Class name -> (attribute, initial value) of all attributes.
+
+    def compile(self, node: ast.ProgramNode) -> Program:
+        module = self.visit(node)
+        return Program(compile(module, self.filename, 'exec'))
+
+    def do_visit(self, node):
+        if node:
+            return self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f't_{self.temps}'
+
+    def located(self, py_node, node):
+        if node.span is not None:
+            py_node.lineno = py_node.end_lineno = node.span[0].line
+            py_node.col_offset = py_node.end_col_offset = 0
+        return py_node
+
+    def int_result(self, expr: pyast.expr, only_min: bool = False) -> pyast.expr:
+        """
+        Wraps an int expression in a 32-bit overflow check. With only_min the result can only overflow by being
+        2**31 (unary minus and floor division of INT_MIN by -1).
+        """
+        t = self.temp()
+        bound = pyast.NamedExpr(store(t), expr)
+        if only_min:
+            test = pyast.Compare(bound, [pyast.NotEq()], [constant(INT_MAX + 1)])
+        else:
+            test = pyast.Compare(constant(INT_MIN), [pyast.LtE(), pyast.LtE()], [bound, constant(INT_MAX)])
+        return pyast.IfExp(test, load(t), call('rt_overflow'))
+
+    ####################################################################################################################
+    # Declarations.
+
+    def declarations(self, declarations: list) -> list:
+        body = []
+        for d in declarations:
+            if isinstance(d, ast.GlobalDeclNode):
+                body.append(pyast.Global([name(d.variable.name)]))
+            elif isinstance(d, ast.NonLocalDeclNode):
+                body.append(pyast.Nonlocal([name(d.variable.name)]))
+        for d in declarations:
+            if isinstance(d, ast.VarDefNode):
+                body.append(self.located(pyast.Assign([store(name(d.var.identifier.name))],
+                                                      constant(d.value.get_value())), d))
+        for d in declarations:
+            if isinstance(d, (ast.FuncDefNode, ast.ClassDefNode)):
+                body.append(self.visit(d))
+        return body
+
+    def block(self, statements: list) -> list:
+        body = []
+        for s in statements:
+            if isinstance(s, ast.ExprNode):
+                body.append(self.located(pyast.Expr(self.statement_expr(s)), s))
+            else:
+                body.append(self.located(self.visit(s), s))
+        return body or [pyast.Pass()]
+
+    def statement_expr(self, node: ast.ExprNode) -> pyast.expr:
+        # A print whose (None) result is discarded writes the text directly.
+        if isinstance(node, ast.FunctionCallExprNode) and node.identifier.name == 'print':
+            arg = node.args[0]
+            t, v = arg.get_type_str(), self.visit(arg)
+            if t == 'int':
+                return call('rt_write', pyast.JoinedStr([pyast.FormattedValue(v, -1, None), constant("\n")]))
+            if t == 'str':
+                return call('rt_write', pyast.BinOp(v, pyast.Add(), constant("\n")))
+            if t == 'bool':
+                return call('rt_write', pyast.IfExp(v, constant("True\n"), constant("False\n")))
+        return self.visit(node)
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        body = self.declarations(node.declarations) + self.block(node.statements)
+        module = pyast.Module(body, [])
+        return pyast.fix_missing_locations(module)
+
+    @visit.register
+    def _(self, node: ast.FuncDefNode):
+        args = pyast.arguments([], [pyast.arg(name(p.identifier.name)) for p in node.params], None, [], [], None, [])
+        body = self.declarations(node.declarations) + self.block(node.statements)
+        return self.located(pyast.FunctionDef(name(node.name.name), args, body, [], None), node)
+
+    @visit.register
+    def _(self, node: ast.ClassDefNode):
+        super_name = node.super_class.name
+        own = [(d.var.identifier.name, d.value.get_value())
+               for d in node.declarations if isinstance(d, ast.VarDefNode)]
+        attrs = self.class_attrs[super_name] + own
+        self.class_attrs[node.name.name] = attrs
+        body = [pyast.Assign([store('__slots__')], pyast.Tuple([constant(name(a)) for a, _ in own], pyast.Load()))]
+        # The constructor: every attribute gets its initial value, then the (possibly inherited) __init__ runs.
+        self_arg = pyast.arguments([], [pyast.arg('self')], None, [], [], None, [])
+        init = [pyast.Assign([pyast.Attribute(load('self'), name(a), pyast.Store())], constant(v)) for a, v in attrs]
+        init.append(pyast.Expr(pyast.Call(pyast.Attribute(load('self'), name('__init__'), pyast.Load()), [], [])))
+        body.append(pyast.FunctionDef('__init__', self_arg, init, [], None))
+        body.extend(self.visit(d) for d in node.declarations if isinstance(d, ast.FuncDefNode))
+        base = 'rt_Object' if super_name == 'object' else name(super_name)
+        return self.located(pyast.ClassDef(name(node.name.name), [load(base)], [], body, []), node)
+
+    ####################################################################################################################
+    # Statements.
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        return pyast.Pass()
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        return pyast.Return(self.visit(node.expr) if node.expr is not None else constant(None))
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        return pyast.Assign([self.target(t) for t in node.targets], self.visit(node.expr))
+
+    def target(self, node: ast.ExprNode) -> pyast.expr:
+        if isinstance(node, ast.IdentifierExprNode):
+            return store(name(node.identifier.name))
+        if isinstance(node, ast.MemberExprNode):
+            return pyast.Attribute(self.visit(node.expr_object), name(node.member.name), pyast.Store())
+        seq, index = self.subscript(node)
+        return pyast.Subscript(seq, index, pyast.Store())
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        else_body = self.block(node.else_body) if node.else_body else []
+        for cond, body in reversed(node.elifs):
+            else_body = [self.located(pyast.If(self.visit(cond), self.block(body), else_body), cond)]
+        return pyast.If(self.visit(node.condition), self.block(node.then_body), else_body)
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        return pyast.While(self.visit(node.condition), self.block(node.body), [])
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        return pyast.For(store(name(node.identifier.name)), self.visit(node.iterable), self.block(node.body), [])
+
+    ####################################################################################################################
+    # Expressions.
+
+    @visit.register
+    def _(self, node: ast.LiteralExprNode):
+        return constant(node.get_value())
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        return load(name(node.identifier.name))
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        if node.op == Operator.Not:
+            return pyast.UnaryOp(pyast.Not(), self.visit(node.operand))
+        if isinstance(node.operand, ast.IntegerLiteralExprNode) and node.operand.get_value() != -2 ** 31:
+            return constant(-node.operand.get_value())
+        return self.int_result(pyast.UnaryOp(pyast.USub(), self.visit(node.operand)), only_min=True)
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        lhs, rhs = self.visit(node.lhs), self.visit(node.rhs)
+        if node.op == Operator.And:
+            return pyast.BoolOp(pyast.And(), [lhs, rhs])
+        if node.op == Operator.Or:
+            return pyast.BoolOp(pyast.Or(), [lhs, rhs])
+        if node.op in CMP_OPS:
+            return pyast.Compare(lhs, [CMP_OPS[node.op]()], [rhs])
+        expr = pyast.BinOp(lhs, OPS[node.op](), rhs)
+        if node.lhs.get_type_str() != 'int':
+            return expr  # String or list concatenation.
+        if node.op == Operator.Modulus:
+            return expr
+        if node.op == Operator.IntDivide:
+            # Only INT_MIN // -1 overflows.
+            if isinstance(node.rhs, ast.IntegerLiteralExprNode) and node.rhs.get_value() != -1 or \
+                    isinstance(node.lhs, ast.IntegerLiteralExprNode) and node.lhs.get_value() != -2 ** 31:
+                return expr
+            return self.int_result(expr, only_min=True)
+        return self.int_result(expr)
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        return pyast.IfExp(self.visit(node.condition), self.visit(node.then_expr), self.visit(node.else_expr))
+
+    def subscript(self, node: ast.IndexExprNode):
+        """
+        Returns the Python expressions of the indexed value and the index. Python accepts negative indices, so
+        they are checked unless the index is a non-negative literal.
+        """
+        seq = self.visit(node.list_expr)
+        if isinstance(node.index, ast.IntegerLiteralExprNode) and node.index.get_value() >= 0:
+            return seq, self.visit(node.index)
+        s, t = self.temp(), self.temp()
+        index = pyast.IfExp(pyast.Compare(pyast.NamedExpr(store(t), self.visit(node.index)), [pyast.GtE()],
+                                          [constant(0)]),
+                            load(t), call('rt_bad_index', load(s)))
+        return pyast.NamedExpr(store(s), seq), index
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        seq, index = self.subscript(node)
+        return pyast.Subscript(seq, index, pyast.Load())
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        return pyast.Attribute(self.visit(node.expr_object), name(node.member.name), pyast.Load())
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        return pyast.List([self.visit(e) for e in node.elements], pyast.Load())
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        obj = self.visit(node.member.expr_object)
+        method = name(node.member.member.name)
+        args = [self.visit(a) for a in node.args]
+        if all(is_pure(a) for a in node.args):
+            return pyast.Call(pyast.Attribute(obj, method, pyast.Load()), args, [])
+        # ChocoPy evaluates the arguments before checking the receiver for None.
+        return pyast.Call(call('rt_method', obj, constant(method)), args, [])
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        f = node.identifier.name
+        args = [self.visit(a) for a in node.args]
+        if f == 'object':
+            return call('rt_Object')
+        if f == 'print':
+            return call('rt_print', *args)
+        if f == 'input':
+            return call('rt_input')
+        if f == 'len':
+            return call('len' if node.args[0].get_type_str() == 'str' else 'rt_len', *args)
+        return call(name(f), *args)
+
+
+########################################################################################################################
+# Cache of compiled code objects.
+
+def front_end(source: str):
+    ast_root = parser.Parser(io.StringIO(source)).parse()
+    st_visitor = symtab_visitor.SymbolTableVisitor()
+    st_visitor.do_visit(ast_root)
+    t_visitor = type_visitor.TypeVisitor(type_env.TypeEnvironment(st_visitor.get_symbol_table()))
+    t_visitor.do_visit(ast_root)
+    return ast_root
+
+
+def cache_header(source: str) -> bytes:
+    # Like a .pyc header: the interpreter's magic number and the backend version, followed by the source hash.
+    digest = hashlib.sha256(source.encode()).digest()
+    return importlib.util.MAGIC_NUMBER + VERSION.to_bytes(4, 'little') + digest
+
+
+def cache_path(cache_dir: str, source: str) -> str:
+    return os.path.join(cache_dir, hashlib.sha256(source.encode()).hexdigest() + '.pyc')
+
+
+def compile_source(source: str, cache_dir: str = None, filename: str = '<chocopy>') -> Program:
+    """
+    Compiles ChocoPy source text (raising on syntax and semantic errors). With a cache directory, the code object
+    is loaded from a file keyed by the source hash if present, and stored there after compilation otherwise.
+    """
+    if cache_dir is not None:
+        path = cache_path(cache_dir, source)
+        header = cache_header(source)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data.startswith(header):
+                return Program(marshal.loads(data[len(header):]))
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+    program = PyCompiler(filename).compile(front_end(source))
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(header + marshal.dumps(program.code))
+        os.replace(tmp, path)
+    return program
@@ -0,0 +1,710 @@
+#
+# Query engine. Version 1.0
+#
+# A demand-driven compiler core: the results of the front end (the tokens of a file, the AST of each top-level
+# declaration or statement, the symbol tables, the signature of a name, the types and diagnostics of a function body)
+# are memoized queries. A query records the inputs and the other queries it reads while it runs. When an input
+# changes the database moves to a new revision, and a query asked for again is revalidated red-green: if none of its
+# dependencies changed since it was last verified its memo is reused as it is (green), otherwise it runs again (red).
+# A query that runs again and gets a result equal to its memo keeps the revision in which the memo last changed
+# (backdating), so the queries depending on it stay green. The memos of a file are therefore revalidated in about the
+# time it takes to compare them, and an edit inside a function body only re-parses the top-level declaration it is in
+# and type-checks that one body again.
+#
+# CompilerDatabase defines the queries of the front end over source texts keyed by path. Its record query returns the
+# driver's result record of a file, diagnostic for diagnostic the same as a run of the phases from scratch.
+#
+import collections
+import contextlib
+import functools
+import io
+import re
+import astree as ast
+import lexer
+import parser
+import semantic_error
+import symbol_table
+import symtab_visitor
+import type_env
+import type_visitor
+
+# A line starting at column 1 begins a top-level declaration or statement, except for elif and else.
+CHUNK_START = re.compile(r'^(?![ \t\r\n]|(?:elif|else)\b)', re.MULTILINE)
+NAME = re.compile(r'[A-Za-z_]\w*')
+# The revisions for which a memo of a file that is not used is kept: an edit going through versions with errors, which
+# stop the analysis early, finds the memos of the last correct version.
+KEEP_REVISIONS = 16
+
+
+class CycleError(Exception):
+    """
+    Raised when a query depends on itself.
+    """
+    def __init__(self, key: tuple):
+        super().__init__(f"Query {key[0]}{key[1]} depends on itself.")
+        self.key = key
+
+
+class Memo:
+    """
+    The result of a query (or the exception it raised) with the keys of its dependencies in the order they were read,
+    the revision it was last verified in and the revision it last changed in.
+    """
+    __slots__ = ('value', 'error', 'deps', 'verified_at', 'changed_at')
+
+    def __init__(self, value, error, deps: list, revision: int):
+        self.value = value
+        self.error = error
+        self.deps = deps
+        self.verified_at = revision
+        self.changed_at = revision
+
+
+def query(fn):
+    """
+    Declares a method of a Database as a query, memoized on its arguments (which must be hashable).
+    """
+    @functools.wraps(fn)
+    def fetch(self, *args):
+        return self.fetch(fn, args)
+    return fetch
+
+
+class Database:
+    """
+    The inputs and the memoized queries of an analysis. The key of a query is (name of the query, arguments), the key
+    of an input dependency is (None, name of the input).
+    """
+    def __init__(self):
+        self.revision = 0
+        self.inputs = {}  # Input name -> (value, revision it last changed in).
+        self.memos = {}  # Query key -> Memo.
+        self.queries = {}  # Query name -> function, to run a query again while revalidating.
+        self.active = []  # The dependency lists of the queries running, the innermost last.
+        self.running = set()
+        self.stats = collections.Counter()
+
+    def set_input(self, name, value):
+        """
+        Sets an input, starting a new revision if its value changed.
+        """
+        old = self.inputs.get(name)
+        if old is not None and old[0] == value:
+            return
+        self.revision += 1
+        self.inputs[name] = (value, self.revision)
+
+    def input(self, name):
+        if self.active:
+            self.active[-1].append((None, name))
+        return self.inputs[name][0]
+
+    def fetch(self, fn, args: tuple):
+        key = (fn.__name__, args)
+        self.queries[fn.__name__] = fn
+        memo = self.validate(key)
+        if self.active:
+            self.active[-1].append(key)
+        if memo.error is not None:
+            raise memo.error
+        return memo.value
+
+    @contextlib.contextmanager
+    def untracked(self):
+        """
+        Reads queries and inputs without recording them as dependencies of the running query.
+        """
+        self.active.append([])
+        try:
+            yield
+        finally:
+            self.active.pop()
+
+    def validate(self, key: tuple) -> Memo:
+        """
+        Returns the memo of query key, brought up to date with the current revision.
+        """
+        memo = self.memos.get(key)
+        if memo is not None:
+            if memo.verified_at == self.revision:
+                self.stats['hits'] += 1
+                return memo
+            if not self.changed(memo):
+                memo.verified_at = self.revision
+                self.stats['reused'] += 1
+                return memo
+        return self.execute(key, memo)
+
+    def changed(self, memo: Memo) -> bool:
+        """
+        Tells whether a dependency of memo changed after it was last verified, revalidating the dependencies in the
+        order they were read (an earlier dependency changing can mean the later ones are not read any more).
+        """
+        for dep in memo.deps:
+            if dep[0] is None:
+                entry = self.inputs.get(dep[1])
+                if entry is None or entry[1] > memo.verified_at:
+                    return True
+            elif self.validate(dep).changed_at > memo.verified_at:
+                return True
+        return False
+
+    def execute(self, key: tuple, old: Memo) -> Memo:
+        if key in self.running:
+            raise CycleError(key)
+        deps = []
+        self.running.add(key)
+        self.active.append(deps)
+        try:
+            value, error = self.queries[key[0]](self, *key[1]), None
+        except CycleError:
+            raise
+        except Exception as e:
+            value, error = None, e
+        finally:
+            self.active.pop()
+            self.running.discard(key)
+        memo = Memo(value, error, deps, self.revision)
+        self.stats['executed'] += 1
+        if old is not None and error is None and old.error is None and type(value) is type(old.value) \
+                and value == old.value:
+            memo.value = old.value
+            memo.changed_at = old.changed_at
+            self.stats['backdated'] += 1
+        self.memos[key] = memo
+        return memo
+
+    def sweep(self, select=lambda key: True, keep: int = 0) -> int:
+        """
+        Discards the memos selected by their key that were not verified in the last keep revisions, and returns how
+        many were discarded.
+        """
+        stale = [k for k, m in self.memos.items() if m.verified_at < self.revision - keep and select(k)]
+        for k in stale:
+            del self.memos[k]
+        return len(stale)
+
+
+def split(text: str) -> list[str]:
+    """
+    Splits a source text into the texts of its top-level declarations and statements, each with the indented, blank
+    and comment lines after it.
+    """
+    starts = [0] + [m.start() for m in CHUNK_START.finditer(text) if 0 < m.start() < len(text)] + [len(text)]
+    return [text[starts[i]:starts[i + 1]] for i in range(len(starts) - 1)]
+
+
+def nodes(tree):
+    """
+    Yields the nodes of a tree (or a list of trees).
+    """
+    stack = [tree]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, ast.Node):
+            yield n
+            stack += [c for c in vars(n).values() if isinstance(c, (ast.Node, list, tuple))]
+        elif isinstance(n, (list, tuple)):
+            stack += [c for c in n if isinstance(c, (ast.Node, list, tuple))]
+
+
+def definitions(declarations: list):
+    """
+    Yields the functions and methods among declarations, and nested in them, with their qualified names (e.g., 'f',
+    'C.m', 'f.g').
+    """
+    stack = [('', d) for d in reversed(declarations)]
+    while stack:
+        prefix, d = stack.pop()
+        if isinstance(d, (ast.ClassDefNode, ast.FuncDefNode)):
+            name = prefix + d.name.name
+            if isinstance(d, ast.FuncDefNode):
+                yield name, d
+            stack += [(name + '.', n) for n in reversed(d.declarations)]
+
+
+def clear_types(tree):
+    """
+    Clears the types an earlier check set on the expressions of a tree (or a list of trees), which a fresh parse does
+    not have: the checker leaves some expressions without a type (e.g., after an error), and an old type would hide
+    the errors of the expressions using it. The queries checking a part of a reused AST clear it first.
+    """
+    for n in nodes(tree):
+        if isinstance(n, ast.ExprNode):
+            n.set_type_str('')
+
+
+def shift(span: tuple, lines: int) -> tuple:
+    if span is None or lines == 0:
+        return span
+    return tuple(lexer.Location(location.line + lines, location.col) for location in span)
+
+
+class Chunk:
+    """
+    A top-level declaration or statement parsed on its own (unless the text is None), its first line at line.
+    """
+    def __init__(self, text: str = None, line: int = 1):
+        self.line = line
+        self.declarations = []
+        self.statements = []
+        self.error = None
+        self.spanned = None  # The nodes with a span, listed when first needed.
+        self.names = None  # The names in its text, listed when first needed (see CompilerDatabase.symbols).
+        # The parts a check set the types of: None for the declarations, qualified function names for their bodies.
+        self.typed = set()
+        if text is None:
+            return
+        try:
+            tree = parser.Parser(io.StringIO(text)).parse()
+            self.declarations, self.statements = tree.declarations, tree.statements
+        except lexer.SyntaxErrorException as e:
+            self.error = e
+
+    def move_to(self, line: int):
+        """
+        Shifts the spans of the nodes so that the first line of the chunk is line.
+        """
+        lines = line - self.line
+        if lines:
+            for n in self.nodes():
+                n.span = shift(n.span, lines)
+            self.line = line
+
+    def nodes(self) -> list[ast.Node]:
+        if self.spanned is None:
+            self.spanned = [n for n in nodes([self.declarations, self.statements]) if n.span is not None]
+        return self.spanned
+
+
+class TypeUses(type_env.TypeEnvironment):
+    """
+    A type environment recording the types it is asked about (their classes, supertypes or validity), on which a
+    type check depends besides the names it uses. It shares the module table and the classes of t_env, listed once
+    for all the checks of a revision.
+    """
+    def __init__(self, t_env: type_env.TypeEnvironment):
+        self.symbol_table = self.scope_symbol_table = t_env.get_symbol_table()
+        self.subtype_of = t_env.get_subtypes()
+        self.used = set()
+
+    def get_class_symbol_table(self, t: str):
+        self.used.add(t)
+        return super().get_class_symbol_table(t)
+
+    def is_user_defined_type(self, t: str):
+        self.used.add(t)
+        return super().is_user_defined_type(t)
+
+    def get_supertypes_of(self, t):
+        self.used.add(t)
+        return super().get_supertypes_of(t)
+
+
+class CompilerDatabase(Database):
+    """
+    The queries of the front end, over source texts keyed by path.
+    """
+    def __init__(self):
+        super().__init__()
+        self.prepared = {}  # (path, text, occurrence) -> Chunk split from a parse of the file (see prepare).
+
+    def set_source(self, path: str, text: str):
+        self.set_input(path, text)
+
+    def sweep_file(self, path: str) -> int:
+        """
+        Discards the memos of a file not used in the last KEEP_REVISIONS revisions (those of its older texts).
+        """
+        return self.sweep(lambda key: key[1][:1] == (path,), KEEP_REVISIONS)
+
+    def forget(self, path: str):
+        """
+        Drops a source and all the memos computed from it.
+        """
+        self.inputs.pop(path, None)
+        for k in [k for k in self.memos if k[1][:1] == (path,)]:
+            del self.memos[k]
+
+    @query
+    def lines(self, path: str) -> tuple:
+        return tuple(self.input(path).split('\n'))
+
+    @query
+    def tokens(self, path: str) -> tuple:
+        lex = lexer.Lexer(io.StringIO(self.input(path)))
+        result = [lex.next()]
+        while result[-1].type != lexer.Tokentype.EOI:
+            result.append(lex.next())
+        return tuple(result)
+
+    @query
+    def chunk_texts(self, path: str) -> tuple:
+        return tuple(split(self.input(path)))
+
+    @query
+    def chunk(self, path: str, text: str, occurrence: int) -> Chunk:
+        """
+        The parse of a top-level declaration or statement, the occurrence-th one of its text in the file. It reads no
+        input, so it is reused for as long as a chunk of that text exists.
+        """
+        return self.prepared.pop((path, text, occurrence), None) or Chunk(text)
+
+    def prepare(self, path: str, texts: tuple):
+        """
+        Parses a file as a whole and splits the AST into the chunks of texts, for chunk to return, as that is faster
+        than parsing the chunks one by one when most of them are new. Raises the syntax error of the file, if any.
+        """
+        tree = parser.Parser(io.StringIO(self.input(path))).parse()
+        top_level = iter(tree.declarations + tree.statements)
+        n = next(top_level, None)
+        line, seen = 1, collections.Counter()
+        for text in texts:
+            end = line + text.count('\n')
+            c = Chunk(line=line)
+            while n is not None and n.span[0].line < end:
+                (c.declarations if isinstance(n, ast.DeclarationNode) else c.statements).append(n)
+                n = next(top_level, None)
+            if len(c.declarations) + len(c.statements) == 1:
+                self.prepared[(path, text, seen[text])] = c
+            seen[text] += 1
+            line = end
+
+    @query
+    def program(self, path: str) -> ast.ProgramNode:
+        """
+        The AST of a file, assembled from the ASTs of its chunks. A syntax error in a chunk is that of a parse of the
+        file when no statement comes before the chunk (the parser is then where it is at the start of a file) and the
+        error is not on the last line of the chunk (where the parse of the file would see the next chunk instead). The
+        file is parsed as a whole otherwise, and when a declaration comes after a statement, as a single chunk.
+        """
+        texts = self.chunk_texts(path)
+        seen = collections.Counter(texts)
+        if sum(('chunk', (path, t, i)) not in self.memos for t in seen for i in range(seen[t])) > len(texts) // 2:
+            self.prepare(path, texts)
+        declarations, statements = [], []
+        line, seen = 1, collections.Counter()
+        try:
+            for i, text in enumerate(texts):
+                c = self.chunk(path, text, seen[text])
+                seen[text] += 1
+                if c.error is not None and not statements and (i == len(texts) - 1 or
+                                                               c.error.location.line < text.count('\n')):
+                    raise lexer.SyntaxErrorException(c.error.message, shift((c.error.location,), line - 1)[0])
+                whole = c.error is not None or (c.declarations and statements)
+                if whole:
+                    c = self.chunk(path, self.input(path), 0)  # The file parsed as a whole, a single chunk.
+                    if c.error is not None:
+                        raise c.error
+                    declarations, statements, line = [], [], 1
+                c.move_to(line)
+                declarations += c.declarations
+                statements += c.statements
+                if whole:
+                    break
+                line += text.count('\n')
+        finally:
+            self.prepared.clear()
+        return ast.ProgramNode(declarations, statements)
+
+    def chunk_keys(self, path: str) -> list:
+        """
+        The (text, occurrence) keys of the chunks the program of a file is assembled from.
+        """
+        tree = self.program(path)
+        top_level = iter(tree.declarations + tree.statements)
+        keys, seen = [], collections.Counter()
+        for text in self.chunk_texts(path):
+            c = self.chunk(path, text, seen[text])
+            if any(n is not next(top_level, None) for n in c.declarations + c.statements):
+                return [(self.input(path), 0)]  # The file parsed as a whole.
+            keys.append((text, seen[text]))
+            seen[text] += 1
+        return keys
+
+    @query
+    def chunk_symbols(self, path: str, text: str, occurrence: int, context: tuple) -> tuple:
+        """
+        The symbols and the symbol tables a chunk adds to the module table, and the diagnostics of their construction
+        numbered from line 1 at the first line of the chunk. context holds the module symbols of the names in the text
+        as the chunks before it left them, (name, flags, type) for each name defined: the construction looks up no
+        other module symbol, so it is reused for as long as a chunk of that text comes after the same symbols.
+        """
+        c = self.chunk(path, text, occurrence)
+        module = symbol_table.SymbolTable('top')
+        module.set_parent(symbol_table.prelude())
+        for name, flags, type_str in context:
+            module.add_symbol(symbol_table.Symbol(name, flags, type_str))
+        before = set(map(id, module.get_symbols()))
+        st_visitor = symtab_visitor.SymbolTableVisitor(collect_errors=True)
+        for node in c.declarations + c.statements:
+            st_visitor.visit_top_level(module, node)
+        return (tuple(s for s in module.get_symbols() if id(s) not in before), tuple(module.get_children()),
+                self.moved(st_visitor.get_diagnostics(), 1 - c.line))
+
+    @query
+    def symbols(self, path: str) -> tuple:
+        """
+        The symbol table of a file, the diagnostics of its construction, and the keys (path aside) of the chunks for
+        chunk_symbols and chunk_declarations. The table is assembled from what each chunk adds to it, so an edit only
+        builds the symbols of the chunks it changes (or of those using a module symbol it changes) again.
+        """
+        module = symbol_table.SymbolTable('top')
+        module.set_parent(symbol_table.prelude())
+        diagnostics, parts = [], []
+        for text, occurrence in self.chunk_keys(path):
+            c = self.chunk(path, text, occurrence)
+            if c.names is None:
+                c.names = sorted(set(NAME.findall(text)))
+            context = tuple((name, s.get_flags(), s.get_type_str()) for name in c.names if (s := module.lookup(name)))
+            symbols, tables, found = self.chunk_symbols(path, text, occurrence, context)
+            for s in symbols:
+                module.add_symbol(s)
+            for t in tables:
+                t.detach()
+                module.add_child(t)
+            diagnostics += self.moved(found, c.line - 1)
+            parts.append((text, occurrence, context))
+        return module, tuple(diagnostics), tuple(parts)
+
+    @query
+    def scope(self, path: str, name: str):
+        """
+        The symbol table of scope name, qualified with the enclosing scopes (e.g., 'C.m'), or None.
+        """
+        st = self.symbols(path)[0]
+        for part in name.split('.') if name else []:
+            if st is None:
+                break
+            st = st.get_child(part)
+        return st
+
+    @query
+    def statements_text(self, path: str) -> str:
+        statements = self.program(path).statements
+        if not statements:
+            return ''
+        return '\n'.join(self.lines(path)[statements[0].span[0].line - 1:statements[-1].span[1].line])
+
+    @query
+    def environment(self, path: str) -> type_env.TypeEnvironment:
+        """
+        The type environment of the module table of a file.
+        """
+        return type_env.TypeEnvironment(self.symbols(path)[0])
+
+    @query
+    def interface(self, path: str) -> dict:
+        """
+        The signatures of the names in the module table of a file. An edit inside a function body leaves it equal, so
+        the signatures read from it stay green.
+        """
+        t_env = self.environment(path)
+        return {name: self.defined_as(t_env, name) for name in t_env.get_symbol_table().get_identifiers()}
+
+    @query
+    def signature(self, path: str, name: str):
+        """
+        What the module scope of a file defines name as, as far as type checking a body goes: ('var', type),
+        ('def', parameter types, return type) or ('class', superclasses, members with their types and the signatures
+        of the methods, inherited ones included). None if the module does not define name.
+        """
+        return self.interface(path).get(name)
+
+    @staticmethod
+    def defined_as(t_env: type_env.TypeEnvironment, name: str):
+        """
+        The signature of name, a symbol of the module table of t_env.
+        """
+        st = t_env.get_symbol_table()
+        symbol = st.lookup(name)
+        decl_type = symbol_table.symbol_decl_type(st, name)
+        if decl_type == symbol_table.DeclType.Function:
+            while not st.lookup(name) or not st.lookup(name).is_local():  # Declared global, e.g., print.
+                st = st.get_parent()
+            s = type_visitor.TypeVisitor.get_signature(st.get_child(name))
+            return 'def', tuple(s.args_type), s.return_type
+        if decl_type == symbol_table.DeclType.Class:
+            members = {}
+            for c in [name] + t_env.get_supertypes_of(name):
+                if c_st := t_env.get_class_symbol_table(c):
+                    for member in c_st.get_identifiers():
+                        if member not in members:
+                            m_st = c_st.get_methods_sym_table(member)
+                            signature = type_visitor.TypeVisitor.get_signature(m_st) if m_st else None
+                            members[member] = (c_st.lookup(member).get_type_str(),
+                                               tuple(signature.args_type) if signature else None)
+            return 'class', tuple(t_env.get_supertypes_of(name)), tuple(sorted(members.items()))
+        return 'var', symbol.get_type_str()
+
+    def uses(self, path: str, text: str, types: set):
+        """
+        Reads the signatures of the names in a text (a superset of the names it uses) and of the types its checking
+        asked about, on which its type checking depends.
+        """
+        for name in sorted(set(NAME.findall(text)) | {t.strip('[]') for t in types}):
+            self.signature(path, name)
+
+    @staticmethod
+    def moved(diagnostics: list, lines: int) -> tuple:
+        return tuple(d._replace(span=shift(d.span, lines)) for d in diagnostics)
+
+    @query
+    def chunk_declarations(self, path: str, text: str, occurrence: int, context: tuple) -> tuple:
+        """
+        The type checking of the declarations of a chunk (see chunk_symbols), the function bodies left to check on
+        demand: its diagnostics, numbered from line 1 at the first line of the chunk, and the qualified names of the
+        functions declared with the number of diagnostics recorded before each.
+        """
+        c = self.chunk(path, text, occurrence)
+        with self.untracked():
+            t_env = self.environment(path)
+        if c.typed:  # Checked in an earlier revision.
+            clear_types(c.declarations)
+            c.typed.clear()
+        c.typed.add(None)
+        t_visitor = type_visitor.TypeVisitor(TypeUses(t_env), collect_errors=True, lazy=True)
+        for d in c.declarations:
+            t_visitor.do_visit(d)
+        self.uses(path, text, t_visitor.t_env.used)
+        return self.moved(t_visitor.get_diagnostics(), 1 - c.line), tuple(t_visitor.positions.items())
+
+    @query
+    def body(self, path: str, text: str, occurrence: int, name: str) -> tuple:
+        """
+        The diagnostics of type checking the body of function name, declared in the chunk of text, numbered from line
+        1 at the first line of the chunk. Besides the text, it depends on the signatures of the names and types it
+        uses and on the signature of the class it is declared in, so an edit elsewhere in the file, or one moving the
+        chunk, leaves it green.
+        """
+        c = self.chunk(path, text, occurrence)
+        with self.untracked():
+            t_env = self.environment(path)
+        functions = dict(definitions(c.declarations))
+        if name.split('.')[0] not in functions:  # A method, of a (top-level) class.
+            self.signature(path, name.split('.')[0])
+        span = functions[name].span
+        if name in c.typed:
+            clear_types(functions[name].statements)
+        c.typed.add(name)
+        t_visitor = type_visitor.TypeVisitor(TypeUses(t_env), collect_errors=True, lazy=True)
+        t_visitor.pending[name] = functions[name].statements
+        diagnostics = t_visitor.check_function(name)
+        self.uses(path, '\n'.join(text.split('\n')[span[0].line - c.line:span[1].line - c.line + 1]),
+                  t_visitor.t_env.used)
+        return self.moved(diagnostics, 1 - c.line)
+
+    @query
+    def module_statements(self, path: str) -> tuple:
+        """
+        The diagnostics of type checking the top-level statements of a file, numbered from line 1 at the first one.
+        """
+        text = self.statements_text(path)
+        with self.untracked():
+            t_env = self.environment(path)
+        statements = self.program(path).statements
+        clear_types(statements)
+        t_visitor = type_visitor.TypeVisitor(TypeUses(t_env), collect_errors=True, lazy=True)
+        for s in statements:
+            t_visitor.do_visit(s)
+        self.uses(path, text, t_visitor.t_env.used)
+        return self.moved(t_visitor.get_diagnostics(), 1 - statements[0].span[0].line) if statements else ()
+
+    @query
+    def type_diagnostics(self, path: str) -> tuple:
+        """
+        The diagnostics of type checking a file, in the order of a serial run.
+        """
+        return tuple(d for part in self.checked_parts(path) for d in part)
+
+    def checked_parts(self, path: str):
+        """
+        Yields the diagnostics of type checking a file in the order of a serial run, a part at a time: those recorded
+        checking the declarations of a chunk before a body, then those of the body, and so on.
+        """
+        for text, occurrence, context in self.symbols(path)[2]:
+            line = self.chunk(path, text, occurrence).line
+            diagnostics, positions = self.chunk_declarations(path, text, occurrence, context)
+            start = 0
+            for name, position in positions:
+                yield self.moved(diagnostics[start:position], line - 1)
+                yield self.moved(self.body(path, text, occurrence, name), line - 1)
+                start = position
+            yield self.moved(diagnostics[start:], line - 1)
+        statements = self.program(path).statements
+        if statements:
+            yield self.moved(self.module_statements(path), statements[0].span[0].line - 1)
+
+    @query
+    def typed_program(self, path: str) -> tuple:
+        """
+        The type-checked AST of a correct file and its symbol table, raising on syntax and semantic errors (see
+        driver.typed_ast). The whole program is checked, as the bodies checked by earlier revisions may have been
+        re-parsed since.
+        """
+        tree = self.program(path)
+        clear_types(tree)
+        for key in self.chunk_keys(path):
+            c = self.chunk(path, *key)
+            c.typed.update([None] + [name for name, _ in definitions(c.declarations)])
+        st_visitor = symtab_visitor.SymbolTableVisitor()
+        st_visitor.do_visit(tree)
+        type_visitor.TypeVisitor(type_env.TypeEnvironment(st_visitor.get_symbol_table())).do_visit(tree)
+        return tree, st_visitor.get_symbol_table()
+
+    @query
+    def record(self, path: str, stop_after: str) -> dict:
+        """
+        The driver's result record of a file (see driver.run_phases).
+        """
+        result = {'file': path, 'ok': True, 'phase': stop_after, 'diagnostics': []}
+        try:
+            if stop_after == 'lex':
+                result['tokens'] = len(self.tokens(path))
+                return result
+            self.program(path)
+        except lexer.SyntaxErrorException as e:
+            result.update(ok=False, phase='parse', diagnostics=[syntax_json(e)])
+            return result
+        if stop_after == 'parse':
+            return result
+
+        diagnostics = self.symbols(path)[1]
+        if stop_after == 'typecheck' and not diagnostics:
+            diagnostics = self.type_diagnostics(path)
+        elif diagnostics:
+            result['phase'] = 'symtab'  # The types are not checked against an incomplete symbol table.
+        result['ok'] = not diagnostics
+        result['diagnostics'] = [diagnostic_json(d) for d in diagnostics]
+        return result
+
+    def diagnostics(self, path: str, stop_after: str):
+        """
+        Yields the diagnostics of the record of a file as they are produced: the syntax error, the errors in the
+        symbol table, then the type errors a function body at a time.
+        """
+        try:
+            if stop_after == 'lex':
+                self.tokens(path)
+                return
+            self.program(path)
+        except lexer.SyntaxErrorException as e:
+            yield syntax_json(e)
+            return
+        if stop_after == 'parse':
+            return
+        diagnostics = self.symbols(path)[1]
+        yield from map(diagnostic_json, diagnostics)
+        if stop_after == 'typecheck' and not diagnostics:
+            for part in self.checked_parts(path):
+                yield from map(diagnostic_json, part)
+
+
+def syntax_json(e: lexer.SyntaxErrorException) -> dict:
+    return {'kind': 'syntax', 'message': e.message, 'scope': None, 'line': e.location.line, 'col': e.location.col}
+
+
+def diagnostic_json(d: semantic_error.Diagnostic) -> dict:
+    start = d.span[0] if d.span else None
+    return {'kind': d.kind, 'message': d.message, 'scope': d.scope,
+            'line': start.line if start else None, 'col': start.col if start else None}
@@ -0,0 +1,1068 @@
+#
+# RISC-V (RV32IM) code generator. Version 1.0
+#
+# Walks a type-checked ProgramNode together with the symbol tables built by SymbolTableVisitor and emits assembly for
+# the assembler and simulator in riscv_sim.py (or any RV32IM toolchain with Venus-style environment calls).
+#
+# Objects have a three-word header followed by the attributes:
+#   0: type tag (object 0, int 1, bool 2, str 3, lists -1, user classes 4...)
+#   4: size in words (header included)
+#   8: pointer to the dispatch table of the class (methods in inheritance order, __init__ first)
+#  12: attributes; for str and lists the length, followed by the NUL-terminated characters or the elements.
+# int and bool values are unboxed in registers and variables of type int/bool, and boxed when they flow into
+# a location of another type (object, ...). None is the null pointer.
+#
+# Activation records: the caller pushes the arguments (first argument deepest) and then the static link (the frame
+# of the function the callee is nested in, or 0), and the callee saves ra and fp below them:
+#   4*(n-i)(fp): argument i of n, 0(fp): static link, -4(fp): return address, -8(fp): caller's fp,
+#   -12-4*j(fp): local variable j.
+# Expressions leave their value in a0; intermediate values are pushed on the stack.
+#
+# The stack grows down towards the heap. gp holds the lowest address the stack may reach, STACK_GUARD bytes above the
+# heap's break (it moves up with each allocation). A function's prologue checks its frame against it, and the
+# allocator checks that sbrk succeeded: running out of either is the "Out of memory" error (exit code 5).
+#
+import functools
+import astree as ast
+from astree import Operator
+import visitor
+import type_visitor
+
+TAG_OBJECT, TAG_INT, TAG_BOOL, TAG_STR, TAG_LIST = 0, 1, 2, 3, -1
+HEADER = 12  # Bytes before the first attribute (or the length of a str/list).
+INT_MIN = -2147483648
+STACK_GUARD = 1024  # Bytes between the heap and the stack, for the values an expression pushes.
+
+
+class Scope:
+    """
+    Compile-time information about the module or a function: the fp offsets of the variables (or the labels of the
+    globals), the names declared global and the nested functions.
+    """
+    def __init__(self, kind: str, parent: "Scope" = None):
+        self.kind = kind
+        self.parent = parent  # The enclosing function scope (None for the module and for top-level functions).
+        self.depth = parent.depth + 1 if parent else (0 if kind == 'module' else 1)
+        self.slots = {}
+        self.globals = set()
+        self.functions = {}
+
+
+class FunctionInfo:
+    """
+    A function or method: its label, scope, defining scope and symbol table (for the signature).
+    """
+    def __init__(self, label: str, node: ast.FuncDefNode, scope: Scope, def_scope: Scope, symtab):
+        self.label = label
+        self.node = node
+        self.scope = scope
+        self.def_scope = def_scope
+        self.symtab = symtab
+        self.signature = type_visitor.TypeVisitor.get_signature(symtab)
+
+
+class ClassInfo:
+    """
+    A class: its type tag, attributes (name, type, initial value) and dispatch table (method name, label),
+    inherited ones first.
+    """
+    def __init__(self, name: str, tag: int, attrs: list, methods: list):
+        self.name = name
+        self.tag = tag
+        self.attrs = attrs
+        self.methods = methods
+
+    def attr_offset(self, name: str) -> int:
+        return HEADER + 4 * [a for a, _, _ in self.attrs].index(name)
+
+    def method_offset(self, name: str) -> int:
+        return 4 * [m for m, _ in self.methods].index(name)
+
+
+def is_unboxed(t: str) -> bool:
+    return t in ('int', 'bool')
+
+
+class RiscVGenerator(visitor.Visitor):
+
+    def __init__(self, t_env):
+        self.t_env = t_env
+        self.st = None  # The symbol table of the current scope.
+        self.module = None
+        self.scope = None
+        self.function = None
+        self.code = []
+        self.data = ['.data']
+        self.strings = {}  # String constant -> label.
+        self.boxed = set()  # Labels of the boxed int constants.
+        self.labels = 0
+        self.classes = {'object': ClassInfo('object', TAG_OBJECT, [], [('__init__', '$object.__init__')])}
+        self.functions = []  # All FunctionInfos, in the order their code is emitted.
+
+    def generate(self, node: ast.ProgramNode) -> str:
+        """
+        Returns the assembly text of the program.
+        """
+        self.visit(node)
+        return '\n'.join(self.code + self.data) + '\n'
+
+    def do_visit(self, node):
+        if node:
+            self.visit(node)
+
+    @functools.singledispatchmethod
+    def visit(self, node):
+        print("Visitor support missing for", type(node))
+        exit()
+
+    ####################################################################################################################
+    # Emission helpers.
+
+    def emit(self, instruction: str):
+        self.code.append('    ' + instruction)
+
+    def label(self, name: str):
+        self.code.append(name + ':')
+
+    def new_label(self) -> str:
+        self.labels += 1
+        return f'label_{self.labels}'
+
+    def push(self, reg: str = 'a0'):
+        self.emit('addi sp, sp, -4')
+        self.emit(f'sw {reg}, 0(sp)')
+
+    def pop(self, reg: str):
+        self.emit(f'lw {reg}, 0(sp)')
+        self.emit('addi sp, sp, 4')
+
+    def string_constant(self, s: str) -> str:
+        if s not in self.strings:
+            self.strings[s] = f'const_{len(self.strings)}'
+        return self.strings[s]
+
+    def load_literal(self, value, t: str, reg: str = 'a0'):
+        """
+        Loads the initial value of a variable or attribute of type t.
+        """
+        if value is None:
+            self.emit(f'mv {reg}, zero')
+        elif isinstance(value, str):
+            self.emit(f'la {reg}, {self.string_constant(value)}')
+        elif is_unboxed(t):
+            self.emit(f'li {reg}, {int(value)}')
+        else:
+            self.emit(f'la {reg}, {self.boxed_constant(value)}')
+
+    def boxed_constant(self, value) -> str:
+        if value is True or value is False:
+            return f'$bool.{value}'
+        label = f'$int.{value}'.replace('-', 'm')
+        if label not in self.boxed:
+            self.boxed.add(label)
+            self.data.extend([f'{label}:', f'    .word {TAG_INT}, 4, $int$dispatchTable, {value}'])
+        return label
+
+    def coerce(self, src: str, dst: str):
+        """
+        Boxes the value in a0 if it is an unboxed int/bool flowing into a location of type dst.
+        """
+        if is_unboxed(src) and not is_unboxed(dst):
+            self.emit('jal rt.box_int' if src == 'int' else 'jal rt.box_bool')
+
+    ####################################################################################################################
+    # Declarations.
+
+    def declare(self, scope: Scope, declarations: list):
+        for d in declarations:
+            if isinstance(d, ast.GlobalDeclNode):
+                scope.globals.add(d.variable.name)
+        for d in declarations:
+            if isinstance(d, ast.FuncDefNode):
+                label = ('$' if scope.kind == 'module' else self.function.label + '.') + d.name.name
+                scope.functions[d.name.name] = self.declare_function(d, label, scope)
+            elif isinstance(d, ast.ClassDefNode):
+                self.declare_class(d)
+
+    def declare_function(self, node: ast.FuncDefNode, label: str, def_scope: Scope) -> FunctionInfo:
+        self.t_env.enter_scope(node.name.name)
+        scope = Scope('function', def_scope if def_scope.kind == 'function' else None)
+        n = len(node.params)
+        for i, p in enumerate(node.params):
+            scope.slots[p.identifier.name] = 4 * (n - i)
+        locals_ = [d for d in node.declarations if isinstance(d, ast.VarDefNode)]
+        for j, d in enumerate(locals_):
+            scope.slots[d.var.identifier.name] = -12 - 4 * j
+        info = FunctionInfo(label, node, scope, def_scope, self.t_env.get_scope_symbol_table())
+        self.functions.append(info)
+        saved, self.function = self.function, info
+        self.declare(scope, node.declarations)
+        self.function = saved
+        self.t_env.exit_scope()
+        return info
+
+    def declare_class(self, node: ast.ClassDefNode):
+        name = node.name.name
+        base = self.classes[node.super_class.name]
+        attrs, methods = list(base.attrs), list(base.methods)
+        self.t_env.enter_scope(name)
+        class_st = self.t_env.get_scope_symbol_table()
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                a = d.var.identifier.name
+                attrs.append((a, class_st.lookup(a).get_type_str(), d.value.get_value()))
+            elif isinstance(d, ast.FuncDefNode):
+                label = f'${name}.{d.name.name}'
+                self.declare_function(d, label, self.module)
+                names = [m for m, _ in methods]
+                if d.name.name in names:
+                    methods[names.index(d.name.name)] = (d.name.name, label)
+                else:
+                    methods.append((d.name.name, label))
+        self.t_env.exit_scope()
+        self.classes[name] = ClassInfo(name, len(self.classes) + TAG_STR, attrs, methods)
+
+    def emit_class_data(self, c: ClassInfo):
+        self.data.append(f'${c.name}$prototype:')
+        self.data.append(f'    .word {c.tag}, {3 + len(c.attrs)}, ${c.name}$dispatchTable')
+        for a, t, v in c.attrs:
+            if v is None:
+                self.data.append('    .word 0')
+            elif isinstance(v, str):
+                self.data.append(f'    .word {self.string_constant(v)}')
+            elif is_unboxed(t):
+                self.data.append(f'    .word {int(v)}')
+            else:
+                self.data.append(f'    .word {self.boxed_constant(v)}')
+        self.data.append(f'${c.name}$dispatchTable:')
+        self.data.append('    .word ' + ', '.join(label for _, label in c.methods))
+
+    ####################################################################################################################
+    # Names.
+
+    def resolve(self, name: str):
+        """
+        Returns ('global', label) or (hops, offset): the number of static links to follow and the fp offset.
+        """
+        scope = self.scope
+        if scope.kind == 'function' and name not in scope.globals:
+            hops = 0
+            while scope:
+                if name in scope.slots:
+                    return hops, scope.slots[name]
+                scope, hops = scope.parent, hops + 1
+        return 'global', '$' + name
+
+    def frame_of(self, hops: int, reg: str = 't0') -> str:
+        """
+        Emits code loading the frame pointer of the function hops static links up into reg, returns its register.
+        """
+        if hops == 0:
+            return 'fp'
+        self.emit(f'lw {reg}, 0(fp)')
+        for _ in range(hops - 1):
+            self.emit(f'lw {reg}, 0({reg})')
+        return reg
+
+    def load_var(self, name: str):
+        where, pos = self.resolve(name)
+        if where == 'global':
+            self.emit(f'la t0, {pos}')
+            self.emit('lw a0, 0(t0)')
+        else:
+            self.emit(f'lw a0, {pos}({self.frame_of(where)})')
+
+    def store_var(self, name: str):
+        where, pos = self.resolve(name)
+        if where == 'global':
+            self.emit(f'la t0, {pos}')
+            self.emit('sw a0, 0(t0)')
+        else:
+            self.emit(f'sw a0, {pos}({self.frame_of(where)})')
+
+    def var_type(self, name: str) -> str:
+        return self.st.lookup(name).get_type_str()
+
+    def lookup_function(self, name: str):
+        scope = self.scope if self.scope.kind == 'function' else None
+        while scope:
+            if name in scope.functions:
+                return scope.functions[name]
+            scope = scope.parent
+        return self.module.functions.get(name)
+
+    ####################################################################################################################
+    # Program and functions.
+
+    @visit.register
+    def _(self, node: ast.ProgramNode):
+        self.module = self.scope = Scope('module')
+        self.st = self.t_env.get_symbol_table()
+        self.declare(self.module, node.declarations)
+
+        self.code.extend([f'.equiv STACK_GUARD, {STACK_GUARD}', '.text', '.globl main', 'main:'])
+        self.emit('mv fp, sp')
+        self.emit('li a0, 9')
+        self.emit('mv a1, zero')
+        self.emit('ecall')
+        self.emit('addi gp, a0, STACK_GUARD')
+        self.block(node.statements)
+        self.emit('li a0, 10')
+        self.emit('ecall')
+        for f in self.functions:
+            self.function_body(f)
+        self.code.append(RUNTIME)
+        self.st = self.t_env.get_symbol_table()
+
+        for d in node.declarations:
+            if isinstance(d, ast.VarDefNode):
+                name = d.var.identifier.name
+                t, v = self.st.lookup(name).get_type_str(), d.value.get_value()
+                if v is None:
+                    init = '0'
+                elif isinstance(v, str):
+                    init = self.string_constant(v)
+                elif is_unboxed(t):
+                    init = str(int(v))
+                else:
+                    init = self.boxed_constant(v)
+                self.data.extend([f'${name}:', f'    .word {init}'])
+        for c in self.classes.values():
+            if c.name != 'object':
+                self.emit_class_data(c)
+        self.data.append(RUNTIME_DATA)
+        for s, label in self.strings.items():
+            size = 4 + (len(s) + 4) // 4
+            escaped = s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t')
+            self.data.extend([f'{label}:', f'    .word {TAG_STR}, {size}, $str$dispatchTable, {len(s)}',
+                              f'    .string "{escaped}"', '    .align 2'])
+
+    def function_body(self, f: FunctionInfo):
+        node = f.node
+        self.scope, self.st, self.function = f.scope, f.symtab, f
+        locals_ = [d for d in node.declarations if isinstance(d, ast.VarDefNode)]
+        size = 8 + 4 * len(locals_)
+        self.label(f.label)
+        self.emit(f'addi sp, sp, -{size}')
+        self.emit('bltu sp, gp, rt.error_memory')
+        self.emit(f'sw ra, {size - 4}(sp)')
+        self.emit(f'sw fp, {size - 8}(sp)')
+        self.emit(f'addi fp, sp, {size}')
+        for d in locals_:
+            name = d.var.identifier.name
+            self.load_literal(d.value.get_value(), self.var_type(name))
+            self.emit(f'sw a0, {f.scope.slots[name]}(fp)')
+        self.block(node.statements)
+        self.emit('mv a0, zero')
+        self.label(f.label + '$return')
+        self.emit('lw ra, -4(fp)')
+        self.emit('mv t0, fp')
+        self.emit('lw fp, -8(fp)')
+        self.emit('mv sp, t0')
+        self.emit('jr ra')
+
+    ####################################################################################################################
+    # Statements.
+
+    def block(self, statements: list):
+        for s in statements:
+            self.visit(s)
+
+    @visit.register
+    def _(self, node: ast.PassStmtNode):
+        pass
+
+    @visit.register
+    def _(self, node: ast.ReturnStmtNode):
+        if node.expr is None:
+            self.emit('mv a0, zero')
+        else:
+            self.visit(node.expr)
+            self.coerce(node.expr.get_type_str(), self.function.signature.return_type)
+        self.emit(f'j {self.function.label}$return')
+
+    @visit.register
+    def _(self, node: ast.AssignStmtNode):
+        src = node.expr.get_type_str()
+        self.visit(node.expr)
+        self.push()
+        for t in node.targets:
+            dst = t.get_type_str()
+            if isinstance(t, ast.IdentifierExprNode):
+                self.emit('lw a0, 0(sp)')
+                self.coerce(src, dst)
+                self.store_var(t.identifier.name)
+            elif isinstance(t, ast.MemberExprNode):
+                self.visit(t.expr_object)
+                self.push()
+                self.emit('lw a0, 4(sp)')
+                self.coerce(src, dst)
+                self.pop('t0')
+                self.emit('beqz t0, rt.error_none')
+                offset = self.classes[t.expr_object.get_type_str()].attr_offset(t.member.name)
+                self.emit(f'sw a0, {offset}(t0)')
+            else:
+                self.visit(t.list_expr)
+                self.push()
+                self.visit(t.index)
+                self.push()
+                self.emit('lw a0, 8(sp)')
+                self.coerce(src, dst)
+                self.pop('t1')
+                self.pop('t0')
+                self.emit('beqz t0, rt.error_none')
+                self.emit('bltz t1, rt.error_oob')
+                self.emit('lw t2, 12(t0)')
+                self.emit('bge t1, t2, rt.error_oob')
+                self.emit('slli t1, t1, 2')
+                self.emit('add t1, t1, t0')
+                self.emit('sw a0, 16(t1)')
+        self.emit('addi sp, sp, 4')
+
+    @visit.register
+    def _(self, node: ast.IfStmtNode):
+        end = self.new_label()
+        for cond, body in [(node.condition, node.then_body)] + node.elifs:
+            skip = self.new_label()
+            self.visit(cond)
+            self.emit(f'beqz a0, {skip}')
+            self.block(body)
+            self.emit(f'j {end}')
+            self.label(skip)
+        self.block(node.else_body)
+        self.label(end)
+
+    @visit.register
+    def _(self, node: ast.WhileStmtNode):
+        start, end = self.new_label(), self.new_label()
+        self.label(start)
+        self.visit(node.condition)
+        self.emit(f'beqz a0, {end}')
+        self.block(node.body)
+        self.emit(f'j {start}')
+        self.label(end)
+
+    @visit.register
+    def _(self, node: ast.ForStmtNode):
+        # The iterated value and the next index are kept on the stack.
+        start, end = self.new_label(), self.new_label()
+        is_str = node.iterable.get_type_str() == 'str'
+        self.visit(node.iterable)
+        self.emit('beqz a0, rt.error_none')
+        self.push()
+        self.push('zero')
+        self.label(start)
+        self.emit('lw t0, 4(sp)')
+        self.emit('lw t1, 0(sp)')
+        self.emit('lw t2, 12(t0)')
+        self.emit(f'bge t1, t2, {end}')
+        self.emit('addi t2, t1, 1')
+        self.emit('sw t2, 0(sp)')
+        if is_str:
+            self.emit('mv a0, t0')
+            self.emit('mv a1, t1')
+            self.emit('jal rt.str_index')
+        else:
+            self.emit('slli t1, t1, 2')
+            self.emit('add t1, t1, t0')
+            self.emit('lw a0, 16(t1)')
+            elem = node.iterable.get_type_str()[1:-1]
+            self.coerce(elem, self.var_type(node.identifier.name))
+        self.store_var(node.identifier.name)
+        self.block(node.body)
+        self.emit(f'j {start}')
+        self.label(end)
+        self.emit('addi sp, sp, 8')
+
+    ####################################################################################################################
+    # Expressions.
+
+    @visit.register
+    def _(self, node: ast.LiteralExprNode):
+        v = node.get_value()
+        if v is None:
+            self.emit('mv a0, zero')
+        elif isinstance(v, str):
+            self.emit(f'la a0, {self.string_constant(v)}')
+        else:
+            self.emit(f'li a0, {int(v)}')
+
+    @visit.register
+    def _(self, node: ast.IdentifierExprNode):
+        self.load_var(node.identifier.name)
+
+    @visit.register
+    def _(self, node: ast.UnaryOpExprNode):
+        self.visit(node.operand)
+        if node.op == Operator.Not:
+            self.emit('seqz a0, a0')
+        else:
+            self.emit(f'li t0, {INT_MIN}')
+            self.emit('beq a0, t0, rt.error_overflow')
+            self.emit('neg a0, a0')
+
+    @visit.register
+    def _(self, node: ast.BinaryOpExprNode):
+        if node.op in (Operator.And, Operator.Or):
+            end = self.new_label()
+            self.visit(node.lhs)
+            self.emit(f'{"beqz" if node.op == Operator.And else "bnez"} a0, {end}')
+            self.visit(node.rhs)
+            self.label(end)
+            return
+        self.visit(node.lhs)
+        self.push()
+        self.visit(node.rhs)
+        self.pop('t0')
+        t = node.lhs.get_type_str()
+        op = node.op
+        if op == Operator.Is:
+            self.emit('sub a0, t0, a0')
+            self.emit('seqz a0, a0')
+        elif op in (Operator.Eq, Operator.NotEq):
+            if t == 'str':
+                self.emit('mv a1, a0')
+                self.emit('mv a0, t0')
+                self.emit('jal rt.str_eq')
+            else:
+                self.emit('sub a0, t0, a0')
+                self.emit('seqz a0, a0')
+            if op == Operator.NotEq:
+                self.emit('xori a0, a0, 1')
+        elif op == Operator.Lt:
+            self.emit('slt a0, t0, a0')
+        elif op == Operator.Gt:
+            self.emit('slt a0, a0, t0')
+        elif op == Operator.LtEq:
+            self.emit('slt a0, a0, t0')
+            self.emit('xori a0, a0, 1')
+        elif op == Operator.GtEq:
+            self.emit('slt a0, t0, a0')
+            self.emit('xori a0, a0, 1')
+        elif t == 'str':
+            self.emit('mv a1, a0')
+            self.emit('mv a0, t0')
+            self.emit('jal rt.str_concat')
+        elif t != 'int':
+            self.emit('mv a1, a0')
+            self.emit('mv a0, t0')
+            self.emit('jal rt.list_concat')
+        elif op == Operator.Plus:
+            self.emit('add t1, t0, a0')
+            self.emit('slti t2, a0, 0')
+            self.emit('slt t3, t1, t0')
+            self.emit('bne t2, t3, rt.error_overflow')
+            self.emit('mv a0, t1')
+        elif op == Operator.Minus:
+            self.emit('sub t1, t0, a0')
+            self.emit('sgtz t2, a0')
+            self.emit('slt t3, t1, t0')
+            self.emit('bne t2, t3, rt.error_overflow')
+            self.emit('mv a0, t1')
+        elif op == Operator.Mult:
+            self.emit('mul t1, t0, a0')
+            self.emit('mulh t2, t0, a0')
+            self.emit('srai t3, t1, 31')
+            self.emit('bne t2, t3, rt.error_overflow')
+            self.emit('mv a0, t1')
+        elif op == Operator.IntDivide:
+            self.emit('jal rt.int_div')
+        else:
+            self.emit('jal rt.int_mod')
+
+    @visit.register
+    def _(self, node: ast.IfExprNode):
+        other, end = self.new_label(), self.new_label()
+        self.visit(node.condition)
+        self.emit(f'beqz a0, {other}')
+        self.visit(node.then_expr)
+        self.coerce(node.then_expr.get_type_str(), node.get_type_str())
+        self.emit(f'j {end}')
+        self.label(other)
+        self.visit(node.else_expr)
+        self.coerce(node.else_expr.get_type_str(), node.get_type_str())
+        self.label(end)
+
+    @visit.register
+    def _(self, node: ast.IndexExprNode):
+        self.visit(node.list_expr)
+        self.push()
+        self.visit(node.index)
+        self.emit('mv a1, a0')
+        self.pop('a0')
+        if node.list_expr.get_type_str() == 'str':
+            self.emit('jal rt.str_index')
+            return
+        self.emit('beqz a0, rt.error_none')
+        self.emit('bltz a1, rt.error_oob')
+        self.emit('lw t0, 12(a0)')
+        self.emit('bge a1, t0, rt.error_oob')
+        self.emit('slli a1, a1, 2')
+        self.emit('add a0, a0, a1')
+        self.emit('lw a0, 16(a0)')
+
+    @visit.register
+    def _(self, node: ast.MemberExprNode):
+        self.visit(node.expr_object)
+        self.emit('beqz a0, rt.error_none')
+        offset = self.classes[node.expr_object.get_type_str()].attr_offset(node.member.name)
+        self.emit(f'lw a0, {offset}(a0)')
+
+    @visit.register
+    def _(self, node: ast.ListExprNode):
+        elem = node.get_type_str()[1:-1]
+        n = len(node.elements)
+        for e in node.elements:
+            self.visit(e)
+            self.coerce(e.get_type_str(), elem)
+            self.push()
+        self.emit('la a0, $.list$prototype')
+        self.emit(f'li a1, {4 + n}')
+        self.emit('jal rt.alloc2')
+        self.emit(f'li t0, {n}')
+        self.emit('sw t0, 12(a0)')
+        for k in range(n):
+            self.emit(f'lw t0, {4 * (n - 1 - k)}(sp)')
+            self.emit(f'sw t0, {16 + 4 * k}(a0)')
+        if n:
+            self.emit(f'addi sp, sp, {4 * n}')
+
+    def push_args(self, args: list, types: list):
+        for a, t in zip(args, types):
+            self.visit(a)
+            self.coerce(a.get_type_str(), t)
+            self.push()
+
+    @visit.register
+    def _(self, node: ast.MethodCallExprNode):
+        cls = node.member.expr_object.get_type_str()
+        name = node.member.member.name
+        signature = type_visitor.TypeVisitor.get_signature(self.t_env.get_method_symbol_table(cls, name))
+        self.visit(node.member.expr_object)
+        self.push()
+        self.push_args(node.args, signature.args_type[1:])
+        self.push('zero')
+        n = len(node.args)
+        self.emit(f'lw a0, {4 * (n + 1)}(sp)')
+        self.emit('beqz a0, rt.error_none')
+        self.emit('lw t0, 8(a0)')
+        self.emit(f'lw t0, {self.classes[cls].method_offset(name)}(t0)')
+        self.emit('jalr t0')
+        self.emit(f'addi sp, sp, {4 * (n + 2)}')
+
+    @visit.register
+    def _(self, node: ast.FunctionCallExprNode):
+        name = node.identifier.name
+        if f := self.lookup_function(name):
+            self.push_args(node.args, f.signature.args_type)
+            if f.def_scope.kind == 'function':
+                self.push(self.frame_of(self.scope.depth - f.def_scope.depth))
+            else:
+                self.push('zero')
+            self.emit(f'jal {f.label}')
+            self.emit(f'addi sp, sp, {4 * (len(node.args) + 1)}')
+        elif name in self.classes:
+            self.emit(f'la a0, ${name}$prototype')
+            self.emit('jal rt.alloc')
+            if name != 'object':
+                self.push()
+                self.push('zero')
+                self.emit('lw t0, 8(a0)')
+                self.emit('lw t0, 0(t0)')
+                self.emit('jalr t0')
+                self.emit('lw a0, 4(sp)')
+                self.emit('addi sp, sp, 8')
+        elif name == 'input':
+            self.emit('jal rt.input')
+        else:
+            arg = node.args[0]
+            t = arg.get_type_str()
+            self.visit(arg)
+            if name == 'len':
+                if t == 'str':
+                    self.emit('lw a0, 12(a0)')
+                elif t.startswith('['):
+                    self.emit('beqz a0, rt.error_arg')
+                    self.emit('lw a0, 12(a0)')
+                else:
+                    self.emit('jal rt.len')
+            else:
+                self.emit({'int': 'jal rt.print_int', 'bool': 'jal rt.print_bool',
+                           'str': 'jal rt.print_str'}.get(t, 'jal rt.print'))
+
+
+# The run-time library. Routines take their arguments in a0/a1, return in a0 and may clobber the t registers.
+RUNTIME = r"""
+$object.__init__:
+    mv a0, zero
+    jr ra
+
+# a0: prototype. Returns a copy of it.
+rt.alloc:
+    lw a1, 4(a0)
+# a0: prototype, a1: size in words. Returns an object with the header of the prototype and a1 words, where the
+# words after the header are copied from the prototype (as far as it has them) or zero.
+rt.alloc2:
+    mv t0, a0
+    mv t2, a1
+    slli a1, a1, 2
+    li a0, 9
+    ecall
+    bltz a0, rt.error_memory
+    add gp, a0, a1
+    addi gp, gp, STACK_GUARD
+    lw t1, 0(t0)
+    sw t1, 0(a0)
+    sw t2, 4(a0)
+    lw t1, 8(t0)
+    sw t1, 8(a0)
+    lw t3, 4(t0)
+    li t4, 3
+rt.alloc_copy:
+    bge t4, t3, rt.alloc_done
+    bge t4, t2, rt.alloc_done
+    slli t5, t4, 2
+    add t6, t0, t5
+    lw t1, 0(t6)
+    add t6, a0, t5
+    sw t1, 0(t6)
+    addi t4, t4, 1
+    j rt.alloc_copy
+rt.alloc_done:
+    jr ra
+
+rt.box_int:
+    addi sp, sp, -8
+    sw ra, 4(sp)
+    sw a0, 0(sp)
+    la a0, $int$prototype
+    jal rt.alloc
+    lw t0, 0(sp)
+    sw t0, 12(a0)
+    lw ra, 4(sp)
+    addi sp, sp, 8
+    jr ra
+
+rt.box_bool:
+    mv t0, a0
+    la a0, $bool.False
+    beqz t0, rt.box_bool_done
+    la a0, $bool.True
+rt.box_bool_done:
+    jr ra
+
+# Floor division and modulo of a0 by a1 with the ChocoPy (and Python) rounding; t0 is the dividend, a0 the divisor.
+rt.int_div:
+    beqz a0, rt.error_div
+    li t2, -1
+    bne a0, t2, rt.int_div_ok
+    li t2, -2147483648
+    beq t0, t2, rt.error_overflow
+rt.int_div_ok:
+    div t1, t0, a0
+    rem t2, t0, a0
+    beqz t2, rt.int_div_done
+    xor t3, t2, a0
+    bgez t3, rt.int_div_done
+    addi t1, t1, -1
+rt.int_div_done:
+    mv a0, t1
+    jr ra
+
+rt.int_mod:
+    beqz a0, rt.error_div
+    rem t1, t0, a0
+    beqz t1, rt.int_mod_done
+    xor t3, t1, a0
+    bgez t3, rt.int_mod_done
+    add t1, t1, a0
+rt.int_mod_done:
+    mv a0, t1
+    jr ra
+
+rt.print_int:
+    mv a1, a0
+    li a0, 1
+    ecall
+    j rt.print_newline
+rt.print_bool:
+    la a1, rt.text_true
+    bnez a0, rt.print_text
+    la a1, rt.text_false
+    j rt.print_text
+rt.print_str:
+    addi a1, a0, 16
+rt.print_text:
+    li a0, 4
+    ecall
+rt.print_newline:
+    li a0, 11
+    li a1, 10
+    ecall
+    mv a0, zero
+    jr ra
+# a0: a boxed value or None.
+rt.print:
+    beqz a0, rt.error_arg
+    lw t0, 0(a0)
+    li t1, 3
+    beq t0, t1, rt.print_str
+    lw t2, 12(a0)
+    li t1, 1
+    bne t0, t1, rt.print_1
+    mv a0, t2
+    j rt.print_int
+rt.print_1:
+    li t1, 2
+    bne t0, t1, rt.error_arg
+    mv a0, t2
+    j rt.print_bool
+
+rt.len:
+    beqz a0, rt.error_arg
+    lw t0, 0(a0)
+    li t1, 3
+    beq t0, t1, rt.len_ok
+    li t1, -1
+    bne t0, t1, rt.error_arg
+rt.len_ok:
+    lw a0, 12(a0)
+    jr ra
+
+# Reads a line (without the newline) into a new str; the characters are pushed on the stack until the length is known.
+rt.input:
+    addi sp, sp, -8
+    sw ra, 4(sp)
+    sw fp, 0(sp)
+    mv fp, sp
+    li a2, 0
+rt.input_read:
+    li a0, 12
+    ecall
+    bltz a0, rt.input_alloc
+    li t1, 10
+    beq a0, t1, rt.input_alloc
+    addi sp, sp, -4
+    sw a0, 0(sp)
+    addi a2, a2, 1
+    j rt.input_read
+rt.input_alloc:
+    addi a1, a2, 4
+    srli a1, a1, 2
+    addi a1, a1, 4
+    la a0, $str$prototype
+    jal rt.alloc2
+    sw a2, 12(a0)
+    addi t0, a0, 16
+    add t0, t0, a2
+    mv t1, sp
+rt.input_copy:
+    beqz a2, rt.input_done
+    addi t0, t0, -1
+    lw t2, 0(t1)
+    sb t2, 0(t0)
+    addi t1, t1, 4
+    addi a2, a2, -1
+    j rt.input_copy
+rt.input_done:
+    mv sp, fp
+    lw ra, 4(sp)
+    lw fp, 0(sp)
+    addi sp, sp, 8
+    jr ra
+
+# Copies a2 bytes from a1 to a0; returns a0 advanced past them.
+rt.copy_bytes:
+    beqz a2, rt.copy_bytes_done
+    lbu t0, 0(a1)
+    sb t0, 0(a0)
+    addi a0, a0, 1
+    addi a1, a1, 1
+    addi a2, a2, -1
+    j rt.copy_bytes
+rt.copy_bytes_done:
+    jr ra
+
+rt.str_concat:
+    addi sp, sp, -12
+    sw ra, 8(sp)
+    sw a0, 4(sp)
+    sw a1, 0(sp)
+    lw t0, 12(a0)
+    lw t1, 12(a1)
+    add a2, t0, t1
+    addi a1, a2, 4
+    srli a1, a1, 2
+    addi a1, a1, 4
+    la a0, $str$prototype
+    jal rt.alloc2
+    sw a2, 12(a0)
+    mv a3, a0
+    addi a0, a0, 16
+    lw t0, 4(sp)
+    lw a2, 12(t0)
+    addi a1, t0, 16
+    jal rt.copy_bytes
+    lw t0, 0(sp)
+    lw a2, 12(t0)
+    addi a1, t0, 16
+    jal rt.copy_bytes
+    mv a0, a3
+    lw ra, 8(sp)
+    addi sp, sp, 12
+    jr ra
+
+rt.str_eq:
+    lw t0, 12(a0)
+    lw t1, 12(a1)
+    bne t0, t1, rt.str_eq_false
+    addi a0, a0, 16
+    addi a1, a1, 16
+rt.str_eq_loop:
+    beqz t0, rt.str_eq_true
+    lbu t2, 0(a0)
+    lbu t3, 0(a1)
+    bne t2, t3, rt.str_eq_false
+    addi a0, a0, 1
+    addi a1, a1, 1
+    addi t0, t0, -1
+    j rt.str_eq_loop
+rt.str_eq_true:
+    li a0, 1
+    jr ra
+rt.str_eq_false:
+    mv a0, zero
+    jr ra
+
+# a0: str, a1: index. Returns a new one-character str.
+rt.str_index:
+    bltz a1, rt.error_oob
+    lw t0, 12(a0)
+    bge a1, t0, rt.error_oob
+    add t0, a0, a1
+    lbu a2, 16(t0)
+    addi sp, sp, -4
+    sw ra, 0(sp)
+    la a0, $str$prototype
+    li a1, 5
+    jal rt.alloc2
+    li t0, 1
+    sw t0, 12(a0)
+    sb a2, 16(a0)
+    lw ra, 0(sp)
+    addi sp, sp, 4
+    jr ra
+
+rt.list_concat:
+    beqz a0, rt.error_none
+    beqz a1, rt.error_none
+    addi sp, sp, -12
+    sw ra, 8(sp)
+    sw a0, 4(sp)
+    sw a1, 0(sp)
+    lw t0, 12(a0)
+    lw t1, 12(a1)
+    add a2, t0, t1
+    addi a1, a2, 4
+    la a0, $.list$prototype
+    jal rt.alloc2
+    sw a2, 12(a0)
+    addi a3, a0, 16
+    lw t0, 4(sp)
+    jal rt.list_concat_copy
+    lw t0, 0(sp)
+    jal rt.list_concat_copy
+    lw ra, 8(sp)
+    addi sp, sp, 12
+    jr ra
+# Copies the elements of the list t0 to a3 (advanced past them).
+rt.list_concat_copy:
+    lw t1, 12(t0)
+    addi t0, t0, 16
+rt.list_concat_loop:
+    beqz t1, rt.list_concat_done
+    lw t2, 0(t0)
+    sw t2, 0(a3)
+    addi t0, t0, 4
+    addi a3, a3, 4
+    addi t1, t1, -1
+    j rt.list_concat_loop
+rt.list_concat_done:
+    jr ra
+
+rt.error_arg:
+    la a1, rt.text_arg
+    li a2, 1
+    j rt.abort
+rt.error_div:
+    la a1, rt.text_div
+    li a2, 2
+    j rt.abort
+rt.error_oob:
+    la a1, rt.text_oob
+    li a2, 3
+    j rt.abort
+rt.error_none:
+    la a1, rt.text_none
+    li a2, 4
+    j rt.abort
+rt.error_memory:
+    la a1, rt.text_memory
+    li a2, 5
+    j rt.abort
+rt.error_overflow:
+    la a1, rt.text_overflow
+    li a2, 6
+# Prints the message a1 and exits with code a2.
+rt.abort:
+    li a0, 4
+    ecall
+    li a0, 11
+    li a1, 10
+    ecall
+    li a0, 17
+    mv a1, a2
+    ecall
+"""
+
+RUNTIME_DATA = r"""$object$prototype:
+    .word 0, 3, $object$dispatchTable
+$object$dispatchTable:
+    .word $object.__init__
+$int$prototype:
+    .word 1, 4, $int$dispatchTable, 0
+$int$dispatchTable:
+    .word $object.__init__
+$bool$prototype:
+    .word 2, 4, $bool$dispatchTable, 0
+$bool$dispatchTable:
+    .word $object.__init__
+$bool.False:
+    .word 2, 4, $bool$dispatchTable, 0
+$bool.True:
+    .word 2, 4, $bool$dispatchTable, 1
+$str$prototype:
+    .word 3, 5, $str$dispatchTable, 0, 0
+$str$dispatchTable:
+    .word $object.__init__
+$.list$prototype:
+    .word -1, 4, $.list$dispatchTable, 0
+$.list$dispatchTable:
+    .word $object.__init__
+rt.text_true:
+    .string "True"
+rt.text_false:
+    .string "False"
+rt.text_arg:
+    .string "Invalid argument"
+rt.text_div:
+    .string "Division by zero"
+rt.text_oob:
+    .string "Index out of bounds"
+rt.text_none:
+    .string "Operation on None"
+rt.text_memory:
+    .string "Out of memory"
+rt.text_overflow:
+    .string "Integer overflow"
+    .align 2"""
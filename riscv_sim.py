@@ -0,0 +1,683 @@
+#
+# RV32IM assembler and simulator. Version 1.0
+#
+# A small, pure-Python toolchain to run the output of the RISC-V backend offline. The assembler takes GNU-style
+# assembly (.text/.data sections, labels, .word/.string/.byte/.space/.align/.equiv directives and the usual
+# pseudo-instructions), encodes real RV32IM machine words and relaxes out-of-range conditional branches.
+# The simulator decodes each instruction word once and runs them with counters for retired instructions and cycles.
+#
+# Environment calls follow the Venus simulator (a0 = call number, a1 = argument):
+#   1 print_int, 4 print_string (NUL-terminated), 9 sbrk (returns the old break, or -1 if the heap would come within
+#   4 KB of the stack; memory is zeroed), 10 exit, 11 print_char, 12 read_char (returns -1 at end of input),
+#   17 exit with code a1.
+#
+import re
+import sys
+
+TEXT_BASE = 0x1000  # Addresses below are the null page: accessing them faults.
+MEMORY_SIZE = 64 * 1024 * 1024
+
+REGISTERS = {'zero': 0, 'ra': 1, 'sp': 2, 'gp': 3, 'tp': 4, 't0': 5, 't1': 6, 't2': 7, 's0': 8, 'fp': 8, 's1': 9,
+             **{f'a{i}': 10 + i for i in range(8)}, **{f's{i}': 16 + i for i in range(2, 12)},
+             **{f't{i}': 25 + i for i in range(3, 7)}, **{f'x{i}': i for i in range(32)}}
+
+CSRS = {'cycle': 0xC00, 'time': 0xC01, 'instret': 0xC02}
+
+# Encodings: (format, opcode, funct3, funct7).
+INSTRUCTIONS = {
+    'lui': ('U', 0x37, 0, 0), 'auipc': ('U', 0x17, 0, 0), 'jal': ('J', 0x6F, 0, 0), 'jalr': ('I', 0x67, 0, 0),
+    'beq': ('B', 0x63, 0, 0), 'bne': ('B', 0x63, 1, 0), 'blt': ('B', 0x63, 4, 0), 'bge': ('B', 0x63, 5, 0),
+    'bltu': ('B', 0x63, 6, 0), 'bgeu': ('B', 0x63, 7, 0),
+    'lb': ('L', 0x03, 0, 0), 'lh': ('L', 0x03, 1, 0), 'lw': ('L', 0x03, 2, 0), 'lbu': ('L', 0x03, 4, 0),
+    'lhu': ('L', 0x03, 5, 0), 'sb': ('S', 0x23, 0, 0), 'sh': ('S', 0x23, 1, 0), 'sw': ('S', 0x23, 2, 0),
+    'addi': ('I', 0x13, 0, 0), 'slti': ('I', 0x13, 2, 0), 'sltiu': ('I', 0x13, 3, 0), 'xori': ('I', 0x13, 4, 0),
+    'ori': ('I', 0x13, 6, 0), 'andi': ('I', 0x13, 7, 0),
+    'slli': ('SH', 0x13, 1, 0), 'srli': ('SH', 0x13, 5, 0), 'srai': ('SH', 0x13, 5, 0x20),
+    'add': ('R', 0x33, 0, 0), 'sub': ('R', 0x33, 0, 0x20), 'sll': ('R', 0x33, 1, 0), 'slt': ('R', 0x33, 2, 0),
+    'sltu': ('R', 0x33, 3, 0), 'xor': ('R', 0x33, 4, 0), 'srl': ('R', 0x33, 5, 0), 'sra': ('R', 0x33, 5, 0x20),
+    'or': ('R', 0x33, 6, 0), 'and': ('R', 0x33, 7, 0),
+    'mul': ('R', 0x33, 0, 1), 'mulh': ('R', 0x33, 1, 1), 'mulhsu': ('R', 0x33, 2, 1), 'mulhu': ('R', 0x33, 3, 1),
+    'div': ('R', 0x33, 4, 1), 'divu': ('R', 0x33, 5, 1), 'rem': ('R', 0x33, 6, 1), 'remu': ('R', 0x33, 7, 1),
+    'ecall': ('E', 0x73, 0, 0), 'csrrs': ('C', 0x73, 2, 0),
+}
+
+BRANCH_INVERSE = {'beq': 'bne', 'bne': 'beq', 'blt': 'bge', 'bge': 'blt', 'bltu': 'bgeu', 'bgeu': 'bltu'}
+
+
+class AssemblerError(Exception):
+    def __init__(self, message, line=None):
+        self.message = message if line is None else f"line {line}: {message}"
+        super().__init__(self.message)
+
+
+class SimulatorError(Exception):
+    """
+    A machine fault (bad memory access, illegal instruction, ...) or a resource limit being exceeded.
+    """
+    def __init__(self, message, pc):
+        self.message = f"{message} (pc = {pc:#x})"
+        super().__init__(self.message)
+
+
+class Image:
+    """
+    An assembled program: the bytes of the text and data sections, their base addresses and the symbols.
+    """
+    def __init__(self, text: bytes, data: bytes, data_base: int, symbols: dict, entry: int):
+        self.text = text
+        self.data = data
+        self.text_base = TEXT_BASE
+        self.data_base = data_base
+        self.symbols = symbols
+        self.entry = entry
+
+
+########################################################################################################################
+# Assembler.
+
+def fits(v: int, bits: int) -> bool:
+    return -(1 << (bits - 1)) <= v < (1 << (bits - 1))
+
+
+def hi_lo(v: int):
+    """
+    Splits v into the (upper 20 bits, lower 12 bits) pair of lui/auipc + addi, where the lower part is signed.
+    """
+    lo = ((v & 0xFFF) ^ 0x800) - 0x800
+    return ((v - lo) >> 12) & 0xFFFFF, lo
+
+
+def encode(name: str, rd=0, rs1=0, rs2=0, imm=0) -> int:
+    fmt, opcode, f3, f7 = INSTRUCTIONS[name]
+    if fmt == 'R':
+        return f7 << 25 | rs2 << 20 | rs1 << 15 | f3 << 12 | rd << 7 | opcode
+    if fmt in ('I', 'L'):
+        return (imm & 0xFFF) << 20 | rs1 << 15 | f3 << 12 | rd << 7 | opcode
+    if fmt == 'SH':
+        return f7 << 25 | (imm & 0x1F) << 20 | rs1 << 15 | f3 << 12 | rd << 7 | opcode
+    if fmt == 'S':
+        return (imm >> 5 & 0x7F) << 25 | rs2 << 20 | rs1 << 15 | f3 << 12 | (imm & 0x1F) << 7 | opcode
+    if fmt == 'B':
+        return ((imm >> 12 & 1) << 31 | (imm >> 5 & 0x3F) << 25 | rs2 << 20 | rs1 << 15 | f3 << 12 |
+                (imm >> 1 & 0xF) << 8 | (imm >> 11 & 1) << 7 | opcode)
+    if fmt == 'U':
+        return (imm & 0xFFFFF) << 12 | rd << 7 | opcode
+    if fmt == 'J':
+        return ((imm >> 20 & 1) << 31 | (imm >> 1 & 0x3FF) << 21 | (imm >> 11 & 1) << 20 | (imm >> 12 & 0xFF) << 12 |
+                rd << 7 | opcode)
+    if fmt == 'C':
+        return (imm & 0xFFF) << 20 | rs1 << 15 | f3 << 12 | rd << 7 | opcode
+    return opcode  # ecall
+
+
+class Assembler:
+
+    LABEL = re.compile(r'^([A-Za-z_$.@][\w$.@]*):')
+
+    def __init__(self):
+        self.symbols = {}
+        self.equivs = {}
+        self.long_branches = set()  # Indices of the text items whose branch target is out of range.
+        self.final = False  # Set for the last pass, where all labels must be known.
+
+    def assemble(self, source: str) -> Image:
+        text_items, data_items = self.parse(source)
+        # Lay out the text section until no more branches need relaxing, then the data section after it.
+        while True:
+            addresses, pc = [], TEXT_BASE
+            for i, item in enumerate(text_items):
+                addresses.append(pc)
+                pc += 4 * self.size(i, item)
+            data_base = (pc + 0xFFF) & ~0xFFF
+            self.layout_data(data_items, data_base)
+            self.layout_labels(text_items, addresses)
+            relaxed = False
+            for i, item in enumerate(text_items):
+                if item[0] in BRANCH_INVERSE and i not in self.long_branches and \
+                        not fits(self.value(item[1][2], item[2]) - addresses[i], 13):
+                    self.long_branches.add(i)
+                    relaxed = True
+            if not relaxed:
+                break
+        self.final = True
+        text = bytearray()
+        for i, item in enumerate(text_items):
+            for word in self.encode_item(i, item, addresses[i]):
+                text += (word & 0xFFFFFFFF).to_bytes(4, 'little')
+        data = bytearray()
+        for item in data_items:
+            data += self.data_bytes(item, data_base + len(data))
+        entry = self.symbols.get('main', TEXT_BASE)
+        return Image(bytes(text), bytes(data), data_base, dict(self.symbols), entry)
+
+    # Parsing: text items are (mnemonic, operands, line) with labels as ('label', name, line); data items are
+    # (directive, operands, line).
+
+    def parse(self, source: str):
+        text_items, data_items = [], []
+        items = text_items
+        for n, line in enumerate(source.split('\n'), 1):
+            line = strip_comment(line).strip()
+            while m := self.LABEL.match(line):
+                items.append(('label', m.group(1), n))
+                line = line[m.end():].strip()
+            if not line:
+                continue
+            parts = line.split(None, 1)
+            op, rest = parts[0], parts[1] if len(parts) > 1 else ''
+            if op == '.text':
+                items = text_items
+            elif op == '.data':
+                items = data_items
+            elif op in ('.globl', '.global'):
+                pass
+            elif op in ('.equiv', '.equ', '.set'):
+                name, value = [x.strip() for x in rest.split(',', 1)]
+                self.equivs[name] = self.value(value, n)
+            elif op in ('.string', '.asciiz'):
+                items.append((op, parse_string(rest, n), n))
+            else:
+                operands = split_operands(rest)
+                if pseudo := self.pseudo(op, operands):
+                    op, operands = pseudo
+                items.append((op, operands, n))
+        return text_items, data_items
+
+    def layout_labels(self, text_items, addresses):
+        for i, item in enumerate(text_items):
+            if item[0] == 'label':
+                self.symbols[item[1]] = addresses[i]
+
+    def layout_data(self, data_items, base):
+        addr = base
+        for item in data_items:
+            if item[0] == 'label':
+                self.symbols[item[1]] = addr
+            else:
+                addr += len(self.data_bytes(item, addr, layout=True))
+
+    def data_bytes(self, item, addr, layout=False) -> bytes:
+        op, operands, n = item
+        if op == 'label':
+            return b''
+        if op == '.word':
+            return b''.join(((0 if layout else self.value(v, n)) & 0xFFFFFFFF).to_bytes(4, 'little')
+                            for v in operands)
+        if op == '.byte':
+            return bytes(self.value(v, n) & 0xFF for v in operands)
+        if op in ('.string', '.asciiz'):
+            return operands.encode() + b'\0'
+        if op == '.space':
+            return bytes(self.value(operands[0], n))
+        if op == '.align':
+            align = 1 << self.value(operands[0], n)
+            return bytes(-addr % align)
+        raise AssemblerError(f"unknown directive '{op}'", n)
+
+    def value(self, text: str, line=None) -> int:
+        text = text.strip()
+        if text in self.equivs:
+            return self.equivs[text]
+        if text in self.symbols:
+            return self.symbols[text]
+        try:
+            return int(text, 0)
+        except ValueError:
+            if not self.final and self.LABEL.match(text + ':'):
+                return 0  # A label that is not laid out yet.
+            raise AssemblerError(f"bad value '{text}'", line)
+
+    def register(self, text: str, line) -> int:
+        if text not in REGISTERS:
+            raise AssemblerError(f"unknown register '{text}'", line)
+        return REGISTERS[text]
+
+    def memory_operand(self, text: str, line):
+        m = re.fullmatch(r'(.*)\((\w+)\)', text.strip())
+        if not m:
+            raise AssemblerError(f"bad memory operand '{text}'", line)
+        return self.value(m.group(1) or '0', line), self.register(m.group(2), line)
+
+    # Sizes and encodings of instructions and pseudo-instructions.
+
+    def size(self, i: int, item) -> int:
+        op, operands, n = item
+        if op == 'label':
+            return 0
+        if op == 'li':
+            return 1 if fits(self.value(operands[1], n), 12) else 2
+        if op == 'la':
+            return 2
+        if i in self.long_branches:
+            return 2
+        return 1
+
+    def encode_item(self, i: int, item, pc: int) -> list:
+        op, ops, n = item
+        reg = lambda k: self.register(ops[k], n)
+        val = lambda k: self.value(ops[k], n)
+        if op == 'label':
+            return []
+        if op == 'li':
+            v = val(1)
+            if fits(v, 12):
+                return [encode('addi', reg(0), 0, imm=v)]
+            hi, lo = hi_lo(v & 0xFFFFFFFF)
+            return [encode('lui', reg(0), imm=hi), encode('addi', reg(0), reg(0), imm=lo)]
+        if op == 'la':
+            hi, lo = hi_lo(val(1) - pc)
+            return [encode('auipc', reg(0), imm=hi), encode('addi', reg(0), reg(0), imm=lo)]
+        if op not in INSTRUCTIONS:
+            raise AssemblerError(f"unknown instruction '{op}'", n)
+        fmt = INSTRUCTIONS[op][0]
+        if fmt == 'B':
+            offset = val(2) - pc
+            if i in self.long_branches:
+                return [encode(BRANCH_INVERSE[op], rs1=reg(0), rs2=reg(1), imm=8),
+                        self.jal(0, val(2) - pc - 4, n)]
+            return [encode(op, rs1=reg(0), rs2=reg(1), imm=offset)]
+        if fmt == 'J':
+            return [self.jal(reg(0), val(1) - pc, n)]
+        if fmt == 'R':
+            return [encode(op, reg(0), reg(1), reg(2))]
+        if fmt in ('I', 'SH'):
+            if op == 'jalr' and len(ops) == 2:
+                imm, rs1 = self.memory_operand(ops[1], n)
+                return [encode(op, reg(0), rs1, imm=imm)]
+            return [encode(op, reg(0), reg(1), imm=self.imm12(val(2), n))]
+        if fmt == 'L':
+            imm, rs1 = self.memory_operand(ops[1], n)
+            return [encode(op, reg(0), rs1, imm=self.imm12(imm, n))]
+        if fmt == 'S':
+            imm, rs1 = self.memory_operand(ops[1], n)
+            return [encode(op, rs1=rs1, rs2=reg(0), imm=self.imm12(imm, n))]
+        if fmt == 'U':
+            return [encode(op, reg(0), imm=val(1))]
+        if fmt == 'C':
+            return [encode(op, reg(0), reg(2), imm=CSRS.get(ops[1].strip()) or val(1))]
+        return [encode(op)]
+
+    def imm12(self, v: int, line) -> int:
+        if not fits(v, 12):
+            raise AssemblerError(f"immediate {v} out of range", line)
+        return v
+
+    def jal(self, rd: int, offset: int, line) -> int:
+        if not fits(offset, 21):
+            raise AssemblerError("jump target out of range", line)
+        return encode('jal', rd, imm=offset)
+
+    @staticmethod
+    def pseudo(op: str, ops: list):
+        """
+        Rewrites a pseudo-instruction (other than li and la) as an (instruction, operands) pair, or returns None.
+        """
+        if op == 'nop':
+            return 'addi', ['zero', 'zero', '0']
+        if op == 'mv':
+            return 'addi', [ops[0], ops[1], '0']
+        if op == 'not':
+            return 'xori', [ops[0], ops[1], '-1']
+        if op == 'neg':
+            return 'sub', [ops[0], 'zero', ops[1]]
+        if op == 'seqz':
+            return 'sltiu', [ops[0], ops[1], '1']
+        if op == 'snez':
+            return 'sltu', [ops[0], 'zero', ops[1]]
+        if op == 'sltz':
+            return 'slt', [ops[0], ops[1], 'zero']
+        if op == 'sgtz':
+            return 'slt', [ops[0], 'zero', ops[1]]
+        if op in ('beqz', 'bnez', 'bltz', 'bgez'):
+            return op[:-1], [ops[0], 'zero', ops[1]]
+        if op == 'blez':
+            return 'bge', ['zero', ops[0], ops[1]]
+        if op == 'bgtz':
+            return 'blt', ['zero', ops[0], ops[1]]
+        if op in ('bgt', 'ble', 'bgtu', 'bleu'):
+            return {'bgt': 'blt', 'ble': 'bge', 'bgtu': 'bltu', 'bleu': 'bgeu'}[op], [ops[1], ops[0], ops[2]]
+        if op == 'j':
+            return 'jal', ['zero', ops[0]]
+        if op in ('jal', 'call') and len(ops) == 1:
+            return 'jal', ['ra', ops[0]]
+        if op == 'jr':
+            return 'jalr', ['zero', f'0({ops[0]})']
+        if op == 'jalr' and len(ops) == 1:
+            return 'jalr', ['ra', f'0({ops[0]})']
+        if op == 'ret':
+            return 'jalr', ['zero', '0(ra)']
+        if op in ('rdcycle', 'rdinstret'):
+            return 'csrrs', [ops[0], op[2:], 'zero']
+        if op == 'csrr':
+            return 'csrrs', [ops[0], ops[1], 'zero']
+        return None
+
+
+def strip_comment(line: str) -> str:
+    in_string = False
+    for i, c in enumerate(line):
+        if c == '"' and (i == 0 or line[i - 1] != '\\'):
+            in_string = not in_string
+        elif c == '#' and not in_string:
+            return line[:i]
+    return line
+
+
+def split_operands(text: str) -> list:
+    return [x.strip() for x in text.split(',')] if text.strip() else []
+
+
+def parse_string(text: str, line) -> str:
+    text = text.strip()
+    if len(text) < 2 or text[0] != '"' or text[-1] != '"':
+        raise AssemblerError("bad string literal", line)
+    escapes = {'n': '\n', 't': '\t', '"': '"', '\\': '\\', '0': '\0'}
+    out, i, body = [], 0, text[1:-1]
+    while i < len(body):
+        if body[i] == '\\' and i + 1 < len(body):
+            out.append(escapes.get(body[i + 1], body[i + 1]))
+            i += 2
+        else:
+            out.append(body[i])
+            i += 1
+    return ''.join(out)
+
+
+def assemble(source: str) -> Image:
+    return Assembler().assemble(source)
+
+
+########################################################################################################################
+# Simulator.
+
+# Decoded operations, numbered roughly by frequency for the dispatch chain in Simulator.run.
+(ADDI, LW, SW, ADD, BEQ, BNE, JAL, JALR, LUI, AUIPC, SUB, SLT, SLTU, SLTI, SLTIU, BLT, BGE, BLTU, BGEU, XORI, ORI,
+ ANDI, SLLI, SRLI, SRAI, XOR, OR, AND, SLL, SRL, SRA, MUL, MULH, MULHSU, MULHU, DIV, DIVU, REM, REMU, LB, LH, LBU, LHU,
+ SB, SH, ECALL, CSRRS) = range(47)
+
+# Extra cycles on top of one per instruction: a simple in-order pipeline with a load-use delay, a flush on taken
+# branches and jumps, and multi-cycle multiply and divide units.
+LOAD_CYCLES = 1
+TAKEN_CYCLES = 2
+MUL_CYCLES = 2
+DIV_CYCLES = 32
+
+
+def sign_extend(v: int, bits: int) -> int:
+    return (v & ((1 << bits) - 1)) - ((v >> (bits - 1) & 1) << bits)
+
+
+def decode(word: int):
+    """
+    Decodes an instruction word into an (operation, rd, rs1, rs2, imm) tuple, or None if it is illegal.
+    """
+    opcode, rd, f3 = word & 0x7F, word >> 7 & 0x1F, word >> 12 & 7
+    rs1, rs2, f7 = word >> 15 & 0x1F, word >> 20 & 0x1F, word >> 25
+    i_imm = sign_extend(word >> 20, 12)
+    if opcode == 0x13:
+        if f3 == 1:
+            return SLLI, rd, rs1, 0, rs2
+        if f3 == 5:
+            return (SRAI if f7 == 0x20 else SRLI), rd, rs1, 0, rs2
+        return {0: ADDI, 2: SLTI, 3: SLTIU, 4: XORI, 6: ORI, 7: ANDI}[f3], rd, rs1, 0, i_imm
+    if opcode == 0x33:
+        if f7 == 1:
+            return [MUL, MULH, MULHSU, MULHU, DIV, DIVU, REM, REMU][f3], rd, rs1, rs2, 0
+        if f7 == 0x20:
+            return {0: SUB, 5: SRA}[f3], rd, rs1, rs2, 0
+        return [ADD, SLL, SLT, SLTU, XOR, SRL, OR, AND][f3], rd, rs1, rs2, 0
+    if opcode == 0x03:
+        return {0: LB, 1: LH, 2: LW, 4: LBU, 5: LHU}[f3], rd, rs1, 0, i_imm
+    if opcode == 0x23:
+        imm = sign_extend((word >> 25) << 5 | (word >> 7 & 0x1F), 12)
+        return {0: SB, 1: SH, 2: SW}[f3], 0, rs1, rs2, imm
+    if opcode == 0x63:
+        imm = sign_extend((word >> 31) << 12 | (word >> 7 & 1) << 11 | (word >> 25 & 0x3F) << 5 |
+                          (word >> 8 & 0xF) << 1, 13)
+        return {0: BEQ, 1: BNE, 4: BLT, 5: BGE, 6: BLTU, 7: BGEU}[f3], 0, rs1, rs2, imm
+    if opcode == 0x6F:
+        imm = sign_extend((word >> 31) << 20 | (word >> 12 & 0xFF) << 12 | (word >> 20 & 1) << 11 |
+                          (word >> 21 & 0x3FF) << 1, 21)
+        return JAL, rd, 0, 0, imm
+    if opcode == 0x67:
+        return JALR, rd, rs1, 0, i_imm
+    if opcode == 0x37:
+        return LUI, rd, 0, 0, sign_extend(word & 0xFFFFF000, 32)
+    if opcode == 0x17:
+        return AUIPC, rd, 0, 0, sign_extend(word & 0xFFFFF000, 32)
+    if opcode == 0x73:
+        if f3 == 0:
+            return ECALL, 0, 0, 0, 0
+        if f3 == 2:
+            return CSRRS, rd, rs1, 0, word >> 20
+    return None
+
+
+class Simulator:
+
+    def __init__(self, image: Image, out=None, inp=None, memory_size: int = MEMORY_SIZE):
+        self.image = image
+        self.out = out or sys.stdout
+        self.inp = inp or sys.stdin
+        self.memory = bytearray(memory_size)
+        self.memory[TEXT_BASE:TEXT_BASE + len(image.text)] = image.text
+        self.memory[image.data_base:image.data_base + len(image.data)] = image.data
+        self.brk = (image.data_base + len(image.data) + 15) & ~15
+        self.regs = [0] * 32
+        self.regs[2] = memory_size - 16  # sp
+        self.instret = 0
+        self.cycles = 0
+        self.exit_code = None
+        words = memoryview(image.text).cast('I')
+        self.program = [decode(w) for w in words]
+
+    def run(self, max_instructions: int = None) -> int:
+        """
+        Runs the program from its entry point until it exits, and returns the exit code.
+        """
+        r = self.regs
+        mem = self.memory
+        mw = memoryview(mem).cast('i')
+        program = self.program
+        text_end = TEXT_BASE + 4 * len(program)
+        limit = max_instructions if max_instructions is not None else -1
+        extra = 0
+        executed = 0
+        pc = self.image.entry
+        try:
+            while True:
+                if executed == limit:
+                    raise SimulatorError("instruction limit exceeded", pc)
+                if not TEXT_BASE <= pc < text_end or pc & 3:
+                    raise SimulatorError("bad instruction address", pc)
+                ins = program[(pc - TEXT_BASE) >> 2]
+                if ins is None:
+                    raise SimulatorError("illegal instruction", pc)
+                op, rd, rs1, rs2, imm = ins
+                executed += 1
+                next_pc = pc + 4
+                if op == ADDI:
+                    if rd:
+                        r[rd] = ((r[rs1] + imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+                elif op == LW:
+                    a = r[rs1] + imm
+                    if a & 3 or a < TEXT_BASE:
+                        raise SimulatorError(f"bad load address {a:#x}", pc)
+                    if rd:
+                        r[rd] = mw[a >> 2]
+                    extra += LOAD_CYCLES
+                elif op == SW:
+                    a = r[rs1] + imm
+                    if a & 3 or a < TEXT_BASE:
+                        raise SimulatorError(f"bad store address {a:#x}", pc)
+                    mw[a >> 2] = r[rs2]
+                elif op == ADD:
+                    if rd:
+                        r[rd] = ((r[rs1] + r[rs2] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+                elif op == BEQ:
+                    if r[rs1] == r[rs2]:
+                        next_pc = pc + imm
+                        extra += TAKEN_CYCLES
+                elif op == BNE:
+                    if r[rs1] != r[rs2]:
+                        next_pc = pc + imm
+                        extra += TAKEN_CYCLES
+                elif op == JAL:
+                    if rd:
+                        r[rd] = next_pc
+                    next_pc = pc + imm
+                    extra += TAKEN_CYCLES
+                elif op == JALR:
+                    target = (r[rs1] + imm) & ~1
+                    if rd:
+                        r[rd] = next_pc
+                    next_pc = target
+                    extra += TAKEN_CYCLES
+                elif op == LUI:
+                    if rd:
+                        r[rd] = imm
+                elif op == AUIPC:
+                    if rd:
+                        r[rd] = ((pc + imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+                elif op == SUB:
+                    if rd:
+                        r[rd] = ((r[rs1] - r[rs2] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+                elif op == SLT:
+                    if rd:
+                        r[rd] = int(r[rs1] < r[rs2])
+                elif op == SLTU:
+                    if rd:
+                        r[rd] = int(r[rs1] & 0xFFFFFFFF < r[rs2] & 0xFFFFFFFF)
+                elif op == SLTI:
+                    if rd:
+                        r[rd] = int(r[rs1] < imm)
+                elif op == SLTIU:
+                    if rd:
+                        r[rd] = int(r[rs1] & 0xFFFFFFFF < imm & 0xFFFFFFFF)
+                elif op == BLT:
+                    if r[rs1] < r[rs2]:
+                        next_pc = pc + imm
+                        extra += TAKEN_CYCLES
+                elif op == BGE:
+                    if r[rs1] >= r[rs2]:
+                        next_pc = pc + imm
+                        extra += TAKEN_CYCLES
+                elif op == BLTU:
+                    if r[rs1] & 0xFFFFFFFF < r[rs2] & 0xFFFFFFFF:
+                        next_pc = pc + imm
+                        extra += TAKEN_CYCLES
+                elif op == BGEU:
+                    if r[rs1] & 0xFFFFFFFF >= r[rs2] & 0xFFFFFFFF:
+                        next_pc = pc + imm
+                        extra += TAKEN_CYCLES
+                elif op <= SRA:
+                    if rd:
+                        r[rd] = self.alu(op, r[rs1], r[rs2] if op >= XOR else imm)
+                elif op <= REMU:
+                    extra += DIV_CYCLES if op >= DIV else MUL_CYCLES
+                    if rd:
+                        r[rd] = self.mul_div(op, r[rs1], r[rs2])
+                elif op <= LHU:
+                    a = r[rs1] + imm
+                    width = 1 if op in (LB, LBU) else 2
+                    if a % width or a < TEXT_BASE:
+                        raise SimulatorError(f"bad load address {a:#x}", pc)
+                    v = int.from_bytes(mem[a:a + width], 'little', signed=op in (LB, LH))
+                    if rd:
+                        r[rd] = v
+                    extra += LOAD_CYCLES
+                elif op <= SH:
+                    a = r[rs1] + imm
+                    width = 1 if op == SB else 2
+                    if a % width or a < TEXT_BASE:
+                        raise SimulatorError(f"bad store address {a:#x}", pc)
+                    mem[a:a + width] = (r[rs2] & ((1 << 8 * width) - 1)).to_bytes(width, 'little')
+                elif op == ECALL:
+                    self.instret, self.cycles = executed, executed + extra
+                    if self.ecall(pc):
+                        return self.exit_code
+                else:  # CSRRS, only reading the counters is supported.
+                    counters = {0xC00: executed + extra, 0xC01: executed + extra, 0xC02: executed}
+                    if imm not in counters or rs1:
+                        raise SimulatorError("unsupported CSR access", pc)
+                    if rd:
+                        r[rd] = sign_extend(counters[imm], 32)
+                pc = next_pc
+        finally:
+            self.instret, self.cycles = executed, executed + extra
+
+    @staticmethod
+    def alu(op: int, a: int, b: int) -> int:
+        if op in (XORI, XOR):
+            return a ^ b
+        if op in (ORI, OR):
+            return a | b
+        if op in (ANDI, AND):
+            return a & b
+        shift = b & 0x1F
+        if op in (SLLI, SLL):
+            return sign_extend(a << shift, 32)
+        if op in (SRLI, SRL):
+            return sign_extend((a & 0xFFFFFFFF) >> shift, 32)
+        return a >> shift  # SRAI, SRA
+
+    @staticmethod
+    def mul_div(op: int, a: int, b: int) -> int:
+        if op == MUL:
+            return sign_extend(a * b, 32)
+        if op == MULH:
+            return sign_extend((a * b) >> 32, 32)
+        if op == MULHSU:
+            return sign_extend((a * (b & 0xFFFFFFFF)) >> 32, 32)
+        if op == MULHU:
+            return sign_extend(((a & 0xFFFFFFFF) * (b & 0xFFFFFFFF)) >> 32, 32)
+        if op in (DIVU, REMU):
+            a, b = a & 0xFFFFFFFF, b & 0xFFFFFFFF
+            if b == 0:
+                return -1 if op == DIVU else sign_extend(a, 32)
+            return sign_extend(a // b if op == DIVU else a % b, 32)
+        if b == 0:
+            return -1 if op == DIV else a
+        q = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)  # Rounds toward zero.
+        return sign_extend(q, 32) if op == DIV else a - q * b
+
+    def ecall(self, pc: int) -> bool:
+        """
+        Performs the environment call in a0; returns True if the program exits.
+        """
+        r = self.regs
+        call, arg = r[10], r[11]
+        if call == 1:
+            self.out.write(str(arg))
+        elif call == 4:
+            end = self.memory.index(0, arg)
+            self.out.write(self.memory[arg:end].decode())
+        elif call == 9:
+            brk = (self.brk + arg + 3) & ~3
+            if brk > r[2] - 4096:  # Out of memory: the break would reach the stack.
+                r[10] = -1
+            else:
+                r[10], self.brk = self.brk, brk
+        elif call == 10:
+            self.exit_code = 0
+            return True
+        elif call == 11:
+            self.out.write(chr(arg & 0xFF))
+        elif call == 12:
+            c = self.inp.read(1)
+            r[10] = ord(c) if c else -1
+        elif call == 17:
+            self.exit_code = arg
+            return True
+        else:
+            raise SimulatorError(f"unknown environment call {call}", pc)
+        return False
+
+
+def run(source: str, out=None, inp=None, max_instructions: int = None) -> Simulator:
+    """
+    Assembles and runs source, and returns the simulator (with its exit code and counters).
+    """
+    sim = Simulator(assemble(source), out, inp)
+    sim.run(max_instructions)
+    return sim
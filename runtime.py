@@ -0,0 +1,123 @@
+#
+# ChocoPy runtime support shared by the execution backends. Version 1.0
+#
+import sys
+
+INT_MIN = -2147483648
+INT_MAX = 2147483647
+
+
+class RuntimeException(Exception):
+    """
+    A ChocoPy run-time error. The exit code follows the ChocoPy reference implementation.
+    """
+    def __init__(self, message, exit_code):
+        self.message = message
+        self.exit_code = exit_code
+
+
+def invalid_argument():
+    raise RuntimeException("Invalid argument", 1)
+
+
+def division_by_zero():
+    raise RuntimeException("Division by zero", 2)
+
+
+def index_out_of_bounds():
+    raise RuntimeException("Index out of bounds", 3)
+
+
+def operation_on_none():
+    raise RuntimeException("Operation on None", 4)
+
+
+def out_of_memory():
+    raise RuntimeException("Out of memory", 5)
+
+
+def integer_overflow():
+    raise RuntimeException("Integer overflow", 6)
+
+
+def check_int(v: int) -> int:
+    """
+    Returns v if it fits in a 32-bit signed integer, otherwise raises an integer-overflow error.
+    """
+    if INT_MIN <= v <= INT_MAX:
+        return v
+    integer_overflow()
+
+
+def int_div(a: int, b: int) -> int:
+    if b == 0:
+        division_by_zero()
+    return check_int(a // b)
+
+
+def int_mod(a: int, b: int) -> int:
+    if b == 0:
+        division_by_zero()
+    return a % b
+
+
+class Object:
+    """
+    The base of the Python classes representing ChocoPy classes (and the representation of 'object' instances).
+    Each ChocoPy class gets a subclass with its attributes as slots and its dispatch table in cp_methods.
+    """
+    __slots__ = ()
+    cp_name = 'object'
+    cp_attrs = ()  # (name, initial value) of all attributes, inherited first.
+    cp_methods = {'__init__': lambda *args: None}
+
+
+def make_class(name: str, base: type, attrs: list[tuple[str, object]], methods: dict) -> type:
+    """
+    Creates the Python class of a ChocoPy class. Own attributes become slots, and the dispatch table
+    extends (and possibly overrides) the methods of the base class.
+    """
+    namespace = {'__slots__': tuple(a for a, _ in attrs),
+                 'cp_name': name,
+                 'cp_attrs': base.cp_attrs + tuple(attrs),
+                 'cp_methods': {**base.cp_methods, **methods}}
+    return type(name, (base,), namespace)
+
+
+def new_object(cls: type):
+    """
+    Allocates an instance of a ChocoPy class with its attributes set to their initial values (without calling
+    __init__).
+    """
+    obj = cls.__new__(cls)
+    for a, v in cls.cp_attrs:
+        setattr(obj, a, v)
+    return obj
+
+
+def to_str(v) -> str:
+    """
+    Returns the text printed for a value by the ChocoPy print function.
+    """
+    if v is True:
+        return "True"
+    if v is False:
+        return "False"
+    if type(v) is int or type(v) is str:
+        return str(v)
+    invalid_argument()
+
+
+def builtin_print(v, out=None):
+    (out or sys.stdout).write(to_str(v) + "\n")
+
+
+def builtin_input(inp=None) -> str:
+    line = (inp or sys.stdin).readline()
+    return line[:-1] if line.endswith("\n") else line
+
+
+def builtin_len(v) -> int:
+    if type(v) is str or type(v) is list:
+        return len(v)
+    invalid_argument()
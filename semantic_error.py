@@ -1,39 +1,86 @@
 #
-# Semantic error. Version 1.1
+# Semantic error. Version 1.2
 #
+import copyreg
+from typing import NamedTuple, Optional
+
 
 class CompilerException(Exception):
-    pass
+    kind = 'error'
+    scope = None
+
+    def __reduce__(self):
+        # The subclasses take the parts of the message as constructor arguments, so an exception is pickled (e.g., to
+        # send it back from a worker process) by its attributes.
+        return copyreg.__newobj__, (type(self),), self.__dict__
 
 
 class UndefinedIdentifierException(CompilerException):
+    kind = 'undefined-identifier'
+
     def __init__(self, name_id, name_scope):
+        self.scope = name_scope
         self.message = f"Undefined identifier '{name_id}' in scope '{name_scope}'."
 
 
 class RedefinedIdentifierException(CompilerException):
+    kind = 'redefined-identifier'
+
     def __init__(self, name_id, name_scope):
+        self.scope = name_scope
         self.message = f"Redefining identifier '{name_id}' in scope '{name_scope}'."
 
 
 # Invalid declarations with global/nonlocal, e.g. where nonlocal refers to a non-local var in enclosing scope.
 class DeclarationException(CompilerException):
+    kind = 'declaration'
+
     def __init__(self, name_id, name_scope):
+        self.scope = name_scope
         self.message = f"Wrong global/nonlocal declaration for '{name_id}' in scope '{name_scope}'."
 
 
 class InvalidUseException(CompilerException):  # E.g., when using a return statement outside a function.
+    kind = 'invalid-use'
+
     def __init__(self, text, name_scope, node):
+        self.scope = name_scope
         self.message = f"Invalid use: '{text}' in scope '{name_scope}' ({str(node)})."
 
 
 class TypeException(CompilerException):
+    kind = 'type'
+
     def __init__(self, type_str_1, type_str_2, name_scope, node):
+        self.scope = name_scope
         self.message = \
             f"TypeError: Incompatible types '{type_str_1}' and '{type_str_2}' in scope '{name_scope}' ({str(node)})."
 
 
 class AttributeException(CompilerException):
+    kind = 'attribute'
+
     def __init__(self, type_str, attribute, name_scope, node):
+        self.scope = name_scope
         self.message = \
             f"AttributeError: '{type_str}' has no attribute '{attribute}' in scope '{name_scope}' ({str(node)})."
+
+
+class Diagnostic(NamedTuple):
+    """
+    A semantic error recorded (rather than raised) when the visitors run in collect-all-errors mode.
+    The span is the (start, end) pair of lexer Locations of the offending node, or None if unknown.
+    """
+    kind: str
+    message: str
+    scope: str
+    span: Optional[tuple]
+
+    @staticmethod
+    def from_exception(e: CompilerException, node) -> "Diagnostic":
+        return Diagnostic(e.kind, e.message, e.scope, node.span if node is not None else None)
+
+    def __str__(self):
+        if self.span is None:
+            return self.message
+        return f"{self.span[0].line}:{self.span[0].col}: {self.message}"
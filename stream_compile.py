@@ -0,0 +1,317 @@
+#
+# Streaming compiler. Version 1.0
+#
+# Compiles a source file too large to hold as a whole in memory, in two passes over the file, each reading it a line
+# at a time:
+#
+#     pre-scan   the top-level declarations, up to the first top-level statement, with the body of every function and
+#                method left out (its lines are not even lexed): a module table of the global variables and the classes
+#                with their superclass, attributes and method signatures, and the names of the functions
+#     compile    each top-level declaration or statement in turn: it is parsed on its own, its symbol table is built in
+#                the module table of the declarations before it, it is type-checked and emitted, and then released, the
+#                table of a declaration being replaced by its signature (see modules.signature)
+#
+# A name is only defined after its declaration, as in a whole program, while the checker knows the classes declared
+# later from the pre-scan, as it does when it checks a whole program. The AST of a declaration, its symbol tables and
+# its types are therefore only held while it is compiled, so that the memory used is proportional to the largest
+# top-level declaration (plus the signatures), not to the file. The output (--emit) is written as it is produced:
+#
+#     check                         nothing, only the diagnostics (the default)
+#     ast, ast-sexpr, ast-jsonl     the typed AST in that format (see ast_dump.py), the same as a dump of the whole
+#                                   program
+#     ir                            the SSA IR (see ir.py): the globals, classes and functions as they are built, the
+#                                   top-level statements ('<module>', one function built across them) last, its blocks
+#                                   written after each statement, as they are finished
+#
+# The diagnostics are written to stderr as they are found, a JSON object per line (see query.diagnostic_json). A
+# syntax error ends the compilation. After a symbol-table error the type check stops, as in the driver, and the output
+# stops at the first error. The exit status is 1 if there was an error.
+#
+# Usage: python stream_compile.py [--emit=check|ast|ast-sexpr|ast-jsonl|ir] [--out=FILE] FILE
+#
+import io
+import json
+import re
+import sys
+import astree as ast
+import ast_dump
+import ir
+import lexer
+import modules
+import parser
+import query
+import symbol_table
+import symtab_visitor
+import type_env
+import type_visitor
+
+EMITS = ['check', 'ast', 'ast-sexpr', 'ast-jsonl', 'ir']
+AST_FORMATS = {'ast': 'tree', 'ast-sexpr': 'sexpr', 'ast-jsonl': 'jsonl'}
+# A line starting at column 1 begins a top-level declaration or statement, except for elif, else and comments (a
+# comment at column 1 may be inside a body).
+START = re.compile(r'(?![ \t\r\n#]|(?:elif|else)\b)')
+# The first line of a top-level declaration (of a function, a class or a global variable).
+DECLARATION = re.compile(r'(?:def|class)\b|[A-Za-z_]\w*[ \t]*:')
+DEF = re.compile(r'[ \t]*def\b')
+
+
+def chunks(path: str):
+    """
+    Yields the top-level declarations and statements of a file as (first line, text), each with the indented, blank
+    and comment lines after it, reading the file a line at a time.
+    """
+    with open(path, encoding='utf-8') as f:
+        lines, first = [], 1
+        for number, line in enumerate(f, 1):
+            if lines and START.match(line):
+                yield first, ''.join(lines)
+                lines, first = [], number
+            lines.append(line)
+        if lines:
+            yield first, ''.join(lines)
+
+
+def first_line(text: str) -> str:
+    """
+    Returns the first line of a text that is not blank or a comment, or ''.
+    """
+    for line in text.splitlines():
+        if line.strip() and not line.lstrip().startswith('#'):
+            return line
+    return ''
+
+
+def stub(text: str) -> str:
+    """
+    Returns the text of a top-level declaration with the body of each function replaced by pass and its other lines
+    left blank, so that the positions do not change: enough to declare its signature.
+    """
+    out, state, indent = [], None, 0  # state is 'header' in the header of a def at indent, 'body' or 'skip' after.
+    for line in text.splitlines(keepends=True):
+        code = line.split('#', 1)[0].rstrip()
+        depth = len(line) - len(line.lstrip(' \t'))
+        if state == 'header':
+            out.append(line)
+            state = 'body' if code.endswith(':') else 'header'
+        elif state in ('body', 'skip') and (not code or depth > indent):
+            out.append(line[:depth] + 'pass\n' if state == 'body' and code else '\n')
+            state = 'skip' if code else state
+        else:
+            out.append(line)
+            state = None
+            if DEF.match(code):
+                state, indent = 'body' if code.endswith(':') else 'header', depth
+    return ''.join(out)
+
+
+def parse(text: str) -> ast.ProgramNode:
+    return parser.Parser(io.StringIO(text)).parse()
+
+
+class Forward(type_env.TypeEnvironment):
+    """
+    A type environment over the module table of the declarations compiled so far, which also knows the classes of
+    the pre-scan, declared later.
+    """
+    def __init__(self, sym_table: symbol_table.SymbolTable, declared: symbol_table.SymbolTable):
+        super().__init__(sym_table)
+        self.declared = declared
+        for st in declared.get_children():
+            if st.get_type() == 'class':
+                self.subtype_of[st.get_name()] = st.get_super_class()
+
+    def get_class_symbol_table(self, t: str):
+        if cst := super().get_class_symbol_table(t):
+            return cst
+        cst = self.declared.get_child(t)
+        return cst if cst and cst.get_type() == 'class' else None
+
+
+class StreamCompiler:
+    """
+    Compiles a file in two passes over it, writing the output of emit to a text stream and each diagnostic, as a
+    dict, to report.
+    """
+    def __init__(self, path: str, out, emit: str = 'check', report=None):
+        assert emit in EMITS, f"Unknown output {emit}."
+        self.path = path
+        self.out = out
+        self.emit = emit
+        self.report = report or (lambda d: print(json.dumps({'file': path, **d}), file=sys.stderr))
+        self.errors = 0
+        self.dumper = None
+        self.builder = None
+        self.spaced = None  # Whether the IR written last was a function, which a blank line follows (None at first).
+        self.value, self.block = 0, None  # The first value and block of the next part of '<module>' (None at first).
+
+    def prescan(self) -> tuple:
+        """
+        Returns the module table of the declarations, with the tables of the classes only (the signatures of their
+        methods), and the names of the functions. A declaration in error is left out or partly declared, its error is
+        reported by the compilation.
+        """
+        functions = []
+        declared = symbol_table.SymbolTable('top')
+        declared.set_parent(symbol_table.prelude())
+        st_visitor = symtab_visitor.SymbolTableVisitor(collect_errors=True)
+        for _, text in chunks(self.path):
+            if not (line := first_line(text)):
+                continue
+            if not DECLARATION.match(line):
+                break  # The first statement, the declarations are all before it.
+            try:
+                tree = parse(stub(text))
+            except lexer.SyntaxErrorException:
+                try:
+                    tree = parse(text)
+                except lexer.SyntaxErrorException:
+                    continue
+            for d in tree.declarations:
+                children = len(declared.get_children())
+                st_visitor.visit_top_level(declared, d)
+                if isinstance(d, ast.FuncDefNode):
+                    functions.append(d.name.name)
+                    if len(declared.get_children()) > children:
+                        declared.get_children()[-1].detach()
+            st_visitor.get_diagnostics().clear()
+        return declared, functions
+
+    def compile(self) -> int:
+        """
+        Compiles the file and returns the number of errors.
+        """
+        declared, functions = self.prescan()
+        root = symbol_table.SymbolTable('top')
+        root.set_parent(symbol_table.prelude())
+        t_env = Forward(root, declared)
+        st_visitor = symtab_visitor.SymbolTableVisitor(collect_errors=True)
+        t_visitor = type_visitor.TypeVisitor(t_env, collect_errors=True)
+        self.start(t_env, functions)
+        checked, statements = True, False
+        for line, text in chunks(self.path):
+            lines = line - 1
+            try:
+                tree = parse(text)
+                if statements and tree.declarations:
+                    lines -= 1
+                    tree = parse('pass\n' + text)  # Raises the error of a parse of the file, after a statement.
+            except lexer.SyntaxErrorException as e:
+                location = query.shift((e.location,), lines)[0]
+                self.diagnose(query.syntax_json(lexer.SyntaxErrorException(e.message, location)))
+                return self.errors
+            if self.emit == 'ast-jsonl':  # The only output with spans, the diagnostics are shifted otherwise.
+                c = query.Chunk(line=1)
+                c.declarations, c.statements = tree.declarations, tree.statements
+                c.move_to(line)
+                lines = 0
+            for node in tree.declarations + tree.statements:
+                statements = statements or not isinstance(node, ast.DeclarationNode)
+                children = len(root.get_children())
+                st_visitor.visit_top_level(root, node)
+                for d in st_visitor.get_diagnostics():
+                    self.diagnose(query.diagnostic_json(d._replace(span=query.shift(d.span, lines))))
+                    checked = False
+                st_visitor.get_diagnostics().clear()
+                if checked:
+                    t_visitor.do_visit(node)
+                    for d in t_visitor.get_diagnostics():
+                        self.diagnose(query.diagnostic_json(d._replace(span=query.shift(d.span, lines))))
+                    t_visitor.get_diagnostics().clear()
+                if not self.errors:
+                    self.write(node)
+                if len(root.get_children()) > children:
+                    table = root.get_children()[-1]
+                    table.detach()
+                    root.add_child(modules.signature(table))
+        if not self.errors:
+            self.finish()
+        return self.errors
+
+    def diagnose(self, d: dict):
+        self.errors += 1
+        self.report(d)
+
+    def start(self, t_env: type_env.TypeEnvironment, functions: list):
+        if self.emit in AST_FORMATS:
+            self.dumper = ast_dump.DUMPERS[AST_FORMATS[self.emit]](self.out)
+            self.dumper.open(ast.ProgramNode([], []), None, 0, None)
+        elif self.emit == 'ir':
+            self.builder = ir.IRBuilder(t_env)
+            self.builder.begin(functions)
+
+    def write(self, node: ast.Node):
+        """
+        Emits a top-level declaration or statement.
+        """
+        if self.dumper:
+            self.dumper.dump(node, 1, 0, 'declarations' if isinstance(node, ast.DeclarationNode) else 'statements')
+        elif self.builder:
+            module = self.builder.module
+            self.builder.add(node)
+            if isinstance(node, ast.VarDefNode):
+                self.write_ir(ir.dump_global(module, *module.globals.pop()), False)
+            elif isinstance(node, ast.ClassDefNode):
+                self.write_ir(ir.dump_class(module, module.classes[node.name.name]), False)
+            for name in list(module.functions):
+                self.write_ir(ir.dump_function(module.functions.pop(name)), True)
+            if not isinstance(node, ast.DeclarationNode):
+                self.write_part(self.builder.flush())
+
+    def write_ir(self, text: str, function: bool):
+        """
+        Writes the IR of a global, a class or a function, the functions set apart by blank lines as in ir.dump.
+        """
+        if self.spaced is not None and (function or self.spaced):
+            self.out.write('\n')
+        self.out.write(text + '\n')
+        self.spaced = function
+
+    def write_part(self, part: ir.Function):
+        """
+        Writes a part of '<module>' (see IRBuilder.flush), numbered on from the parts before, so that the parts make
+        up the dump of the whole function.
+        """
+        text = ir.dump_function(part, self.value, self.block or 0, self.block is not None)
+        if self.block is None:
+            self.write_ir(text, True)
+        elif text:
+            self.out.write(text + '\n')
+        self.value += len(part)
+        self.block = (self.block or 0) + len(part.blocks) - 1
+
+    def finish(self):
+        if self.dumper:
+            self.dumper.close(ast.ProgramNode([], []), 0)
+            self.dumper.flush()
+        elif self.builder:
+            module = self.builder.end()
+            self.write_part(module.functions.pop('<module>'))
+        self.out.flush()
+
+
+def main(argv):
+    options = {'--emit': 'check', '--out': None}
+    files = []
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name in options and value:
+            options[name] = value
+        elif a.startswith('--'):
+            print(f"Unknown option {a}", file=sys.stderr)
+            return 2
+        else:
+            files.append(a)
+    if len(files) != 1 or options['--emit'] not in EMITS:
+        print("Usage: python stream_compile.py [--emit=check|ast|ast-sexpr|ast-jsonl|ir] [--out=FILE] FILE",
+              file=sys.stderr)
+        return 2
+    if options['--out']:
+        with open(options['--out'], 'w', encoding='utf-8') as out:
+            errors = StreamCompiler(files[0], out, options['--emit']).compile()
+    else:
+        errors = StreamCompiler(files[0], sys.stdout, options['--emit']).compile()
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
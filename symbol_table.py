@@ -1,6 +1,7 @@
 #
-#  Symbol table. Version 1.06
+#  Symbol table. Version 1.08
 #
+import functools
 from enum import IntFlag, Enum, auto
 from typing import Optional
 
@@ -26,6 +27,7 @@ class Symbol:
         self._name = name
         self._flags = flags
         self._type_str = type_str
+        self._frozen = False
 
     def __repr__(self):
         return f"<symbol '{self._name}'>"
@@ -70,12 +72,14 @@ class Symbol:
         return self._flags
 
     def set_flags(self, flags):
+        assert not self._frozen, f"Symbol '{self._name}' is frozen."
         self._flags = flags
 
     def get_type_str(self):
         return self._type_str
 
     def set_type_str(self, type_str):
+        assert not self._frozen, f"Symbol '{self._name}' is frozen."
         self._type_str = type_str
 
 
@@ -87,7 +91,9 @@ class SymbolTable:
         self._symbols = {}
         self._parent = None
         self._children = []
+        self._child_index = {}  # Name -> the child tables of that name, in order.
         self._is_nested = False
+        self._frozen = False
 
     def get_type(self):
         """
@@ -144,19 +150,75 @@ class SymbolTable:
         """
         return self._children
 
+    def get_child(self, name):
+        """
+        Return the (first) nested symbol table named name, or None if there is none.
+        """
+        tables = self._child_index.get(name)
+        return tables[0] if tables else None
+
     def add_symbol(self, s: Symbol):
         """
         Add a new symbol to the table.
         """
+        assert not self._frozen, f"Symbol table '{self._name}' is frozen."
         self._symbols[s.get_name()] = s
 
     def add_child(self, st):
         """
         Add a new child symbol table
         """
+        assert not self._frozen, f"Symbol table '{self._name}' is frozen."
         assert st._parent is None, "Symbol table can only have one parent table."
         st._parent = self
         self._children.append(st)
+        self._child_index.setdefault(st.get_name(), []).append(st)
+
+    def set_parent(self, st):
+        """
+        Link st as the enclosing table without adding this table to st's children (used to link a module's
+        table to the shared built-in prelude).
+        """
+        assert self._parent is None, "Symbol table can only have one parent table."
+        self._parent = st
+
+    def detach(self):
+        """
+        Unlink the table from its parent table (used to move the table of a declaration to a rebuilt module table).
+        The last child added is unlinked in constant time.
+        """
+        parent = self._parent
+        if parent is not None:
+            if parent._children and parent._children[-1] is self:
+                parent._children.pop()
+            elif self in parent._children:
+                parent._children.remove(self)
+            if self in parent._child_index.get(self._name, []):
+                parent._child_index[self._name].remove(self)
+            self._parent = None
+
+    def freeze(self):
+        """
+        Make the table, its symbols and its nested tables immutable.
+        """
+        self._frozen = True
+        for s in self._symbols.values():
+            s._frozen = True
+        for st in self._children:
+            st.freeze()
+
+    def is_frozen(self):
+        """
+        Return True if the table is frozen.
+        """
+        return self._frozen
+
+    def __reduce_ex__(self, protocol):
+        # The shared prelude is pickled by reference, so that a module's table unpickles linked to the prelude of the
+        # receiving process.
+        if self is prelude():
+            return prelude, ()
+        return super().__reduce_ex__(protocol)
 
 
 class Function(SymbolTable):
@@ -221,21 +283,40 @@ class Class(SymbolTable):
         """
         Return the child symbol-table of the given method if it exists, otherwise None.
         """
-        for st in self._children:
-            if st.get_name() == name:
-                return st
-        return None
+        return self.get_child(name)
 
 
-def built_ins(name: str) -> Optional[tuple[str, DeclType]]:
+@functools.cache
+def prelude() -> SymbolTable:
     """
-    Returns information about built-in entities.
+    Returns the frozen scope of the built-in entities, which is the parent of every module's 'top' table.
+    It is constructed once per process and shared by all compilations.
     """
-    built_ins_info = {'print': ("<None>", DeclType.Function),
-                      'len': ("int", DeclType.Function),
-                      'input': ('str', DeclType.Function),
-                      'object': ('object', DeclType.Class)}
-    return built_ins_info.get(name, None)
+    st = SymbolTable('builtins')
+    # The 'print' function.
+    f_st = Function('print')
+    f_st.add_symbol(Symbol('val', Symbol.Is.Parameter, 'object'))
+    st.add_symbol(Symbol('print', Symbol.Is.Global + Symbol.Is.Local, '<None>'))
+    st.add_child(f_st)
+    # The 'input' function.
+    f_st = Function('input')
+    st.add_symbol(Symbol('input', Symbol.Is.Global + Symbol.Is.Local, 'str'))
+    st.add_child(f_st)
+    # The 'len' function.
+    f_st = Function('len')
+    f_st.add_symbol(Symbol('val', Symbol.Is.Parameter, 'object'))
+    st.add_symbol(Symbol('len', Symbol.Is.Global + Symbol.Is.Local, 'int'))
+    st.add_child(f_st)
+    # The 'object' class with constructor.
+    c_st = Class('object', '')
+    f_st = Function('__init__')
+    f_st.add_symbol(Symbol('self', Symbol.Is.Parameter, 'object'))
+    c_st.add_symbol(Symbol('__init__', Symbol.Is.Local, '<None>'))
+    c_st.add_child(f_st)
+    st.add_symbol(Symbol('object', Symbol.Is.Global + Symbol.Is.Local, 'object'))
+    st.add_child(c_st)
+    st.freeze()
+    return st
 
 
 def symbol_decl_type(st: SymbolTable, name: str) -> Optional[DeclType]:
@@ -245,16 +326,15 @@ def symbol_decl_type(st: SymbolTable, name: str) -> Optional[DeclType]:
     """
 
     if not st:
-        b_in = built_ins(name)
-        return b_in[1] if b_in else None
+        return None
     symbol = st.lookup(name)
     if symbol and symbol.is_local():
-        for cst in st.get_children():
-            if name == cst.get_name():
-                if cst.get_type() == 'function':
-                    return DeclType.Function
-                elif cst.get_type() == 'class':
-                    return DeclType.Class
+        cst = st.get_child(name)
+        if cst is not None:
+            if cst.get_type() == 'function':
+                return DeclType.Function
+            elif cst.get_type() == 'class':
+                return DeclType.Class
         return DeclType.Variable
     else:
         return symbol_decl_type(st.get_parent(), name)
@@ -0,0 +1,312 @@
+#
+# Symbol table export and import. Version 1.0
+#
+# Writes the scope tree of a symbol table (see SymbolTableVisitor.get_symbol_table) to a binary stream, one scope at a
+# time in preorder, and rebuilds SymbolTable, Function and Class objects from it, so that tools can load the symbols
+# of a module without running the semantic analysis again. Each scope has an id (its position in the preorder), the id
+# of its parent, its kind, its name, whether it is nested, the superclass of a class and its symbols, each with its
+# name, flags, type and declaration kind (see symbol_table.symbol_decl_type). There are two formats:
+#
+#     json     JSON lines in UTF-8, a header object then an object per scope
+#     binary   a magic number, then variable-length integers and strings, each string written once and referred to
+#              by its index afterwards (type and member names repeat a lot)
+#
+# A module's table is linked to the built-in prelude on import, as it was when exported. load detects the format.
+#
+# Usage: python symtab_io.py [--format=json|binary] [--out=FILE] FILE
+#        python symtab_io.py --load=FILE
+#
+import io
+import json
+import sys
+import disp_symtable
+import driver
+import symbol_table
+from symbol_table import Symbol
+
+FORMATS = ['json', 'binary']
+VERSION = 1
+MAGIC = b'CPST'
+KINDS = ['module', 'function', 'class']
+DECLS = [None] + list(symbol_table.DeclType)
+END = 0xFF
+FLUSH = 1 << 16
+
+
+def flag_names(flags: int) -> list[str]:
+    return [f.name for f in Symbol.Is if flags & f]
+
+
+def decl_type(st: symbol_table.SymbolTable, s: Symbol):
+    """
+    symbol_decl_type of a symbol of st, without walking the enclosing scopes for the local symbols.
+    """
+    if s.is_local():
+        child = st.get_child(s.get_name())
+        if child is not None and child.get_type() == 'function':
+            return symbol_table.DeclType.Function
+        if child is not None and child.get_type() == 'class':
+            return symbol_table.DeclType.Class
+        return symbol_table.DeclType.Variable
+    return symbol_table.symbol_decl_type(st.get_parent(), s.get_name())
+
+
+def scopes(st: symbol_table.SymbolTable):
+    """
+    Yields the scopes of the tree rooted at st in preorder, as (id, parent id, table).
+    """
+    count = 0
+    stack = [(st, None)]
+    while stack:
+        table, parent = stack.pop()
+        yield count, parent, table
+        stack += [(child, count) for child in reversed(table.get_children())]
+        count += 1
+
+
+class JsonWriter:
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = []
+        self.size = 0
+
+    def write(self, record: dict):
+        line = json.dumps(record) + '\n'
+        self.buffer.append(line)
+        self.size += len(line)
+        if self.size >= FLUSH:
+            self.flush()
+
+    def flush(self):
+        self.stream.write(''.join(self.buffer).encode('utf-8'))
+        self.buffer.clear()
+        self.size = 0
+
+    def header(self, st: symbol_table.SymbolTable):
+        self.write({'format': 'symtab', 'version': VERSION, 'prelude': st.get_parent() is symbol_table.prelude(),
+                    'frozen': st.is_frozen()})
+
+    def scope(self, ident: int, parent: int, st: symbol_table.SymbolTable):
+        record = {'id': ident, 'parent': parent, 'kind': st.get_type(), 'name': st.get_name(), 'nested': st.is_nested()}
+        if st.get_type() == 'class':
+            record['super'] = st.get_super_class()
+        decls = [decl_type(st, s) for s in st.get_symbols()]
+        record['symbols'] = [{'name': s.get_name(), 'flags': flag_names(s.get_flags()), 'type': s.get_type_str(),
+                              'decl': d.name if d else None} for s, d in zip(st.get_symbols(), decls)]
+        self.write(record)
+
+    def end(self):
+        self.flush()
+
+
+class BinaryWriter:
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray()
+        self.strings = {}
+
+    def int(self, n: int):
+        while n >= 0x80:
+            self.buffer.append(n & 0x7F | 0x80)
+            n >>= 7
+        self.buffer.append(n)
+
+    def str(self, s: str):
+        index = self.strings.get(s)
+        if index is not None:
+            self.int(index << 1)
+            return
+        self.strings[s] = len(self.strings)
+        data = s.encode('utf-8')
+        self.int(len(data) << 1 | 1)
+        self.buffer += data
+
+    def header(self, st: symbol_table.SymbolTable):
+        self.buffer += MAGIC
+        self.buffer += bytes([VERSION, (st.get_parent() is symbol_table.prelude()) | st.is_frozen() << 1])
+
+    def scope(self, ident: int, parent: int, st: symbol_table.SymbolTable):
+        self.buffer.append(KINDS.index(st.get_type()) | st.is_nested() << 2)
+        self.int(0 if parent is None else parent + 1)
+        self.str(st.get_name())
+        if st.get_type() == 'class':
+            self.str(st.get_super_class())
+        self.int(len(st.get_symbols()))
+        for s in st.get_symbols():
+            self.str(s.get_name())
+            self.buffer += bytes([int(s.get_flags()), DECLS.index(decl_type(st, s))])
+            self.str(s.get_type_str())
+        if len(self.buffer) >= FLUSH:
+            self.stream.write(self.buffer)
+            self.buffer.clear()
+
+    def end(self):
+        self.buffer.append(END)
+        self.stream.write(self.buffer)
+        self.buffer.clear()
+
+
+def dump(st: symbol_table.SymbolTable, stream, fmt: str = 'json') -> int:
+    """
+    Writes the scope tree rooted at st to a binary stream in format fmt and returns the number of scopes written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown symbol table format {fmt}, they are {', '.join(FORMATS)}")
+    writer = JsonWriter(stream) if fmt == 'json' else BinaryWriter(stream)
+    writer.header(st)
+    count = 0
+    for ident, parent, table in scopes(st):
+        writer.scope(ident, parent, table)
+        count += 1
+    writer.end()
+    return count
+
+
+def dumps(st: symbol_table.SymbolTable, fmt: str = 'json') -> bytes:
+    out = io.BytesIO()
+    dump(st, out, fmt)
+    return out.getvalue()
+
+
+class Builder:
+    """
+    Rebuilds the tables of the scopes read, in preorder.
+    """
+    def __init__(self):
+        self.tables = []
+        self.prelude = False
+        self.frozen = False
+
+    def scope(self, parent: int, kind: str, name: str, nested: bool, super_class: str, symbols: list):
+        if kind == 'function':
+            st = symbol_table.Function(name, is_nested=nested)
+        elif kind == 'class':
+            st = symbol_table.Class(name, super_class)
+        else:
+            st = symbol_table.SymbolTable(name)
+        for s_name, flags, type_str in symbols:
+            st.add_symbol(Symbol(s_name, flags, type_str))
+        if parent is not None:
+            self.tables[parent].add_child(st)
+        self.tables.append(st)
+
+    def result(self) -> symbol_table.SymbolTable:
+        if not self.tables:
+            raise ValueError("The symbol table file has no scope.")
+        root = self.tables[0]
+        if self.prelude:
+            root.set_parent(symbol_table.prelude())
+        if self.frozen:
+            root.freeze()
+        return root
+
+
+def read_json(stream, first: bytes, builder: Builder):
+    header = json.loads(first + stream.readline())
+    if header.get('format') != 'symtab' or header.get('version') != VERSION:
+        raise ValueError(f"Not a symbol table file of version {VERSION}.")
+    builder.prelude, builder.frozen = header['prelude'], header['frozen']
+    for line in stream:
+        r = json.loads(line)
+        symbols = [(s['name'], sum(Symbol.Is[f] for f in s['flags']), s['type']) for s in r['symbols']]
+        builder.scope(r['parent'], r['kind'], r['name'], r['nested'], r.get('super'), symbols)
+
+
+class BinaryReader:
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.strings = []
+
+    def byte(self) -> int:
+        b = self.stream.read(1)
+        if not b:
+            raise ValueError("The symbol table file is truncated.")
+        return b[0]
+
+    def int(self) -> int:
+        n, shift = 0, 0
+        while True:
+            b = self.byte()
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def str(self) -> str:
+        n = self.int()
+        if not n & 1:
+            return self.strings[n >> 1]
+        s = self.stream.read(n >> 1).decode('utf-8')
+        self.strings.append(s)
+        return s
+
+    def read(self, builder: Builder):
+        version, flags = self.byte(), self.byte()
+        if version != VERSION:
+            raise ValueError(f"Not a symbol table file of version {VERSION}.")
+        builder.prelude, builder.frozen = bool(flags & 1), bool(flags & 2)
+        while (b := self.byte()) != END:
+            kind, nested = KINDS[b & 3], bool(b & 4)
+            parent = self.int() - 1
+            name = self.str()
+            super_class = self.str() if kind == 'class' else None
+            symbols = []
+            for _ in range(self.int()):
+                s_name = self.str()
+                flags, _ = self.byte(), self.byte()  # The declaration kind follows from the tables.
+                symbols.append((s_name, flags, self.str()))
+            builder.scope(None if parent < 0 else parent, kind, name, nested, super_class, symbols)
+
+
+def load(stream) -> symbol_table.SymbolTable:
+    """
+    Rebuilds the symbol table written to a binary stream by dump, in either format.
+    """
+    builder = Builder()
+    first = stream.read(len(MAGIC))
+    if first == MAGIC:
+        BinaryReader(stream).read(builder)
+    else:
+        read_json(stream, first, builder)
+    return builder.result()
+
+
+def loads(data: bytes) -> symbol_table.SymbolTable:
+    return load(io.BytesIO(data))
+
+
+def main(argv):
+    options = {'--format': 'json', '--out': None, '--load': None}
+    files = []
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name in options and value:
+            options[name] = value
+        elif a.startswith('--'):
+            print(f"Unknown option {a}", file=sys.stderr)
+            return 2
+        else:
+            files.append(a)
+    if options['--load']:
+        with open(options['--load'], 'rb') as f:
+            disp_symtable.DispSymbolTable().print_symtable(load(f))
+        return 0
+    if len(files) != 1 or options['--format'] not in FORMATS:
+        print("Usage: python symtab_io.py [--format=json|binary] [--out=FILE] FILE", file=sys.stderr)
+        return 2
+    with open(files[0], encoding='utf-8') as f:
+        _, st = driver.typed_ast(f.read())
+    if options['--out']:
+        with open(options['--out'], 'wb') as f:
+            dump(st, f, options['--format'])
+    else:
+        dump(st, sys.stdout.buffer, options['--format'])
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -9,32 +9,34 @@ import semantic_error
 
 class SymbolTableVisitor(visitor.Visitor):
 
-    def __init__(self):
-        # Built-in functions and their return types.
-        self.built_ins = {'print': "<None>", 'len': "int", 'input': 'str', 'object': 'object'}
+    def __init__(self, collect_errors=False):
         self.root_sym_table = None
         self.curr_sym_table = None
         self.parent_sym_table = None
+        # In collect-all-errors mode semantic errors are recorded as diagnostics instead of being raised.
+        self.collect_errors = collect_errors
+        self.diagnostics = []
+
+    def report(self, e: semantic_error.CompilerException, node: ast.Node):
+        """
+        Raises the semantic error e, or records it as a diagnostic in collect-all-errors mode.
+        """
+        if not self.collect_errors:
+            raise e
+        self.diagnostics.append(semantic_error.Diagnostic.from_exception(e, node))
+
+    def get_diagnostics(self) -> list[semantic_error.Diagnostic]:
+        return self.diagnostics
 
     def is_defined(self, node: ast.IdentifierNode):
-        found = False
         curr_lvl = self.curr_sym_table
 
-        if node.name in self.built_ins:
-            found = True
-
-        # If we have reached the root table, we haven't found it
-        while not found and curr_lvl is not None:
-            syms = curr_lvl.get_symbols()
-            for s in syms:
-                # If it exists
-                if s.get_name() == node.name:
-                    found = True
-                    break
-            if found: break
+        # If we have passed the built-in prelude (the parent of the root table), we haven't found it
+        while curr_lvl is not None:
+            if curr_lvl.lookup(node.name):
+                return True
             curr_lvl = curr_lvl.get_parent()
-        return found
-
+        return False
 
     def do_visit(self, node):
         if node:
@@ -68,13 +70,20 @@ class SymbolTableVisitor(visitor.Visitor):
     # This identifier must already exist
     @visit.register
     def _(self, node: ast.IdentifierExprNode):
+        self.use(node.identifier, node)
+
+    def use(self, identifier: ast.IdentifierNode, node: ast.Node):
+        """
+        Resolves a name used by node (a variable or the target of a for loop), reporting it as undefined if no scope
+        declares it.
+        """
         # search scopes for variable - local first, then enclosing, then global
         found_symbol = None
         curr_lvl = self.curr_sym_table
         while found_symbol is None and curr_lvl is not None:
             syms = curr_lvl.get_symbols()
             for s in syms:
-                if s.get_name() == node.identifier.name:
+                if s.get_name() == identifier.name:
                     found_symbol = s
                     break
             if found_symbol is not None: break
@@ -83,14 +92,16 @@ class SymbolTableVisitor(visitor.Visitor):
         # If we have reached the root table and found nothing
         # The variable is undefined
         if found_symbol is None:
-            raise semantic_error.UndefinedIdentifierException(node.identifier.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.UndefinedIdentifierException(identifier.name,
+                                                                    self.curr_sym_table.get_name()), node)
+            return
 
         # If the variable is in an enclosing scope, we put it in current scope as read-only
         if curr_lvl != self.curr_sym_table:
             global_flag = Symbol.Is.Global if found_symbol.is_global() else 0
-            new_s = Symbol(node.identifier.name, Symbol.Is.ReadOnly + global_flag, type_str=found_symbol.get_type_str())
+            new_s = Symbol(identifier.name, Symbol.Is.ReadOnly + global_flag, type_str=found_symbol.get_type_str())
             self.curr_sym_table.add_symbol(new_s)
-        self.do_visit(node.identifier)
+        self.do_visit(identifier)
 
     @visit.register
     def _(self, node: ast.BinaryOpExprNode):
@@ -133,35 +144,33 @@ class SymbolTableVisitor(visitor.Visitor):
         if not is_present:
 
             # check what type the function returns by finding the identifier
-
-            # First check if its a built-in function: these are global and not local
-            if node.identifier.name in self.built_ins:
-                s = Symbol(node.identifier.name, Symbol.Is.Global, type_str=self.built_ins[node.identifier.name])
-
-            # Else it must be in a parent symbol table
+            # in a parent symbol table (the built-in functions are in the prelude, the parent of the root table)
+            found = False
+            curr_lvl = self.curr_sym_table
+
+            # If we have passed the prelude,
+            # The function does not exist
+            while not found and curr_lvl.get_parent() is not None:
+                curr_lvl = curr_lvl.get_parent()
+                syms = curr_lvl.get_symbols()
+                for s in syms:
+                    if s.get_name() == node.identifier.name:
+                        found = True
+                        type_str = s.get_type_str()
+                        break
+                if found: break
+
+            if not found:
+                self.report(semantic_error.UndefinedIdentifierException(node.identifier.name,
+                                                                        self.curr_sym_table.get_name()), node)
+                s = None
             else:
-                found = False
-                curr_lvl = self.curr_sym_table
-
-                # If we have reached the root table,
-                # The function does not exist
-                while not found and curr_lvl is not self.root_sym_table:
-                    curr_lvl = curr_lvl.get_parent()
-                    syms = curr_lvl.get_symbols()
-                    for s in syms:
-                        if s.get_name() == node.identifier.name:
-                            found = True
-                            type_str = s.get_type_str()
-                            break
-                    if found: break
-                
-                if not found:
-                    raise semantic_error.UndefinedIdentifierException(node.identifier.name, self.curr_sym_table.get_name())
-
-                global_flag = Symbol.Is.Global if curr_lvl == self.root_sym_table else 0
+                # Module-level and built-in functions are global.
+                global_flag = Symbol.Is.Global if curr_lvl.get_type() == 'module' else 0
                 s = Symbol(node.identifier.name, global_flag, type_str=type_str)
-                
-            self.curr_sym_table.add_symbol(s)
+
+            if s is not None:
+                self.curr_sym_table.add_symbol(s)
 
         for a in node.args:
             self.do_visit(a)
@@ -213,7 +222,8 @@ class SymbolTableVisitor(visitor.Visitor):
 
     @visit.register
     def _(self, node: ast.ForStmtNode):
-        self.do_visit(node.identifier)
+        # The loop variable must already exist, as the target of an assignment.
+        self.use(node.identifier, node.identifier)
         self.do_visit(node.iterable)
         for s in node.body:
             self.do_visit(s)
@@ -235,7 +245,8 @@ class SymbolTableVisitor(visitor.Visitor):
     def _(self, node: ast.VarDefNode):
         # We cannot redefine variables
         if self.is_defined(node.var.identifier):
-            raise semantic_error.RedefinedIdentifierException(node.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.RedefinedIdentifierException(node.var.identifier.name,
+                                                                    self.curr_sym_table.get_name()), node)
         self.do_visit(node.var)
         self.do_visit(node.value)
 
@@ -262,7 +273,9 @@ class SymbolTableVisitor(visitor.Visitor):
         
         # Variable does not exist
         if not found:
-            raise semantic_error.UndefinedIdentifierException(node.variable.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.UndefinedIdentifierException(node.variable.name,
+                                                                    self.curr_sym_table.get_name()), node)
+            return
 
         s = Symbol(node.variable.name, Symbol.Is.Global, type_str=type_str)
         self.curr_sym_table.add_symbol(s)
@@ -273,7 +286,8 @@ class SymbolTableVisitor(visitor.Visitor):
         
         # it is illegal for a nonlocal declaration to occur outside a nested function, 
         if not self.curr_sym_table.is_nested():
-            raise semantic_error.DeclarationException(node.variable.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.DeclarationException(node.variable.name, self.curr_sym_table.get_name()), node)
+            return
 
         # Find the corresponding variable in the parent scope
         syms = self.parent_sym_table.get_symbols()
@@ -282,7 +296,9 @@ class SymbolTableVisitor(visitor.Visitor):
             if sym.get_name() == node.variable.name:
                 # Illegal to refer to a global variable
                 if sym.is_global():
-                    raise semantic_error.DeclarationException(node.variable.name, self.curr_sym_table.get_name())
+                    self.report(semantic_error.DeclarationException(node.variable.name,
+                                                                    self.curr_sym_table.get_name()), node)
+                    return
                 else:
                     type_str = sym.get_type_str()
                     found = True
@@ -290,7 +306,9 @@ class SymbolTableVisitor(visitor.Visitor):
         
         # Couldn't find variable in enclosing scope
         if not found:
-            raise semantic_error.UndefinedIdentifierException(node.variable.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.UndefinedIdentifierException(node.variable.name,
+                                                                    self.curr_sym_table.get_name()), node)
+            return
 
         s = Symbol(node.variable.name, 0, type_str=type_str)
         self.curr_sym_table.add_symbol(s)
@@ -299,12 +317,14 @@ class SymbolTableVisitor(visitor.Visitor):
     def _(self, node: ast.ClassDefNode):
         # We cannot redefine classes
         if self.is_defined(node.name):
-            raise semantic_error.RedefinedIdentifierException(node.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.RedefinedIdentifierException(node.name.name,
+                                                                    self.curr_sym_table.get_name()), node)
         self.do_visit(node.name)
 
         # check if super class is defined
         if not self.is_defined(node.super_class) and node.super_class.name != "object":
-            raise semantic_error.UndefinedIdentifierException(node.super_class.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.UndefinedIdentifierException(node.super_class.name,
+                                                                    self.curr_sym_table.get_name()), node.super_class)
         self.do_visit(node.super_class)
 
         self.parent_sym_table = self.curr_sym_table
@@ -337,7 +357,8 @@ class SymbolTableVisitor(visitor.Visitor):
     def _(self, node: ast.FuncDefNode):
         # We cannot overload / redefine functions
         if self.is_defined(node.name):
-            raise semantic_error.RedefinedIdentifierException(node.name, self.curr_sym_table.get_name())
+            self.report(semantic_error.RedefinedIdentifierException(node.name.name,
+                                                                    self.curr_sym_table.get_name()), node)
         self.do_visit(node.name)
 
         is_nested = False
@@ -373,6 +394,7 @@ class SymbolTableVisitor(visitor.Visitor):
     @visit.register
     def _(self, node: ast.ProgramNode):
         self.root_sym_table = symbol_table.SymbolTable('top')
+        self.root_sym_table.set_parent(symbol_table.prelude())
         self.curr_sym_table = self.root_sym_table
         for d in node.declarations:
             self.do_visit(d)
@@ -380,5 +402,15 @@ class SymbolTableVisitor(visitor.Visitor):
             self.do_visit(s)
         self.curr_sym_table = self.root_sym_table
 
+    def visit_top_level(self, st: symbol_table.SymbolTable, node: ast.Node):
+        """
+        Visits one top-level declaration or statement with st as the module table, as an editor does when it analyses
+        a program one part at a time. st holds the symbols of the parts before node, node adds its own.
+        """
+        self.root_sym_table = self.curr_sym_table = st
+        self.parent_sym_table = None
+        self.do_visit(node)
+        self.curr_sym_table = self.root_sym_table
+
     def get_symbol_table(self) -> symbol_table.SymbolTable:
         return self.root_sym_table
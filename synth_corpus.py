@@ -0,0 +1,392 @@
+#
+# Synthetic corpus generator. Version 1.0
+#
+# Generates well-typed ChocoPy programs of a controllable size and shape for benchmarks: the number of classes and the
+# depth of their inheritance, the number of functions, the nesting of blocks and nested functions, the size of the
+# expressions and of the list literals, and the share of strings in the code. The same seed and shape give the same
+# program. The programs use every kind of declaration, statement and expression: globals, attributes, overriding
+# methods, constructors, nested functions with nonlocal and global declarations, if/elif/else, while and for loops,
+# conditional expressions joining class types, lists and strings with concatenation, indexing and len.
+#
+# The programs are meant to be compiled. Running them terminates (loops are bounded, functions only call the functions
+# before them and methods call nothing), but the calls fan out, so a large program may run for long.
+#
+# Usage: python synth_corpus.py [--seed=N] [--count=N] [--out=DIR] [--SHAPE=VALUE...]
+#        (SHAPE is one of the keys of SHAPE, e.g. --functions=200 --depth=4 --strings=0.5)
+#
+import os
+import random
+import sys
+
+# The shape of a program and its default values.
+SHAPE = {
+    'classes': 10,       # Number of classes.
+    'depth': 3,          # Largest depth of the inheritance (1: all classes inherit from object).
+    'functions': 50,     # Number of top-level functions.
+    'nesting': 2,        # Largest nesting of blocks in a body, and of nested functions.
+    'statements': 6,     # Statements in a body, and in a block at most.
+    'expr_size': 6,      # Largest number of leaves in an expression.
+    'list_size': 4,      # Number of elements of the list literals, at least 1 (they are indexed and iterated).
+    'strings': 0.2,      # Share of the values of type str.
+}
+# Presets for the benchmarks, each a change from the default shape.
+PRESETS = {
+    'default': {},
+    'classes': {'classes': 40, 'depth': 8},
+    'nested': {'nesting': 4, 'statements': 4},
+    'expressions': {'expr_size': 24, 'list_size': 12},
+    'strings': {'strings': 0.7},
+}
+WORDS = ['choco', 'py', 'lexer', 'parse', 'type', 'class', 'object', 'token', 'scope', 'value', 'list', 'node']
+NOT_NONE = ('int', 'bool', 'str')
+
+
+class Env:
+    """
+    The names visible at a point of a body: name (or attribute path, e.g. 'self.a1') -> type, the names that may be
+    assigned there, and the callables: name (or method path) -> (parameter types, return type). The locals of the
+    function are those it defines, the enclosing locals those of the function around it.
+    """
+    def __init__(self, names: dict = None, assignable: set = None, callables: dict = None):
+        self.names = dict(names or {})
+        self.assignable = set(assignable or ())
+        self.callables = dict(callables or {})
+        self.locals = []
+        self.enclosing_locals = []
+
+    def nested(self) -> 'Env':
+        """
+        The environment of a nested function: the names are readable, not assignable.
+        """
+        env = Env(self.names, (), self.callables)
+        env.enclosing_locals = self.locals
+        return env
+
+
+class Generator:
+
+    def __init__(self, seed: int = 0, **shape):
+        unknown = set(shape) - set(SHAPE)
+        if unknown:
+            raise ValueError(f"Unknown shape parameters {sorted(unknown)}, they are {list(SHAPE)}")
+        self.shape = {**SHAPE, **shape}
+        if self.shape['list_size'] < 1:
+            raise ValueError(f"list_size is {self.shape['list_size']}, it must be at least 1")
+        self.rng = random.Random(seed)
+        self.lines = []
+        self.counter = 0
+        self.parents = {}  # Class -> superclass.
+        self.attributes = {}  # Class -> {attribute: type}, the inherited ones included.
+        self.methods = {}  # Class -> {method: (parameter types, return type)}, the inherited ones included.
+        self.globals = {}  # Global variable -> type.
+        self.functions = {}  # Function -> (parameter types, return type).
+
+    def fresh(self, prefix: str) -> str:
+        self.counter += 1
+        return f'{prefix}{self.counter}'
+
+    # Types and values.
+
+    def scalar_type(self) -> str:
+        r = self.rng.random()
+        if r < self.shape['strings']:
+            return 'str'
+        return 'int' if r < self.shape['strings'] + (1 - self.shape['strings']) * 0.75 else 'bool'
+
+    def value_type(self) -> str:
+        r = self.rng.random()
+        if r < 0.15:
+            return '[int]'
+        if r < 0.3 and self.parents:
+            return self.rng.choice(list(self.parents))
+        return self.scalar_type()
+
+    def subclass_of(self, t: str) -> str:
+        subclasses = [c for c in self.parents if t in self.ancestors(c)]
+        return self.rng.choice(subclasses)
+
+    def ancestors(self, c: str) -> list:
+        result = [c]
+        while c in self.parents:
+            c = self.parents[c]
+            result.append(c)
+        return result
+
+    def literal(self, t: str) -> str:
+        if t == 'int':
+            return str(self.rng.randint(0, 99))
+        if t == 'bool':
+            return self.rng.choice(['True', 'False'])
+        if t == 'str':
+            n = 1 + int(self.shape['strings'] * 6)
+            return '"' + ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(1, n))) + '"'
+        if t == '[int]':
+            return '[' + ', '.join(str(self.rng.randint(0, 99)) for _ in range(self.shape['list_size'])) + ']'
+        return f'{self.subclass_of(t)}()'
+
+    def initial(self, t: str) -> str:
+        """
+        The initial value of a variable of type t in its definition.
+        """
+        return self.literal(t) if t in NOT_NONE else 'None'
+
+    # Expressions.
+
+    def expr(self, t: str, size: int, env: Env) -> str:
+        """
+        An expression of type t with at most size leaves. Lists, strings and objects are never None or empty, so
+        indexing them and calling their methods cannot fail.
+        """
+        if size <= 1 or self.rng.random() < 0.2:
+            return self.leaf(t, env)
+        left = self.rng.randint(1, size - 1)
+        right = size - left
+        choice = self.rng.random()
+        calls = [name for name, (_, ret) in env.callables.items() if ret == t]
+        if choice < 0.15 and calls:
+            return self.call(self.rng.choice(calls), size - 1, env)
+        if choice < 0.25:
+            return f'({self.expr(t, left, env)} if {self.expr("bool", 1, env)} else {self.expr(t, right, env)})'
+        if t == 'int':
+            r = self.rng.random()
+            if r < 0.55:
+                return f'({self.expr("int", left, env)} {self.rng.choice("+-*")} {self.expr("int", right, env)})'
+            if r < 0.7:
+                return f'({self.expr("int", size - 1, env)} {self.rng.choice(["//", "%"])} {self.rng.randint(1, 9)})'
+            if r < 0.8:
+                return f'len({self.expr(self.rng.choice(["str", "[int]"]), size - 1, env)})'
+            if r < 0.9:
+                return f'{self.expr("[int]", size - 1, env)}[0]'
+            return f'(-{self.expr("int", size - 1, env)})'
+        if t == 'bool':
+            r = self.rng.random()
+            if r < 0.5:
+                op = self.rng.choice(['<', '<=', '>', '>=', '==', '!='])
+                return f'({self.expr("int", left, env)} {op} {self.expr("int", right, env)})'
+            if r < 0.65:
+                return f'({self.expr("str", left, env)} {self.rng.choice(["==", "!="])} {self.expr("str", right, env)})'
+            if r < 0.85:
+                return f'({self.expr("bool", left, env)} {self.rng.choice(["and", "or"])} ' \
+                       f'{self.expr("bool", right, env)})'
+            return f'(not {self.expr("bool", size - 1, env)})'
+        if t == 'str':
+            if self.rng.random() < 0.8:
+                return f'({self.expr("str", left, env)} + {self.expr("str", right, env)})'
+            return f'{self.expr("str", size - 1, env)}[0]'
+        if t == '[int]':
+            if self.rng.random() < 0.5:
+                return f'({self.expr("[int]", left, env)} + {self.expr("[int]", right, env)})'
+            return '[' + ', '.join(self.expr('int', max(1, size // self.shape['list_size']), env)
+                                   for _ in range(self.shape['list_size'])) + ']'
+        # An object: a constructor, or two joined to their closest common superclass of type t.
+        a, b = self.subclass_of(t), self.subclass_of(t)
+        if a != b and t in self.ancestors(a) and t in self.ancestors(b):
+            return f'({a}() if {self.expr("bool", size - 1, env)} else {b}())'
+        return f'{a}()'
+
+    def leaf(self, t: str, env: Env) -> str:
+        names = [n for n, nt in env.names.items() if nt == t or nt in self.parents and t in self.ancestors(nt)]
+        if names and self.rng.random() < 0.7:
+            return self.rng.choice(names)
+        return self.literal(t)
+
+    def call(self, name: str, size: int, env: Env) -> str:
+        params, _ = env.callables[name]
+        size = max(1, size // max(1, len(params)))
+        return f'{name}(' + ', '.join(self.expr(p, size, env) for p in params) + ')'
+
+    # Statements.
+
+    def block(self, env: Env, indent: str, depth: int, decls: list) -> list:
+        """
+        The statements of a block, at least one. decls receives the definitions of the loop variables it needs.
+        """
+        lines = []
+        for _ in range(self.rng.randint(1, self.shape['statements'])):
+            lines += self.statement(env, indent, depth, decls)
+        return lines
+
+    def statement(self, env: Env, indent: str, depth: int, decls: list) -> list:
+        size = self.rng.randint(1, self.shape['expr_size'])
+        r = self.rng.random()
+        if depth < self.shape['nesting'] and r < 0.3:
+            kind = self.rng.choice(['if', 'while', 'for', 'for_str'])
+            inner = indent + '    '
+            if kind == 'if':
+                lines = [f'{indent}if {self.expr("bool", size, env)}:'] + self.block(env, inner, depth + 1, decls)
+                if self.rng.random() < 0.4:
+                    lines += [f'{indent}elif {self.expr("bool", size, env)}:'] \
+                        + self.block(env, inner, depth + 1, decls)
+                if self.rng.random() < 0.5:
+                    lines += [f'{indent}else:'] + self.block(env, inner, depth + 1, decls)
+                return lines
+            if kind == 'while':
+                i = self.fresh('i')
+                decls.append(f'{i}: int = 0')
+                env.names[i] = 'int'
+                return [f'{indent}while {i} < {self.rng.randint(1, 5)}:'] \
+                    + self.block(env, inner, depth + 1, decls) + [f'{inner}{i} = {i} + 1']
+            v = self.fresh('v')
+            t = 'int' if kind == 'for' else 'str'
+            decls.append(f'{v}: {t} = {self.literal(t)}')
+            env.names[v] = t
+            iterable = self.expr('[int]' if t == 'int' else 'str', size, env)
+            return [f'{indent}for {v} in {iterable}:'] + self.block(env, inner, depth + 1, decls)
+        targets = sorted(env.assignable)
+        if r < 0.75 and targets:
+            target = self.rng.choice(targets)
+            return [f'{indent}{target} = {self.expr(env.names[target], size, env)}']
+        calls = list(env.callables)
+        if r < 0.9 and calls:
+            return [f'{indent}{self.call(self.rng.choice(calls), size, env)}']
+        return [f'{indent}print({self.expr(self.scalar_type(), size, env)})']
+
+    # Declarations.
+
+    def function(self, name: str, params: list, ret: str, env: Env, indent: str, depth: int,
+                 method_of: str = None) -> list:
+        """
+        The definition of a function (or of a method of class method_of) with the given parameter types, whose body
+        sees env.
+        """
+        inner = indent + '    '
+        env = env.nested()
+        names = []
+        if method_of:
+            names.append(('self', f'"{method_of}"'))
+            env.names.update({f'self.{a}': t for a, t in self.attributes[method_of].items()})
+            env.assignable.update(f'self.{a}' for a in self.attributes[method_of])
+        for t in params:
+            p = self.fresh('p')
+            names.append((p, t))
+            env.names[p] = t
+            env.assignable.add(p)
+        header = f'{indent}def {name}(' + ', '.join(f'{p}: {t}' for p, t in names) + ')'
+        header += f' -> {ret}:' if ret else ':'
+
+        decls, body = [], []
+        # Assigning enclosing variables: globals in a top-level function, the enclosing locals in a nested one.
+        if depth == 0 and not method_of and self.globals and self.rng.random() < 0.3:
+            g = self.rng.choice(sorted(self.globals))
+            decls.append(f'global {g}')
+            env.assignable.add(g)
+        outer = [n for n in env.enclosing_locals if env.names[n] in NOT_NONE]
+        if depth > 0 and outer and self.rng.random() < 0.5:
+            n = self.rng.choice(outer)
+            decls.append(f'nonlocal {n}')
+            env.assignable.add(n)
+        for _ in range(self.rng.randint(1, 3)):
+            t = self.value_type()
+            local = self.fresh('l')
+            decls.append(f'{local}: {t} = {self.initial(t)}')
+            if t not in NOT_NONE:
+                body.append(f'{inner}{local} = {self.literal(t)}')  # Lists and objects are never None when used.
+            env.names[local] = t
+            env.assignable.add(local)
+            env.locals.append(local)
+            if t in self.parents:
+                env.names.update({f'{local}.{a}': at for a, at in self.attributes[t].items()})
+                env.assignable.update(f'{local}.{a}' for a in self.attributes[t])
+                env.callables.update({f'{local}.{m}': sig for m, sig in self.methods[t].items()})
+        nested = []
+        if not method_of and depth < self.shape['nesting'] - 1 and self.rng.random() < 0.3:
+            g = self.fresh('g')
+            sig = ([self.scalar_type()], self.scalar_type())
+            nested = self.function(g, *sig, env, inner, depth + 1)
+            env.callables[g] = sig
+        body += self.block(env, inner, 0, decls)
+        if ret in self.parents:  # The type checker wants the return type itself, not a subclass.
+            value = self.rng.choice([n for n, t in env.names.items() if t == ret] + [f'{ret}()'])
+            body.append(f'{inner}return {value}')
+        elif ret:
+            body.append(f'{inner}return {self.expr(ret, self.shape["expr_size"], env)}')
+        return [header] + [inner + d for d in decls] + nested + body
+
+    def classes(self) -> list:
+        lines = []
+        depth = {}
+        for i in range(self.shape['classes']):
+            name = f'K{i}'
+            bases = [c for c in self.parents if depth[c] < self.shape['depth']]
+            parent = self.rng.choice(bases) if bases and self.rng.random() < 0.7 else 'object'
+            depth[name] = depth.get(parent, 0) + 1
+            self.attributes[name] = dict(self.attributes.get(parent, {}))
+            self.methods[name] = dict(self.methods.get(parent, {}))
+            lines.append(f'class {name}({parent}):')
+            for _ in range(self.rng.randint(1, 3)):
+                a, t = self.fresh('a'), self.scalar_type()
+                lines.append(f'    {a}: {t} = {self.literal(t)}')
+                self.attributes[name][a] = t
+            if self.rng.random() < 0.3:
+                lines += self.function('__init__', [], '', Env(), '    ', 0, name)
+            inherited = list(self.methods[name].items())
+            for m, sig in self.rng.sample(inherited, min(len(inherited), self.rng.randint(0, 1))):
+                lines += self.function(m, *sig, Env(), '    ', 0, name)  # Overriding.
+            for _ in range(self.rng.randint(1, 2)):
+                m, sig = self.fresh('m'), ([self.scalar_type()], self.scalar_type())
+                self.methods[name][m] = sig
+                lines += self.function(m, *sig, Env(), '    ', 0, name)
+            self.parents[name] = parent  # The class is used after its definition only.
+        return lines
+
+    def program(self) -> str:
+        lines = []
+        for _ in range(max(1, self.shape['functions'] // 10)):
+            g, t = self.fresh('gv'), self.scalar_type()
+            lines.append(f'{g}: {t} = {self.literal(t)}')
+            self.globals[g] = t
+        lines += self.classes()
+        for i in range(self.shape['functions']):
+            name = f'f{i}'
+            sig = ([self.value_type() for _ in range(self.rng.randint(1, 3))], self.value_type())
+            env = Env(self.globals, (), self.functions)
+            lines += self.function(name, *sig, env, '', 0)
+            self.functions[name] = sig
+        env = Env(self.globals, self.globals, self.functions)
+        for name in list(self.functions)[-3:]:
+            ret = self.functions[name][1]
+            call = self.call(name, self.shape['expr_size'], env)
+            lines.append(f'print({call})' if ret in NOT_NONE else f'print(len({call}))' if ret == '[int]' else call)
+        return '\n'.join(lines) + '\n'
+
+
+def generate(seed: int = 0, **shape) -> str:
+    """
+    Returns a program of the given shape (see SHAPE), the same for the same seed and shape.
+    """
+    return Generator(seed, **shape).program()
+
+
+def main(argv):
+    seed, count, out = 0, 1, None
+    shape = {}
+    for a in argv:
+        name, _, value = a.partition('=')
+        if name == '--seed':
+            seed = int(value)
+        elif name == '--count':
+            count = int(value)
+        elif name == '--out':
+            out = value
+        elif name[2:] in SHAPE:
+            shape[name[2:]] = type(SHAPE[name[2:]])(value)
+        else:
+            print(f"Unknown option {a}", file=sys.stderr)
+            return 2
+    for i in range(count):
+        try:
+            text = generate(seed + i, **shape)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        if out is None:
+            sys.stdout.write(text)
+            continue
+        os.makedirs(out, exist_ok=True)
+        with open(os.path.join(out, f'synth_{seed + i}.py'), 'w') as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
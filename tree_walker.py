@@ -0,0 +1,296 @@
+#
+# Tree-walking interpreter. Version 1.0
+#
+# A naive interpreter of type-checked ProgramNodes, the baseline of the execution benchmarks (see bench_exec.py): it
+# visits the AST as it runs, dispatching on the class of every node it evaluates, keeps the variables of each scope in
+# a dictionary searched along the static links, and returns from functions with an exception. It implements the same
+# ChocoPy semantics as the closure engine, with the run-time errors of runtime.py.
+#
+import sys
+import astree as ast
+from astree import Operator
+import visitor
+import runtime
+from runtime import operation_on_none, index_out_of_bounds
+
+
+class Frame:
+    """
+    The variables of a module or function scope, the names it declares global, and its static link (the frame of the
+    enclosing function, or the module frame).
+    """
+    def __init__(self, parent: "Frame" = None):
+        self.parent = parent
+        self.module = parent.module if parent else self
+        self.vars = {}
+        self.globals = set()
+
+    def find(self, name: str) -> "Frame":
+        """
+        Returns the frame holding a variable.
+        """
+        if name in self.globals:
+            return self.module
+        frame = self
+        while name not in frame.vars:
+            frame = frame.parent
+        return frame
+
+
+class Function:
+    """
+    A function or method: its definition and the frame it was defined in.
+    """
+    def __init__(self, node: ast.FuncDefNode, frame: Frame):
+        self.node = node
+        self.frame = frame
+
+
+class Class:
+    """
+    A class: its attributes with their initial values and its methods, inherited ones included.
+    """
+    def __init__(self, name: str, base: "Class", attrs: dict, methods: dict):
+        self.name = name
+        self.attrs = {**base.attrs, **attrs} if base else attrs
+        self.methods = {**base.methods, **methods} if base else methods
+
+
+class Instance:
+    """
+    An object, with its attributes in a dictionary.
+    """
+    def __init__(self, cls: Class):
+        self.cls = cls
+        self.fields = dict(cls.attrs)
+
+
+class Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class Interpreter(visitor.Visitor):
+
+    def __init__(self, out=None, inp=None):
+        self.write = (out or sys.stdout).write
+        self.readline = (inp or sys.stdin).readline
+
+    def run(self, node: ast.ProgramNode):
+        """
+        Runs a program. Raises runtime.RuntimeException on ChocoPy run-time errors, out of memory when the calls nest
+        too deeply.
+        """
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 1000000))
+        try:
+            self.visit(node, Frame())
+        except RecursionError:
+            runtime.out_of_memory()
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def visit(self, node, frame: Frame):
+        # Looked up by name on every visit, as ast.NodeVisitor does (a Python call, so the recursion stays off the C
+        # stack, unlike functools.singledispatchmethod).
+        return getattr(self, 'visit_' + type(node).__name__)(node, frame)
+
+    def declare(self, declarations: list, frame: Frame):
+        for d in declarations:
+            if isinstance(d, ast.VarDefNode):
+                frame.vars[d.var.identifier.name] = d.value.get_value()
+            elif isinstance(d, ast.GlobalDeclNode):
+                frame.globals.add(d.variable.name)
+            elif isinstance(d, ast.FuncDefNode):
+                frame.vars[d.name.name] = Function(d, frame)
+            elif isinstance(d, ast.ClassDefNode):
+                attrs, methods = {}, {}
+                for m in d.declarations:
+                    if isinstance(m, ast.VarDefNode):
+                        attrs[m.var.identifier.name] = m.value.get_value()
+                    elif isinstance(m, ast.FuncDefNode):
+                        methods[m.name.name] = Function(m, frame)
+                base = frame.vars.get(d.super_class.name)
+                frame.vars[d.name.name] = Class(d.name.name, base, attrs, methods)
+
+    def call(self, function: Function, args: list):
+        frame = Frame(function.frame)
+        for p, v in zip(function.node.params, args):
+            frame.vars[p.identifier.name] = v
+        self.declare(function.node.declarations, frame)
+        try:
+            for s in function.node.statements:
+                self.visit(s, frame)
+        except Return as r:
+            return r.value
+
+    ####################################################################################################################
+    # Statements.
+
+    def visit_ProgramNode(self, node: ast.ProgramNode, frame: Frame):
+        self.declare(node.declarations, frame)
+        for s in node.statements:
+            self.visit(s, frame)
+
+    def visit_ExprStmt(self, node: ast.ExprStmt, frame: Frame):
+        self.visit(node.expr, frame)
+
+    def visit_PassStmtNode(self, node: ast.PassStmtNode, frame: Frame):
+        pass
+
+    def visit_ReturnStmtNode(self, node: ast.ReturnStmtNode, frame: Frame):
+        raise Return(None if node.expr is None else self.visit(node.expr, frame))
+
+    def visit_AssignStmtNode(self, node: ast.AssignStmtNode, frame: Frame):
+        v = self.visit(node.expr, frame)
+        for t in node.targets:
+            self.assign(t, v, frame)
+
+    def assign(self, target: ast.ExprNode, v, frame: Frame):
+        if isinstance(target, ast.IdentifierExprNode):
+            frame.find(target.identifier.name).vars[target.identifier.name] = v
+        elif isinstance(target, ast.MemberExprNode):
+            obj = self.visit(target.expr_object, frame)
+            if obj is None:
+                operation_on_none()
+            obj.fields[target.member.name] = v
+        else:
+            a, i = self.visit(target.list_expr, frame), self.visit(target.index, frame)
+            if a is None:
+                operation_on_none()
+            if i < 0 or i >= len(a):
+                index_out_of_bounds()
+            a[i] = v
+
+    def visit_IfStmtNode(self, node: ast.IfStmtNode, frame: Frame):
+        for c, body in [(node.condition, node.then_body)] + node.elifs:
+            if self.visit(c, frame):
+                for s in body:
+                    self.visit(s, frame)
+                return
+        for s in node.else_body or []:
+            self.visit(s, frame)
+
+    def visit_WhileStmtNode(self, node: ast.WhileStmtNode, frame: Frame):
+        while self.visit(node.condition, frame):
+            for s in node.body:
+                self.visit(s, frame)
+
+    def visit_ForStmtNode(self, node: ast.ForStmtNode, frame: Frame):
+        seq = self.visit(node.iterable, frame)
+        if seq is None:
+            operation_on_none()
+        for v in seq:
+            frame.find(node.identifier.name).vars[node.identifier.name] = v
+            for s in node.body:
+                self.visit(s, frame)
+
+    ####################################################################################################################
+    # Expressions.
+
+    def visit_LiteralExprNode(self, node: ast.LiteralExprNode, frame: Frame):
+        return node.get_value()
+
+    visit_NoneLiteralExprNode = visit_StringLiteralExprNode = visit_IntegerLiteralExprNode = visit_LiteralExprNode
+    visit_BooleanLiteralExprNode = visit_LiteralExprNode
+
+    def visit_IdentifierExprNode(self, node: ast.IdentifierExprNode, frame: Frame):
+        return frame.find(node.identifier.name).vars[node.identifier.name]
+
+    def visit_UnaryOpExprNode(self, node: ast.UnaryOpExprNode, frame: Frame):
+        v = self.visit(node.operand, frame)
+        if node.op == Operator.Not:
+            return not v
+        return runtime.check_int(-v)
+
+    def visit_BinaryOpExprNode(self, node: ast.BinaryOpExprNode, frame: Frame):
+        op = node.op
+        lhs = self.visit(node.lhs, frame)
+        if op == Operator.And:
+            return lhs and self.visit(node.rhs, frame)
+        if op == Operator.Or:
+            return lhs or self.visit(node.rhs, frame)
+        rhs = self.visit(node.rhs, frame)
+        if op == Operator.Is:
+            return lhs is rhs
+        if op == Operator.Eq:
+            return lhs == rhs
+        if op == Operator.NotEq:
+            return lhs != rhs
+        if op == Operator.Lt:
+            return lhs < rhs
+        if op == Operator.LtEq:
+            return lhs <= rhs
+        if op == Operator.Gt:
+            return lhs > rhs
+        if op == Operator.GtEq:
+            return lhs >= rhs
+        if op == Operator.Minus:
+            return runtime.check_int(lhs - rhs)
+        if op == Operator.Mult:
+            return runtime.check_int(lhs * rhs)
+        if op == Operator.IntDivide:
+            return runtime.int_div(lhs, rhs)
+        if op == Operator.Modulus:
+            return runtime.int_mod(lhs, rhs)
+        if node.lhs.get_type_str() == 'int':
+            return runtime.check_int(lhs + rhs)
+        if lhs is None or rhs is None:
+            operation_on_none()
+        return lhs + rhs
+
+    def visit_IfExprNode(self, node: ast.IfExprNode, frame: Frame):
+        if self.visit(node.condition, frame):
+            return self.visit(node.then_expr, frame)
+        return self.visit(node.else_expr, frame)
+
+    def visit_IndexExprNode(self, node: ast.IndexExprNode, frame: Frame):
+        a, i = self.visit(node.list_expr, frame), self.visit(node.index, frame)
+        if a is None:
+            operation_on_none()
+        if i < 0 or i >= len(a):
+            index_out_of_bounds()
+        return a[i]
+
+    def visit_MemberExprNode(self, node: ast.MemberExprNode, frame: Frame):
+        obj = self.visit(node.expr_object, frame)
+        if obj is None:
+            operation_on_none()
+        return obj.fields[node.member.name]
+
+    def visit_ListExprNode(self, node: ast.ListExprNode, frame: Frame):
+        return [self.visit(e, frame) for e in node.elements]
+
+    def visit_MethodCallExprNode(self, node: ast.MethodCallExprNode, frame: Frame):
+        obj = self.visit(node.member.expr_object, frame)
+        args = [self.visit(a, frame) for a in node.args]
+        if obj is None:
+            operation_on_none()
+        return self.call(obj.cls.methods[node.member.member.name], [obj] + args)
+
+    def visit_FunctionCallExprNode(self, node: ast.FunctionCallExprNode, frame: Frame):
+        name = node.identifier.name
+        args = [self.visit(a, frame) for a in node.args]
+        if name in frame.globals:
+            frame = frame.module
+        while frame and name not in frame.vars:
+            frame = frame.parent
+        if frame is None:
+            return self.call_built_in(name, args)
+        f = frame.vars[name]
+        if isinstance(f, Function):
+            return self.call(f, args)
+        obj = Instance(f)
+        if '__init__' in f.methods:
+            self.call(f.methods['__init__'], [obj])
+        return obj
+
+    def call_built_in(self, name: str, args: list):
+        if name == 'print':
+            self.write(runtime.to_str(args[0]) + "\n")
+        elif name == 'len':
+            return runtime.builtin_len(args[0])
+        else:
+            assert name == 'input', f"Should not happen, unknown function {name}."
+            line = self.readline()
+            return line[:-1] if line.endswith("\n") else line
@@ -73,10 +73,9 @@ class TypeEnvironment:
         """
         Enter a new scope, adjust the current symbol-table accordingly.
         """
-        for st in self.scope_symbol_table.get_children():
-            if st.get_name() == name:
-                self.scope_symbol_table = st
-                return
+        if st := self.scope_symbol_table.get_child(name):
+            self.scope_symbol_table = st
+            return
         assert False, f"Non-existing name '{name}' in enter_scope call."
 
     def exit_scope(self):
@@ -88,6 +87,39 @@ class TypeEnvironment:
             return
         assert False, "exit_scope called when in top-most (module) scope."
 
+    def get_class_symbol_table(self, t: str):
+        """
+        Returns the symbol-table of class t (user-defined or built-in), or None if t is not a class.
+        """
+        st = self.symbol_table
+        while st:
+            if (cst := st.get_child(t)) and cst.get_type() == 'class':
+                return cst
+            if cst:  # A function of the same name comes first, look further.
+                for cst in st.get_children():
+                    if cst.get_type() == 'class' and cst.get_name() == t:
+                        return cst
+            st = st.get_parent()
+        return None
+
+    def get_member_symbol(self, t: str, name: str):
+        """
+        Returns the symbol of attribute or method name of class t, possibly inherited, or None if there is none.
+        """
+        for c in [t] + self.get_supertypes_of(t):
+            if (st := self.get_class_symbol_table(c)) and (s := st.lookup(name)):
+                return s
+        return None
+
+    def get_method_symbol_table(self, t: str, name: str):
+        """
+        Returns the symbol-table of method name of class t, possibly inherited, or None if there is none.
+        """
+        for c in [t] + self.get_supertypes_of(t):
+            if (st := self.get_class_symbol_table(c)) and (m_st := st.get_methods_sym_table(name)):
+                return m_st
+        return None
+
     def get_subtypes(self):
         """
         Returns a dictionary of user-defined types/subtypes.
@@ -129,8 +161,10 @@ class TypeEnvironment:
     def is_assign_comp(self, t1: str, t2: str):
         """
         Returns True if t1 and t2 are assignment compatible, otherwise False.
+        The '<Error>' type (of expressions that failed checking) is compatible with all types.
         """
         return self.is_comp(t1, t2) \
+            or '<Error>' in (t1, t2) \
             or t1 == '<None>' and t2 not in ['bool', 'int', 'str'] \
             or t1 == '<Empty>' and TypeEnvironment.is_list_type(t2) \
             or (t1 == '[<None>]' and TypeEnvironment.is_list_type(t2)
@@ -155,6 +189,8 @@ class TypeEnvironment:
         Returns the join type for types t1 and t2.
         """
 
+        if '<Error>' in (t1, t2):
+            return '<Error>'
         if self.is_assign_comp(t1, t2):
             return t2
         elif self.is_assign_comp(t2, t1):
@@ -1,54 +1,64 @@
+import concurrent.futures
 import functools
+import gc
+import time
 import astree as ast
 from astree import Operator
 import visitor
 import semantic_error
 import symbol_table
-from symbol_table import Symbol
 import type_env
 
 
 class TypeVisitor(visitor.Visitor):
 
-    def __init__(self, t_env: type_env.TypeEnvironment):
+    def __init__(self, t_env: type_env.TypeEnvironment, collect_errors=False, lazy=False, workers=None):
         self.t_env = t_env
-        self.upd_sym_table()
-
-    def upd_sym_table(self):
-        # We update the provided symbol-table with the built-in entities (thus no need to handle them specifically).
-        # We update the provided symbol-table with the built-in entities (thus no need to handle them specifically).
-        st = self.t_env.get_symbol_table()
-        # The 'print' function.
-        f_st = symbol_table.Function('print')
-        f_st.add_symbol(symbol_table.Symbol('val', Symbol.Is.Parameter, 'object'))
-        st.add_symbol(symbol_table.Symbol('print', Symbol.Is.Global, '<None>'))
-        st.add_child(f_st)
-        # The 'input' function.
-        f_st = symbol_table.Function('input')
-        st.add_symbol(symbol_table.Symbol('input', Symbol.Is.Global, 'str'))
-        st.add_child(f_st)
-        # The 'len' function.
-        f_st = symbol_table.Function('len')
-        f_st.add_symbol(symbol_table.Symbol('val', Symbol.Is.Parameter, 'object'))
-        st.add_symbol(symbol_table.Symbol('len', Symbol.Is.Global, 'int'))
-        st.add_child(f_st)
-        # The 'object' class with constructor.
-        c_st = symbol_table.Class('object', '')
-        f_st = symbol_table.Function('__init__')
-        f_st.add_symbol(symbol_table.Symbol('self', Symbol.Is.Parameter, 'object'))
-        c_st.add_symbol(symbol_table.Symbol('__init__', Symbol.Is.Local, '<None>'))
-        c_st.add_child(f_st)
-        st.add_child(c_st)
+        # In collect-all-errors mode semantic errors are recorded as diagnostics instead of being raised, and the
+        # offending expressions get the '<Error>' type so that checking can continue.
+        self.collect_errors = collect_errors
+        self.diagnostics = []
+        # In lazy mode visiting the program checks the declarations only (classes, signatures, variable definitions),
+        # the statements of each function body are checked on demand by check_function or check_all.
+        self.lazy = lazy
+        self.pending = {}  # Qualified function name (e.g., 'f', 'C.m', 'f.g') -> statements of its body.
+        self.checked = {}  # Qualified function name -> its diagnostics, or the exception raised while checking it.
+        self.positions = {}  # Qualified function name -> number of diagnostics recorded before its body.
+        self.module_statements = None
+        # With workers the function bodies are checked in that many processes (see check_parallel).
+        self.workers = workers
+        self.timings = {}
+
+    def report(self, e: semantic_error.CompilerException, node: ast.Node):
+        """
+        Raises the semantic error e, or records it as a diagnostic in collect-all-errors mode.
+        """
+        if not self.collect_errors:
+            raise e
+        self.diagnostics.append(semantic_error.Diagnostic.from_exception(e, node))
+
+    def get_diagnostics(self) -> list[semantic_error.Diagnostic]:
+        return self.diagnostics
 
     def invalid_use_error(self, node: ast.Node, text: str):
-        raise semantic_error.InvalidUseException(text, self.t_env.get_scope_symbol_table().get_name(), node)
+        self.report(semantic_error.InvalidUseException(text, self.t_env.get_scope_symbol_table().get_name(), node),
+                    node)
 
     def type_error(self, node: ast.Node, type_str_1: str, type_str_2: str):
-        raise semantic_error.TypeException(type_str_1, type_str_2, self.t_env.get_scope_symbol_table().get_name(), node)
+        self.report(semantic_error.TypeException(type_str_1, type_str_2,
+                                                 self.t_env.get_scope_symbol_table().get_name(), node), node)
 
     def attribute_error(self, node: ast.Node, type_str: str, attribute_str: str):
-        raise semantic_error.AttributeException(type_str, attribute_str,
-                                                self.t_env.get_scope_symbol_table().get_name(), node)
+        self.report(semantic_error.AttributeException(type_str, attribute_str,
+                                                      self.t_env.get_scope_symbol_table().get_name(), node), node)
+
+    def missing_symbol(self, name: str):
+        """
+        Handles a name missing from the symbol table. In collect-all-errors mode the symbol-table construction already
+        recorded an error for it, otherwise it is raised as undefined.
+        """
+        if not self.collect_errors:
+            raise semantic_error.UndefinedIdentifierException(name, self.t_env.get_scope_symbol_table().get_name())
 
     class Signature:
         """
@@ -121,6 +131,52 @@ class TypeVisitor(visitor.Visitor):
         if node:
             self.visit(node)
 
+    def get_functions(self) -> list[str]:
+        """
+        Returns the qualified names of the functions and methods whose bodies are checked on demand, in declaration
+        order.
+        """
+        return list(self.pending)
+
+    def check_function(self, name: str) -> list[semantic_error.Diagnostic]:
+        """
+        Type-checks the body of function/method name (qualified with the enclosing classes and functions, e.g., 'C.m')
+        in lazy mode and returns its diagnostics. The result is memoized, so a body is checked at most once.
+        """
+        if name not in self.checked:
+            statements = self.pending[name]
+            path = name.split('.')
+            start = len(self.diagnostics)
+            for scope in path:
+                self.t_env.enter_scope(scope)
+            try:
+                for s in statements:
+                    self.do_visit(s)
+            except semantic_error.CompilerException as e:
+                self.checked[name] = e
+            else:
+                self.checked[name] = self.diagnostics[start:]
+            finally:
+                for _ in path:
+                    self.t_env.exit_scope()
+        result = self.checked[name]
+        if isinstance(result, semantic_error.CompilerException):
+            raise result
+        return result
+
+    def check_all(self) -> list[semantic_error.Diagnostic]:
+        """
+        Type-checks, in lazy mode, the function bodies not checked yet and the top-level statements, and returns all
+        the diagnostics.
+        """
+        for name in self.pending:
+            self.check_function(name)
+        if self.module_statements is not None:
+            statements, self.module_statements = self.module_statements, None
+            for s in statements:
+                self.do_visit(s)
+        return self.diagnostics
+
     @functools.singledispatchmethod
     def visit(self, node):
         print("Visitor support missing for", type(node))
@@ -151,10 +207,15 @@ class TypeVisitor(visitor.Visitor):
         self.do_visit(node.identifier)
         # Look up the type of the identifier in the current symbol-table scope.
         symbol = self.t_env.get_scope_symbol_table().lookup(node.identifier.name)
-        assert symbol, f"Should not happen, identifier {node.identifier.name} not in scope or missing in symbol table."
+        if not symbol:
+            self.missing_symbol(node.identifier.name)
+            node.set_type_str('<Error>')
+            return
         if symbol_table.symbol_decl_type(self.t_env.get_scope_symbol_table(), node.identifier.name) != \
                 symbol_table.DeclType.Variable:
             self.type_error(node, node.identifier.name, 'expected variable')
+            node.set_type_str('<Error>')
+            return
         node.set_type_str(symbol.get_type_str())
 
     @visit.register
@@ -164,9 +225,11 @@ class TypeVisitor(visitor.Visitor):
         ops_int_arth = [Operator.Minus, Operator.Plus, Operator.Modulus, Operator.IntDivide, Operator.Mult]
         ops_int_compare = [Operator.Lt, Operator.LtEq, Operator.Eq, Operator.NotEq, Operator.GtEq, Operator.Gt]
         ops_str_compare = [Operator.Eq, Operator.NotEq]
-        ops_bool = [Operator.Eq, Operator.NotEq, Operator.And, Operator.Not]
+        ops_bool = [Operator.Eq, Operator.NotEq, Operator.And, Operator.Or]
         base_types = ['int', 'str', 'bool']
-        if node.op in ops_int_arth and node.lhs.get_type_str() == 'int' and node.rhs.get_type_str() == 'int':
+        if '<Error>' in (node.lhs.get_type_str(), node.rhs.get_type_str()):
+            node.set_type_str('<Error>')
+        elif node.op in ops_int_arth and node.lhs.get_type_str() == 'int' and node.rhs.get_type_str() == 'int':
             node.set_type_str('int')
         elif node.op in ops_int_compare and node.lhs.get_type_str() == 'int' and node.rhs.get_type_str() == 'int':
             node.set_type_str('bool')
@@ -180,24 +243,32 @@ class TypeVisitor(visitor.Visitor):
                 self.t_env.is_list_type(node.rhs.get_type_str()):
             t1 = self.t_env.list_elem_type(node.lhs.get_type_str())
             t2 = self.t_env.list_elem_type(node.rhs.get_type_str())
-            node.set_type_str(self.t_env.join(t1, t2))
+            node.set_type_str(self.t_env.list_type(self.t_env.join(t1, t2)))
         elif node.op == Operator.Is and node.lhs.get_type_str() not in base_types and \
-                node.lhs.get_type_str() not in base_types:
+                node.rhs.get_type_str() not in base_types:
             node.set_type_str('bool')
         else:
             self.type_error(node, node.lhs.get_type_str(), node.rhs.get_type_str())
+            node.set_type_str('<Error>')
 
     @visit.register
     def _(self, node: ast.MemberExprNode):
         self.do_visit(node.expr_object)
         self.do_visit(node.member)
         type_str = node.expr_object.get_type_str()
-        for st in self.t_env.get_symbol_table().get_children():
-            if st.get_type() == 'class' and st.get_name() == type_str:
-                if node.member.name not in st.get_identifiers():
-                    self.attribute_error(node, type_str, node.member.name)
-                node.set_type_str(st.lookup(node.member.name).get_type_str())
-                break
+        if type_str == '<Error>':
+            node.set_type_str('<Error>')
+            return
+        if self.t_env.get_class_symbol_table(type_str):
+            # Attributes and methods may be inherited.
+            if symbol := self.t_env.get_member_symbol(type_str, node.member.name):
+                node.set_type_str(symbol.get_type_str())
+            else:
+                self.attribute_error(node, type_str, node.member.name)
+                node.set_type_str('<Error>')
+        else:  # Only objects of classes have attributes and methods.
+            self.attribute_error(node, type_str, node.member.name)
+            node.set_type_str('<Error>')
 
     @visit.register
     def _(self, node: ast.FunctionCallExprNode):
@@ -208,28 +279,32 @@ class TypeVisitor(visitor.Visitor):
             args_type.append(a.get_type_str())
         signature = TypeVisitor.Signature(node.identifier.name, args_type)
         symbol = self.t_env.get_scope_symbol_table().lookup(node.identifier.name)
-        assert symbol, f"Should not happen, identifier {node.identifier.name} not in scope or missing in symbol table."
+        if not symbol:
+            self.missing_symbol(node.identifier.name)
+            node.set_type_str('<Error>')
+            return
         if symbol_table.symbol_decl_type(self.t_env.get_scope_symbol_table(), node.identifier.name) == \
                 symbol_table.DeclType.Variable:
             self.type_error(node, node.identifier.name, 'expected function')
+            node.set_type_str('<Error>')
+            return
         node.set_type_str(symbol.get_type_str())
         # Look function up in current and all enclosing scopes and make sure signature matches function definition.
         scope_st = self.t_env.get_scope_symbol_table()
         found = False
         while scope_st and not found:
-            for st in scope_st.get_children():
-                if st.get_name() == node.identifier.name:
-                    if st.get_type() == 'function':
-                        signature_defined = self.get_signature(st)
-                    else:
-                        # A class constructor. They are not allowed to have arguments in ChocoPy.
-                        signature_defined = TypeVisitor.Signature(st.get_name(), [])
-                    if not signature_defined.call_compatible(signature, self.t_env):
-                        self.type_error(node, str(signature), str(signature_defined))
-                    found = True
-                    break
+            if st := scope_st.get_child(node.identifier.name):
+                if st.get_type() == 'function':
+                    signature_defined = self.get_signature(st)
+                else:
+                    # A class constructor. They are not allowed to have arguments in ChocoPy.
+                    signature_defined = TypeVisitor.Signature(st.get_name(), [])
+                if not signature_defined.call_compatible(signature, self.t_env):
+                    self.type_error(node, str(signature), str(signature_defined))
+                found = True
             scope_st = scope_st.get_parent()
-        assert found, f"Should not happen, missing symbol table for function identifier {node.identifier.name}."
+        if not found:
+            self.missing_symbol(node.identifier.name)
 
     @visit.register
     def _(self, node: ast.MethodCallExprNode):
@@ -239,14 +314,14 @@ class TypeVisitor(visitor.Visitor):
         for a in node.args:
             self.do_visit(a)
             args_type.append(a.get_type_str())
+        if '<Error>' in (type_str_expr, node.member.get_type_str()):
+            node.set_type_str('<Error>')
+            return
         signature = TypeVisitor.Signature(node.member.member.name, args_type)
-        for st in self.t_env.get_symbol_table().get_children():
-            if st.get_type() == 'class' and st.get_name() == type_str_expr:
-                if m_st := st.get_methods_sym_table(node.member.member.name):
-                    signature_defined = self.get_signature(m_st)
-                    if not signature_defined.call_compatible(signature, self.t_env):
-                        self.type_error(node, str(signature), str(signature_defined))
-                break
+        if m_st := self.t_env.get_method_symbol_table(type_str_expr, node.member.member.name):
+            signature_defined = self.get_signature(m_st)
+            if not signature_defined.call_compatible(signature, self.t_env):
+                self.type_error(node, str(signature), str(signature_defined))
         node.set_type_str(node.member.get_type_str())
 
     @visit.register
@@ -256,13 +331,13 @@ class TypeVisitor(visitor.Visitor):
     @visit.register
     def _(self, node: ast.IfStmtNode):
         self.do_visit(node.condition)
-        if node.condition.get_type_str() != 'bool':
+        if node.condition.get_type_str() not in ['bool', '<Error>']:
             self.type_error(node, node.condition.get_type_str(), 'bool')
         for s in node.then_body:
             self.do_visit(s)
         for e in node.elifs:
             self.do_visit(e[0])
-            if e[0].get_type_str() != 'bool':
+            if e[0].get_type_str() not in ['bool', '<Error>']:
                 self.type_error(node, e[0].get_type_str(), 'bool')
             for s in e[1]:
                 self.do_visit(s)
@@ -319,7 +394,6 @@ class TypeVisitor(visitor.Visitor):
         self.do_visit(node.return_type)
 
         # Here we do the type checking of the function definition.
-        module_st = self.t_env.get_symbol_table()
         scope_st = self.t_env.get_scope_symbol_table()
         parent_st = scope_st.get_parent()
         is_method = parent_st and parent_st.get_type() == 'class'
@@ -330,9 +404,8 @@ class TypeVisitor(visitor.Visitor):
             elif signature.args_type[0] != parent_st.get_name():  # ... of the same type as the enclosing class.
                 self.type_error(node, signature.args_type[0], parent_st.get_name())
             else:  # We also need to ensure that the signatures of overriding methods are compatible.
-                supertypes = self.t_env.get_supertypes_of(parent_st.get_name())
-                for st in module_st.get_children():
-                    if st.get_type() == 'class' and st.get_name() in supertypes:
+                for t in self.t_env.get_supertypes_of(parent_st.get_name()):
+                    if st := self.t_env.get_class_symbol_table(t):
                         if m_st := st.get_methods_sym_table(scope_st.get_name()):
                             super_signature = self.get_signature(m_st)
                             if not signature.method_compatible(super_signature, self.t_env):
@@ -340,16 +413,84 @@ class TypeVisitor(visitor.Visitor):
 
         for d in node.declarations:
             self.do_visit(d)
+        if self.lazy:
+            name = self.qualified_name(scope_st)
+            self.pending[name] = node.statements
+            self.positions[name] = len(self.diagnostics)
+        else:
+            for s in node.statements:
+                self.do_visit(s)
+        self.t_env.exit_scope()
+
+    def qualified_name(self, st: symbol_table.SymbolTable) -> str:
+        """
+        Returns the name of scope st qualified with the names of the enclosing scopes (e.g., 'C.m').
+        """
+        names = []
+        while st is not self.t_env.get_symbol_table():
+            names.append(st.get_name())
+            st = st.get_parent()
+        return '.'.join(reversed(names))
+
+    def check_parallel(self, node: ast.ProgramNode):
+        """
+        Type-checks the program, the function bodies sharded across a pool of worker processes. Each worker gets the
+        symbol table once and returns the types of the expressions and the diagnostics of its bodies, which are merged
+        back so that the annotated tree and the diagnostics (or the error raised) are those of a serial run. While the
+        workers run, the parent lists the expressions of the bodies in the order of expressions(), so that the merge
+        itself only sets types. The seconds spent in the parent on the declarations, on the bodies (workers and
+        listing) and on the merge are left in self.timings.
+        """
+        start = time.perf_counter()
+        self.lazy = True
+        error = None
+        try:
+            for d in node.declarations:
+                self.do_visit(d)
+        except semantic_error.CompilerException as e:
+            error = e  # Raised after the errors of the bodies declared before it, as a serial run would.
+        self.lazy = False
+        declared = time.perf_counter()
+
+        names = list(self.pending)
+        size = max(1, len(names) // (self.workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(
+                self.workers, initializer=init_worker,
+                initargs=(self.t_env.get_symbol_table(), self.pending, self.collect_errors)) as executor:
+            shards = executor.map(check_shard, [names[i:i + size] for i in range(0, len(names), size)])
+            targets = {name: expressions(self.pending[name]) for name in names}
+            results = [r for shard in shards for r in shard]
+        checked = time.perf_counter()
+
+        merged, position = [], 0
+        for name, types, result in results:
+            for e, t in zip(targets[name], types):
+                e.set_type_str(t)
+            if isinstance(result, semantic_error.CompilerException):
+                raise result
+            merged += self.diagnostics[position:self.positions[name]] + result
+            position = self.positions[name]
+            self.checked[name] = result
+        self.diagnostics = merged + self.diagnostics[position:]
+        self.timings = {'declarations': declared - start, 'bodies': checked - declared,
+                        'merge': time.perf_counter() - checked}
+        if error:
+            raise error
         for s in node.statements:
             self.do_visit(s)
-        self.t_env.exit_scope()
 
     @visit.register
     def _(self, node: ast.ProgramNode):
+        if self.workers:
+            self.check_parallel(node)
+            return
         for d in node.declarations:
             self.do_visit(d)
-        for s in node.statements:
-            self.do_visit(s)
+        if self.lazy:
+            self.module_statements = node.statements
+        else:
+            for s in node.statements:
+                self.do_visit(s)
 
     #######################################################################
     # Finish writing the methods below.
@@ -358,18 +499,22 @@ class TypeVisitor(visitor.Visitor):
     @visit.register
     def _(self, node: ast.UnaryOpExprNode):
         self.do_visit(node.operand)
+        if node.operand.get_type_str() == '<Error>':
+            node.set_type_str('<Error>')
         # Minus operator works on integers only
-        if node.op == Operator.Minus:
+        elif node.op == Operator.Minus:
             if node.operand.get_type_str() == 'int':
                 node.set_type_str('int')
             else:
-                raise self.type_error(node, node.operand.get_type_str(), 'int')
+                self.type_error(node, node.operand.get_type_str(), 'int')
+                node.set_type_str('<Error>')
         # Not works on bools only
         elif node.op == Operator.Not:
             if node.operand.get_type_str() == 'bool':
                 node.set_type_str('bool')
             else:
-                raise self.type_error(node, node.operand.get_type_str(), 'bool')
+                self.type_error(node, node.operand.get_type_str(), 'bool')
+                node.set_type_str('<Error>')
         else:
             assert False, "Should not happen, unary operators are (-) and Not only"
 
@@ -377,8 +522,8 @@ class TypeVisitor(visitor.Visitor):
     def _(self, node: ast.IfExprNode):
         self.do_visit(node.condition)
         # condition must be a bool
-        if node.condition.get_type_str() != 'bool':
-            self.type_error(node, node.condition.get_type_str, 'bool')
+        if node.condition.get_type_str() not in ['bool', '<Error>']:
+            self.type_error(node, node.condition.get_type_str(), 'bool')
 
         self.do_visit(node.then_expr)
         self.do_visit(node.else_expr)
@@ -388,13 +533,21 @@ class TypeVisitor(visitor.Visitor):
     @visit.register
     def _(self, node: ast.IndexExprNode):
         self.do_visit(node.list_expr)
+        self.do_visit(node.index)
+        if '<Error>' in (node.list_expr.get_type_str(), node.index.get_type_str()):
+            node.set_type_str('<Error>')
+            return
+
         # the list_expr must be a list type or a string
         if not (self.t_env.is_list_type(node.list_expr.get_type_str()) or node.list_expr.get_type_str() == 'str'):
             self.type_error(node, node.list_expr.get_type_str(), 'str or list-type')
+            node.set_type_str('<Error>')
+            return
 
-        self.do_visit(node.index)
         if node.index.get_type_str() != 'int':
             self.type_error(node, node.index.get_type_str(), 'int')
+            node.set_type_str('<Error>')
+            return
 
         if node.list_expr.get_type_str() == 'str':
             node.set_type_str('str')
@@ -418,18 +571,21 @@ class TypeVisitor(visitor.Visitor):
         # Note, if there is no return expression, set the type to return type to <None>.
         # Also, throw and exception if return statement is used outside a function
         #    self.invalid_use_error(node, "return statement used outside a function")
-        if self.t_env.get_scope_symbol_table().get_type() != 'function':
-            self.invalid_use_error(node, "return statement used outside a function")      
+        in_function = self.t_env.get_scope_symbol_table().get_type() == 'function'
+        if not in_function:
+            self.invalid_use_error(node, "return statement used outside a function")
 
         # no return type means is None
         if node.expr is None:
             node.expr = ast.NoneLiteralExprNode()
         self.do_visit(node.expr)
+        if not in_function:
+            return
 
         # check if return type matches return type of function
         func_sym = self.t_env.get_scope_symbol_table().get_parent().lookup(self.t_env.get_scope_symbol_table().get_name())
-        if func_sym.get_type_str() != node.expr.get_type_str():
-            raise self.type_error(node, node.expr.get_type_str(), func_sym.get_type_str())
+        if func_sym.get_type_str() != node.expr.get_type_str() and node.expr.get_type_str() != '<Error>':
+            self.type_error(node, node.expr.get_type_str(), func_sym.get_type_str())
 
     @visit.register
     def _(self, node: ast.AssignStmtNode):
@@ -445,7 +601,8 @@ class TypeVisitor(visitor.Visitor):
             self.do_visit(t)
             # target must not be read-only identifier
             if isinstance(t, ast.IdentifierExprNode):
-                if self.t_env.get_scope_symbol_table().lookup(t.identifier.name).is_read_only():
+                t_symbol = self.t_env.get_scope_symbol_table().lookup(t.identifier.name)
+                if t_symbol and t_symbol.is_read_only():
                     self.invalid_use_error(node, "Cannot assign to implicitly declared variable")
             if not self.t_env.is_assign_comp(expr_type, t.get_type_str()):
                 self.type_error(node, t.get_type_str(), expr_type)
@@ -453,7 +610,7 @@ class TypeVisitor(visitor.Visitor):
     @visit.register
     def _(self, node: ast.WhileStmtNode):
         self.do_visit(node.condition)
-        if not node.condition.get_type_str() == 'bool':
+        if node.condition.get_type_str() not in ['bool', '<Error>']:
             self.type_error(node, node.condition.get_type_str(), 'bool')
         for s in node.body:
             self.do_visit(s)
@@ -464,17 +621,21 @@ class TypeVisitor(visitor.Visitor):
         self.do_visit(node.identifier)
         self.do_visit(node.iterable)
 
+        id_symbol = self.t_env.get_scope_symbol_table().lookup(node.identifier.name)
+        if not id_symbol:
+            self.missing_symbol(node.identifier.name)
         # The identifier must be a variable, not a function or a class
-        if symbol_table.symbol_decl_type(self.t_env.get_scope_symbol_table(), node.identifier.name) != \
+        elif symbol_table.symbol_decl_type(self.t_env.get_scope_symbol_table(), node.identifier.name) != \
                 symbol_table.DeclType.Variable:
             self.type_error(node, node.identifier.name, 'expected variable')
-
+            id_symbol = None
         # identifier must not be read-only
-        if self.t_env.get_scope_symbol_table().lookup(node.identifier.name).is_read_only():
+        elif id_symbol.is_read_only():
             self.invalid_use_error(node, "Cannot assign to implicitly declared variable")
 
-        id_symbol = self.t_env.get_scope_symbol_table().lookup(node.identifier.name)
-        if node.iterable.get_type_str() == 'str':
+        if id_symbol is None or node.iterable.get_type_str() == '<Error>':
+            pass
+        elif node.iterable.get_type_str() == 'str':
             # identifier must be assignment compatible with string
             if not self.t_env.is_assign_comp('str', id_symbol.get_type_str()):
                 self.type_error(node, id_symbol.get_type_str(), 'str')
@@ -487,3 +648,56 @@ class TypeVisitor(visitor.Visitor):
             self.type_error(node, node.iterable.get_type_str(), "str or list-type")
         for s in node.body:
             self.do_visit(s)
+
+
+# The type checker of a worker process of TypeVisitor.check_parallel.
+worker_visitor = None
+
+
+def init_worker(st: symbol_table.SymbolTable, pending: dict, collect_errors: bool):
+    """
+    Sets up a worker with the symbol table and the function bodies, received once (inherited where processes fork).
+    """
+    global worker_visitor
+    gc.disable()  # Collections would walk, and so copy, the whole tree inherited from the parent, for no garbage.
+    worker_visitor = TypeVisitor(type_env.TypeEnvironment(st), collect_errors, lazy=True)
+    worker_visitor.pending = pending
+
+
+def check_shard(shard: list[str]) -> list:
+    """
+    Type-checks the function bodies named in shard, and returns for each its name, the types of its expressions and
+    its diagnostics (or the error raised).
+    """
+    results = []
+    for name in shard:
+        statements = worker_visitor.pending[name]
+        try:
+            result = worker_visitor.check_function(name)
+        except semantic_error.CompilerException as e:
+            result = e
+        results.append((name, [e.get_type_str() for e in expressions(statements)], result))
+    return results
+
+
+def expressions(node) -> list[ast.ExprNode]:
+    """
+    Returns the expression nodes of a tree (or list of trees) in a fixed order. Like the type checker, it gives a bare
+    return statement a None literal, so that a tree and its type-checked copy give matching nodes. Spans are skipped,
+    as they hold no nodes.
+    """
+    result = []
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, ast.Node):
+            if isinstance(n, ast.ExprNode):
+                result.append(n)
+            elif isinstance(n, ast.ReturnStmtNode) and n.expr is None:
+                n.expr = ast.NoneLiteralExprNode()
+            children = [c for k, c in vars(n).items() if k != 'span' and isinstance(c, (list, tuple, ast.Node))]
+            children.reverse()
+            stack.extend(children)
+        elif isinstance(n, (list, tuple)):
+            stack.extend(reversed(n))
+    return result
@@ -0,0 +1,285 @@
+#
+# Bytecode virtual machine. Version 1.0
+#
+# Runs a bytecode.Program with a single dispatch loop. ChocoPy calls do not recurse in Python: the caller's state
+# is pushed on an explicit call stack, so deep ChocoPy recursion does not depend on Python's. The stack holds at most
+# MAX_CALLS frames, a deeper call is an out-of-memory error, as on the other backends.
+#
+import sys
+import runtime
+from runtime import INT_MIN, INT_MAX, operation_on_none, index_out_of_bounds, integer_overflow, division_by_zero
+from bytecode import *
+
+MAX_CALLS = 1000000
+
+
+class VM:
+
+    def __init__(self, program: Program, out=None, inp=None):
+        self.program = program
+        self.write = (out or sys.stdout).write
+        self.readline = (inp or sys.stdin).readline
+        # The root class: the dispatch table maps method names to CodeObjects, so object.__init__ is one too.
+        init = CodeObject('object.__init__', 1)
+        init.code.extend([LOAD_CONST, init.const_index(None), RETURN_VALUE, 0])
+        root = runtime.make_class('object', runtime.Object, [], {'__init__': init})
+        self.classes = []
+        for name, super_name, attrs, methods in program.classes:
+            base = root if super_name == 'object' else self.classes[self.class_index(super_name)]
+            methods = {m: program.functions[i] for m, i in methods.items()}
+            self.classes.append(runtime.make_class(name, base, attrs, methods))
+        self.root = root
+
+    def class_index(self, name: str) -> int:
+        for i, c in enumerate(self.program.classes):
+            if c[0] == name:
+                return i
+
+    def run(self):
+        """
+        Runs the program. Raises runtime.RuntimeException on ChocoPy run-time errors, out of memory when the calls nest
+        deeper than MAX_CALLS.
+        """
+        functions = self.program.functions
+        classes = self.classes
+        root = self.root
+        write = self.write
+        readline = self.readline
+        to_str = runtime.to_str
+
+        g = list(self.program.global_defaults)
+        co = self.program.module
+        code, consts, names = co.code, co.consts, co.names
+        frame = g
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        calls = []
+        pc = 0
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if op == LOAD_LOCAL:
+                push(frame[arg])
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == STORE_LOCAL:
+                frame[arg] = pop()
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == LOAD_GLOBAL:
+                push(g[arg])
+            elif op == STORE_GLOBAL:
+                g[arg] = pop()
+            elif op == ADD_INT:
+                rhs = pop()
+                v = stack[-1] + rhs
+                if v < INT_MIN or v > INT_MAX:
+                    integer_overflow()
+                stack[-1] = v
+            elif op == SUB_INT:
+                rhs = pop()
+                v = stack[-1] - rhs
+                if v < INT_MIN or v > INT_MAX:
+                    integer_overflow()
+                stack[-1] = v
+            elif op == LT_INT:
+                rhs = pop()
+                stack[-1] = stack[-1] < rhs
+            elif op == LE_INT:
+                rhs = pop()
+                stack[-1] = stack[-1] <= rhs
+            elif op == GT_INT:
+                rhs = pop()
+                stack[-1] = stack[-1] > rhs
+            elif op == GE_INT:
+                rhs = pop()
+                stack[-1] = stack[-1] >= rhs
+            elif op == EQ:
+                rhs = pop()
+                stack[-1] = stack[-1] == rhs
+            elif op == NE:
+                rhs = pop()
+                stack[-1] = stack[-1] != rhs
+            elif op == INDEX_LIST:
+                i = pop()
+                lst = stack[-1]
+                if lst is None:
+                    operation_on_none()
+                if i < 0 or i >= len(lst):
+                    index_out_of_bounds()
+                stack[-1] = lst[i]
+            elif op == CALL_FUNC:
+                callee = functions[arg]
+                n = callee.n_params
+                new_frame = stack[-n - 1:] if n else [pop()]
+                if n:
+                    del stack[-n - 1:]
+                new_frame.extend(callee.defaults)
+                if len(calls) >= MAX_CALLS:
+                    runtime.out_of_memory()
+                calls.append((code, consts, names, pc, stack, frame))
+                code, consts, names, pc, frame = callee.code, callee.consts, callee.names, 0, new_frame
+                stack = []
+                push = stack.append
+                pop = stack.pop
+            elif op == RETURN_VALUE:
+                v = pop()
+                if not calls:
+                    return
+                code, consts, names, pc, stack, frame = calls.pop()
+                push = stack.append
+                pop = stack.pop
+                push(v)
+            elif op == LOAD_OUTER:
+                f = frame
+                for _ in range(arg >> 16):
+                    f = f[0]
+                push(f[arg & 0xFFFF])
+            elif op == STORE_OUTER:
+                f = frame
+                for _ in range(arg >> 16):
+                    f = f[0]
+                f[arg & 0xFFFF] = pop()
+            elif op == LOAD_LINK:
+                f = frame
+                for _ in range(arg):
+                    f = f[0]
+                push(f)
+            elif op == MUL_INT:
+                rhs = pop()
+                v = stack[-1] * rhs
+                if v < INT_MIN or v > INT_MAX:
+                    integer_overflow()
+                stack[-1] = v
+            elif op == DIV_INT:
+                rhs = pop()
+                if rhs == 0:
+                    division_by_zero()
+                v = stack[-1] // rhs
+                if v > INT_MAX:
+                    integer_overflow()
+                stack[-1] = v
+            elif op == MOD_INT:
+                rhs = pop()
+                if rhs == 0:
+                    division_by_zero()
+                stack[-1] = stack[-1] % rhs
+            elif op == NEG_INT:
+                v = -stack[-1]
+                if v > INT_MAX:
+                    integer_overflow()
+                stack[-1] = v
+            elif op == NOT:
+                stack[-1] = not stack[-1]
+            elif op == IS:
+                rhs = pop()
+                stack[-1] = stack[-1] is rhs
+            elif op == POP:
+                pop()
+            elif op == DUP:
+                push(stack[-1])
+            elif op == FOR_ITER:
+                i = stack[-1]
+                seq = stack[-2]
+                if i < len(seq):
+                    stack[-1] = i + 1
+                    push(seq[i])
+                else:
+                    del stack[-2:]
+                    pc = arg
+            elif op == GET_ITER:
+                if stack[-1] is None:
+                    operation_on_none()
+                push(0)
+            elif op == LOAD_ATTR:
+                obj = stack[-1]
+                if obj is None:
+                    operation_on_none()
+                stack[-1] = getattr(obj, names[arg])
+            elif op == STORE_ATTR:
+                obj = pop()
+                if obj is None:
+                    operation_on_none()
+                setattr(obj, names[arg], pop())
+            elif op == CALL_METHOD:
+                argc = arg >> 16
+                obj = stack[-argc - 1]
+                if obj is None:
+                    operation_on_none()
+                callee = obj.cp_methods[names[arg & 0xFFFF]]
+                new_frame = [None]
+                new_frame.extend(stack[-argc - 1:])
+                del stack[-argc - 1:]
+                new_frame.extend(callee.defaults)
+                if len(calls) >= MAX_CALLS:
+                    runtime.out_of_memory()
+                calls.append((code, consts, names, pc, stack, frame))
+                code, consts, names, pc, frame = callee.code, callee.consts, callee.names, 0, new_frame
+                stack = []
+                push = stack.append
+                pop = stack.pop
+            elif op == NEW:
+                push(runtime.new_object(classes[arg] if arg >= 0 else root))
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    pop()
+                else:
+                    pc = arg
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    pop()
+            elif op == BUILD_LIST:
+                if arg:
+                    lst = stack[-arg:]
+                    del stack[-arg:]
+                    push(lst)
+                else:
+                    push([])
+            elif op == STORE_INDEX_LIST:
+                i = pop()
+                lst = pop()
+                if lst is None:
+                    operation_on_none()
+                if i < 0 or i >= len(lst):
+                    index_out_of_bounds()
+                lst[i] = pop()
+            elif op == INDEX_STR:
+                i = pop()
+                s = stack[-1]
+                if i < 0 or i >= len(s):
+                    index_out_of_bounds()
+                stack[-1] = s[i]
+            elif op == CONCAT_STR:
+                rhs = pop()
+                stack[-1] = stack[-1] + rhs
+            elif op == CONCAT_LIST:
+                rhs = pop()
+                lhs = stack[-1]
+                if lhs is None or rhs is None:
+                    operation_on_none()
+                stack[-1] = lhs + rhs
+            elif op == PRINT_INT:
+                write(str(stack[-1]) + "\n")
+                stack[-1] = None
+            elif op == PRINT_STR:
+                write(stack[-1] + "\n")
+                stack[-1] = None
+            elif op == PRINT:
+                write(to_str(stack[-1]) + "\n")
+                stack[-1] = None
+            elif op == LEN_STR:
+                stack[-1] = len(stack[-1])
+            elif op == LEN:
+                stack[-1] = runtime.builtin_len(stack[-1])
+            elif op == INPUT:
+                line = readline()
+                push(line[:-1] if line.endswith("\n") else line)
+            else:
+                assert False, f"Unknown opcode {op}"